@@ -4,6 +4,12 @@
 import sys
 from pathlib import Path
 
+from src.core.spawn_server import SpawnServer
+
+# 在导入Qt之前启动进程服务，fork出的服务进程不包含Qt
+spawn_server = SpawnServer()
+spawn_server.start()
+
 from PySide6.QtWidgets import QApplication
 from PySide6.QtCore import QTimer
 
@@ -23,11 +29,14 @@ def main():
         app.setStyleSheet(stylesheet)
     
     # 创建主窗口
-    window = MainWindow()
+    window = MainWindow(spawn_server)
     window.show()
     
     # 应用程序主循环
-    return app.exec()
+    try:
+        return app.exec()
+    finally:
+        spawn_server.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,600 @@
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import tempfile
+import tracemalloc
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from .log_index import KIND_COMMAND, iter_log_records
+from .metrics import LatencyHistogram
+from .mock_engine import MockEngine
+from .output_buffer import OutputBuffer
+from .rule_analyzer import generate_matching_commands
+from .rule_manager import Rule, RuleManager
+from .rule_matcher import RuleMatcher
+from .rule_schema import MATCH_ARGV
+from .spawn_server import SpawnServer, measure_spawn_latency
+
+
+# 合成语料中的常见命令，一般不会被规则匹配
+_COMMON_COMMANDS = [
+    'ls', 'ls -l', 'pwd', 'whoami', 'id', 'uname -r', 'hostname', 'uptime', 'date',
+    'ps aux', 'df -h', 'free -m', 'w', 'last -n 5', 'cat /etc/os-release',
+    'netstat -tlnp', 'ss -antp', 'systemctl status sshd', 'echo $PATH', 'env',
+]
+
+
+# 生成字面文本密集规则集所用的片段
+_LITERAL_DIRS = ['/etc/', '/var/log/', '/usr/lib/', '/opt/', '/root/.ssh/', '/proc/', '/home/admin/']
+_LITERAL_WORDS = ['passwd', 'shadow', 'sudoers', 'crontab', 'profile', 'hosts', 'audit',
+                  'authorized_keys', 'login.defs', 'pam.d', 'secure', 'messages', 'cmdline',
+                  'PASS_MAX_DAYS', 'PermitRootLogin', 'Protocol', 'MaxAuthTries', 'umask']
+_LITERAL_COMMANDS = ['cat', 'grep', 'ls -l', 'stat', 'head', 'tail -n 20', 'awk', 'more']
+
+
+class StubbedMockEngine(MockEngine):
+    """
+    不启动子进程的MockEngine
+
+    真实命令、脚本、条件和过滤都返回固定结果，只测量规则匹配和进程内处理的开销。
+    """
+
+    def __init__(self, rule_manager: RuleManager, stub_output: str = "",
+                 stub_returncode: int = 0):
+        """
+        Args:
+            rule_manager: 规则管理器
+            stub_output: 所有子进程阶段返回的输出
+            stub_returncode: 所有子进程阶段返回的退出码（决定条件是否满足）
+        """
+        super().__init__(rule_manager)
+        self.stub_output = stub_output
+        self.stub_returncode = stub_returncode
+        self._stub_bytes = stub_output.encode('utf-8')
+
+    def _process_stream(self, args, stage: str, shell: bool = False,
+                        input_chunks: Optional[Iterable[bytes]] = None, label: str = '命令',
+                        merge_stderr: bool = True) -> '_StubStream':
+        return _StubStream(self.metrics.stage_histogram(stage), self._stub_bytes,
+                           self.stub_returncode, input_chunks)
+
+
+class _StubStream:
+    """StubbedMockEngine的子进程阶段：读完输入后返回固定输出"""
+
+    def __init__(self, histogram: LatencyHistogram, output: bytes, returncode: int,
+                 input_chunks: Optional[Iterable[bytes]]):
+        self.histogram = histogram
+        self.output = output
+        self.returncode = returncode
+        self.input_chunks = input_chunks
+        self.completed = False
+
+    def stop(self):
+        pass
+
+    def __iter__(self) -> Iterator[bytes]:
+        start = time.perf_counter_ns()
+        if self.input_chunks is not None:
+            for _ in self.input_chunks:
+                pass
+        self.completed = True
+        self.histogram.record(time.perf_counter_ns() - start)
+        yield self.output
+
+
+def load_log_commands(log_path: Union[str, Path], limit: Optional[int] = None) -> List[str]:
+    """从ssh_commands.log读取记录的命令"""
+    commands = []
+    for record in iter_log_records(log_path):
+        if record.kind != KIND_COMMAND:
+            continue
+        commands.append(record.command)
+        if limit is not None and len(commands) >= limit:
+            break
+    return commands
+
+
+def synthetic_commands(rules: Sequence[Rule], count: int, match_ratio: float = 0.5,
+                       seed: int = 0) -> List[str]:
+    """
+    生成合成语料
+
+    Args:
+        rules: 规则列表，按各启用规则的模式生成匹配样本
+        count: 命令数量
+        match_ratio: 取自规则样本的比例，其余取自常见命令
+        seed: 随机种子
+    """
+    rng = random.Random(seed)
+    pools = []
+    for rule in rules:
+        if not rule.enabled:
+            continue
+        if rule.match_mode == MATCH_ARGV:
+            # 参数模式本身就是一条命令，不含通配符时即为匹配样本
+            samples = [rule.pattern] if rule.matches(rule.pattern) else []
+        else:
+            samples = generate_matching_commands(rule.pattern, 20, seed=rng.randrange(1 << 30))
+        if samples:
+            pools.append(samples)
+
+    commands = []
+    for _ in range(count):
+        if pools and rng.random() < match_ratio:
+            commands.append(rng.choice(rng.choice(pools)))
+        else:
+            commands.append(rng.choice(_COMMON_COMMANDS))
+    return commands
+
+
+def literal_heavy_rules(count: int, seed: int = 0) -> List[Rule]:
+    """
+    生成字面文本密集的合成规则集
+
+    模式形如默认规则中的 cat\\s+/etc/xxx、grep\\s+PASS_MAX_DAYS，每条规则都带有独特的字面文本。
+    """
+    rng = random.Random(seed)
+    rules = []
+    for index in range(count):
+        word = f"{rng.choice(_LITERAL_WORDS)}{index}"
+        command = rng.choice(_LITERAL_COMMANDS).replace(' ', '\\s+')
+        shape = index % 3
+        if shape == 0:
+            pattern = f"{command}\\s+{re.escape(rng.choice(_LITERAL_DIRS) + word)}"
+        elif shape == 1:
+            pattern = f"{command}\\s+.*{re.escape(word)}"
+        else:
+            pattern = (f"{re.escape(rng.choice(_LITERAL_DIRS) + word)}|"
+                       f"{command}\\s+-[a-z]+\\s+{re.escape(word)}")
+        rules.append(Rule(index + 1, f"synthetic-{index + 1}", "", pattern, 'empty'))
+    return rules
+
+
+class MatcherBenchmark:
+    """规则匹配器在开启和关闭字面文本前置过滤时的对比结果"""
+
+    def __init__(self, rules: int, commands: int, plain_ns: int, prefilter_ns: int,
+                 candidates: int, states: int):
+        self.rules = rules
+        self.commands = commands
+        self.plain_ns = plain_ns
+        self.prefilter_ns = prefilter_ns
+        self.candidates = candidates  # 前置过滤后需要运行正则的规则总数
+        self.states = states          # 自动机状态数
+
+    @property
+    def speedup(self) -> float:
+        """前置过滤带来的加速倍数"""
+        return self.plain_ns / self.prefilter_ns if self.prefilter_ns else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'rules': self.rules,
+            'commands': self.commands,
+            'plain_us_per_command': self.plain_ns / self.commands / 1000 if self.commands else 0.0,
+            'prefilter_us_per_command': self.prefilter_ns / self.commands / 1000 if self.commands else 0.0,
+            'candidates_per_command': self.candidates / self.commands if self.commands else 0.0,
+            'automaton_states': self.states,
+            'speedup': self.speedup,
+        }
+
+    def format(self) -> str:
+        """格式化为文本报告"""
+        data = self.to_dict()
+        return (f"规则数: {self.rules}  命令数: {self.commands}  自动机状态: {self.states}\n"
+                f"逐条匹配: {data['plain_us_per_command']:.2f} us/条\n"
+                f"前置过滤: {data['prefilter_us_per_command']:.2f} us/条  "
+                f"平均候选规则: {data['candidates_per_command']:.2f}\n"
+                f"加速: {self.speedup:.1f}x")
+
+
+def run_matcher_benchmark(rules: Sequence[Rule], commands: Sequence[str],
+                          repeat: int = 3) -> MatcherBenchmark:
+    """
+    对比开启和关闭前置过滤时查找首个匹配规则的耗时，取多次中的最短耗时
+
+    两种方式的匹配结果必须一致，否则抛出AssertionError。
+    """
+    enabled = [rule for rule in rules if rule.enabled]
+    plain = RuleMatcher(enabled, prefilter=False)
+    filtered = RuleMatcher(enabled, prefilter=True)
+
+    timings = []
+    for matcher in (plain, filtered):
+        best = None
+        for _ in range(repeat):
+            find = matcher.find_with_position
+            start = time.perf_counter_ns()
+            for command in commands:
+                find(command)
+            elapsed = time.perf_counter_ns() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings.append(best)
+
+    candidates = 0
+    for command in commands:
+        assert plain.find_with_position(command) == filtered.find_with_position(command), command
+        candidates += sum(1 for _ in filtered._candidate_positions(command))
+
+    states = filtered.literal_index.states if filtered.literal_index else 0
+    return MatcherBenchmark(len(plain.rule_ids), len(commands), timings[0], timings[1],
+                            candidates, states)
+
+
+def legacy_filter_output(command: str, filter_cmd: str) -> str:
+    """
+    引擎改为字节流之前的过滤实现，只用于对比
+
+    以text=True读取真实命令的完整输出并拼接stdout和stderr，再写入临时脚本
+    echo '<输出>' | <过滤器> 执行，以text=True读取过滤结果。
+    """
+    process = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=60)
+    output = process.stdout + (process.stderr if process.stderr else "")
+    with tempfile.NamedTemporaryFile(suffix='.sh', delete=False) as temp:
+        temp.write(f"#!/bin/bash\necho '{output}' | {filter_cmd}\n".encode('utf-8'))
+        temp_path = temp.name
+    try:
+        return subprocess.run(['/bin/bash', temp_path], capture_output=True, text=True,
+                              timeout=60).stdout
+    finally:
+        os.unlink(temp_path)
+
+
+class OutputBenchmark:
+    """大输出经过过滤规则时，各输出路径的耗时和内存峰值"""
+
+    def __init__(self, output_bytes: int, results: List[Tuple[str, int, int]]):
+        """
+        Args:
+            output_bytes: 过滤后的输出大小
+            results: 每种路径的 (名称, 最短耗时纳秒, Python内存峰值字节)
+        """
+        self.output_bytes = output_bytes
+        self.results = results
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'output_bytes': self.output_bytes,
+            'paths': [{
+                'name': name,
+                'seconds': elapsed / 1e9,
+                'peak_bytes': peak,
+                'peak_copies': peak / self.output_bytes if self.output_bytes else 0.0,
+            } for name, elapsed, peak in self.results],
+        }
+
+    def format(self) -> str:
+        """格式化为文本报告"""
+        lines = [f"输出大小: {self.output_bytes / 1048576:.1f} MB  "
+                 "(峰值倍数 = Python内存峰值 / 输出大小，约等于同时存在的输出副本数)",
+                 f"{'路径':<10}{'耗时(s)':>10}{'内存峰值(MB)':>14}{'峰值倍数':>10}"]
+        for path in self.to_dict()['paths']:
+            lines.append(f"{path['name']:<10}{path['seconds']:>10.3f}"
+                         f"{path['peak_bytes'] / 1048576:>14.1f}{path['peak_copies']:>10.2f}")
+        return '\n'.join(lines)
+
+
+def run_output_benchmark(size_mb: int = 16, repeat: int = 3) -> OutputBenchmark:
+    """
+    对比大输出经过过滤规则（过滤器为cat）时各输出路径的开销
+
+    - legacy: 字节流之前的实现（legacy_filter_output）
+    - str: process_command，内部为字节，最后解码一次
+    - bytes: process_command_bytes，不解码
+    - buffer: process_command_buffer，超过内存上限的部分转存到临时文件，通过mmap读取
+    - stream: process_command_stream写入丢弃数据的sink，不保存完整输出
+
+    耗时取多次中的最短值；内存峰值在tracemalloc下单独执行一次统计。
+    各路径的输出必须一致，否则抛出AssertionError。
+    """
+    size = size_mb * 1024 * 1024
+    command = f"yes 'abcdefghijklmnopqrstuvwxyz0123456789' | head -c {size}"
+    filter_cmd = 'cat'
+    rule_manager = RuleManager()
+    rule_manager.add_rule(Rule(0, "输出基准", "", r"^yes ", 'filter', filter=filter_cmd))
+    engine = MockEngine(rule_manager)
+
+    received = [0]
+
+    def discard(chunk: bytes):
+        received[0] += len(chunk)
+
+    paths = [
+        ('legacy', lambda: legacy_filter_output(command, filter_cmd)),
+        ('str', lambda: engine.process_command(command)[0]),
+        ('bytes', lambda: engine.process_command_bytes(command)[0]),
+        ('buffer', lambda: engine.process_command_buffer(command)[0]),
+        ('stream', lambda: engine.process_command_stream(command, discard)),
+    ]
+
+    expected = engine.process_command_bytes(command)[0]
+    results = []
+    for name, run in paths:
+        best = None
+        for _ in range(repeat):
+            received[0] = 0
+            start = time.perf_counter_ns()
+            output = run()
+            elapsed = time.perf_counter_ns() - start
+            best = elapsed if best is None else min(best, elapsed)
+        if name == 'stream':
+            assert received[0] == len(expected), name
+        elif isinstance(output, OutputBuffer):
+            assert output.getbuffer() == expected, name
+            output.close()
+        else:
+            data = output.encode('utf-8') if isinstance(output, str) else output
+            # 旧实现的 echo 会在末尾多输出一个换行
+            assert data.rstrip(b'\n') == expected.rstrip(b'\n'), name
+        del output
+
+        tracemalloc.start()
+        output = run()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        if isinstance(output, OutputBuffer):
+            output.close()
+        del output
+        results.append((name, best, peak))
+    return OutputBenchmark(len(expected), results)
+
+
+class SpawnBenchmark:
+    """GUI规模的进程中，直接fork启动子进程和通过进程服务启动的延迟对比"""
+
+    def __init__(self, ballast_mb: int, qt_loaded: bool, results: List[Tuple[str, Dict[str, float]]]):
+        """
+        Args:
+            ballast_mb: 测量前在当前进程中分配并写入的内存（MB），模拟GUI进程的内存占用
+            qt_loaded: 测量时是否已加载Qt并创建QApplication
+            results: 每种启动方式的 (名称, measure_spawn_latency结果)
+        """
+        self.ballast_mb = ballast_mb
+        self.qt_loaded = qt_loaded
+        self.results = results
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'ballast_mb': self.ballast_mb,
+            'qt_loaded': self.qt_loaded,
+            'paths': [dict(name=name, **latency) for name, latency in self.results],
+        }
+
+    def format(self) -> str:
+        """格式化为文本报告"""
+        lines = [f"附加内存: {self.ballast_mb} MB  Qt: {'已加载' if self.qt_loaded else '未加载'}",
+                 f"{'方式':<14}{'启动均值(ms)':>14}{'启动P99(ms)':>14}{'总均值(ms)':>12}{'总P99(ms)':>12}"]
+        for name, latency in self.results:
+            lines.append(f"{name:<14}{latency['spawn_avg_ms']:>14.3f}{latency['spawn_p99_ms']:>14.3f}"
+                         f"{latency['total_avg_ms']:>12.3f}{latency['total_p99_ms']:>12.3f}")
+        return '\n'.join(lines)
+
+
+def run_spawn_benchmark(count: int = 200, ballast_mb: int = 256) -> SpawnBenchmark:
+    """
+    对比子进程启动延迟
+
+    先启动进程服务（此时进程还很小，和main.py中导入Qt之前启动一致），再分配ballast_mb的内存、
+    尽量加载Qt，然后分别用subprocess.Popen和SpawnServer.popen启动/bin/true。
+    CPython 3.10起subprocess在条件允许时用vfork，解释器支持时另外测量关闭vfork（完整fork）的延迟。
+    """
+    server = SpawnServer()
+    if not server.start():
+        raise RuntimeError("当前平台不支持进程服务")
+    try:
+        ballast = bytearray(ballast_mb * 1024 * 1024)
+        for offset in range(0, len(ballast), 4096):
+            ballast[offset] = 1
+        qt_loaded = False
+        try:
+            os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+            from PySide6.QtWidgets import QApplication
+            qt_loaded = (QApplication.instance() or QApplication([])) is not None
+        except ImportError:
+            pass
+
+        results = [('popen', measure_spawn_latency(subprocess.Popen, count))]
+        if getattr(subprocess, '_USE_VFORK', False):
+            subprocess._USE_VFORK = False
+            try:
+                results.append(('popen_fork', measure_spawn_latency(subprocess.Popen, count)))
+            finally:
+                subprocess._USE_VFORK = True
+        results.append(('spawn_server', measure_spawn_latency(server.popen, count)))
+        del ballast
+        return SpawnBenchmark(ballast_mb, qt_loaded, results)
+    finally:
+        server.close()
+
+
+class BenchmarkReport:
+    """基准测试结果"""
+
+    def __init__(self, engine: MockEngine, commands: int, simulated: int,
+                 elapsed: float, latency: LatencyHistogram, rate: Optional[float]):
+        self.commands = commands
+        self.simulated = simulated
+        self.elapsed = elapsed
+        self.latency = latency
+        self.rate = rate
+
+        snapshot = engine.rule_manager.snapshot
+        self.decision_cache = engine.rule_manager.decision_cache.stats()
+        engine_metrics = engine.metrics.to_dict()
+        self.stages = engine_metrics['stages']
+        self.rule_hits = []
+        for rule_id, counters in engine_metrics['rules'].items():
+            rule = snapshot.get_rule(int(rule_id))
+            self.rule_hits.append({
+                'id': int(rule_id),
+                'name': rule.name if rule else '',
+                'matched': counters['matched'],
+                'before_match': counters['before_match'],
+                'evaluated': counters['evaluated'],
+            })
+        self.rule_hits.sort(key=lambda hit: hit['matched'], reverse=True)
+
+    @property
+    def passthrough(self) -> int:
+        """未被模拟、直接执行的命令数量"""
+        return self.commands - self.simulated
+
+    @property
+    def throughput(self) -> float:
+        """每秒处理的命令数量"""
+        return self.commands / self.elapsed if self.elapsed > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'commands': self.commands,
+            'simulated': self.simulated,
+            'passthrough': self.passthrough,
+            'simulated_ratio': self.simulated / self.commands if self.commands else 0.0,
+            'elapsed_seconds': self.elapsed,
+            'target_rate': self.rate,
+            'throughput': self.throughput,
+            'latency': self.latency.summary(),
+            'stages': self.stages,
+            'decision_cache': self.decision_cache,
+            'rules': self.rule_hits,
+        }
+
+    def format(self) -> str:
+        """格式化为文本报告"""
+        if not self.commands:
+            return "没有可回放的命令"
+        latency = self.latency.summary()
+        lines = [
+            f"命令数: {self.commands}  耗时: {self.elapsed:.3f}s  "
+            f"吞吐: {self.throughput:.0f} 条/秒" +
+            (f"  目标速率: {self.rate:.0f} 条/秒" if self.rate else ""),
+            f"被模拟: {self.simulated} ({self.simulated / self.commands:.1%})  "
+            f"直接执行: {self.passthrough} ({self.passthrough / self.commands:.1%})",
+            f"延迟(ms): p50={latency['p50_ms']:.4f} p90={latency['p90_ms']:.4f} "
+            f"p99={latency['p99_ms']:.4f} p99.9={latency['p999_ms']:.4f} max={latency['max_ms']:.4f}",
+            f"匹配缓存: 命中率 {self.decision_cache['hit_rate']:.1%}  "
+            f"命中 {self.decision_cache['hits']}  未命中 {self.decision_cache['misses']}  "
+            f"淘汰 {self.decision_cache['evictions']}",
+            "",
+            f"{'ID':>5}  {'命中':>8}  {'占比':>7}  {'匹配前':>8}  {'测试':>8}  名称",
+        ]
+        for hit in self.rule_hits:
+            lines.append(
+                f"{hit['id']:>5}  {hit['matched']:>8}  {hit['matched'] / self.commands:>7.1%}  "
+                f"{hit['before_match']:>8}  {hit['evaluated']:>8}  {hit['name']}"
+            )
+        return '\n'.join(lines)
+
+
+def run_benchmark(engine: MockEngine, commands: Iterable[str],
+                  rate: Optional[float] = None) -> BenchmarkReport:
+    """
+    回放命令并统计结果
+
+    Args:
+        engine: 模拟引擎，通常为StubbedMockEngine
+        commands: 要回放的命令
+        rate: 每秒命令数，为None时全速回放。按固定间隔发送，
+              延迟从计划发送时间算起，处理落后时排队等待的时间也计入延迟
+    """
+    engine.metrics.reset()
+    engine.rule_manager.decision_cache.reset_stats()
+    latency = LatencyHistogram()
+    interval_ns = int(1e9 / rate) if rate else 0
+    count = 0
+    simulated = 0
+
+    start = time.perf_counter_ns()
+    for command in commands:
+        if interval_ns:
+            scheduled = start + count * interval_ns
+            delay = scheduled - time.perf_counter_ns()
+            if delay > 0:
+                time.sleep(delay / 1e9)
+        else:
+            scheduled = time.perf_counter_ns()
+
+        _, was_simulated = engine.process_command_bytes(command)
+        latency.record(time.perf_counter_ns() - scheduled)
+        simulated += was_simulated
+        count += 1
+
+    elapsed = (time.perf_counter_ns() - start) / 1e9
+    return BenchmarkReport(engine, count, simulated, elapsed, latency, rate)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口: python -m src.core.benchmark"""
+    parser = argparse.ArgumentParser(description="通过MockEngine回放命令的基准测试")
+    parser.add_argument('--rules', default=str(Path(__file__).resolve().parents[2] / 'config' / 'default_rules.json'),
+                        help="规则文件路径")
+    parser.add_argument('--log', help="回放的ssh_commands.log路径，不指定时使用合成语料")
+    parser.add_argument('--count', type=int, default=100000, help="合成语料的命令数量或日志最多读取的命令数量")
+    parser.add_argument('--match-ratio', type=float, default=0.5, help="合成语料中规则样本的比例")
+    parser.add_argument('--seed', type=int, default=0, help="合成语料的随机种子")
+    parser.add_argument('--rate', type=float, help="每秒回放的命令数量，不指定时全速回放")
+    parser.add_argument('--repeat', type=int, default=1, help="语料重复回放的次数")
+    parser.add_argument('--matcher', action='store_true',
+                        help="只对比规则匹配器开启和关闭字面文本前置过滤时的耗时")
+    parser.add_argument('--synthetic-rules', type=int,
+                        help="使用指定数量的字面文本密集合成规则，代替规则文件")
+    parser.add_argument('--output-mb', type=int,
+                        help="只对比指定大小（MB）的输出经过过滤规则时各输出路径的开销")
+    parser.add_argument('--spawn', type=int,
+                        help="只对比指定次数的子进程启动延迟（直接fork与进程服务）")
+    parser.add_argument('--ballast-mb', type=int, default=256,
+                        help="测量启动延迟前分配的内存（MB），模拟GUI进程的大小")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出")
+    args = parser.parse_args(argv)
+
+    if args.spawn:
+        report = run_spawn_benchmark(args.spawn, args.ballast_mb)
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2) if args.json
+              else report.format())
+        return 0
+
+    if args.output_mb:
+        report = run_output_benchmark(args.output_mb, max(args.repeat, 1))
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2) if args.json
+              else report.format())
+        return 0
+
+    rule_manager = RuleManager()
+    if args.synthetic_rules:
+        for rule in literal_heavy_rules(args.synthetic_rules, args.seed):
+            rule_manager.add_rule(rule)
+    elif not rule_manager.load_rules(args.rules):
+        print(f"加载规则失败: {args.rules}", file=sys.stderr)
+        return 1
+
+    if args.log:
+        commands = load_log_commands(args.log, args.count)
+    else:
+        commands = synthetic_commands(rule_manager.snapshot.rules, args.count,
+                                      args.match_ratio, args.seed)
+
+    if args.matcher:
+        report = run_matcher_benchmark(rule_manager.snapshot.rules, commands, max(args.repeat, 1))
+    else:
+        engine = StubbedMockEngine(rule_manager)
+        report = run_benchmark(engine, commands * args.repeat, args.rate)
+    if args.json:
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print(report.format())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,364 @@
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from .log_index import KIND_COMMAND, iter_log_records, split_log_file
+from .regex_guard import RegexGuard, is_risky_pattern
+from .rule_manager import Rule, RuleManager
+from .rule_schema import MATCH_ARGV
+from .shell_parser import ArgvPattern
+
+
+# 日志文件以 "YYYY-MM-DD HH:MM:SS [" 开头，否则按每行一条命令的文本处理
+_LOG_HEADER_RE = re.compile(rb'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d \[')
+
+# 可能引用分组编号的写法，这类模式不能拼接到组合正则中
+_GROUP_REFERENCE_RE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(')
+
+# 语料小于该大小时不启动进程池
+_PARALLEL_THRESHOLD = 8 * 1024 * 1024
+
+
+class CombinedMatcher:
+    """
+    一次得到所有命中规则的匹配器
+
+    所有可以拼接的模式组成一个选择结构作为预筛选：一次search即可判断命令是否
+    可能被任何规则匹配，不匹配的命令（通常占多数）无需逐条测试。
+    命中预筛选的命令再逐条测试，得到全部匹配的规则。重复的命令直接复用结果。
+    包含分组引用、全局内联标志或有回溯风险的模式不参与预筛选，
+    有回溯风险的模式在RegexGuard的时限内匹配。
+    有参数匹配规则时不使用预筛选，参数模式直接逐条测试（命令解析结果有缓存）。
+    """
+
+    # 结果缓存的最大条目数，超过后清空
+    CACHE_SIZE = 100000
+
+    def __init__(self, patterns: Sequence[Optional[Union[str, ArgvPattern]]],
+                 guard_timeout: float = 0.05):
+        """
+        Args:
+            patterns: 按规则顺序排列的正则或参数模式，None表示不参与匹配
+            guard_timeout: 有回溯风险的模式的匹配时限（秒）
+        """
+        self.size = len(patterns)
+        self._entries: List[Tuple[int, str, Union[re.Pattern, ArgvPattern], bool]] = []  # (规则位置, 模式, 正则, 是否有风险)
+        self._guard_timeout = guard_timeout
+        self._guard: Optional[RegexGuard] = None
+        self._cache: Dict[str, Tuple[int, ...]] = {}
+
+        parts = []
+        prefilter_complete = True  # 所有模式都参与了预筛选
+        for index, pattern in enumerate(patterns):
+            if pattern is None:
+                continue
+            if isinstance(pattern, ArgvPattern):
+                self._entries.append((index, pattern.source, pattern, False))
+                prefilter_complete = False
+                continue
+            try:
+                regex = re.compile(pattern, re.IGNORECASE)
+            except re.error:
+                continue
+            risky = is_risky_pattern(pattern)
+            self._entries.append((index, pattern, regex, risky))
+            part = f'(?:{pattern})'
+            if risky or regex.groupindex or _GROUP_REFERENCE_RE.search(pattern) or not self._compiles(part):
+                prefilter_complete = False
+            elif regex.search(''):
+                # 能匹配空串的模式匹配所有命令，预筛选没有意义
+                prefilter_complete = False
+            else:
+                parts.append(part)
+
+        self._prefilter = (re.compile('|'.join(parts), re.IGNORECASE)
+                           if parts and prefilter_complete else None)
+
+    @staticmethod
+    def _compiles(part: str) -> bool:
+        try:
+            re.compile(part, re.IGNORECASE)
+            return True
+        except re.error:
+            return False
+
+    def matches(self, command: str) -> Tuple[int, ...]:
+        """返回匹配命令的所有规则位置（升序）"""
+        hits = self._cache.get(command)
+        if hits is not None:
+            return hits
+
+        if self._prefilter is not None and not self._prefilter.search(command):
+            hits = ()
+        else:
+            found = []
+            for index, pattern, regex, risky in self._entries:
+                if risky:
+                    if self._guard is None:
+                        self._guard = RegexGuard(timeout=self._guard_timeout)
+                    matched = self._guard.search(index, pattern, command)
+                else:
+                    matched = regex.search(command) is not None
+                if matched:
+                    found.append(index)
+            hits = tuple(found)
+
+        if len(self._cache) >= self.CACHE_SIZE:
+            self._cache.clear()
+        self._cache[command] = hits
+        return hits
+
+    def close(self):
+        """关闭受限匹配使用的子进程"""
+        if self._guard is not None:
+            self._guard.close()
+
+
+class _Partial:
+    """一段语料的统计结果"""
+
+    def __init__(self, size: int):
+        self.total = 0
+        self.unmatched = 0
+        self.matched = [0] * size
+        self.won = [0] * size
+        self.samples: List[List[str]] = [[] for _ in range(size)]
+
+    def add(self, command: str, hits: Sequence[int], sample_limit: int):
+        self.total += 1
+        if not hits:
+            self.unmatched += 1
+            return
+        self.won[hits[0]] += 1
+        for index in hits:
+            self.matched[index] += 1
+            if len(self.samples[index]) < sample_limit:
+                self.samples[index].append(command)
+
+    def merge(self, other: '_Partial', sample_limit: int):
+        self.total += other.total
+        self.unmatched += other.unmatched
+        for index in range(len(self.matched)):
+            self.matched[index] += other.matched[index]
+            self.won[index] += other.won[index]
+            room = sample_limit - len(self.samples[index])
+            if room > 0:
+                self.samples[index].extend(other.samples[index][:room])
+
+
+def is_log_file(path: Union[str, Path]) -> bool:
+    """判断语料是否为ssh_commands.log格式"""
+    with open(path, 'rb') as f:
+        return bool(_LOG_HEADER_RE.match(f.read(32)))
+
+
+def _split_text_file(path: Union[str, Path], parts: int) -> List[Tuple[int, int]]:
+    """把文本文件划分为边界对齐到行首的若干区间"""
+    size = os.path.getsize(path)
+    if not size:
+        return []
+    step = max(size // max(parts, 1), 1)
+    ranges = []
+    start = 0
+    with open(path, 'rb') as f:
+        while start < size:
+            f.seek(min(start + step, size))
+            f.readline()
+            end = min(f.tell(), size) if start + step < size else size
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def _iter_commands(path: str, log: bool, start: int, end: int):
+    """读取语料区间中的命令"""
+    if log:
+        for record in iter_log_records(path, start, end):
+            if record.kind == KIND_COMMAND:
+                yield record.command
+        return
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    for line in data.decode('utf-8', 'replace').splitlines():
+        if line.strip():
+            yield line
+
+
+_worker_matcher: Optional[CombinedMatcher] = None
+
+
+def _init_worker(patterns: List[Optional[str]]):
+    """进程池初始化：每个进程只构建一次组合正则"""
+    global _worker_matcher
+    _worker_matcher = CombinedMatcher(patterns)
+
+
+def _cover_range(path: str, log: bool, start: int, end: int, sample_limit: int) -> _Partial:
+    """统计一段语料"""
+    matcher = _worker_matcher
+    partial = _Partial(matcher.size)
+    for command in _iter_commands(path, log, start, end):
+        partial.add(command, matcher.matches(command), sample_limit)
+    return partial
+
+
+class RuleCoverage:
+    """单条规则的覆盖情况"""
+
+    def __init__(self, rule: Rule, matched: int, won: int, samples: List[str], valid: bool):
+        self.rule_id = rule.id
+        self.name = rule.name
+        self.pattern = rule.pattern
+        self.matched = matched  # 模式匹配的命令数
+        self.won = won  # 在首个匹配规则下实际生效的命令数
+        self.samples = samples
+        self.valid = valid
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.rule_id,
+            'name': self.name,
+            'pattern': self.pattern,
+            'matched': self.matched,
+            'won': self.won,
+            'samples': self.samples,
+            'valid': self.valid,
+        }
+
+
+class CoverageReport:
+    """规则覆盖报告"""
+
+    def __init__(self, rules: List[RuleCoverage], total: int, unmatched: int,
+                 elapsed: float, workers: int):
+        self.rules = rules
+        self.total = total
+        self.unmatched = unmatched
+        self.elapsed = elapsed
+        self.workers = workers
+
+    @property
+    def zero_hit_rules(self) -> List[RuleCoverage]:
+        """在语料中没有匹配任何命令的规则"""
+        return [coverage for coverage in self.rules if coverage.matched == 0]
+
+    @property
+    def never_won_rules(self) -> List[RuleCoverage]:
+        """有匹配但总被前面的规则抢先的规则"""
+        return [coverage for coverage in self.rules if coverage.matched and not coverage.won]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'commands': self.total,
+            'unmatched': self.unmatched,
+            'elapsed_seconds': self.elapsed,
+            'workers': self.workers,
+            'rules': [coverage.to_dict() for coverage in self.rules],
+            'zero_hit_rules': [coverage.rule_id for coverage in self.zero_hit_rules],
+            'never_won_rules': [coverage.rule_id for coverage in self.never_won_rules],
+        }
+
+    def format(self) -> str:
+        """格式化为文本报告"""
+        lines = [
+            f"命令数: {self.total}  未匹配: {self.unmatched}  "
+            f"耗时: {self.elapsed:.2f}s  进程数: {self.workers}",
+            "",
+            f"{'ID':>5}  {'匹配':>8}  {'生效':>8}  名称",
+        ]
+        for coverage in self.rules:
+            flag = "" if coverage.valid else "  (模式无效)"
+            lines.append(f"{coverage.rule_id:>5}  {coverage.matched:>8}  {coverage.won:>8}  "
+                         f"{coverage.name}{flag}")
+            for sample in coverage.samples[:3]:
+                lines.append(f"{'':>27}例: {sample[:80]}")
+        if self.zero_hit_rules:
+            lines.append("")
+            lines.append("未命中的规则: " + ", ".join(str(c.rule_id) for c in self.zero_hit_rules))
+        if self.never_won_rules:
+            lines.append("有匹配但从未生效的规则: " + ", ".join(str(c.rule_id) for c in self.never_won_rules))
+        return '\n'.join(lines)
+
+
+def compute_coverage(rules: Sequence[Rule], corpus_path: Union[str, Path],
+                     workers: Optional[int] = None, sample_limit: int = 5) -> CoverageReport:
+    """
+    统计启用规则在语料上的覆盖情况
+
+    Args:
+        rules: 按优先级排列的规则，只统计启用的规则
+        corpus_path: ssh_commands.log 或每行一条命令的文本文件
+        workers: 进程数，默认为CPU核数；语料较小时在当前进程处理
+        sample_limit: 每条规则保留的示例命令数量
+    """
+    start_time = time.perf_counter()
+    path = str(corpus_path)
+    enabled = [rule for rule in rules if rule.enabled]
+    patterns = [rule.get_argv_pattern() if rule.match_mode == MATCH_ARGV else rule.pattern
+                for rule in enabled]
+    log = is_log_file(path)
+
+    workers = workers or os.cpu_count() or 1
+    if os.path.getsize(path) < _PARALLEL_THRESHOLD:
+        workers = 1
+    parts = workers * 4 if workers > 1 else 1
+    ranges = split_log_file(path, parts) if log else _split_text_file(path, parts)
+
+    result = _Partial(len(enabled))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(patterns,)) as executor:
+            futures = [executor.submit(_cover_range, path, log, start, end, sample_limit)
+                       for start, end in ranges]
+            for future in futures:
+                result.merge(future.result(), sample_limit)
+    else:
+        _init_worker(patterns)
+        try:
+            for start, end in ranges:
+                result.merge(_cover_range(path, log, start, end, sample_limit), sample_limit)
+        finally:
+            _worker_matcher.close()
+
+    coverages = [
+        RuleCoverage(rule, result.matched[index], result.won[index], result.samples[index],
+                     rule.get_matcher() is not None)
+        for index, rule in enumerate(enabled)
+    ]
+    return CoverageReport(coverages, result.total, result.unmatched,
+                          time.perf_counter() - start_time, workers)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口: python -m src.core.coverage 语料文件"""
+    parser = argparse.ArgumentParser(description="统计规则在命令语料上的覆盖情况")
+    parser.add_argument('corpus', help="ssh_commands.log 或每行一条命令的文本文件")
+    parser.add_argument('--rules', default=str(Path(__file__).resolve().parents[2] / 'config' / 'default_rules.json'),
+                        help="规则文件路径")
+    parser.add_argument('--workers', type=int, help="进程数，默认为CPU核数")
+    parser.add_argument('--samples', type=int, default=5, help="每条规则保留的示例命令数量")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出")
+    args = parser.parse_args(argv)
+
+    rule_manager = RuleManager()
+    if not rule_manager.load_rules(args.rules):
+        print(f"加载规则失败: {args.rules}", file=sys.stderr)
+        return 1
+
+    report = compute_coverage(rule_manager.snapshot.rules, args.corpus, args.workers, args.samples)
+    if args.json:
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print(report.format())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .rule_manager import Rule
+    from .rule_snapshot import RuleSnapshot
+
+# 匹配结果: (首个匹配的规则, 位置)，未匹配时规则为None、位置为规则数量
+Decision = Tuple[Optional['Rule'], int]
+
+
+class DecisionCache:
+    """
+    规则匹配结果的LRU缓存
+
+    以 (命令, 规则快照版本) 为键，同时缓存匹配和未匹配的结果。
+    规则变化后版本号递增，旧结果不会再被命中；RuleManager发布新快照时还会清空缓存以释放内存。
+    所有操作在一把锁内完成，可以被多个线程同时使用。
+    """
+
+    def __init__(self, capacity: int = 4096, max_command_length: int = 4096):
+        """
+        Args:
+            capacity: 最多缓存的结果数量，为0时不缓存
+            max_command_length: 超过该长度的命令不缓存，避免少量超长命令占用大量内存
+        """
+        self.capacity = capacity
+        self.max_command_length = max_command_length
+        self._entries: 'OrderedDict[Tuple[str, int], Decision]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, command: str, version: int) -> Optional[Decision]:
+        """查找缓存的结果，未命中时返回None"""
+        key = (command, version)
+        with self._lock:
+            decision = self._entries.get(key)
+            if decision is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return decision
+
+    def put(self, command: str, version: int, decision: Decision):
+        """写入结果，超出容量时淘汰最久未使用的结果"""
+        if self.capacity <= 0 or len(command) > self.max_command_length:
+            return
+        key = (command, version)
+        with self._lock:
+            self._entries[key] = decision
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def lookup(self, snapshot: 'RuleSnapshot', command: str,
+               evaluated: Optional[Dict[int, int]] = None) -> Decision:
+        """
+        在快照中查找首个匹配的规则及其位置，优先使用缓存；不确定的结果（受限匹配超时）不缓存
+
+        Args:
+            snapshot: 规则快照
+            command: 命令
+            evaluated: 规则ID -> 测试次数，未命中缓存时为每个实际测试的规则加一
+        """
+        decision = self.get(command, snapshot.version)
+        if decision is None:
+            rule, position, certain = snapshot.matcher.find_with_certainty(command, evaluated)
+            decision = (rule, position)
+            if certain:
+                self.put(command, snapshot.version, decision)
+        return decision
+
+    def clear(self):
+        """清空缓存的结果，保留统计"""
+        with self._lock:
+            self._entries.clear()
+
+    def reset_stats(self):
+        """清零统计"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """命中率"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            size = len(self._entries)
+        return {
+            'capacity': self.capacity,
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hit_rate,
+        }
@@ -0,0 +1,422 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from .benchmark import load_log_commands
+from .coverage import is_log_file
+from .file_metadata import MetadataOverride, parse_metadata_command
+from .mock_engine import MockEngine
+from .pattern_compiler import PatternCompileError, compile_pattern
+from .rule_manager import Rule, RuleManager, build_rule_blocks, export_condition
+from .rule_schema import MATCH_ARGV
+
+
+# bash批量驱动中的真实命令桩，输出随命令一起传入的桩文本
+_STUB_EXEC = 'printf \'%s\' "$__FAKELINUX_STUB"'
+
+# 批量驱动脚本：从fd 3读取以NUL分隔的 (命令, 桩输出)，每条命令在子shell中执行规则块，
+# 规则块中的exit只结束子shell；输出以 \036规则ID\036 开头（未命中为 -），以NUL结尾
+_DRIVER_TEMPLATE = """#!/bin/bash
+while IFS= read -r -d '' CMD <&3 && IFS= read -r -d '' __FAKELINUX_STUB <&3; do
+  (
+{RULE_BLOCKS}
+  printf '\\036-\\036'
+  OUTPUT=$({REAL_EXEC} 2>&1)
+  echo "$OUTPUT"
+  exit 0
+  ) </dev/null
+  printf '\\0'
+done 3<&0
+"""
+
+# 分歧类型
+KIND_DECISION = 'decision'  # 两端命中的规则不同
+KIND_OUTPUT = 'output'      # 命中同一规则但输出不同
+KIND_ERROR = 'error'        # bash端没有给出可解析的结果
+
+StubOutput = Union[str, Callable[[str], str]]
+
+
+def _exportable(rule: Rule) -> bool:
+    """规则模式能否转换为导出脚本中的条件"""
+    try:
+        export_condition(rule)
+        return True
+    except PatternCompileError:
+        return False
+
+
+def build_driver_script(rules: Sequence[Rule]) -> str:
+    """
+    生成差异测试用的bash批量驱动脚本，规则块与导出脚本相同
+
+    无法转换为ERE的规则会使导出失败，这里跳过它们（视为不匹配），由check_ere_patterns报告。
+    """
+    exportable = [rule for rule in rules if _exportable(rule)]
+    blocks = build_rule_blocks(exportable, real_exec=_STUB_EXEC, marker=True)
+    blocks = ['\n'.join('  ' + line if line else line for line in block.split('\n'))
+              for block in blocks]
+    return (_DRIVER_TEMPLATE
+            .replace('{RULE_BLOCKS}', '\n'.join(blocks))
+            .replace('{REAL_EXEC}', _STUB_EXEC))
+
+
+def check_ere_patterns(rules: Sequence[Rule]) -> Dict[int, str]:
+    """检查规则模式转换出的ERE，并交给grep -E确认，返回 {规则ID: 问题说明}"""
+    notes = {}
+    for rule in rules:
+        if not rule.enabled or rule.match_mode == MATCH_ARGV:
+            # 参数模式在导出脚本中由awk匹配，不经过grep
+            continue
+        try:
+            eres = compile_pattern(rule.pattern).to_ere()
+        except PatternCompileError as e:
+            notes[rule.id] = f"无法转换为ERE（差异测试中视为不匹配）: {str(e)}"
+            continue
+        for ere in eres:
+            try:
+                process = subprocess.run(['grep', '-Eiq', '-e', ere], input='',
+                                         capture_output=True, text=True, timeout=5)
+            except Exception as e:
+                notes[rule.id] = f"grep检查失败: {str(e)}"
+                break
+            if process.returncode == 2:
+                notes[rule.id] = f"grep -E不支持转换后的模式 {ere}: {process.stderr.strip()}"
+                break
+            elif process.stderr.strip():
+                notes[rule.id] = f"grep -E警告 {ere}: {process.stderr.strip()}"
+                break
+    return notes
+
+
+class DifferentialEngine(MockEngine):
+    """真实命令执行被替换为桩的MockEngine，条件、过滤和脚本照常执行"""
+
+    def __init__(self, rule_manager: RuleManager, stub_output: StubOutput = ""):
+        super().__init__(rule_manager)
+        self.stub_output = stub_output
+
+    def stub_for(self, command: str) -> str:
+        """命令对应的桩输出"""
+        if callable(self.stub_output):
+            return self.stub_output(command)
+        return self.stub_output
+
+    def _real_command_stream(self, command: str, cache_ttl: Optional[float] = None,
+                             input_chunks: Optional[Iterable[bytes]] = None) -> Iterable[bytes]:
+        return [self.stub_for(command).encode('utf-8')]
+
+    def _render_metadata(self, command: str, override: MetadataOverride) -> Optional[bytes]:
+        """
+        文件属性伪装规则与bash端一致：支持的调用由awk逐行改写桩输出（桩文本不是ls/stat的格式，
+        原样输出，末尾没有换行时补上）；不支持的调用返回None，由ModeRewriter改写桩输出
+        """
+        if parse_metadata_command(command) is None:
+            return None
+        stub = self.stub_for(command).encode('utf-8')
+        return stub if not stub or stub.endswith(b'\n') else stub + b'\n'
+    
+    def evaluate(self, command: str) -> Tuple[Optional[Rule], bytes]:
+        """返回 (命中的规则, 输出)"""
+        rule = self.rule_manager.snapshot.matcher.find(command)
+        if rule is None:
+            return None, self._execute_real_command(command)
+        return rule, self._apply_rule(command, rule)
+
+
+class Divergence:
+    """一条命令在两端的不同结果"""
+
+    def __init__(self, kind: str, command: str, python_rule: Optional[int],
+                 bash_rule: Optional[int], python_output: bytes, bash_output: bytes,
+                 count: int = 1):
+        self.kind = kind
+        self.command = command
+        self.count = count  # 语料中出现的次数
+        self.python_rule = python_rule
+        self.bash_rule = bash_rule
+        self.python_output = python_output
+        self.bash_output = bash_output
+
+    @property
+    def rule_id(self) -> Optional[int]:
+        """用于分组的规则ID，优先取Python端命中的规则"""
+        return self.python_rule if self.python_rule is not None else self.bash_rule
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'kind': self.kind,
+            'command': self.command,
+            'count': self.count,
+            'python_rule': self.python_rule,
+            'bash_rule': self.bash_rule,
+            'python_output': self.python_output.decode('utf-8', 'backslashreplace'),
+            'bash_output': self.bash_output.decode('utf-8', 'backslashreplace'),
+        }
+
+
+def _parse_bash_results(stdout: bytes, count: int) -> List[Optional[Tuple[Optional[int], bytes]]]:
+    """解析驱动脚本输出，无法解析的记录为None；输出保持原始字节"""
+    records = stdout.split(b'\0')
+    results: List[Optional[Tuple[Optional[int], bytes]]] = []
+    for index in range(count):
+        if index >= len(records) - 1:
+            results.append(None)
+            continue
+        parts = records[index].split(b'\036', 2)
+        if len(parts) != 3 or parts[0]:
+            results.append(None)
+            continue
+        rule_id = None if parts[1] == b'-' else int(parts[1]) if parts[1].isdigit() else None
+        if rule_id is None and parts[1] != b'-':
+            results.append(None)
+            continue
+        results.append((rule_id, parts[2]))
+    return results
+
+
+def _run_bash_chunk(script_path: str, commands: Sequence[str], stubs: Sequence[str],
+                    timeout: float) -> Tuple[List[Optional[Tuple[Optional[int], bytes]]], str]:
+    """在一个bash进程中依次执行一批命令，返回 (每条命令的结果, 错误信息)"""
+    data = b''.join(command.encode('utf-8') + b'\0' + stub.encode('utf-8') + b'\0'
+                    for command, stub in zip(commands, stubs))
+    try:
+        process = subprocess.run(['/bin/bash', script_path], input=data, capture_output=True,
+                                 timeout=timeout)
+    except subprocess.TimeoutExpired as e:
+        return _parse_bash_results(e.stdout or b'', len(commands)), "bash执行超时"
+    error = process.stderr.decode('utf-8', 'replace').strip()
+    return _parse_bash_results(process.stdout, len(commands)), error
+
+
+def _normalize(output: bytes) -> bytes:
+    """忽略结尾换行的差异（bash的 $(...) 会去掉结尾换行，echo再补一个）"""
+    return output.rstrip(b'\n')
+
+
+class DifferentialReport:
+    """差异测试结果，分歧按规则分组"""
+
+    def __init__(self, rules: Sequence[Rule], total: int, divergences: List[Divergence],
+                 pattern_notes: Dict[int, str], bash_errors: Dict[str, int]):
+        self.total = total
+        self.divergences = divergences
+        self.pattern_notes = pattern_notes
+        self.bash_errors = bash_errors
+        self._rules = {rule.id: rule for rule in rules}
+
+    @property
+    def divergent(self) -> int:
+        """出现分歧的命令数量（按语料中的出现次数计）"""
+        return sum(divergence.count for divergence in self.divergences)
+
+    @staticmethod
+    def _kinds(divergences: List[Divergence]) -> Dict[str, int]:
+        """按分歧类型计数"""
+        kinds: Dict[str, int] = {}
+        for divergence in divergences:
+            kinds[divergence.kind] = kinds.get(divergence.kind, 0) + divergence.count
+        return kinds
+
+    def by_rule(self) -> Dict[Optional[int], List[Divergence]]:
+        """按规则分组，未命中任何规则的分歧（只可能是错误）归入None"""
+        groups: Dict[Optional[int], List[Divergence]] = {}
+        for divergence in self.divergences:
+            groups.setdefault(divergence.rule_id, []).append(divergence)
+        for divergences in groups.values():
+            divergences.sort(key=lambda divergence: divergence.count, reverse=True)
+        return dict(sorted(groups.items(),
+                           key=lambda item: sum(divergence.count for divergence in item[1]),
+                           reverse=True))
+
+    def to_dict(self, sample_limit: int = 20) -> Dict[str, Any]:
+        """转换为字典，每条规则最多保留sample_limit条分歧"""
+        groups = []
+        for rule_id, divergences in self.by_rule().items():
+            rule = self._rules.get(rule_id)
+            kinds = self._kinds(divergences)
+            groups.append({
+                'rule_id': rule_id,
+                'name': rule.name if rule else '',
+                'pattern': rule.pattern if rule else '',
+                'note': self.pattern_notes.get(rule_id, ''),
+                'count': sum(kinds.values()),
+                'kinds': kinds,
+                'samples': [divergence.to_dict() for divergence in divergences[:sample_limit]],
+            })
+        return {
+            'commands': self.total,
+            'divergent': self.divergent,
+            'pattern_notes': {str(rule_id): note for rule_id, note in self.pattern_notes.items()},
+            'bash_errors': self.bash_errors,
+            'rules': groups,
+        }
+
+    def format(self, sample_limit: int = 3) -> str:
+        """格式化为文本报告"""
+        lines = [f"命令数: {self.total}  分歧: {self.divergent}  "
+                 f"不同的分歧命令: {len(self.divergences)}"]
+        if self.pattern_notes:
+            lines.append("")
+            lines.append("模式问题:")
+            for rule_id, note in sorted(self.pattern_notes.items()):
+                rule = self._rules.get(rule_id)
+                lines.append(f"  #{rule_id} {rule.name if rule else ''}: {note}")
+        if self.bash_errors:
+            lines.append("")
+            lines.append("bash错误输出:")
+            for error, count in sorted(self.bash_errors.items(), key=lambda item: -item[1])[:10]:
+                lines.append(f"  {count:>6}  {error}")
+
+        for rule_id, divergences in self.by_rule().items():
+            rule = self._rules.get(rule_id)
+            kinds = self._kinds(divergences)
+            lines.append("")
+            title = f"#{rule_id} {rule.name}" if rule else "(无规则)"
+            lines.append(f"{title}  {sum(kinds.values())} 条  " +
+                         ' '.join(f"{kind}={count}" for kind, count in sorted(kinds.items())))
+            if rule:
+                lines.append(f"  模式: {rule.pattern}")
+            for divergence in divergences[:sample_limit]:
+                lines.append(f"  命令: {divergence.command}  (x{divergence.count})")
+                if divergence.kind == KIND_DECISION:
+                    lines.append(f"    Python命中: {divergence.python_rule}  "
+                                 f"bash命中: {divergence.bash_rule}")
+                else:
+                    lines.append(f"    Python输出: {divergence.python_output[:200]!r}")
+                    lines.append(f"    bash输出: {divergence.bash_output[:200]!r}")
+        return '\n'.join(lines)
+
+
+def run_differential(rule_manager: RuleManager, commands: Sequence[str],
+                     stub_output: StubOutput = "", workers: Optional[int] = None,
+                     chunk_size: int = 200, command_timeout: float = 5.0,
+                     compare_output: bool = True) -> DifferentialReport:
+    """
+    让Python引擎和导出的bash规则块处理同一批命令，并比较结果
+
+    两端都不执行真实命令：Python端由DifferentialEngine返回桩输出，bash端把 eval "$CMD"
+    替换为输出同一段桩文本。相同的 (命令, 桩输出) 只执行一次，按出现次数计入结果。
+    bash端按批次在线程池中并行执行，每批一个bash进程。
+
+    Args:
+        rule_manager: 规则管理器，两端使用同一个规则快照
+        commands: 命令语料
+        stub_output: 真实命令的桩输出，可以是固定文本或以命令为参数的函数
+        workers: 并行的bash进程数，默认为CPU核数
+        chunk_size: 每个bash进程处理的不同命令数量
+        command_timeout: 每条命令的平均超时（秒），一批的超时为其乘以命令数量
+        compare_output: 是否比较输出，为False时只比较命中的规则
+    """
+    snapshot = rule_manager.snapshot
+    rules = snapshot.rules
+    engine = DifferentialEngine(rule_manager, stub_output)
+    pattern_notes = check_ere_patterns(rules)
+
+    # 语料通常高度重复，相同的输入只执行一次
+    occurrences: Dict[Tuple[str, str], int] = {}
+    for command in commands:
+        key = (command, engine.stub_for(command))
+        occurrences[key] = occurrences.get(key, 0) + 1
+    unique = list(occurrences)
+
+    driver = build_driver_script(rules)
+    with tempfile.NamedTemporaryFile(suffix='.sh', delete=False) as temp:
+        temp.write(driver.encode('utf-8'))
+        script_path = temp.name
+    chunks = [unique[start:start + chunk_size] for start in range(0, len(unique), chunk_size)]
+
+    def run_chunk(chunk: List[Tuple[str, str]]):
+        chunk_commands = [command for command, _ in chunk]
+        bash_results, error = _run_bash_chunk(script_path, chunk_commands,
+                                              [stub for _, stub in chunk],
+                                              command_timeout * len(chunk))
+        python_results = [engine.evaluate(command) for command in chunk_commands]
+        return chunk, python_results, bash_results, error
+
+    divergences: List[Divergence] = []
+    bash_errors: Dict[str, int] = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as executor:
+            for chunk, python_results, bash_results, error in executor.map(run_chunk, chunks):
+                for line in error.splitlines():
+                    bash_errors[line] = bash_errors.get(line, 0) + 1
+                for key, (python_rule, python_output), bash_result in zip(
+                        chunk, python_results, bash_results):
+                    command = key[0]
+                    count = occurrences[key]
+                    python_id = python_rule.id if python_rule else None
+                    if bash_result is None:
+                        divergences.append(Divergence(KIND_ERROR, command, python_id, None,
+                                                      python_output, b'', count))
+                        continue
+                    bash_id, bash_output = bash_result
+                    if bash_id != python_id:
+                        kind = KIND_DECISION
+                    elif compare_output and _normalize(python_output) != _normalize(bash_output):
+                        kind = KIND_OUTPUT
+                    else:
+                        continue
+                    divergences.append(Divergence(kind, command, python_id, bash_id,
+                                                  python_output, bash_output, count))
+    finally:
+        os.unlink(script_path)
+
+    return DifferentialReport(rules, len(commands), divergences, pattern_notes, bash_errors)
+
+
+def load_corpus(path: Union[str, Path], limit: Optional[int] = None) -> List[str]:
+    """读取命令语料，支持ssh_commands.log和每行一条命令的文本文件"""
+    if is_log_file(path):
+        return load_log_commands(path, limit)
+    commands = []
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip():
+                continue
+            commands.append(line)
+            if limit is not None and len(commands) >= limit:
+                break
+    return commands
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口: python -m src.core.differential 语料文件"""
+    parser = argparse.ArgumentParser(description="比较Python引擎与导出bash脚本对同一语料的处理结果")
+    parser.add_argument('corpus', help="ssh_commands.log 或每行一条命令的文本文件")
+    parser.add_argument('--rules', default=str(Path(__file__).resolve().parents[2] / 'config' / 'default_rules.json'),
+                        help="规则文件路径")
+    parser.add_argument('--limit', type=int, help="最多读取的命令数量")
+    parser.add_argument('--stub', default="", help="真实命令的桩输出")
+    parser.add_argument('--workers', type=int, help="并行的bash进程数，默认为CPU核数")
+    parser.add_argument('--chunk', type=int, default=200, help="每个bash进程处理的命令数量")
+    parser.add_argument('--decisions-only', action='store_true', help="只比较命中的规则，不比较输出")
+    parser.add_argument('--json', action='store_true', help="以JSON格式输出")
+    args = parser.parse_args(argv)
+
+    rule_manager = RuleManager()
+    if not rule_manager.load_rules(args.rules):
+        print(f"加载规则失败: {args.rules}", file=sys.stderr)
+        return 1
+
+    commands = load_corpus(args.corpus, args.limit)
+    report = run_differential(rule_manager, commands, args.stub.replace('\\n', '\n'),
+                              args.workers, args.chunk,
+                              compare_output=not args.decisions_only)
+    if args.json:
+        print(json.dumps(report.to_dict(), ensure_ascii=False, indent=2))
+    else:
+        print(report.format())
+    return 1 if report.divergences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
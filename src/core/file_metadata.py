@@ -0,0 +1,1362 @@
+import ctypes
+import glob
+import grp
+import json
+import os
+import pwd
+import re
+import shlex
+import stat
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .shell_parser import AWK_TOKENIZE_FUNCTION, glob_to_regex, split_simple_command
+
+# 不影响输出的长选项对应的“短选项”（输出不是终端，--color=auto 等不起作用）
+NO_OPTION = '-'
+
+# 输出不是终端时不起作用的 --color、--classify 取值
+_NON_TTY_WHEN = ('never', 'no', 'none', 'auto', 'tty', 'if-tty')
+
+# 支持的选项：短选项字符，以及长选项对应的短选项
+_OPTIONS: Dict[str, Tuple[str, Dict[str, str]]] = {
+    'ls': ('laAdnogirthF', {
+        '--all': 'a', '--almost-all': 'A', '--directory': 'd', '--numeric-uid-gid': 'n',
+        '--inode': 'i', '--reverse': 'r', '--human-readable': 'h',
+        '--classify': 'F', '--classify=always': 'F', '--classify=yes': 'F',
+        '--classify=force': 'F',
+        **{f'--classify={when}': NO_OPTION for when in _NON_TTY_WHEN},
+        **{f'--{name}={when}': NO_OPTION for name in ('color', 'colour')
+           for when in _NON_TTY_WHEN},
+    }),
+    'stat': ('L', {'--dereference': 'L'}),
+}
+
+# ls的长格式选项（-n、-g、-o隐含-l），只处理长格式的输出
+LONG_FORMAT_OPTIONS = 'lngo'
+
+# 参数中出现时需要shell展开变量、命令替换或花括号，不在进程内处理
+_UNSUPPORTED_CHARS = '$`{}'
+
+# 通配符；命令中有引号或转义时无法区分通配符是否被引用，不在进程内处理
+_GLOB_CHARS = '*?['
+_QUOTE_CHARS = '\'"\\'
+
+# ls -l 中“最近”的时间范围（秒）：格里高利历平均年长的一半，更早或未来的时间显示年份
+SIX_MONTHS = 31556952 // 2
+
+# C locale的月份缩写
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+# stat的文件类型描述（%F）
+_FILE_TYPES = (
+    (stat.S_ISDIR, 'directory'),
+    (stat.S_ISCHR, 'character special file'),
+    (stat.S_ISBLK, 'block special file'),
+    (stat.S_ISFIFO, 'fifo'),
+    (stat.S_ISLNK, 'symbolic link'),
+    (stat.S_ISSOCK, 'socket'),
+)
+
+# 有这些扩展属性时ls -l在权限后显示 +（ACL）或 .（SELinux上下文）
+_ACL_XATTRS = ('system.posix_acl_access', 'system.posix_acl_default')
+_SELINUX_XATTR = 'security.selinux'
+
+# statx（读取创建时间）
+_AT_FDCWD = -100
+_AT_SYMLINK_NOFOLLOW = 0x100
+_STATX_BTIME = 0x800
+
+
+class _StatxTimestamp(ctypes.Structure):
+    _fields_ = [('tv_sec', ctypes.c_int64), ('tv_nsec', ctypes.c_uint32),
+                ('reserved', ctypes.c_int32)]
+
+
+class _Statx(ctypes.Structure):
+    _fields_ = [
+        ('stx_mask', ctypes.c_uint32), ('stx_blksize', ctypes.c_uint32),
+        ('stx_attributes', ctypes.c_uint64), ('stx_nlink', ctypes.c_uint32),
+        ('stx_uid', ctypes.c_uint32), ('stx_gid', ctypes.c_uint32),
+        ('stx_mode', ctypes.c_uint16), ('spare0', ctypes.c_uint16),
+        ('stx_ino', ctypes.c_uint64), ('stx_size', ctypes.c_uint64),
+        ('stx_blocks', ctypes.c_uint64), ('stx_attributes_mask', ctypes.c_uint64),
+        ('stx_atime', _StatxTimestamp), ('stx_btime', _StatxTimestamp),
+        ('stx_ctime', _StatxTimestamp), ('stx_mtime', _StatxTimestamp),
+        ('stx_rdev_major', ctypes.c_uint32), ('stx_rdev_minor', ctypes.c_uint32),
+        ('stx_dev_major', ctypes.c_uint32), ('stx_dev_minor', ctypes.c_uint32),
+        ('spare2', ctypes.c_uint64 * 14),
+    ]
+
+
+@lru_cache(maxsize=None)
+def _statx_function() -> Optional[Any]:
+    """libc中的statx，不可用时返回None"""
+    try:
+        function = ctypes.CDLL(None, use_errno=True).statx
+    except (OSError, AttributeError):
+        return None
+    function.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_uint,
+                         ctypes.POINTER(_Statx)]
+    function.restype = ctypes.c_int
+    return function
+
+
+def birth_time(path: bytes, follow_symlinks: bool = False) -> Optional[Tuple[int, int]]:
+    """文件的创建时间 (秒, 纳秒)，文件系统或内核不提供时返回None"""
+    function = _statx_function()
+    if function is None:
+        return None
+    buffer = _Statx()
+    flags = 0 if follow_symlinks else _AT_SYMLINK_NOFOLLOW
+    if function(_AT_FDCWD, path, flags, _STATX_BTIME, ctypes.byref(buffer)) != 0:
+        return None
+    if not buffer.stx_mask & _STATX_BTIME:
+        return None
+    return buffer.stx_btime.tv_sec, buffer.stx_btime.tv_nsec
+
+
+@lru_cache(maxsize=1)
+def selinux_enabled() -> bool:
+    """SELinux是否启用（selinuxfs已挂载），启用时stat输出Context行"""
+    return os.path.exists('/sys/fs/selinux/enforce')
+
+
+def _parse_mode(text: str) -> int:
+    """八进制权限位（如 6000），空串为0"""
+    if not text:
+        return 0
+    if not re.fullmatch('[0-7]{1,4}', text):
+        raise ValueError(f"无效的权限位: {text}")
+    return int(text, 8)
+
+
+def _parse_time(text: str) -> int:
+    """本地时间 YYYY-MM-DD HH:MM[:SS] 转换为时间戳"""
+    for time_format in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M'):
+        try:
+            return int(time.mktime(time.strptime(text, time_format)))
+        except ValueError:
+            continue
+    raise ValueError(f"无效的修改时间: {text}（格式为 YYYY-MM-DD HH:MM:SS）")
+
+
+def _user_name(uid: int) -> Optional[str]:
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except KeyError:
+        return None
+
+
+def _group_name(gid: int) -> Optional[str]:
+    try:
+        return grp.getgrgid(gid).gr_name
+    except KeyError:
+        return None
+
+
+def _resolve_user(spec: str) -> Tuple[Optional[int], Optional[str]]:
+    """属主设置（用户名或数字ID）对应的 (uid, 用户名)，系统中不存在的部分为None"""
+    if spec.isdigit():
+        return int(spec), _user_name(int(spec))
+    try:
+        return pwd.getpwnam(spec).pw_uid, spec
+    except KeyError:
+        return None, spec
+
+
+def _resolve_group(spec: str) -> Tuple[Optional[int], Optional[str]]:
+    """属组设置（组名或数字ID）对应的 (gid, 组名)，系统中不存在的部分为None"""
+    if spec.isdigit():
+        return int(spec), _group_name(int(spec))
+    try:
+        return grp.getgrnam(spec).gr_gid, spec
+    except KeyError:
+        return None, spec
+
+
+def absolute_path(path: bytes, cwd: bytes) -> bytes:
+    """按文本规范化的绝对路径（合并 /、去掉 . 并回退 ..，不解析符号链接），用于匹配路径通配符"""
+    if not path.startswith(b'/'):
+        path = cwd + b'/' + path
+    parts: List[bytes] = []
+    for part in path.split(b'/'):
+        if part == b'..':
+            if parts:
+                parts.pop()
+        elif part and part != b'.':
+            parts.append(part)
+    return b'/' + b'/'.join(parts)
+
+
+def _quote(name: bytes) -> bytes:
+    """错误信息中的文件名，与coreutils的引用方式相同（不含控制字符的情况）"""
+    if b"'" not in name:
+        return b"'" + name + b"'"
+    if not any(char in name for char in b'"$`\\!'):
+        return b'"' + name + b'"'
+    return b"'" + name.replace(b"'", b"'\\''") + b"'"
+
+
+def _format_timestamp(seconds: int, nanoseconds: int) -> str:
+    """stat的时间格式：本地时间、纳秒和时区偏移"""
+    tm = time.localtime(seconds)
+    return (time.strftime('%Y-%m-%d %H:%M:%S', tm) + f'.{nanoseconds:09d} '
+            + time.strftime('%z', tm))
+
+
+def human_size(size: int) -> str:
+    """ls -h 的大小：1024进制向上取整，小于10时保留一位小数（1.1K、10K、4.7G）"""
+    if size < 1024:
+        return str(size)
+    units = 'KMGTPEZYRQ'
+    exponent = 0
+    scale = 1024
+    while size // scale >= 1024 and exponent < len(units) - 1:
+        scale *= 1024
+        exponent += 1
+    if size // scale < 10:
+        tenths = -(-size * 10 // scale)
+        if tenths < 100:
+            return f'{tenths // 10}.{tenths % 10}{units[exponent]}'
+    amount = -(-size // scale)
+    if amount >= 1024 and exponent < len(units) - 1:
+        return f'1.0{units[exponent + 1]}'
+    return f'{amount}{units[exponent]}'
+
+
+def type_indicator(mode: int) -> str:
+    """ls -F 在名称后追加的类型标记"""
+    if stat.S_ISREG(mode):
+        return '*' if mode & 0o111 else ''
+    if stat.S_ISDIR(mode):
+        return '/'
+    if stat.S_ISLNK(mode):
+        return '@'
+    if stat.S_ISFIFO(mode):
+        return '|'
+    if stat.S_ISSOCK(mode):
+        return '='
+    return ''
+
+
+def _ls_time(tm: time.struct_time, recent: bool) -> str:
+    """ls -l 的时间列（C locale）：最近半年内显示时分，否则显示年份"""
+    month = MONTHS[tm.tm_mon - 1]
+    if recent:
+        return f'{month} {tm.tm_mday:2d} {tm.tm_hour:02d}:{tm.tm_min:02d}'
+    return f'{month} {tm.tm_mday:2d}  {tm.tm_year}'
+
+
+class MetadataOverride:
+    """
+    文件属性的伪装设置
+
+    paths为路径通配符（* 匹配任意字符，包括 /），与文件按文本规范化的绝对路径比较，为空时应用于所有文件；
+    clear_mode/set_mode为清除和设置的权限位（八进制，如 6000 清除SUID和SGID）；
+    owner/group为属主和属组（名称或数字ID）；mtime为修改时间（本地时间 YYYY-MM-DD HH:MM:SS）。
+    """
+
+    __slots__ = ('paths', 'clear_mode', 'set_mode', 'uid', 'user', 'gid', 'group',
+                 'mtime', 'paths_regex', '_regex')
+
+    def __init__(self, paths: Sequence[str] = (), clear_mode: str = '', set_mode: str = '',
+                 owner: str = '', group: str = '', mtime: str = ''):
+        """
+        Raises:
+            ValueError: 权限位或修改时间格式无效
+        """
+        self.paths = tuple(paths)
+        self.clear_mode = _parse_mode(clear_mode)
+        self.set_mode = _parse_mode(set_mode)
+        self.uid, self.user = _resolve_user(owner) if owner else (None, None)
+        self.gid, self.group = _resolve_group(group) if group else (None, None)
+        self.mtime = _parse_time(mtime) if mtime else None
+        self.paths_regex = '|'.join(glob_to_regex(path) for path in self.paths)
+        self._regex = None
+        if self.paths:
+            self._regex = re.compile(f'^({self.paths_regex})$'.encode('utf-8'), re.DOTALL)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MetadataOverride':
+        """
+        从规则的metadata字段创建
+
+        Raises:
+            ValueError: 设置无效
+        """
+        if not isinstance(data, dict):
+            raise ValueError("文件属性设置必须是对象")
+        try:
+            return cls(**data)
+        except TypeError as e:
+            raise ValueError(str(e))
+
+    @property
+    def changes_owner(self) -> bool:
+        return self.user is not None or self.uid is not None
+
+    @property
+    def changes_group(self) -> bool:
+        return self.group is not None or self.gid is not None
+
+    def matches(self, path: bytes) -> bool:
+        """规范化的绝对路径是否应用本设置"""
+        return self._regex is None or self._regex.match(path) is not None
+
+    def apply_mode(self, mode: int) -> int:
+        """清除、设置权限位，文件类型不变"""
+        return (mode & ~0o7777) | ((mode & 0o7777 & ~self.clear_mode) | self.set_mode)
+
+    def bash_call(self, now: Optional[float] = None) -> str:
+        """导出脚本中调用METADATA_FUNCTION的命令"""
+        values = [
+            self.paths_regex, f'{self.clear_mode:04o}', f'{self.set_mode:04o}',
+            '' if self.uid is None else str(self.uid), self.user or '',
+            '' if self.gid is None else str(self.gid), self.group or '',
+        ]
+        if self.mtime is None:
+            values.extend(['', '', '', ''])
+        else:
+            tm = time.localtime(self.mtime)
+            values.extend([str(self.mtime), _ls_time(tm, True), _ls_time(tm, False),
+                           _format_timestamp(self.mtime, 0)])
+        return ' '.join([METADATA_FUNCTION_NAME] + [shlex.quote(value) for value in values])
+
+    def __repr__(self) -> str:
+        return f"MetadataOverride({list(self.paths)!r})"
+
+
+@lru_cache(maxsize=256)
+def _compile_override(source: str) -> MetadataOverride:
+    return MetadataOverride.from_dict(json.loads(source))
+
+
+def compile_metadata_override(data: Dict[str, Any]) -> MetadataOverride:
+    """
+    编译规则的文件属性设置（按内容缓存，属主和属组在首次编译时解析）
+
+    Raises:
+        ValueError: 设置无效
+    """
+    return _compile_override(json.dumps(data, sort_keys=True))
+
+
+class MetadataCommand:
+    """可以在进程内处理的ls/stat调用"""
+
+    __slots__ = ('program', 'options', 'operands')
+
+    def __init__(self, program: str, options: str, operands: Tuple[str, ...]):
+        self.program = program
+        self.options = options  # 按出现顺序排列的短选项字符（长选项已转换）
+        self.operands = operands
+
+    def __repr__(self) -> str:
+        return f"MetadataCommand({self.program!r}, {self.options!r}, {list(self.operands)!r})"
+
+
+def parse_metadata_command(command: str) -> Optional[MetadataCommand]:
+    """
+    解析ls/stat调用，不支持时返回None
+
+    只支持单条简单命令（没有管道、重定向和前置的变量赋值），选项在_OPTIONS中，
+    ls为长格式；参数不含变量、命令替换和花括号，~ 只支持当前用户。
+    导出脚本中的METADATA_AWK按相同的规则判断，两端对同一命令的处理方式一致。
+    """
+    words = split_simple_command(command)
+    if not words:
+        return None
+    program = words[0].rsplit('/', 1)[-1]
+    if program not in _OPTIONS:
+        return None
+    short_options, long_options = _OPTIONS[program]
+
+    options = []
+    operands = []
+    options_done = False
+    for word in words[1:]:
+        if not options_done and word.startswith('-') and len(word) > 1:
+            if word == '--':
+                options_done = True
+            elif word.startswith('--'):
+                if word not in long_options:
+                    return None
+                if long_options[word] != NO_OPTION:
+                    options.append(long_options[word])
+            else:
+                for char in word[1:]:
+                    if char not in short_options:
+                        return None
+                    options.append(char)
+            continue
+        if any(char in word for char in _UNSUPPORTED_CHARS):
+            return None
+        if word.startswith('~') and word != '~' and not word.startswith('~/'):
+            return None
+        if (any(char in word for char in _GLOB_CHARS)
+                and any(char in command for char in _QUOTE_CHARS)):
+            return None
+        operands.append(word)
+
+    if program == 'ls':
+        if not any(option in LONG_FORMAT_OPTIONS for option in options):
+            return None
+        # 唯一的参数由通配符展开为一个目录时ls不输出目录名，导出脚本无法确定目录
+        if len(operands) == 1 and any(char in operands[0] for char in _GLOB_CHARS):
+            return None
+    return MetadataCommand(program, ''.join(options), tuple(operands))
+
+
+def _expand(word: str) -> List[bytes]:
+    """按shell的方式展开 ~ 和通配符（C locale排序，没有匹配时保留原文）"""
+    if word == '~' or word.startswith('~/'):
+        home = os.environ.get('HOME')
+        if home is None:
+            home = pwd.getpwuid(os.getuid()).pw_dir
+        word = home + word[1:]
+    path = os.fsencode(word)
+    if any(char in word for char in _GLOB_CHARS):
+        matches = sorted(glob.glob(path))
+        if matches:
+            return matches
+    return [path]
+
+
+class FileInfo:
+    """一个文件的属性，已应用伪装设置"""
+
+    __slots__ = ('name', 'path', 'st', 'mode', 'uid', 'gid', 'user', 'group', 'mtime_ns',
+                 'target', 'indicator')
+
+    def __init__(self, name: bytes, path: bytes, st: os.stat_result):
+        self.name = name  # 输出中显示的名称
+        self.path = path
+        self.st = st
+        self.mode = st.st_mode
+        self.uid = st.st_uid
+        self.gid = st.st_gid
+        self.user: Optional[str] = None
+        self.group: Optional[str] = None
+        self.mtime_ns = st.st_mtime_ns
+        self.target = b''
+        self.indicator = ''
+
+
+class _Renderer:
+    """
+    一次调用的输出
+
+    coreutils输出错误信息前会先刷新标准输出，合并后的输出中错误信息按发生的顺序出现。
+    """
+
+    def __init__(self, program: str, override: MetadataOverride):
+        self.program = program
+        self.override = override
+        self.cwd = os.getcwdb()
+        self.now_ns = time.time_ns()
+        self.lines: List[bytes] = []
+        self._users: Dict[int, Optional[str]] = {}
+        self._groups: Dict[int, Optional[str]] = {}
+
+    def error(self, message: bytes):
+        self.lines.append(self.program.encode() + b': ' + message)
+
+    def output(self) -> bytes:
+        return b''.join(line + b'\n' for line in self.lines)
+
+    def info(self, name: bytes, path: bytes, st: os.stat_result) -> FileInfo:
+        """读取属性并应用伪装设置"""
+        info = FileInfo(name, path, st)
+        override = self.override
+        hit = override.matches(absolute_path(path, self.cwd))
+        if hit:
+            info.mode = override.apply_mode(st.st_mode)
+            if override.mtime is not None:
+                info.mtime_ns = override.mtime * 1000000000
+        if hit and override.changes_owner:
+            if override.uid is not None:
+                info.uid = override.uid
+            info.user = override.user
+        else:
+            if info.uid not in self._users:
+                self._users[info.uid] = _user_name(info.uid)
+            info.user = self._users[info.uid]
+        if hit and override.changes_group:
+            if override.gid is not None:
+                info.gid = override.gid
+            info.group = override.group
+        else:
+            if info.gid not in self._groups:
+                self._groups[info.gid] = _group_name(info.gid)
+            info.group = self._groups[info.gid]
+        if stat.S_ISLNK(st.st_mode):
+            try:
+                info.target = os.readlink(path)
+            except OSError:
+                pass
+        return info
+
+    # ls
+
+    @staticmethod
+    def _indicator(path: bytes, st: os.stat_result) -> str:
+        """ACL（+）或SELinux上下文（.）标记"""
+        try:
+            names = os.listxattr(path, follow_symlinks=False)
+        except OSError:
+            return ''
+        if not stat.S_ISLNK(st.st_mode) and any(name in names for name in _ACL_XATTRS):
+            return '+'
+        if _SELINUX_XATTR in names:
+            return '.'
+        return ''
+
+    def ls_info(self, name: bytes, path: bytes, st: os.stat_result) -> FileInfo:
+        info = self.info(name, path, st)
+        info.indicator = self._indicator(path, st)
+        return info
+
+    @staticmethod
+    def sort(infos: List[FileInfo], options: str):
+        """按名称（字节序）或修改时间（-t，真实时间）排序，-r反向"""
+        if 't' in options:
+            infos.sort(key=lambda info: (-info.st.st_mtime_ns, info.name), reverse='r' in options)
+        else:
+            infos.sort(key=lambda info: info.name, reverse='r' in options)
+
+    def _time_column(self, mtime_ns: int) -> str:
+        if mtime_ns > self.now_ns:
+            self.now_ns = time.time_ns()
+        recent = self.now_ns - SIX_MONTHS * 1000000000 < mtime_ns < self.now_ns
+        return _ls_time(time.localtime(mtime_ns // 1000000000), recent)
+
+    def long_lines(self, infos: List[FileInfo], width_infos: List[FileInfo],
+                   options: str) -> List[bytes]:
+        """
+        ls -l 格式的行
+
+        列宽按width_infos计算（命令行参数中的目录虽然单独列出，也参与文件部分的列宽）。
+        用户名和组名左对齐，数字ID右对齐。
+        """
+        numeric = 'n' in options
+        show_owner = 'g' not in options
+        show_group = 'o' not in options
+
+        def owner_text(info: FileInfo) -> Tuple[str, bool]:
+            if numeric or info.user is None:
+                return str(info.uid), True
+            return info.user, False
+
+        def group_text(info: FileInfo) -> Tuple[str, bool]:
+            if numeric or info.group is None:
+                return str(info.gid), True
+            return info.group, False
+
+        inode_width = max(len(str(info.st.st_ino)) for info in width_infos)
+        nlink_width = max(len(str(info.st.st_nlink)) for info in width_infos)
+        owner_width = max(len(owner_text(info)[0]) for info in width_infos)
+        group_width = max(len(group_text(info)[0]) for info in width_infos)
+        size_text = human_size if 'h' in options else str
+        major_width = minor_width = size_width = 0
+        for info in width_infos:
+            if stat.S_ISCHR(info.st.st_mode) or stat.S_ISBLK(info.st.st_mode):
+                major_width = max(major_width, len(str(os.major(info.st.st_rdev))))
+                minor_width = max(minor_width, len(str(os.minor(info.st.st_rdev))))
+                size_width = max(size_width, major_width + 2 + minor_width)
+            else:
+                size_width = max(size_width, len(size_text(info.st.st_size)))
+        any_indicator = any(info.indicator for info in width_infos)
+
+        lines = []
+        for info in infos:
+            parts = []
+            if 'i' in options:
+                parts.append(f'{info.st.st_ino:>{inode_width}} ')
+            mode = stat.filemode(info.mode)
+            if any_indicator:
+                mode += info.indicator or ' '
+            parts.append(f'{mode} {info.st.st_nlink:>{nlink_width}} ')
+            columns = []
+            if show_owner:
+                columns.append((owner_text(info), owner_width))
+            if show_group:
+                columns.append((group_text(info), group_width))
+            for (text, right), width in columns:
+                parts.append(f'{text:>{width}} ' if right else f'{text:<{width}} ')
+            if stat.S_ISCHR(info.st.st_mode) or stat.S_ISBLK(info.st.st_mode):
+                blanks = max(0, size_width - (major_width + 2 + minor_width))
+                parts.append(f'{os.major(info.st.st_rdev):>{major_width + blanks}}, '
+                             f'{os.minor(info.st.st_rdev):>{minor_width}} ')
+            else:
+                parts.append(f'{size_text(info.st.st_size):>{size_width}} ')
+            parts.append(self._time_column(info.mtime_ns) + ' ')
+            line = ''.join(parts).encode('utf-8') + info.name
+            if stat.S_ISLNK(info.st.st_mode):
+                line += b' -> ' + info.target
+                if 'F' in options:
+                    # 符号链接按目标的类型标记，目标不存在时不标记
+                    try:
+                        line += type_indicator(os.stat(info.path).st_mode).encode()
+                    except OSError:
+                        pass
+            elif 'F' in options:
+                # 标记按伪装后的权限判断，与导出脚本改写后的结果一致
+                line += type_indicator(info.mode).encode()
+            lines.append(line)
+        return lines
+
+    def list_directory(self, directory: bytes, options: str, hidden: str) -> Optional[List[bytes]]:
+        """列出目录内容（total行和各项），目录无法打开时记录错误并返回None"""
+        try:
+            with os.scandir(directory) as iterator:
+                entries = [(entry.name, entry.stat(follow_symlinks=False)) for entry in iterator
+                           if hidden or not entry.name.startswith(b'.')]
+        except OSError as e:
+            self.error(b'cannot open directory ' + _quote(directory) + b': '
+                       + os.strerror(e.errno).encode())
+            return None
+        if hidden == 'a':
+            for name in (b'.', b'..'):
+                try:
+                    entries.append((name, os.lstat(directory + b'/' + name)))
+                except OSError:
+                    pass
+
+        infos = [self.ls_info(name, directory + b'/' + name, st) for name, st in entries]
+        self.sort(infos, options)
+        total = sum(info.st.st_blocks for info in infos)
+        if 'h' in options:
+            lines = [b'total ' + human_size(total * 512).encode()]
+        else:
+            lines = [b'total %d' % ((total + 1) // 2)]
+        if infos:
+            lines.extend(self.long_lines(infos, infos, options))
+        return lines
+
+    def ls(self, options: str, operands: Sequence[str]):
+        """GNU ls -l（C locale，输出不是终端）"""
+        hidden = ''
+        for option in options:
+            if option in 'aA':
+                hidden = option
+        paths = [path for word in operands for path in _expand(word)]
+
+        if not paths and 'd' not in options:
+            lines = self.list_directory(b'.', options, hidden)
+            self.lines.extend(lines or [])
+            return
+        if not paths:
+            paths = [b'.']
+
+        infos = []
+        for path in paths:
+            try:
+                st = os.lstat(path)
+            except OSError as e:
+                self.error(b'cannot access ' + _quote(path) + b': ' + os.strerror(e.errno).encode())
+                continue
+            infos.append(self.ls_info(path, path, st))
+        self.sort(infos, options)
+
+        if 'd' in options:
+            directories = []
+            files = infos
+        else:
+            directories = [info for info in infos if stat.S_ISDIR(info.st.st_mode)]
+            files = [info for info in infos if not stat.S_ISDIR(info.st.st_mode)]
+        if files:
+            self.lines.extend(self.long_lines(files, infos, options))
+            if directories:
+                self.lines.append(b'')
+
+        # 只有一个参数时不输出目录名
+        print_name = len(paths) > 1
+        first = True
+        for info in directories:
+            lines = self.list_directory(info.path, options, hidden)
+            if lines is None:
+                continue
+            if print_name:
+                if not first:
+                    self.lines.append(b'')
+                first = False
+                self.lines.append(info.name + b':')
+            self.lines.extend(lines)
+
+    # stat
+
+    def stat(self, options: str, operands: Sequence[str]):
+        """GNU stat的默认格式"""
+        if not operands:
+            self.error(b"missing operand\nTry 'stat --help' for more information.")
+            return
+        follow = 'L' in options
+        for word in operands:
+            for path in _expand(word):
+                try:
+                    st = os.stat(path) if follow else os.lstat(path)
+                except OSError as e:
+                    self.error(b'cannot statx ' + _quote(path) + b': '
+                               + os.strerror(e.errno).encode())
+                    continue
+                self.lines.extend(self.stat_lines(self.info(path, path, st), follow))
+
+    def stat_lines(self, info: FileInfo, follow: bool) -> List[bytes]:
+        st = info.st
+        name = info.name
+        if stat.S_ISLNK(st.st_mode):
+            name += b' -> ' + info.target
+        file_type = 'weird file'
+        if stat.S_ISREG(st.st_mode):
+            file_type = 'regular file' if st.st_size else 'regular empty file'
+        for predicate, description in _FILE_TYPES:
+            if predicate(st.st_mode):
+                file_type = description
+        device = stat.S_ISCHR(st.st_mode) or stat.S_ISBLK(st.st_mode)
+
+        lines = [
+            b'  File: ' + name,
+            f'  Size: {st.st_size:<10}\tBlocks: {st.st_blocks:<10} IO Block: {st.st_blksize:<6} '
+            f'{file_type}',
+        ]
+        device_line = (f'Device: {os.major(st.st_dev)},{os.minor(st.st_dev)}\t'
+                       f'Inode: {st.st_ino:<11} Links: ')
+        if device:
+            device_line += (f'{st.st_nlink:<5} Device type: '
+                            f'{os.major(st.st_rdev)},{os.minor(st.st_rdev)}')
+        else:
+            device_line += str(st.st_nlink)
+        lines.append(device_line)
+        lines.append(f'Access: ({info.mode & 0o7777:04o}/{stat.filemode(info.mode)})  '
+                     f'Uid: ({info.uid:5}/{info.user or "UNKNOWN":>8})   '
+                     f'Gid: ({info.gid:5}/{info.group or "UNKNOWN":>8})')
+        if selinux_enabled():
+            try:
+                context = os.getxattr(info.path, _SELINUX_XATTR, follow_symlinks=follow)
+                lines.append(b'Context: ' + context.rstrip(b'\0'))
+            except OSError:
+                lines.append('Context: ?')
+
+        mtime = divmod(info.mtime_ns, 1000000000)
+        birth = birth_time(info.path, follow)
+        lines.extend([
+            'Access: ' + _format_timestamp(*divmod(st.st_atime_ns, 1000000000)),
+            'Modify: ' + _format_timestamp(*mtime),
+            'Change: ' + _format_timestamp(*divmod(st.st_ctime_ns, 1000000000)),
+            ' Birth: ' + (_format_timestamp(*birth) if birth is not None else '-'),
+        ])
+        return [line if isinstance(line, bytes) else line.encode('utf-8') for line in lines]
+
+
+def render_metadata_command(command: str, override: MetadataOverride) -> Optional[bytes]:
+    """
+    在进程内执行ls/stat调用：用os.lstat/os.scandir读取属性，应用伪装设置后
+    按GNU coreutils（C locale、输出不是终端）的格式生成输出，与标准错误合并
+
+    不支持的调用返回None，由调用方执行真实命令并用ModeRewriter改写输出。
+    """
+    parsed = parse_metadata_command(command)
+    if parsed is None:
+        return None
+    renderer = _Renderer(parsed.program, override)
+    if parsed.program == 'ls':
+        renderer.ls(parsed.options, parsed.operands)
+    else:
+        renderer.stat(parsed.options, parsed.operands)
+    return renderer.output()
+
+
+# 权限字符串（ls -l、stat %A）
+_MODE_PATTERN = rb'[-bcdlps][-r][-w][-xsS][-r][-w][-xsS][-r][-w][-xtT]'
+
+# 输出中的权限字符串：前面是行首、空白、( 或 /，后面可以有ACL或SELinux标记
+_SYMBOLIC_MODE_RE = re.compile(rb'(?:(?<=[ \t(/])|^)(' + _MODE_PATTERN + rb')(?=[.+]?(?:[ \t)]|$))')
+
+# stat默认格式的权限行
+_STAT_ACCESS_RE = re.compile(rb'^Access: \(([0-7]{4})/(' + _MODE_PATTERN + rb')\)')
+
+# 权限字符串首字符对应的文件类型
+_MODE_TYPES = {b'-': stat.S_IFREG, b'd': stat.S_IFDIR, b'l': stat.S_IFLNK, b'c': stat.S_IFCHR,
+               b'b': stat.S_IFBLK, b'p': stat.S_IFIFO, b's': stat.S_IFSOCK}
+
+# stat -t 的输出格式：前四项后面的字段不需要改写，作为最后一个指令的值整体保留
+_TERSE_FORMAT = '%n %s %b %f %Z'
+
+# stat格式中可以改写的指令：八进制权限、权限字符串、十六进制的原始模式
+_FORMAT_VALUE_RE = {'a': re.compile(rb'[0-7]+'), 'A': re.compile(_MODE_PATTERN),
+                    'f': re.compile(rb'[0-9a-f]+')}
+
+
+def _parse_filemode(text: bytes) -> int:
+    """权限字符串（如 -rwsr-xr-x）转换为st_mode"""
+    mode = _MODE_TYPES[text[:1]]
+    for i, char in enumerate(text[1:10]):
+        if char in b'rwxst':
+            mode |= 1 << (8 - i)
+    for i, char in enumerate(text[3:10:3]):
+        if char in b'sStT':
+            mode |= 0o4000 >> i
+    return mode
+
+
+def _stat_format(words: List[str]) -> Optional[List[Tuple[bool, str]]]:
+    """
+    stat -c/--format 的格式按指令切分为 (是否为指令, 指令字母或字面文本)，
+    如 "%a %n" 为 [(True, 'a'), (False, ' '), (True, 'n')]
+
+    --printf 的格式只支持末尾的 \\n 一个转义，去掉后与 -c 相同；-t 按_TERSE_FORMAT处理。
+    不是stat、查询文件系统（-f）、没有给出格式、格式中有带宽度等修饰的指令
+    或无法区分的相邻指令（前一个不是 %a、%A、%f）时返回None。
+    """
+    if words[0].rsplit('/', 1)[-1] != 'stat':
+        return None
+    text = None
+    i = 1
+    while i < len(words):
+        word = words[i]
+        printf = False
+        if word == '--':
+            break
+        if word in ('-c', '--format', '--printf') and i + 1 < len(words):
+            i += 1
+            text, printf = words[i], word == '--printf'
+        elif word.startswith('--format='):
+            text = word[len('--format='):]
+        elif word.startswith('--printf='):
+            text, printf = word[len('--printf='):], True
+        elif word.startswith('-c') and len(word) > 2:
+            text = word[2:]
+        elif word == '--terse':
+            text = _TERSE_FORMAT
+        elif word == '--file-system':
+            return None
+        elif word.startswith('-') and not word.startswith('--'):
+            # -f 输出文件系统的信息，其中的 %a 是可用块数
+            if 'f' in word:
+                return None
+            if 't' in word:
+                text = _TERSE_FORMAT
+        if printf:
+            text = text[:-2] if text.endswith('\\n') and '\\' not in text[:-2] else None
+        i += 1
+    if not text:
+        return None
+
+    pieces: List[Tuple[bool, str]] = []
+    for literal, directive in re.findall(r'([^%]+)|(%.?)', text):
+        if literal or directive == '%%':
+            literal = literal or '%'
+            if pieces and not pieces[-1][0]:
+                pieces[-1] = (False, pieces[-1][1] + literal)
+            else:
+                pieces.append((False, literal))
+            continue
+        letter = directive[1:]
+        if not (letter.isascii() and letter.isalpha()):
+            return None
+        if pieces and pieces[-1][0] and pieces[-1][1] not in _FORMAT_VALUE_RE:
+            return None
+        pieces.append((True, letter))
+    return pieces
+
+
+class ModeRewriter:
+    """
+    不支持在进程内处理的ls/stat调用：按行改写真实命令的输出中的权限
+
+    无法确定每行对应的文件，输出中的权限字符串和stat的权限行都按设置改写（只改权限位）；
+    stat -c/--format 的输出按格式拆分后改写 %a、%A、%f，格式中有 %n 时按文件名匹配路径。
+    导出脚本中的METADATA_AWK（FL_FALLBACK）按相同的规则改写。
+    """
+
+    def __init__(self, command: str, override: MetadataOverride):
+        self.override = override
+        self.cwd = os.getcwdb()
+        words = split_simple_command(command)
+        self.format = _stat_format(words) if words else None
+
+    def _symbolic(self, match: 're.Match') -> bytes:
+        mode = self.override.apply_mode(_parse_filemode(match.group(1)))
+        return stat.filemode(mode).encode()
+
+    def _format_line(self, line: bytes) -> Optional[bytes]:
+        """按stat格式拆分一行并改写权限指令的值，拆分失败时返回None"""
+        values = []
+        position = 0
+        for i, (directive, text) in enumerate(self.format):
+            if not directive:
+                literal = text.encode()
+                if not line.startswith(literal, position):
+                    return None
+                position += len(literal)
+                continue
+            # 权限指令的值由固定的字符组成，其他指令的值到下一段字面文本为止
+            pattern = _FORMAT_VALUE_RE.get(text)
+            if pattern is not None:
+                match = pattern.match(line, position)
+                if match is None:
+                    return None
+                end = match.end()
+            elif i + 1 == len(self.format):
+                end = len(line)
+            else:
+                end = line.find(self.format[i + 1][1].encode(), position)
+                if end < 0:
+                    return None
+            values.append((text, line[position:end]))
+            position = end
+        if position != len(line):
+            return None
+
+        names = [value for letter, value in values if letter == 'n']
+        if names and not self.override.matches(absolute_path(names[0], self.cwd)):
+            return line
+        output = []
+        for letter, value in values:
+            if letter == 'a':
+                value = b'%o' % self.override.apply_mode(int(value, 8))
+            elif letter == 'f':
+                value = b'%x' % self.override.apply_mode(int(value, 16))
+            elif letter == 'A':
+                value = _SYMBOLIC_MODE_RE.sub(self._symbolic, value)
+            output.append(value)
+        # 按原格式重新拼接：字面文本原样保留
+        result = []
+        for directive, text in self.format:
+            result.append(output.pop(0) if directive else text.encode())
+        return b''.join(result)
+
+    def rewrite(self, line: bytes) -> bytes:
+        """改写一行（不含换行符）"""
+        if self.format is not None:
+            rewritten = self._format_line(line)
+            if rewritten is not None:
+                return rewritten
+        line = _SYMBOLIC_MODE_RE.sub(self._symbolic, line)
+        match = _STAT_ACCESS_RE.match(line)
+        if match is not None:
+            octal = b'%04o' % (_parse_filemode(match.group(2)) & 0o7777)
+            line = line[:match.start(1)] + octal + line[match.end(1):]
+        return line
+
+    def stream(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """逐行改写输出流，每个输入块处理完整的行，剩余部分留到下一块（最后一行与awk相同补上换行）"""
+        pending = b''
+        iterator = iter(chunks)
+        try:
+            for chunk in iterator:
+                lines = (pending + chunk).split(b'\n')
+                pending = lines.pop()
+                if lines:
+                    yield b''.join(self.rewrite(line) + b'\n' for line in lines)
+        finally:
+            # 提前结束时关闭上游（结束真实命令）
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+        if pending:
+            yield self.rewrite(pending) + b'\n'
+
+
+# 导出脚本中的文件属性伪装：按parse_metadata_command的规则判断调用是否支持（FL_CHECK），
+# 支持时改写真实命令的C locale输出。ls的输出按空行分段缓存，修改属主或属组后按段重新对齐
+_METADATA_AWK = r'''
+BEGIN {
+  n = split("@SHORT_OPTIONS@", tmp, " "); for (i = 1; i < n; i += 2) SHORT[tmp[i]] = tmp[i + 1]
+  n = split("@LONG_OPTIONS@", tmp, " "); for (i = 1; i < n; i += 3) LONG[tmp[i], tmp[i + 1]] = tmp[i + 2]
+  CHECK = (ENVIRON["FL_CHECK"] != ""); FALLBACK = (ENVIRON["FL_FALLBACK"] != "")
+  tokenized = tokenize(ENVIRON["FL_CMD"])
+  ok = tokenized && parse_invocation(ENVIRON["FL_CMD"])
+  if (CHECK) exit !ok
+
+  PWD = ENVIRON["FL_PWD"]; NOW = ENVIRON["FL_NOW"] + 0
+  PATHS = ENVIRON["FL_PATHS"]; if (PATHS != "") PATHS = "^(" PATHS ")$"
+  octal_bits(ENVIRON["FL_CLEAR"], CLR); octal_bits(ENVIRON["FL_SET"], SET)
+  CHMODE = (ENVIRON["FL_CLEAR"] + 0 || ENVIRON["FL_SET"] + 0)
+  UID = ENVIRON["FL_UID"]; USER = ENVIRON["FL_USER"]; CHOWN = (UID != "" || USER != "")
+  GID = ENVIRON["FL_GID"]; GROUP = ENVIRON["FL_GROUP"]; CHGRP = (GID != "" || GROUP != "")
+  MTIME = ENVIRON["FL_MTIME"]
+  if (MTIME != "") {
+    LSTIME = (MTIME + 0 > NOW - @SIX_MONTHS@ && MTIME + 0 <= NOW) ? ENVIRON["FL_LS_RECENT"] : ENVIRON["FL_LS_OLD"]
+  }
+  INODE = index(OPTS, "i"); NUMERIC = index(OPTS, "n"); CLASSIFY = index(OPTS, "F")
+  SHOW_OWNER = !index(OPTS, "g"); SHOW_GROUP = !index(OPTS, "o")
+  NID = SHOW_OWNER + SHOW_GROUP
+  IMPLICIT = (NOP == 0) ? "." : tilde(OPER[1])
+  NL = 0; RELAYOUT = 0; HEADER = ""; INDIR = 0
+  MODE_RE = "[-bcdlps][-r][-w][-xsS][-r][-w][-xsS][-r][-w][-xtT]"
+  VALUE_RE["a"] = "^[0-7]+"; VALUE_RE["f"] = "^[0-9a-f]+"; VALUE_RE["A"] = "^" MODE_RE
+  NP = (FALLBACK && tokenized) ? stat_format() : 0
+}
+FALLBACK { print fallback_line($0); next }
+PROG == "stat" { stat_line(); next }
+{ ls_line() }
+END { if (!CHECK && !FALLBACK) flush() }
+
+function parse_invocation(cmd,    i, j, w, c, done, short) {
+  if (NT == 0) return 0
+  for (i = 1; i <= NT; i++) if (O[i]) return 0
+  PROG = T[1]; sub(/.*\//, "", PROG)
+  if (!(PROG in SHORT)) return 0
+  short = SHORT[PROG]; OPTS = ""; NOP = 0; done = 0
+  for (i = 2; i <= NT; i++) {
+    w = T[i]
+    if (!done && substr(w, 1, 1) == "-" && length(w) > 1) {
+      if (w == "--") done = 1
+      else if (substr(w, 1, 2) == "--") {
+        if (!((PROG, w) in LONG)) return 0
+        if (LONG[PROG, w] != "@NO_OPTION@") OPTS = OPTS LONG[PROG, w]
+      } else {
+        for (j = 2; j <= length(w); j++) {
+          c = substr(w, j, 1)
+          if (!index(short, c)) return 0
+          OPTS = OPTS c
+        }
+      }
+      continue
+    }
+    if (w ~ /[$`{}]/) return 0
+    if (substr(w, 1, 1) == "~" && w != "~" && substr(w, 1, 2) != "~/") return 0
+    if (w ~ /[*?[]/ && (index(cmd, Q) || index(cmd, "\"") || index(cmd, "\\"))) return 0
+    OPER[++NOP] = w
+  }
+  if (PROG == "ls") {
+    if (OPTS !~ /[@LONG_FORMAT@]/) return 0
+    if (NOP == 1 && OPER[1] ~ /[*?[]/) return 0
+  }
+  return 1
+}
+
+function indicator(m,    type) {
+  type = substr(m, 1, 1)
+  if (type == "-") return (substr(m, 4, 1) substr(m, 7, 1) substr(m, 10, 1)) ~ /[xst]/ ? "*" : ""
+  if (type == "d") return "/"
+  if (type == "p") return "|"
+  if (type == "s") return "="
+  return ""
+}
+
+# 不支持的调用（FL_FALLBACK）：与ModeRewriter相同，按stat -c的格式或权限字符串改写每一行
+function stat_format(    i, w, text, pf, n, k, c) {
+  if (NT == 0) return 0
+  for (i = 1; i <= NT; i++) if (O[i]) return 0
+  w = T[1]; sub(/.*\//, "", w)
+  if (w != "stat") return 0
+  text = ""
+  for (i = 2; i <= NT; i++) {
+    w = T[i]; pf = 0
+    if (w == "--") break
+    if ((w == "-c" || w == "--format" || w == "--printf") && i < NT) { pf = (w == "--printf"); text = T[++i] }
+    else if (substr(w, 1, 9) == "--format=") text = substr(w, 10)
+    else if (substr(w, 1, 9) == "--printf=") { text = substr(w, 10); pf = 1 }
+    else if (substr(w, 1, 2) == "-c" && length(w) > 2) text = substr(w, 3)
+    else if (w == "--terse") text = "@TERSE_FORMAT@"
+    else if (w == "--file-system") return 0
+    else if (substr(w, 1, 1) == "-" && substr(w, 1, 2) != "--") {
+      if (index(w, "f")) return 0
+      if (index(w, "t")) text = "@TERSE_FORMAT@"
+    }
+    if (pf) {
+      n = length(text)
+      text = (substr(text, n - 1) == "\\n" && !index(substr(text, 1, n - 2), "\\")) ? substr(text, 1, n - 2) : ""
+    }
+  }
+  NP = 0; n = length(text); k = 0
+  while (k < n) {
+    c = substr(text, ++k, 1)
+    if (c == "%") {
+      if (k == n) return 0
+      c = substr(text, ++k, 1)
+      if (c != "%") {
+        if (c !~ /^[A-Za-z]$/) return 0
+        if (NP && PD[NP] && !(PT[NP] in VALUE_RE)) return 0
+        PD[++NP] = 1; PT[NP] = c
+        continue
+      }
+    }
+    if (NP && !PD[NP]) PT[NP] = PT[NP] c
+    else { PD[++NP] = 0; PT[NP] = c }
+  }
+  return NP
+}
+
+function format_line(line,    i, p, e, k, rest, out) {
+  p = 1
+  for (i = 1; i <= NP; i++) {
+    if (!PD[i]) {
+      if (substr(line, p, length(PT[i])) != PT[i]) return 0
+      p += length(PT[i]); continue
+    }
+    rest = substr(line, p)
+    if (PT[i] in VALUE_RE) {
+      if (!match(rest, VALUE_RE[PT[i]])) return 0
+      e = p + RLENGTH
+    } else if (i == NP) e = length(line) + 1
+    else {
+      k = index(rest, PT[i + 1])
+      if (!k) return 0
+      e = p + k - 1
+    }
+    V[i] = substr(line, p, e - p); p = e
+  }
+  if (p != length(line) + 1) return 0
+
+  FORMATTED = line
+  for (i = 1; i <= NP; i++) if (PD[i] && PT[i] == "n") { if (!matches(V[i])) return 1; break }
+  out = ""
+  for (i = 1; i <= NP; i++) {
+    if (!PD[i]) out = out PT[i]
+    else if (PT[i] == "a") out = out sprintf("%o", apply_bits(parse_number(V[i], 8)))
+    else if (PT[i] == "f") out = out sprintf("%x", apply_bits(parse_number(V[i], 16)))
+    else if (PT[i] == "A") out = out apply_mode(V[i])
+    else out = out V[i]
+  }
+  FORMATTED = out
+  return 1
+}
+
+function parse_number(s, base,    i, n) {
+  n = 0
+  for (i = 1; i <= length(s); i++) n = n * base + index("0123456789abcdef", substr(s, i, 1)) - 1
+  return n
+}
+
+function apply_bits(n,    i, p, r, bits) {
+  bits = n % 4096; r = n - bits; p = 2048
+  for (i = 1; i <= 12; i++) {
+    if ((int(bits / p) % 2 && !CLR[i]) || SET[i]) r += p
+    p /= 2
+  }
+  return r
+}
+
+function fallback_line(line,    out, p, s, c, a) {
+  if (NP && format_line(line)) return FORMATTED
+  out = ""; p = 1
+  while (match(substr(line, p), MODE_RE)) {
+    s = p + RSTART - 1
+    c = (s == 1) ? " " : substr(line, s - 1, 1)
+    a = substr(line, s + 10, 1)
+    if (a == "." || a == "+") a = substr(line, s + 11, 1)
+    if (index(" \t(/", c) && (a == "" || index(" \t)", a))) {
+      out = out substr(line, p, s - p) apply_mode(substr(line, s, 10)); p = s + 10
+    } else {
+      out = out substr(line, p, s - p + 1); p = s + 1
+    }
+  }
+  line = out substr(line, p)
+  if (line ~ ("^Access: \\([0-7][0-7][0-7][0-7]/" MODE_RE "\\)")) {
+    apply_mode(substr(line, 15, 10))
+    line = "Access: (" OCTAL substr(line, 14)
+  }
+  return line
+}
+
+function tilde(w) {
+  if (w == "~" || substr(w, 1, 2) == "~/") return ENVIRON["HOME"] substr(w, 2)
+  return w
+}
+
+function abs_path(p,    n, i, k, parts, out) {
+  if (substr(p, 1, 1) != "/") p = PWD "/" p
+  n = split(p, parts, "/"); k = 0
+  for (i = 1; i <= n; i++) {
+    if (parts[i] == "..") { if (k) k-- }
+    else if (parts[i] != "" && parts[i] != ".") S[++k] = parts[i]
+  }
+  out = ""
+  for (i = 1; i <= k; i++) out = out "/" S[i]
+  return out == "" ? "/" : out
+}
+
+function matches(p) { return PATHS == "" || abs_path(p) ~ PATHS }
+
+function octal_bits(s, B,    i, d) {
+  s = sprintf("%04d", s + 0)
+  for (i = 0; i < 4; i++) {
+    d = substr(s, i + 1, 1) + 0
+    B[3 * i + 1] = (d >= 4); B[3 * i + 2] = (d % 4 >= 2); B[3 * i + 3] = (d % 2)
+  }
+}
+
+function apply_mode(m,    i, c, x, s) {
+  for (i = 0; i < 3; i++) {
+    M[3 * i + 4] = (substr(m, 3 * i + 2, 1) == "r")
+    M[3 * i + 5] = (substr(m, 3 * i + 3, 1) == "w")
+    c = substr(m, 3 * i + 4, 1)
+    M[3 * i + 6] = (c == "x" || c == "s" || c == "t")
+    M[i + 1] = (c == "s" || c == "S" || c == "t" || c == "T")
+  }
+  for (i = 1; i <= 12; i++) M[i] = ((M[i] && !CLR[i]) || SET[i])
+  s = substr(m, 1, 1)
+  for (i = 0; i < 3; i++) {
+    s = s (M[3 * i + 4] ? "r" : "-") (M[3 * i + 5] ? "w" : "-")
+    x = (i == 2) ? "t" : "s"
+    if (M[i + 1]) s = s (M[3 * i + 6] ? x : toupper(x))
+    else s = s (M[3 * i + 6] ? "x" : "-")
+  }
+  OCTAL = ""
+  for (i = 0; i < 4; i++) OCTAL = OCTAL (M[3 * i + 1] * 4 + M[3 * i + 2] * 2 + M[3 * i + 3])
+  return s
+}
+
+function stat_line(    F, k, uid, user, gid, group) {
+  if (substr($0, 1, 8) == "  File: ") {
+    FILE = substr($0, 9); k = index(FILE, " -> ")
+    if (k) FILE = substr(FILE, 1, k - 1)
+    HIT = 0
+  } else if (substr($0, 1, 9) == "Access: (") {
+    HIT = matches(FILE)
+    if (HIT && (CHMODE || CHOWN || CHGRP) && split($0, F, /[()\/]/) == 10) {
+      uid = F[5]; user = F[6]; gid = F[8]; group = F[9]
+      sub(/^ +/, "", uid); sub(/^ +/, "", user); sub(/^ +/, "", gid); sub(/^ +/, "", group)
+      if (CHMODE) F[3] = apply_mode(F[3])
+      else OCTAL = F[2]
+      if (CHOWN) { if (UID != "") uid = UID; user = (USER != "") ? USER : "UNKNOWN" }
+      if (CHGRP) { if (GID != "") gid = GID; group = (GROUP != "") ? GROUP : "UNKNOWN" }
+      $0 = sprintf("Access: (%s/%s)  Uid: (%5s/%8s)   Gid: (%5s/%8s)", OCTAL, F[3], uid, user, gid, group)
+    }
+  } else if (HIT && MTIME != "" && substr($0, 1, 8) == "Modify: ") {
+    $0 = "Modify: " ENVIRON["FL_STAT_MTIME"]
+  }
+  print
+}
+
+function parse_entry(line,    k, t, rest) {
+  E_PRE = ""
+  if (INODE) {
+    if (!match(line, /^ *[0-9]+ /)) return 0
+    E_PRE = substr(line, 1, RLENGTH); line = substr(line, RLENGTH + 1)
+  }
+  if (!match(line, /^[-bcdlps][-r][-w][-xsS][-r][-w][-xsS][-r][-w][-xtT][.+]? +[0-9]+ /)) return 0
+  E_MODE = substr(line, 1, 10); E_LINKS = substr(line, 11, RLENGTH - 10)
+  rest = substr(line, RLENGTH + 1); E_AREA = length(rest)
+  for (k = 1; k <= NID; k++) {
+    if (!match(rest, /^ *[^ ]+ +/)) return 0
+    t = substr(rest, 1, RLENGTH); gsub(/ /, "", t); E_ID[k] = t
+    rest = substr(rest, RLENGTH + 1)
+  }
+  if (!match(rest, /^ *([0-9]+, +[0-9]+|[0-9]+(\.[0-9])?[KMGTPEZYRQ]?) /)) return 0
+  E_SIZE = substr(rest, 1, RLENGTH - 1); sub(/^ +/, "", E_SIZE)
+  rest = substr(rest, RLENGTH + 1); E_AREA -= length(rest)
+  if (length(rest) < 14 || substr(rest, 13, 1) != " ") return 0
+  E_MID = substr(line, 11, length(line) - length(rest) - 10)
+  E_DATE = substr(rest, 1, 12); E_NAME = substr(rest, 14)
+  return 1
+}
+
+function ls_line(    line, k, name, hit, type, mark) {
+  line = $0
+  if (line == "") { flush(); print ""; HEADER = ""; INDIR = 0; return }
+  if (!parse_entry(line)) {
+    if (line ~ /^total [0-9]+(\.[0-9])?[KMGTPEZYRQ]?$/) { INDIR = 1; DIR = (HEADER != "") ? HEADER : IMPLICIT }
+    else if (line ~ /:$/ && substr(line, 1, 4) != "ls: ") HEADER = substr(line, 1, length(line) - 1)
+    BUF[++NL] = line; ENTRY[NL] = 0
+    return
+  }
+
+  name = E_NAME; type = substr(E_MODE, 1, 1); mark = ""
+  if (type == "l") { k = index(name, " -> "); if (k) name = substr(name, 1, k - 1) }
+  else if (CLASSIFY) {
+    # -F 的类型标记不属于文件名；普通文件的 * 按改写后的权限重新判断
+    mark = indicator(E_MODE)
+    if (mark != "" && substr(name, length(name)) == mark) name = substr(name, 1, length(name) - 1)
+  }
+  hit = matches(INDIR ? DIR "/" name : name)
+  if (hit && CHMODE) {
+    E_MODE = apply_mode(E_MODE)
+    if (CLASSIFY && type == "-") E_NAME = name indicator(E_MODE)
+  }
+  if (hit && MTIME != "") E_DATE = LSTIME
+  for (k = 1; k <= NID; k++) ORIGINAL[NL + 1, k] = E_ID[k]
+  k = 0
+  if (SHOW_OWNER) {
+    k++
+    if (hit && CHOWN) { E_ID[k] = (NUMERIC || USER == "") ? (UID != "" ? UID : E_ID[k]) : USER; RELAYOUT = 1 }
+  }
+  if (SHOW_GROUP) {
+    k++
+    if (hit && CHGRP) { E_ID[k] = (NUMERIC || GROUP == "") ? (GID != "" ? GID : E_ID[k]) : GROUP; RELAYOUT = 1 }
+  }
+
+  NL++; ENTRY[NL] = 1
+  HEAD[NL] = E_PRE E_MODE; MID[NL] = E_MID; LINKS[NL] = E_LINKS
+  SIZE[NL] = E_SIZE; AREA[NL] = E_AREA; TAIL[NL] = E_DATE " " E_NAME
+  for (k = 1; k <= NID; k++) ID[NL, k] = E_ID[k]
+}
+
+function flush(    i, k, sw, area, line, t) {
+  if (RELAYOUT) {
+    for (k = 1; k <= NID; k++) { W[k] = 0; OW[k] = 0 }
+    sw = 0; area = 0
+    for (i = 1; i <= NL; i++) {
+      if (!ENTRY[i]) continue
+      for (k = 1; k <= NID; k++) {
+        if (length(ID[i, k]) > W[k]) W[k] = length(ID[i, k])
+        if (length(ORIGINAL[i, k]) > OW[k]) OW[k] = length(ORIGINAL[i, k])
+      }
+      if (length(SIZE[i]) > sw) sw = length(SIZE[i])
+      area = AREA[i]
+    }
+    # 属主、属组和大小列的总宽度在段内不变，减去原属主、属组列宽得到原大小列宽
+    # （文件部分的列宽包含命令行中目录参数的大小）
+    area -= 1
+    for (k = 1; k <= NID; k++) area -= OW[k] + 1
+    if (area > sw) sw = area
+  }
+  for (i = 1; i <= NL; i++) {
+    if (!ENTRY[i]) { print BUF[i]; continue }
+    if (!RELAYOUT) { print HEAD[i] MID[i] TAIL[i]; continue }
+    line = HEAD[i] LINKS[i]
+    for (k = 1; k <= NID; k++) {
+      t = ID[i, k]
+      line = line sprintf((t ~ /^[0-9]+$/) ? "%" W[k] "s " : "%-" W[k] "s ", t)
+    }
+    print line sprintf("%" sw "s ", SIZE[i]) TAIL[i]
+  }
+  NL = 0; RELAYOUT = 0
+}
+'''
+
+METADATA_AWK = ((_METADATA_AWK + AWK_TOKENIZE_FUNCTION)
+                .replace('@SHORT_OPTIONS@', ' '.join(
+                    f'{program} {options[0]}' for program, options in _OPTIONS.items()))
+                .replace('@LONG_OPTIONS@', ' '.join(
+                    f'{program} {option} {short}' for program, options in _OPTIONS.items()
+                    for option, short in options[1].items()))
+                .replace('@LONG_FORMAT@', LONG_FORMAT_OPTIONS)
+                .replace('@NO_OPTION@', NO_OPTION)
+                .replace('@TERSE_FORMAT@', _TERSE_FORMAT)
+                .replace('@SIX_MONTHS@', str(SIX_MONTHS)))
+
+# 导出脚本中文件属性伪装函数的名称
+METADATA_FUNCTION_NAME = 'fakelinux_file_metadata'
+
+# 导出脚本中的文件属性伪装函数，参数由MetadataOverride.bash_call生成：路径正则、清除和设置的权限位、
+# uid、用户名、gid、组名、修改时间戳、ls -l中最近和较早的时间列、stat的修改时间。
+# 调用不支持时按ModeRewriter的规则改写真实命令输出中的权限（FL_FALLBACK）；
+# 支持时LC_ALL=C在函数内赋值，真实命令的输出和通配符展开都按C locale
+_METADATA_FUNCTION_TEMPLATE = (
+    f"{METADATA_FUNCTION_NAME}() {{\n"
+    f"  local now program='{METADATA_AWK}'\n"
+    f"  if ! LC_ALL=C FL_CHECK=1 FL_CMD=\"$CMD\" awk \"$program\"; then\n"
+    f"    {{REAL_EXEC}} 2>&1 | LC_ALL=C FL_FALLBACK=1 FL_CMD=\"$CMD\" FL_PWD=\"$PWD\" "
+    f"FL_PATHS=\"$1\" FL_CLEAR=\"$2\" FL_SET=\"$3\" awk \"$program\"\n"
+    f"    return 0\n"
+    f"  fi\n"
+    f"  local -x LC_ALL=C\n"
+    f"  printf -v now '%(%s)T' -1\n"
+    f"  {{REAL_EXEC}} 2>&1 | FL_CMD=\"$CMD\" FL_PWD=\"$PWD\" FL_NOW=\"$now\" FL_PATHS=\"$1\" "
+    f"FL_CLEAR=\"$2\" FL_SET=\"$3\" FL_UID=\"$4\" FL_USER=\"$5\" FL_GID=\"$6\" FL_GROUP=\"$7\" "
+    f"FL_MTIME=\"$8\" FL_LS_RECENT=\"$9\" FL_LS_OLD=\"${{10}}\" FL_STAT_MTIME=\"${{11}}\" "
+    f"awk \"$program\"\n"
+    f"  return 0\n"
+    f"}}\n"
+)
+
+
+def metadata_function(real_exec: str) -> str:
+    """导出脚本中的文件属性伪装函数，real_exec为执行真实命令的shell片段"""
+    return _METADATA_FUNCTION_TEMPLATE.replace('{REAL_EXEC}', real_exec)
@@ -0,0 +1,68 @@
+from collections import deque
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class LiteralIndex:
+    """
+    多字面文本的Aho-Corasick自动机，用于规则匹配前的候选筛选
+
+    每条规则对应一个位，规则的必需字面文本集合（匹配必然包含其中之一）中任意一个出现在命令中，
+    该规则就成为候选；没有必需字面文本的规则总是候选。
+    字面文本为小写，扫描时比较小写后的命令。
+    """
+
+    def __init__(self, literal_sets: Sequence[Optional[Tuple[str, ...]]]):
+        """
+        Args:
+            literal_sets: 按规则位置排列的必需字面文本集合，None表示没有可用的字面文本
+        """
+        self.size = len(literal_sets)
+        self.always = 0  # 总是候选的规则位
+        goto: List[Dict[str, int]] = [{}]
+        output: List[int] = [0]
+
+        for position, literals in enumerate(literal_sets):
+            bit = 1 << position
+            if not literals:
+                self.always |= bit
+                continue
+            for literal in literals:
+                state = 0
+                for char in literal:
+                    next_state = goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(goto)
+                        goto[state][char] = next_state
+                        goto.append({})
+                        output.append(0)
+                    state = next_state
+                output[state] |= bit
+
+        # 按广度优先计算失败链接，并把转移补全为确定自动机，扫描时每个字符只查一次字典
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in goto[1:]]
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            output[state] |= output[fail[state]]
+            delta[state] = dict(delta[fail[state]])
+            for char, next_state in goto[state].items():
+                fail[next_state] = delta[fail[state]].get(char, 0) if state else 0
+                delta[state][char] = next_state
+                queue.append(next_state)
+
+        self._delta = delta
+        self._output = output
+        self.states = len(goto)
+
+    def candidates(self, command: str) -> int:
+        """返回候选规则的位掩码，命令需已转为小写"""
+        delta = self._delta
+        output = self._output
+        found = self.always
+        state = 0
+        for char in command:
+            state = delta[state].get(char, 0)
+            if output[state]:
+                found |= output[state]
+        return found
@@ -0,0 +1,519 @@
+import mmap
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+
+# 导出脚本写入的日志行：
+#   2024-01-01 12:00:00 [CMD] root: cat /etc/passwd
+#   2024-01-01 12:00:00 [SSH] Interactive session started by root (PID=1234)
+# 命令中包含换行时，后续行不以时间戳开头，归入同一条记录
+_RECORD_RE = re.compile(
+    rb'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d) \[(CMD|SSH)\] ([^\n]*'
+    rb'(?:\n(?!\d{4}-\d\d-\d\d \d\d:\d\d:\d\d \[)[^\n]*)*)\n',
+    re.MULTILINE
+)
+_HEADER_RE = re.compile(rb'\d{4}-\d\d-\d\d \d\d:\d\d:\d\d \[')
+_SESSION_USER_RE = re.compile(rb'started by (\S+)')
+
+# 命令的第一个词：跳过开头的空格和制表符后连续的非空白字符，建立索引和查询时使用同一规则
+_HEAD_RE = re.compile(rb'[ \t]*(\S*)')
+
+# 建立索引时只提取"用户: 程序名"，以字面量开头的正则可以在C层快速跳过无关内容；
+# 程序名部分与_HEAD_RE相同，只有一个分组，findall直接返回bytes，按块计数后再拆分
+_COMMAND_KEY_RE = re.compile(rb'\[CMD\] ([^:\n]*: [ \t]*\S*)')
+_SESSION_KEY_RE = re.compile(rb'\[SSH\] Interactive session started by (\S+)')
+
+KIND_COMMAND = 0
+KIND_SESSION = 1
+
+# 索引块大小，块边界对齐到记录开头
+BLOCK_SIZE = 1024 * 1024
+
+# 超过该大小的增量才使用多进程扫描
+_PARALLEL_THRESHOLD = 64 * 1024 * 1024
+
+# 索引格式版本，提取规则变化时递增，旧索引在下次ingest时重建
+_INDEX_FORMAT = '3'
+
+# 块的时间范围取首尾记录的时间，查询时放宽该秒数以容忍并发会话写入的轻微乱序
+_TIME_SLACK = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS heads (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY,
+    start_offset INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    ts_min INTEGER,
+    ts_max INTEGER,
+    records INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS block_keys (
+    block_id INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    head_id INTEGER,
+    count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS blocks_ts ON blocks (ts_min, ts_max);
+CREATE INDEX IF NOT EXISTS block_keys_user ON block_keys (user_id);
+CREATE INDEX IF NOT EXISTS block_keys_head ON block_keys (head_id);
+"""
+
+
+class LogRecord(NamedTuple):
+    """日志中的一条记录"""
+    timestamp: int  # 本地时间的Unix时间戳
+    kind: int  # KIND_COMMAND 或 KIND_SESSION
+    user: str
+    command: str  # 会话记录为整行描述
+    offset: int  # 记录在日志文件中的字节偏移
+    length: int  # 记录的字节长度（含末尾换行）
+
+
+class _BlockSummary(NamedTuple):
+    """一个索引块的扫描结果"""
+    start: int
+    end: int
+    first_ts: Optional[bytes]
+    last_ts: Optional[bytes]
+    commands: Dict[Tuple[bytes, bytes], int]  # (用户, 程序名) -> 次数
+    sessions: Dict[bytes, int]  # 用户 -> 次数
+
+
+def command_head(command: bytes) -> bytes:
+    """取命令的程序名（第一个词，去掉路径），与建立索引时的提取规则相同"""
+    return _HEAD_RE.match(command).group(1).rsplit(b'/', 1)[-1]
+
+
+class _TimestampCache:
+    """时间戳解析缓存，同一秒内的记录只解析一次"""
+
+    def __init__(self):
+        self._cache: Dict[bytes, int] = {}
+
+    def __call__(self, text: bytes) -> int:
+        value = self._cache.get(text)
+        if value is None:
+            if len(self._cache) > 65536:
+                self._cache.clear()
+            value = int(time.mktime(time.strptime(text.decode('ascii'), '%Y-%m-%d %H:%M:%S')))
+            self._cache[text] = value
+        return value
+
+
+def _split_record(kind: bytes, body: bytes) -> Tuple[int, bytes, bytes]:
+    """拆分记录内容，返回 (类型, 用户, 命令)"""
+    if kind == b'CMD':
+        user, _, command = body.partition(b': ')
+        return KIND_COMMAND, user, command
+    match = _SESSION_USER_RE.search(body)
+    return KIND_SESSION, (match.group(1) if match else b''), body
+
+
+def _last_header(data, start: int, end: int) -> int:
+    """查找 [start, end) 中最后一个记录开头的位置，没有时返回-1"""
+    boundary = data.rfind(b'\n', start, end - 1)
+    while boundary >= 0:
+        if _HEADER_RE.match(data, boundary + 1):
+            return boundary + 1
+        boundary = data.rfind(b'\n', start, boundary)
+    return start if _HEADER_RE.match(data, start) else -1
+
+
+def _split_blocks(data, offset: int, size: int, block_size: int) -> List[Tuple[int, int]]:
+    """
+    把 [offset, size) 划分为索引块
+
+    块边界对齐到记录开头，多行记录不会被拆开；末尾没有换行的部分不划入。
+    """
+    end = data.rfind(b'\n', offset, size) + 1
+    blocks = []
+    position = offset
+    while position < end:
+        block_end = position + block_size
+        if block_end < end:
+            header = _last_header(data, position, block_end)
+            block_end = header if header > position else end
+        else:
+            block_end = end
+        blocks.append((position, block_end))
+        position = block_end
+    return blocks
+
+
+def _scan_blocks(data, blocks: List[Tuple[int, int]]) -> List[_BlockSummary]:
+    """统计每个块中的用户、程序名和首尾时间"""
+    summaries = []
+    for start, end in blocks:
+        first = data[start:start + 19] if _HEADER_RE.match(data, start) else None
+        last_start = _last_header(data, start, end)
+        last = data[last_start:last_start + 19] if last_start >= 0 else None
+        # 相同的键先在C层计数，拆分用户和程序名只对不同的键执行一次
+        commands: Dict[Tuple[bytes, bytes], int] = {}
+        for text, count in Counter(_COMMAND_KEY_RE.findall(data, start, end)).items():
+            user, _, command = text.partition(b': ')
+            key = (user, command_head(command))
+            commands[key] = commands.get(key, 0) + count
+        summaries.append(_BlockSummary(
+            start, end, first, last, commands,
+            Counter(_SESSION_KEY_RE.findall(data, start, end)),
+        ))
+    return summaries
+
+
+def _scan_file_blocks(path: str, size: int, blocks: List[Tuple[int, int]]) -> List[_BlockSummary]:
+    """在子进程中映射文件并扫描一组块"""
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+        return _scan_blocks(data, blocks)
+
+
+def _iter_records(data, start: int, end: int) -> Iterator[Tuple[int, int, bytes, bytes, bytes]]:
+    """
+    解析 [start, end) 中的完整记录
+
+    Yields:
+        (偏移, 结束偏移, 时间戳文本, 类型, 记录内容)
+    """
+    for match in _RECORD_RE.finditer(data, start, end):
+        yield match.start(), match.end(), match.group(1), match.group(2), match.group(3)
+
+
+def iter_log_records(log_path: Union[str, Path], offset: int = 0,
+                     end: Optional[int] = None) -> Iterator[LogRecord]:
+    """
+    从指定偏移开始流式解析日志文件
+
+    文件通过mmap映射，不整体读入内存；末尾未写完的记录不会返回。
+    end为结束偏移（不含），应取split_log_file返回的边界。
+    """
+    with open(log_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if end is not None:
+            size = min(size, end)
+        if size <= offset:
+            return
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+            parse_time = _TimestampCache()
+            for block_start, block_end in _split_blocks(data, offset, size, BLOCK_SIZE):
+                for record_start, record_end, ts, kind, body in _iter_records(data, block_start, block_end):
+                    kind_id, user, command = _split_record(kind, body)
+                    yield LogRecord(parse_time(ts), kind_id, user.decode('utf-8', 'replace'),
+                                    command.decode('utf-8', 'replace'),
+                                    record_start, record_end - record_start)
+
+
+def split_log_file(log_path: Union[str, Path], parts: int) -> List[Tuple[int, int]]:
+    """把日志文件划分为大致相等、边界对齐到记录开头的若干区间，用于并行处理"""
+    with open(log_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return []
+        with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+            return _split_blocks(data, 0, size, max(size // max(parts, 1), 1))
+
+
+class LogIndex:
+    """
+    ssh_commands.log 的增量索引
+
+    日志按约1MB的块建立稀疏索引：每个块记录时间范围以及出现过的用户和程序名的次数。
+    扫描只提取这些字段，不逐条构造记录对象；查询时先用索引筛选块，再精确解析候选块。
+    已处理的字节偏移保存在索引库中，再次调用ingest时只扫描新增部分。
+    """
+
+    def __init__(self, log_path: Union[str, Path], index_path: Union[str, Path, None] = None):
+        """
+        Args:
+            log_path: 日志文件路径
+            index_path: 索引数据库路径，默认为日志路径加 .index.sqlite
+        """
+        self.log_path = Path(log_path)
+        self.index_path = Path(index_path) if index_path else Path(f"{log_path}.index.sqlite")
+        self.connection = sqlite3.connect(str(self.index_path))
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(_SCHEMA)
+        self._users: Dict[str, int] = dict(self.connection.execute('SELECT name, id FROM users'))
+        self._heads: Dict[str, int] = dict(self.connection.execute('SELECT name, id FROM heads'))
+
+    def close(self):
+        """关闭索引数据库"""
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def _get_meta(self, key: str) -> Optional[str]:
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value):
+        self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                                (key, str(value)))
+
+    @property
+    def offset(self) -> int:
+        """已索引到的字节偏移"""
+        return int(self._get_meta('offset') or 0)
+
+    def _intern(self, table: str, cache: Dict[str, int], name: bytes) -> int:
+        """获取用户或程序名的ID，不存在时插入"""
+        text = name.decode('utf-8', 'replace')
+        value = cache.get(text)
+        if value is None:
+            value = self.connection.execute(
+                f'INSERT INTO {table} (name) VALUES (?)', (text,)
+            ).lastrowid
+            cache[text] = value
+        return value
+
+    @staticmethod
+    def _file_signature(f) -> str:
+        """日志文件签名（inode和开头内容），用于检测日志轮转"""
+        st = os.fstat(f.fileno())
+        head = os.pread(f.fileno(), 64, 0)
+        return f"{st.st_ino}:{head.hex()}"
+
+    def _is_rotated(self, f, size: int, offset: int) -> bool:
+        """判断日志自上次索引后是否被轮转或截断"""
+        if size < offset:
+            return True
+        stored = self._get_meta('signature')
+        if not stored:
+            return False
+        inode, _, head = stored.partition(':')
+        current_inode, _, current_head = self._file_signature(f).partition(':')
+        return inode != current_inode or not current_head.startswith(head)
+
+    def reset(self):
+        """清空索引"""
+        with self.connection:
+            self.connection.execute('DELETE FROM block_keys')
+            self.connection.execute('DELETE FROM blocks')
+            self.connection.execute('DELETE FROM meta')
+
+    def ingest(self, workers: Optional[int] = None, block_size: int = BLOCK_SIZE
+               ) -> Dict[str, float]:
+        """
+        增量索引日志新增的部分
+
+        Args:
+            workers: 扫描进程数，默认为CPU核数；增量较小时总在当前进程扫描
+            block_size: 索引块大小
+
+        Returns:
+            统计信息：records、blocks、bytes、seconds、mb_per_second、rotated
+        """
+        start_time = time.perf_counter()
+        stats = {'records': 0, 'blocks': 0, 'bytes': 0, 'seconds': 0.0,
+                 'mb_per_second': 0.0, 'rotated': False}
+
+        try:
+            f = open(self.log_path, 'rb')
+        except FileNotFoundError:
+            return stats
+
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            offset = self.offset
+            # 日志被轮转或截断时重新建立索引
+            if offset and self._is_rotated(f, size, offset):
+                self.reset()
+                offset = 0
+                stats['rotated'] = True
+            # 旧版本索引中的程序名提取方式不同，重新建立
+            elif offset and self._get_meta('format') != _INDEX_FORMAT:
+                self.reset()
+                offset = 0
+            if size <= offset:
+                return stats
+
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+                blocks = _split_blocks(data, offset, size, block_size)
+                if not blocks:
+                    return stats
+
+                workers = workers or os.cpu_count() or 1
+                if workers > 1 and size - offset >= _PARALLEL_THRESHOLD:
+                    summaries = self._scan_parallel(size, blocks, workers)
+                else:
+                    summaries = _scan_blocks(data, blocks)
+
+            end_offset = blocks[-1][1]
+            with self.connection:
+                stats['records'] = self._store(summaries)
+                self._set_meta('offset', end_offset)
+                self._set_meta('signature', self._file_signature(f))
+                self._set_meta('format', _INDEX_FORMAT)
+
+        stats['blocks'] = len(blocks)
+        stats['bytes'] = end_offset - offset
+        stats['seconds'] = time.perf_counter() - start_time
+        if stats['seconds'] > 0:
+            stats['mb_per_second'] = stats['bytes'] / stats['seconds'] / (1024 * 1024)
+        return stats
+
+    def _scan_parallel(self, size: int, blocks: List[Tuple[int, int]], workers: int
+                       ) -> List[_BlockSummary]:
+        """多进程扫描块，每个进程独立映射文件"""
+        chunk = max(1, len(blocks) // (workers * 4))
+        groups = [blocks[i:i + chunk] for i in range(0, len(blocks), chunk)]
+        summaries = []
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for result in executor.map(_scan_file_blocks, [str(self.log_path)] * len(groups),
+                                       [size] * len(groups), groups):
+                summaries.extend(result)
+        return summaries
+
+    def _store(self, summaries: List[_BlockSummary]) -> int:
+        """写入块索引，返回记录数"""
+        parse_time = _TimestampCache()
+        users, heads = self._users, self._heads
+        total = 0
+        key_rows = []
+
+        for summary in summaries:
+            records = sum(summary.commands.values()) + sum(summary.sessions.values())
+            total += records
+            times = [parse_time(ts) for ts in (summary.first_ts, summary.last_ts) if ts]
+            block_id = self.connection.execute(
+                'INSERT INTO blocks (start_offset, length, ts_min, ts_max, records) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (summary.start, summary.end - summary.start,
+                 min(times) if times else None, max(times) if times else None, records)
+            ).lastrowid
+
+            # 同一块内按 (用户, 程序名) 合并
+            merged: Dict[Tuple[int, int], int] = {}
+            for (user, head), count in summary.commands.items():
+                user_id = self._intern('users', users, user)
+                head_id = self._intern('heads', heads, head)
+                merged[(user_id, head_id)] = merged.get((user_id, head_id), 0) + count
+            for (user_id, head_id), count in merged.items():
+                key_rows.append((block_id, KIND_COMMAND, user_id, head_id, count))
+
+            for user, count in summary.sessions.items():
+                key_rows.append((block_id, KIND_SESSION, self._intern('users', users, user),
+                                 None, count))
+
+        self.connection.executemany(
+            'INSERT INTO block_keys (block_id, kind, user_id, head_id, count) VALUES (?, ?, ?, ?, ?)',
+            key_rows
+        )
+        return total
+
+    def query(self, start: Optional[int] = None, end: Optional[int] = None,
+              user: Optional[str] = None, head: Optional[str] = None,
+              kind: Optional[int] = None, limit: int = 1000) -> List[LogRecord]:
+        """
+        按条件查询记录，结果按日志顺序返回
+
+        Args:
+            start: 起始时间戳（含）
+            end: 结束时间戳（不含）
+            user: 用户名
+            head: 程序名，如 cat
+            kind: 记录类型
+            limit: 最大返回数量
+        """
+        conditions, params = [], []
+        if start is not None:
+            conditions.append('(blocks.ts_max IS NULL OR blocks.ts_max >= ?)')
+            params.append(start - _TIME_SLACK)
+        if end is not None:
+            conditions.append('(blocks.ts_min IS NULL OR blocks.ts_min < ?)')
+            params.append(end + _TIME_SLACK)
+        if user is not None:
+            if user not in self._users:
+                return []
+            conditions.append('block_keys.user_id = ?')
+            params.append(self._users[user])
+        if head is not None:
+            if head not in self._heads:
+                return []
+            conditions.append('block_keys.head_id = ?')
+            params.append(self._heads[head])
+        if kind is not None:
+            conditions.append('block_keys.kind = ?')
+            params.append(kind)
+
+        sql = ('SELECT DISTINCT blocks.start_offset, blocks.length FROM blocks '
+               'JOIN block_keys ON block_keys.block_id = blocks.id')
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY blocks.start_offset'
+        candidates = self.connection.execute(sql, params).fetchall()
+        if not candidates:
+            return []
+
+        user_bytes = user.encode('utf-8') if user is not None else None
+        head_bytes = head.encode('utf-8') if head is not None else None
+        parse_time = _TimestampCache()
+        records = []
+        with open(self.log_path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as data:
+                for block_start, length in candidates:
+                    block_end = min(block_start + length, size)
+                    for record_start, record_end, ts, kind_text, body in _iter_records(
+                            data, block_start, block_end):
+                        kind_id, record_user, command = _split_record(kind_text, body)
+                        if kind is not None and kind_id != kind:
+                            continue
+                        if user_bytes is not None and record_user != user_bytes:
+                            continue
+                        if head_bytes is not None and (kind_id != KIND_COMMAND or
+                                                       command_head(command) != head_bytes):
+                            continue
+                        timestamp = parse_time(ts)
+                        if start is not None and timestamp < start:
+                            continue
+                        if end is not None and timestamp >= end:
+                            continue
+                        records.append(LogRecord(
+                            timestamp, kind_id, record_user.decode('utf-8', 'replace'),
+                            command.decode('utf-8', 'replace'),
+                            record_start, record_end - record_start
+                        ))
+                        if len(records) >= limit:
+                            return records
+        return records
+
+    def count_by(self, column: str = 'head', limit: int = 20) -> List[Tuple[str, int]]:
+        """按程序名或用户统计命令数量，返回 [(名称, 数量)]"""
+        if column == 'head':
+            sql = ('SELECT heads.name, SUM(count) AS n FROM block_keys JOIN heads '
+                   'ON block_keys.head_id = heads.id GROUP BY head_id ORDER BY n DESC LIMIT ?')
+        elif column == 'user':
+            sql = ('SELECT users.name, SUM(count) AS n FROM block_keys JOIN users '
+                   'ON block_keys.user_id = users.id WHERE kind = 0 '
+                   'GROUP BY user_id ORDER BY n DESC LIMIT ?')
+        else:
+            raise ValueError(f"不支持的统计字段: {column}")
+        return self.connection.execute(sql, (limit,)).fetchall()
+
+    def count(self) -> int:
+        """已索引的记录总数"""
+        return self.connection.execute('SELECT COALESCE(SUM(records), 0) FROM blocks').fetchone()[0]
@@ -0,0 +1,352 @@
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# 处理命令的各个阶段
+STAGES = ('match', 'real_exec', 'condition', 'filter', 'script', 'metadata')
+
+# Prometheus指标名前缀
+METRIC_PREFIX = 'fakelinux'
+
+# Prometheus直方图的桶上界（纳秒），从约1微秒到约68秒按2的幂划分
+PROMETHEUS_BOUNDS = [1 << bits for bits in range(10, 37)]
+
+
+class LatencyHistogram:
+    """
+    对数线性延迟直方图（HDR风格），单位为纳秒
+
+    每个2的幂区间再等分为 2**SUB_BUCKET_BITS 个子桶，相对误差约 1/32，
+    记录只需一次位运算和一次列表自增。
+    """
+
+    SUB_BUCKET_BITS = 5
+    SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+    MAX_BITS = 40  # 约18分钟，超过的值计入最后一个桶
+    BUCKET_COUNT = (MAX_BITS - SUB_BUCKET_BITS + 1) * SUB_BUCKETS
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKET_COUNT
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @classmethod
+    def bucket_index(cls, value: int) -> int:
+        """计算值所在的桶"""
+        if value < cls.SUB_BUCKETS:
+            return max(value, 0)
+        shift = value.bit_length() - cls.SUB_BUCKET_BITS - 1
+        index = (shift + 1) * cls.SUB_BUCKETS + (value >> shift) - cls.SUB_BUCKETS
+        return min(index, cls.BUCKET_COUNT - 1)
+
+    @classmethod
+    def bucket_upper(cls, index: int) -> int:
+        """桶的上界（不含）"""
+        if index < cls.SUB_BUCKETS:
+            return index + 1
+        shift = index // cls.SUB_BUCKETS - 1
+        mantissa = index % cls.SUB_BUCKETS + cls.SUB_BUCKETS
+        return (mantissa + 1) << shift
+
+    def record(self, value: int):
+        """记录一个值"""
+        self.counts[self.bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other: 'LatencyHistogram'):
+        """合并另一个直方图"""
+        counts = list(other.counts)
+        for index, value in enumerate(counts):
+            if value:
+                self.counts[index] += value
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, percent: float) -> int:
+        """获取百分位值（返回所在桶的上界，不超过最大值）"""
+        if not self.count:
+            return 0
+        target = max(1, int(self.count * percent / 100.0 + 0.5))
+        seen = 0
+        for index, value in enumerate(self.counts):
+            seen += value
+            if seen >= target:
+                return min(self.bucket_upper(index) - 1, self.max)
+        return self.max
+
+    def cumulative(self, bounds: List[int]) -> List[Tuple[int, int]]:
+        """
+        按给定上界统计累计数量，返回 [(上界, 小于上界的数量)]
+
+        上界取2的幂时与桶边界对齐，结果是精确的。
+        """
+        result = []
+        seen = 0
+        index = 0
+        for bound in bounds:
+            while index < self.BUCKET_COUNT and self.bucket_upper(index) <= bound:
+                seen += self.counts[index]
+                index += 1
+            result.append((bound, seen))
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        """直方图摘要，单位为毫秒"""
+        to_ms = 1e-6
+        return {
+            'count': self.count,
+            'mean_ms': (self.total / self.count * to_ms) if self.count else 0.0,
+            'p50_ms': self.percentile(50) * to_ms,
+            'p90_ms': self.percentile(90) * to_ms,
+            'p99_ms': self.percentile(99) * to_ms,
+            'p999_ms': self.percentile(99.9) * to_ms,
+            'max_ms': self.max * to_ms,
+        }
+
+
+class _Shard:
+    """单个线程的指标分片，只由所属线程写入"""
+
+    __slots__ = ('stages', 'timeouts', 'version', 'positions', 'before_match', 'evaluated',
+                 'matched', 'executed')
+
+    def __init__(self):
+        self.stages = {stage: LatencyHistogram() for stage in STAGES}
+        self.timeouts: Dict[str, int] = {}  # 阶段 -> 超时次数
+        self.version: Optional[int] = None  # 最近一次匹配的快照版本
+        self.positions: Dict[Tuple[int, int], int] = {}  # (快照版本, 首个匹配位置) -> 次数
+        self.before_match: Dict[int, int] = {}  # 旧版本的首个匹配位置折算出的次数
+        self.evaluated: Dict[int, int] = {}
+        self.matched: Dict[int, int] = {}
+        self.executed: Dict[int, int] = {}
+
+
+class _StageTimer:
+    """阶段计时上下文"""
+
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram: LatencyHistogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.record(time.perf_counter_ns() - self.start)
+        return False
+
+
+class EngineMetrics:
+    """
+    MockEngine的运行指标
+
+    每个线程写入自己的分片，记录时不加锁；导出时合并所有分片。
+    每条规则的before_match（在匹配顺序中排在首个匹配规则之前或就是它的次数）不逐条累加，
+    而是记录首个匹配位置，导出时按快照中的规则顺序推算。它是顺序扫描时会测试该规则的次数；
+    evaluated是实际运行该规则正则的次数，字面索引、参数索引和决策缓存跳过的不计。
+    分片切换到新的快照版本时，把旧版本的匹配位置折算为before_match，
+    不再被任何分片引用的版本的规则顺序随之丢弃。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+        self._orders: Dict[int, Tuple[int, ...]] = {}  # 快照版本 -> 匹配器中的规则ID顺序
+        self.started_at = time.time()
+
+    def _shard(self) -> _Shard:
+        """获取当前线程的分片"""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+            return shard
+
+    def record_match(self, version: int, rule_ids: Tuple[int, ...], position: int,
+                     elapsed_ns: int):
+        """
+        记录一次规则匹配
+
+        Args:
+            version: 规则快照版本
+            rule_ids: 匹配器中按顺序排列的规则ID
+            position: 首个匹配规则的位置，未匹配时为规则数量
+            elapsed_ns: 匹配耗时（纳秒）
+        """
+        shard = self._shard()
+        shard.stages['match'].record(elapsed_ns)
+        key = (version, position)
+        if shard.version != version:
+            self._switch_version(shard, version, rule_ids, key)
+        else:
+            shard.positions[key] = shard.positions.get(key, 0) + 1
+        if position < len(rule_ids):
+            rule_id = rule_ids[position]
+            shard.matched[rule_id] = shard.matched.get(rule_id, 0) + 1
+
+    def _switch_version(self, shard: _Shard, version: int, rule_ids: Tuple[int, ...],
+                        key: Tuple[int, int]):
+        """分片切换快照版本：折算旧版本的匹配位置，丢弃不再使用的规则顺序"""
+        with self._shards_lock:
+            self._orders[version] = rule_ids
+            folded = {old: count for old, count in shard.positions.items() if old[0] != version}
+            for old, count in folded.items():
+                del shard.positions[old]
+                self._fold(shard.before_match, old, count, self._orders)
+            shard.version = version
+            shard.positions[key] = shard.positions.get(key, 0) + 1
+            live = {old_version for other in self._shards for old_version, _ in list(other.positions)}
+            for old_version in [v for v in self._orders if v not in live]:
+                del self._orders[old_version]
+
+    @staticmethod
+    def _fold(before_match: Dict[int, int], key: Tuple[int, int], count: int,
+              orders: Dict[int, Tuple[int, ...]]):
+        """把首个匹配位置的次数累加到该位置之前（含）的规则上"""
+        version, position = key
+        for rule_id in orders.get(version, ())[:position + 1]:
+            before_match[rule_id] = before_match.get(rule_id, 0) + count
+
+    def record_executed(self, rule_id: int):
+        """记录一次规则动作执行"""
+        executed = self._shard().executed
+        executed[rule_id] = executed.get(rule_id, 0) + 1
+
+    def stage_histogram(self, stage: str) -> LatencyHistogram:
+        """
+        当前线程分片中的阶段耗时直方图
+
+        阶段在其他线程中结束时（如作为下游阶段输入的流），先在当前线程取得直方图再记录，
+        不为临时线程创建分片。
+        """
+        return self._shard().stages[stage]
+
+    def stage_timeouts(self) -> Dict[str, int]:
+        """
+        当前线程分片中各阶段的超时次数
+
+        和stage_histogram一样先在处理命令的线程中取得，阶段结束时（可能在其他线程中）再累加。
+        """
+        return self._shard().timeouts
+
+    def rule_evaluations(self) -> Dict[int, int]:
+        """
+        当前线程分片中各规则的实际测试次数（规则ID -> 次数）
+
+        传给RuleMatcher，由它为每个实际运行的正则加一。
+        """
+        return self._shard().evaluated
+
+    def time_stage(self, stage: str) -> _StageTimer:
+        """返回阶段计时上下文，用法: with metrics.time_stage('filter'): ..."""
+        return _StageTimer(self.stage_histogram(stage))
+
+    def reset(self):
+        """清空所有指标"""
+        with self._shards_lock:
+            self._shards = []
+            self._orders = {}
+            self._local = threading.local()
+            self.started_at = time.time()
+
+    def _merge(self) -> Tuple[Dict[str, LatencyHistogram], Dict[str, int],
+                              Dict[str, Dict[int, int]]]:
+        """合并所有分片"""
+        # 匹配位置和折算结果在锁内一起复制，不会与正在折算的分片重复或遗漏
+        with self._shards_lock:
+            shards = list(self._shards)
+            orders = dict(self._orders)
+            folded = [(dict(shard.positions), dict(shard.before_match)) for shard in shards]
+
+        stages = {stage: LatencyHistogram() for stage in STAGES}
+        timeouts = {stage: 0 for stage in STAGES}
+        positions: Dict[Tuple[int, int], int] = {}
+        counters: Dict[str, Dict[int, int]] = {
+            'before_match': {}, 'evaluated': {}, 'matched': {}, 'executed': {},
+        }
+        for shard, (shard_positions, before_match) in zip(shards, folded):
+            for stage, histogram in shard.stages.items():
+                stages[stage].merge(histogram)
+            for stage, count in dict(shard.timeouts).items():
+                timeouts[stage] = timeouts.get(stage, 0) + count
+            for key, count in shard_positions.items():
+                positions[key] = positions.get(key, 0) + count
+            for name, values in (('before_match', before_match),
+                                 ('evaluated', dict(shard.evaluated)),
+                                 ('matched', dict(shard.matched)),
+                                 ('executed', dict(shard.executed))):
+                merged = counters[name]
+                for rule_id, count in values.items():
+                    merged[rule_id] = merged.get(rule_id, 0) + count
+
+        # 首个匹配位置之前（含）的规则
+        for key, count in positions.items():
+            self._fold(counters['before_match'], key, count, orders)
+        return stages, timeouts, counters
+
+    def to_dict(self) -> Dict[str, Any]:
+        """导出为字典"""
+        stages, timeouts, counters = self._merge()
+        rule_ids = sorted(set().union(*counters.values()))
+        return {
+            'uptime_seconds': time.time() - self.started_at,
+            'commands': stages['match'].count,
+            'stages': {stage: histogram.summary() for stage, histogram in stages.items()},
+            'timeouts': timeouts,
+            'rules': {
+                str(rule_id): {name: counters[name].get(rule_id, 0) for name in counters}
+                for rule_id in rule_ids
+            },
+        }
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """导出为JSON文本"""
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
+
+    def to_prometheus(self) -> str:
+        """导出为Prometheus文本格式"""
+        stages, timeouts, counters = self._merge()
+        lines = []
+
+        for name, help_text in (('before_match', '规则在匹配顺序中排在首个匹配规则之前（含）的次数'),
+                                ('evaluated', '规则的正则实际被测试的次数'),
+                                ('matched', '规则首个匹配命令的次数'),
+                                ('executed', '规则动作被执行的次数')):
+            metric = f'{METRIC_PREFIX}_rule_{name}_total'
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} counter')
+            for rule_id, count in sorted(counters[name].items()):
+                lines.append(f'{metric}{{rule_id="{rule_id}"}} {count}')
+
+        metric = f'{METRIC_PREFIX}_stage_duration_seconds'
+        lines.append(f'# HELP {metric} 命令处理各阶段耗时')
+        lines.append(f'# TYPE {metric} histogram')
+        for stage, histogram in stages.items():
+            for upper, cumulative in histogram.cumulative(PROMETHEUS_BOUNDS):
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="{upper / 1e9:.9g}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {histogram.count}')
+            lines.append(f'{metric}_sum{{stage="{stage}"}} {histogram.total / 1e9:.9g}')
+            lines.append(f'{metric}_count{{stage="{stage}"}} {histogram.count}')
+
+        metric = f'{METRIC_PREFIX}_stage_timeouts_total'
+        lines.append(f'# HELP {metric} 命令处理各阶段因超出时间预算被结束的次数')
+        lines.append(f'# TYPE {metric} counter')
+        for stage, count in timeouts.items():
+            lines.append(f'{metric}{{stage="{stage}"}} {count}')
+
+        return '\n'.join(lines) + '\n'
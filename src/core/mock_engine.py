@@ -1,85 +1,532 @@
 import os
-import re
-import subprocess
 import tempfile
-from typing import Optional, Tuple
+import threading
+import time
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
 
+from .file_metadata import MetadataOverride, ModeRewriter, render_metadata_command
+from .metrics import EngineMetrics
+from .output_buffer import DEFAULT_MEMORY_LIMIT, OutputBuffer
+from .output_cache import OutputCache
+from .process_stream import ChainedStream, ProcessStream, limit_args
 from .rule_manager import Rule, RuleManager
+from .rule_schema import MATCH_ARGV
+from .rule_snapshot import RuleSnapshot
+from .shell_parser import parse_command
+from .stream_condition import StreamCondition, compile_condition
+from .tracing import NULL_TRACE, NullTrace, Span, TraceContext, TraceSink
+
+# 条件判断前暂存真实输出时使用的内存上限（字节），超出部分转存到临时文件
+CONDITION_SPOOL_MEMORY = 1024 * 1024
+
+# 接收输出块的对象：可调用对象，或带write方法的二进制文件类对象
+Sink = Union[Callable[[bytes], Any], IO[bytes]]
+
+# 单条命令所有子进程阶段共享的时间预算（秒）
+DEFAULT_COMMAND_TIMEOUT = 5.0
+
+# 管道各阶段及其匹配的规则（未匹配为None），阶段为原始命令文本
+PipelinePlan = List[Tuple[str, Optional[Rule]]]
+
+
+class CommandBudget:
+    """
+    单条命令的执行预算
+    
+    真实命令、条件、过滤和脚本共享同一个截止时间：前面的阶段用掉的时间不再留给后面的阶段，
+    并发执行的阶段（真实命令和过滤器）同时到期。规则设置了资源限制时，各阶段在相同的
+    RLIMIT_CPU/RLIMIT_AS下运行。
+    """
+    
+    def __init__(self, timeout: float, rule: Optional[Rule] = None):
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.cpu_limit: Optional[int] = None
+        self.memory_limit: Optional[int] = None
+        self.timed_out: List[str] = []  # 超时的阶段，可能由其他线程追加
+        if rule is not None:
+            self.apply_rule(rule)
+    
+    def apply_rule(self, rule: Rule):
+        """使用规则的资源限制"""
+        self.cpu_limit = rule.cpu_limit
+        self.memory_limit = rule.memory_limit
+    
+    def restrict(self, rule: Rule):
+        """与规则的资源限制取较严格者（管道中多个阶段匹配规则时）"""
+        if rule.cpu_limit:
+            self.cpu_limit = min(self.cpu_limit or rule.cpu_limit, rule.cpu_limit)
+        if rule.memory_limit:
+            self.memory_limit = min(self.memory_limit or rule.memory_limit, rule.memory_limit)
 
 
 class MockEngine:
     """命令模拟引擎，负责根据规则模拟命令执行结果"""
     
-    def __init__(self, rule_manager: RuleManager):
+    def __init__(self, rule_manager: RuleManager, trace_sink: Optional[TraceSink] = None,
+                 passthrough_cache_ttl: Optional[float] = None,
+                 popen: Optional[Callable[..., Any]] = None,
+                 command_timeout: float = DEFAULT_COMMAND_TIMEOUT,
+                 capture_memory_limit: int = DEFAULT_MEMORY_LIMIT,
+                 capture_max_bytes: Optional[int] = None):
+        """
+        Args:
+            rule_manager: 规则管理器
+            trace_sink: 追踪输出，设置后为每条命令记录区间树
+            passthrough_cache_ttl: 未匹配规则、直接执行的命令的输出缓存时间（秒），
+                                   为None时不缓存；过滤规则是否缓存由规则的cache_output决定
+            popen: 启动子进程的函数，参数与subprocess.Popen一致；在GUI进程中传入SpawnServer.popen，
+                   由启动Qt之前创建的服务进程代为启动，默认为subprocess.Popen
+            command_timeout: 每条命令的时间预算（秒），由所有子进程阶段共享，
+                             到期时结束仍在运行的阶段的整个进程组
+            capture_memory_limit: 保存完整输出时（process_command等）内存中保留的最大字节数，
+                                  超出部分转存到临时文件并通过mmap读取
+            capture_max_bytes: 保存完整输出时保留的最大字节数，超出部分截断并追加标记，
+                               不再读取并结束子进程；为None时不截断
+        """
         self.rule_manager = rule_manager
+        self.metrics = EngineMetrics()
+        self.trace_sink = trace_sink
+        self.output_cache = OutputCache()
+        self.passthrough_cache_ttl = passthrough_cache_ttl
+        self.popen = popen
+        self.command_timeout = command_timeout
+        self.capture_memory_limit = capture_memory_limit
+        self.capture_max_bytes = capture_max_bytes
+        self._local = threading.local()
     
     def process_command(self, command: str) -> Tuple[str, bool]:
         """
         处理命令并返回模拟结果
         
+        流式接口的包装，完整输出保存在OutputBuffer中，按UTF-8解码（无效字节替换为U+FFFD），用于界面显示。
+        
         Args:
             command: 要处理的命令
             
         Returns:
             Tuple[str, bool]: (命令输出, 是否被模拟)
         """
-        # 查找匹配的规则
-        rule = self.rule_manager.find_matching_rule(command)
-        if not rule:
-            return self._execute_real_command(command), False
+        buffer, simulated = self.process_command_buffer(command)
+        with buffer:
+            return buffer.decode(), simulated
+    
+    def process_command_bytes(self, command: str) -> Tuple[bytes, bool]:
+        """
+        处理命令并返回模拟结果的原始字节
+        
+        输出不经过解码，非UTF-8内容原样保留；只有显示时才需要解码。
+        
+        Returns:
+            Tuple[bytes, bool]: (命令输出, 是否被模拟)
+        """
+        buffer, simulated = self.process_command_buffer(command)
+        with buffer:
+            return buffer.tobytes(), simulated
+    
+    def process_command_buffer(self, command: str) -> Tuple[OutputBuffer, bool]:
+        """
+        处理命令并把模拟结果保存在有上限的输出缓冲中
+        
+        内存中最多保留capture_memory_limit字节，超出部分转存到临时文件，通过getbuffer()/chunks()
+        读取时不复制回内存；设置了capture_max_bytes时截断。调用方使用完毕后需要close()。
+        
+        Returns:
+            Tuple[OutputBuffer, bool]: (命令输出, 是否被模拟)
+        """
+        buffer = self._new_buffer()
+        try:
+            simulated = self.process_command_stream(command, buffer)
+        except BaseException:
+            buffer.close()
+            raise
+        return buffer, simulated
+    
+    def process_command_stream(self, command: str, sink: Sink) -> bool:
+        """
+        处理命令并把模拟结果按块写入sink
+        
+        真实命令、过滤器和脚本的输出边读取边写入，不在内存中保存完整输出。
+        sink阻塞时引擎不再读取，管道写满后子进程随之暂停；sink抛出异常时结束所有子进程并向上传播。
+        
+        Args:
+            command: 要处理的命令
+            sink: 接收bytes块的可调用对象，或带write方法的对象（二进制文件等）；
+                  带is_full方法时（如OutputBuffer），返回True后不再读取并结束子进程
+            
+        Returns:
+            bool: 是否被模拟
+        """
+        write = getattr(sink, 'write', sink)
+        is_full = getattr(sink, 'is_full', None)
+        with self._command_budget() as budget:
+            return self._process_command(command, write, is_full, budget)
+    
+    def _process_command(self, command: str, write: Callable[[bytes], Any],
+                         is_full: Optional[Callable[[], bool]], budget: CommandBudget) -> bool:
+        """处理命令，设置了追踪输出时记录区间树"""
+        trace = self._start_trace(command)
+        try:
+            # 查找匹配的规则
+            snapshot = self.rule_manager.snapshot
+            with trace.span('match', 'match', version=snapshot.version):
+                rule, position, elapsed = self._find_rule(command, snapshot, trace)
+            self.metrics.record_match(snapshot.version, snapshot.matcher.rule_ids, position,
+                                      elapsed)
+            
+            plan = self._match_pipeline(command, snapshot, rule, position)
+            if plan is not None:
+                if trace.enabled:
+                    trace.annotate(simulated=True, pipeline=[
+                        {'stage': text.strip(), 'rule_id': stage_rule.id if stage_rule else None}
+                        for text, stage_rule in plan])
+                self._emit(self._pipeline_stream(plan, budget), write, is_full)
+                return True
+            if not rule:
+                trace.annotate(simulated=False)
+                self._emit(self._real_command_stream(command, self.passthrough_cache_ttl),
+                           write, is_full)
+                return False
+            
+            # 根据规则类型处理命令
+            trace.annotate(simulated=True, rule_id=rule.id, rule_name=rule.name,
+                           action=rule.action)
+            self.metrics.record_executed(rule.id)
+            budget.apply_rule(rule)
+            self._emit(self._rule_stream(command, rule), write, is_full)
+            return True
+        finally:
+            if budget.timed_out:
+                trace.annotate(timed_out=list(budget.timed_out), budget_seconds=budget.timeout)
+            self._local.trace = None
+            trace.finish()
+    
+    def _start_trace(self, command: str) -> Union[TraceContext, NullTrace]:
+        """开始记录命令的追踪，未设置追踪输出时返回不记录的NULL_TRACE"""
+        if self.trace_sink is None:
+            return NULL_TRACE
+        trace = TraceContext(command, self.trace_sink)
+        self._local.trace = trace
+        return trace
+    
+    def _find_rule(self, command: str, snapshot: RuleSnapshot,
+                   trace: Union[TraceContext, NullTrace]) -> Tuple[Optional[Rule], int, int]:
+        """
+        经决策缓存查找匹配的规则
+        
+        Returns:
+            (匹配的规则, 位置, 耗时纳秒)；追踪时为每个被测试的规则记录区间
+        """
+        cache = self.rule_manager.decision_cache
+        evaluated = self.metrics.rule_evaluations()
+        start = time.perf_counter_ns()
+        if not trace.enabled:
+            rule, position = cache.lookup(snapshot, command, evaluated)
+            return rule, position, time.perf_counter_ns() - start
+        
+        decision = cache.get(command, snapshot.version)
+        if decision is not None:
+            elapsed = time.perf_counter_ns() - start
+            trace.annotate(cached=True, tested=0)
+            return decision[0], decision[1], elapsed
+        rule, position, certain, timings = snapshot.matcher.find_with_timings(command, evaluated)
+        elapsed = time.perf_counter_ns() - start
+        if certain:
+            cache.put(command, snapshot.version, (rule, position))
+        for tested, test_start, test_end, guarded in timings:
+            trace.add_span('regex', 'regex', test_start, test_end,
+                           rule_id=tested.id, pattern=tested.pattern,
+                           guarded=guarded, matched=tested is rule)
+        trace.annotate(cached=False, tested=len(timings))
+        return rule, position, elapsed
+    
+    def _match_pipeline(self, command: str, snapshot: RuleSnapshot, rule: Optional[Rule],
+                        position: int) -> Optional[PipelinePlan]:
+        """
+        按管道阶段分别匹配规则
+        
+        命令是只由 | 连接的管道时，先按阶段查找规则（同样经过决策缓存）。有阶段匹配的规则
+        不晚于整条命令匹配的规则（位置更靠前或相同，说明整条命令的匹配可以由单个阶段解释，
+        如 cat /etc/shadow | wc -l 的匹配落在 cat /etc/shadow 阶段上），或整条命令未匹配规则、
+        匹配的是参数匹配规则（它描述的是其中一段命令）时，返回各阶段及其规则；
+        否则（整条命令的匹配跨越了多个阶段，或没有阶段匹配规则）返回None，按整条命令处理。
+        """
+        if '|' not in command:
+            return None
+        pipeline = parse_command(command).pipeline
+        if pipeline is None:
+            return None
+        cache = self.rule_manager.decision_cache
+        evaluated = self.metrics.rule_evaluations()
+        plan = []
+        first = len(snapshot.matcher.rule_ids)
+        for text in pipeline:
+            stage_rule, stage_position = cache.lookup(snapshot, text.strip(), evaluated)
+            plan.append((text, stage_rule))
+            if stage_rule is not None:
+                first = min(first, stage_position)
+        if first == len(snapshot.matcher.rule_ids):
+            return None
+        if rule is not None and rule.match_mode != MATCH_ARGV and first > position:
+            return None
+        return plan
+    
+    def _pipeline_stream(self, plan: PipelinePlan, budget: CommandBudget) -> Iterable[bytes]:
+        """
+        按阶段执行管道：匹配规则的阶段应用规则，其余阶段执行真实命令
+        
+        各阶段通过ProcessStream的输入线程连接，上一阶段的输出流作为下一阶段的输入；
+        相邻的真实阶段合并为一条shell管道执行。替换和返回空的阶段不读取输入，
+        它之前的阶段不会启动（如 cat /etc/shadow | grep root 中grep阶段被替换时不读取shadow）。
+        真实阶段只有最后一段的标准错误合并到输出，中间阶段的标准错误被丢弃，不送入下游。
+        """
+        for _, rule in plan:
+            if rule is not None:
+                self.metrics.record_executed(rule.id)
+                budget.restrict(rule)
+        
+        stream: Optional[Iterable[bytes]] = None
+        index = 0
+        while index < len(plan):
+            text, rule = plan[index]
+            if rule is not None:
+                stream = self._rule_stream(text.strip(), rule, stream)
+                if index + 1 < len(plan):
+                    # 作为下一阶段的输入，在其输入线程中迭代
+                    stream = self._bind_context(stream)
+                index += 1
+                continue
+            end = index
+            while end < len(plan) and plan[end][1] is None:
+                end += 1
+            group = '|'.join(text for text, _ in plan[index:end]).strip()
+            stream = self._process_stream(group, 'real_exec', shell=True, input_chunks=stream,
+                                          merge_stderr=end == len(plan))
+            index = end
+        return stream
+    
+    def _bind_context(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """
+        在当前线程的命令预算和追踪下迭代输出流
+        
+        规则的输出流是生成器，其中的子进程阶段在首次迭代时才创建；作为下游阶段的输入时
+        由下游的输入线程迭代，需要沿用创建时的预算（截止时间和资源限制）和追踪。
+        """
+        budget = getattr(self._local, 'budget', None)
+        trace = self._current_trace()
+        
+        def generate():
+            self._local.budget = budget
+            self._local.trace = trace
+            try:
+                yield from chunks
+            finally:
+                self._local.budget = None
+                self._local.trace = None
+        
+        return generate()
+    
+    def _current_trace(self) -> Optional[TraceContext]:
+        """当前线程正在记录的追踪"""
+        return getattr(self._local, 'trace', None)
+    
+    @contextmanager
+    def _command_budget(self, rule: Optional[Rule] = None) -> Iterator[CommandBudget]:
+        """
+        为当前线程处理的命令设置时间预算，已有预算时沿用
+        
+        预算在命令开始时创建，之后各阶段创建子进程流时读取，预算内的阶段共享截止时间。
+        """
+        budget = getattr(self._local, 'budget', None)
+        if budget is not None:
+            yield budget
+            return
+        budget = CommandBudget(self.command_timeout, rule)
+        self._local.budget = budget
+        try:
+            yield budget
+        finally:
+            self._local.budget = None
+    
+    def _new_buffer(self) -> OutputBuffer:
+        """按引擎的输出上限创建输出缓冲"""
+        return OutputBuffer(self.capture_memory_limit, self.capture_max_bytes)
+    
+    def _capture(self, chunks: Iterable[bytes]) -> OutputBuffer:
+        """读取完整输出到有上限的输出缓冲"""
+        buffer = self._new_buffer()
+        try:
+            self._emit(chunks, buffer.write, buffer.is_full)
+        except BaseException:
+            buffer.close()
+            raise
+        return buffer
+    
+    def _collect(self, chunks: Iterable[bytes]) -> bytes:
+        """读取完整输出"""
+        with self._capture(chunks) as buffer:
+            return buffer.tobytes()
+    
+    @staticmethod
+    def _emit(chunks: Iterable[bytes], write: Callable[[bytes], Any],
+              is_full: Optional[Callable[[], bool]] = None):
+        """把输出块依次写入sink，结束、sink已满或出错时关闭流（结束仍在运行的子进程）"""
+        iterator = iter(chunks)
+        try:
+            for chunk in iterator:
+                if chunk:
+                    write(chunk)
+                    if is_full is not None and is_full():
+                        break
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+    
+    def _process_stream(self, args: Union[str, List[str]], stage: str, shell: bool = False,
+                        input_chunks: Optional[Iterable[bytes]] = None, label: str = '命令',
+                        merge_stderr: bool = True) -> ProcessStream:
+        """
+        创建子进程阶段的输出流，统一记录阶段耗时、超时和追踪
+        
+        计时分片、命令预算和追踪的父区间在创建时确定，流可以在其他线程中被消费（作为下游阶段的输入）。
+        """
+        histogram = self.metrics.stage_histogram(stage)
+        timeouts = self.metrics.stage_timeouts()
+        budget = getattr(self._local, 'budget', None) or CommandBudget(self.command_timeout)
+        trace = self._current_trace()
+        parent = trace.current if trace is not None else None
+        if budget.cpu_limit or budget.memory_limit:
+            args = limit_args(args, shell, budget.cpu_limit, budget.memory_limit)
+            shell = False
         
-        # 根据规则类型处理命令
-        return self._apply_rule(command, rule), True
+        def finish(stream: ProcessStream):
+            histogram.record(stream.end_ns - stream.start_ns)
+            if stream.timed_out:
+                timeouts[stage] = timeouts.get(stage, 0) + 1
+                budget.timed_out.append(stage)
+            if parent is None:
+                return
+            span = Span(stage, 'stage', stream.start_ns, stream.end_ns, {
+                'returncode': stream.returncode,
+                'bytes_in': stream.bytes_in,
+                'bytes_out': stream.bytes_out,
+                'timed_out': stream.timed_out,
+            })
+            if stream.error is not None:
+                span.args['error'] = stream.error
+            elif stream.pid is not None:
+                span.children.append(Span('spawn', 'process', stream.start_ns, stream.spawned_ns,
+                                          {'pid': stream.pid}))
+            if stream.timed_out:
+                # 进程组在到期时被结束；pid为None表示开始时预算已用完，没有启动子进程
+                span.children.append(Span('timeout', 'event', stream.end_ns, stream.end_ns, {
+                    'budget_seconds': budget.timeout,
+                    'pgid': stream.pid,
+                }))
+            parent.children.append(span)
+        
+        return ProcessStream(args, shell=shell, deadline=budget.deadline, input_chunks=input_chunks,
+                             label=label, merge_stderr=merge_stderr, on_finish=finish,
+                             popen=self.popen)
     
-    def _apply_rule(self, command: str, rule: Rule) -> str:
-        """应用规则处理命令"""
+    def _rule_stream(self, command: str, rule: Rule,
+                     input_chunks: Optional[Iterable[bytes]] = None) -> Iterator[bytes]:
+        """
+        应用规则处理命令，生成输出块
+        
+        input_chunks为管道中上一阶段的输出：脚本和过滤规则的真实命令从标准输入读取它，
+        替换、返回空和文件属性伪装不读取。
+        """
         if rule.action == 'replace':
             # 直接返回替换输出
-            return rule.output
+            yield rule.output_bytes()
         
         elif rule.action == 'script':
             # 执行自定义脚本
-            return self._execute_custom_script(command, rule.script)
+            yield from self._script_stream(command, rule.script, input_chunks)
         
         elif rule.action == 'filter':
-            # 执行命令并过滤输出
-            real_output = self._execute_real_command(command)
+            # 执行命令并过滤输出；有输入时输出取决于输入，不使用缓存
+            cache_ttl = rule.cache_ttl if rule.cache_output and input_chunks is None else None
+            real_output = self._real_command_stream(command, cache_ttl, input_chunks)
             
-            # 检查条件
+            # 检查条件：判断前读取的输出先暂存（超过内存上限的部分转存到临时文件），判断后重放；
+            # 重放给条件命令和过滤器的是缓冲区切片，不复制
             if rule.condition:
-                if self._check_condition(real_output, rule.condition):
-                    return self._apply_filter(real_output, rule.filter)
-                return real_output
+                with OutputBuffer(CONDITION_SPOOL_MEMORY) as spool:
+                    predicate = compile_condition(rule.condition)
+                    if predicate is not None:
+                        matched, rest = self._scan_condition(real_output, predicate, spool)
+                    else:
+                        for chunk in real_output:
+                            spool.write(chunk)
+                        matched = self._condition_met(spool.chunks(), rule.condition)
+                        rest = None
+
+                    if not matched:
+                        yield from map(bytes, spool.chunks())
+                    elif rest is None:
+                        yield from self._filter_stream(spool.chunks(), rule.filter)
+                    else:
+                        # 条件提前满足，暂存部分和剩余输出依次送入过滤器
+                        yield from self._filter_stream(
+                            ChainedStream((spool.chunks(), rest), source=real_output),
+                            rule.filter)
+                return
             
-            # 无条件直接过滤
-            return self._apply_filter(real_output, rule.filter)
+            # 无条件直接过滤，真实命令的输出边产生边送入过滤器
+            yield from self._filter_stream(real_output, rule.filter)
         
         elif rule.action == 'empty':
             # 返回空输出
-            return ""
+            return
         
-        # 未知动作，执行真实命令
-        return self._execute_real_command(command)
+        elif rule.action == 'metadata':
+            # 在进程内生成ls/stat的输出并伪装文件属性
+            yield from self._metadata_stream(command, rule, input_chunks)
+        
+        else:
+            # 未知动作，执行真实命令
+            yield from self._real_command_stream(command, input_chunks=input_chunks)
     
-    def _execute_real_command(self, command: str) -> str:
-        """执行真实命令（仅用于测试）"""
-        try:
-            # 注意：实际环境中可能需要更安全的方式执行命令
-            process = subprocess.run(
-                command,
-                shell=True,
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            return process.stdout + (process.stderr if process.stderr else "")
-        except subprocess.TimeoutExpired:
-            return "命令执行超时"
-        except Exception as e:
-            return f"命令执行错误: {str(e)}"
+    def _apply_rule(self, command: str, rule: Rule) -> bytes:
+        """应用规则处理命令，返回完整输出"""
+        with self._command_budget(rule):
+            return self._collect(self._rule_stream(command, rule))
     
-    def _execute_custom_script(self, command: str, script: str) -> str:
-        """执行自定义脚本"""
+    def _real_command_stream(self, command: str, cache_ttl: Optional[float] = None,
+                             input_chunks: Optional[Iterable[bytes]] = None) -> Iterable[bytes]:
+        """
+        执行真实命令（仅用于测试），返回输出流
+        
+        cache_ttl不为None时，只读命令的输出经过输出缓存，依赖文件变化或超过cache_ttl秒后重新执行。
+        input_chunks不为None时写入命令的标准输入（管道中的阶段），此时不使用缓存。
+        """
+        # 注意：实际环境中可能需要更安全的方式执行命令
+        if cache_ttl is None or input_chunks is not None:
+            return self._process_stream(command, 'real_exec', shell=True, input_chunks=input_chunks)
+        
+        output, ticket = self.output_cache.lookup(command)
+        trace = self._current_trace()
+        if trace is not None:
+            trace.event('output_cache', hit=output is not None)
+        if output is not None:
+            return [output]
+        stream = self._process_stream(command, 'real_exec', shell=True)
+        if ticket is None:
+            return stream
+        return self.output_cache.record(stream, ticket, cache_ttl)
+    
+    def _execute_real_command(self, command: str, cache_ttl: Optional[float] = None) -> bytes:
+        """执行真实命令（仅用于测试），返回完整输出"""
+        with self._command_budget():
+            return self._collect(self._real_command_stream(command, cache_ttl))
+    
+    def _script_stream(self, command: str, script: str,
+                       input_chunks: Optional[Iterable[bytes]] = None) -> Iterator[bytes]:
+        """执行自定义脚本，input_chunks不为None时写入脚本的标准输入"""
         try:
             # 创建临时脚本文件
             with tempfile.NamedTemporaryFile(suffix='.sh', delete=False) as temp:
@@ -93,89 +540,106 @@ CMD="{command}"
             
             # 设置执行权限
             os.chmod(temp_path, 0o755)
-            
-            # 执行脚本
-            process = subprocess.run(
-                ['/bin/bash', temp_path],
-                capture_output=True,
-                text=True,
-                timeout=5
-            )
-            
-            # 删除临时文件
-            os.unlink(temp_path)
-            
-            return process.stdout + (process.stderr if process.stderr else "")
         except Exception as e:
-            return f"脚本执行错误: {str(e)}"
+            yield f"脚本执行错误: {str(e)}".encode('utf-8')
+            return
         
-    def _check_condition(self, output: str, condition: str) -> bool:
-        """检查输出是否满足条件"""
         try:
-            # 创建临时脚本文件
-            with tempfile.NamedTemporaryFile(suffix='.sh', delete=False) as temp:
-                script_content = f"""#!/bin/bash
-echo '{output}' | {condition}
-"""
-                temp.write(script_content.encode('utf-8'))
-                temp_path = temp.name
-            
-            # 设置执行权限
-            os.chmod(temp_path, 0o755)
-            
-            # 执行脚本
-            process = subprocess.run(
-                ['/bin/bash', temp_path],
-                capture_output=True,
-                text=True
-            )
-            
+            yield from self._process_stream(['/bin/bash', temp_path], 'script',
+                                            input_chunks=input_chunks, label='脚本')
+        finally:
             # 删除临时文件
             os.unlink(temp_path)
-            
-            # 如果退出码为0，则条件满足
-            return process.returncode == 0
-        except Exception:
-            return False
     
-    def _apply_filter(self, output: str, filter_cmd: str) -> str:
-        """应用过滤器处理输出"""
+    def _metadata_stream(self, command: str, rule: Rule,
+                         input_chunks: Optional[Iterable[bytes]] = None) -> Iterable[bytes]:
+        """
+        伪装文件属性：解析ls/stat调用，在进程内读取文件属性并按coreutils的格式输出，不启动子进程
+        
+        调用不支持（其他程序、不支持的选项、需要shell展开的参数等）时执行真实命令，
+        逐行改写输出中的权限；设置无效时直接输出真实命令的结果。
+        """
+        override = rule.get_metadata_override()
+        if override is None:
+            return self._real_command_stream(command, input_chunks=input_chunks)
+        start = time.perf_counter_ns()
+        output = self._render_metadata(command, override)
+        end = time.perf_counter_ns()
+        if output is None:
+            real_output = self._real_command_stream(command, input_chunks=input_chunks)
+            return ModeRewriter(command, override).stream(real_output)
+        
+        self.metrics.stage_histogram('metadata').record(end - start)
+        trace = self._current_trace()
+        if trace is not None:
+            trace.add_span('metadata', 'stage', start, end, native=True, bytes_out=len(output))
+        return [output]
+    
+    def _render_metadata(self, command: str, override: MetadataOverride) -> Optional[bytes]:
+        """生成ls/stat调用伪装后的输出，不支持时返回None"""
         try:
-            # 创建临时脚本文件
-            with tempfile.NamedTemporaryFile(suffix='.sh', delete=False) as temp:
-                script_content = f"""#!/bin/bash
-echo '{output}' | {filter_cmd}
-"""
-                temp.write(script_content.encode('utf-8'))
-                temp_path = temp.name
-            
-            # 设置执行权限
-            os.chmod(temp_path, 0o755)
-            
-            # 执行脚本
-            process = subprocess.run(
-                ['/bin/bash', temp_path],
-                capture_output=True,
-                text=True
-            )
-            
-            # 删除临时文件
-            os.unlink(temp_path)
-            
-            return process.stdout
-        except Exception as e:
-            return f"过滤执行错误: {str(e)}"
+            return render_metadata_command(command, override)
+        except OSError as e:
+            print(f"生成文件属性输出失败: {str(e)}")
+            return None
     
-    def preview_rule(self, command: str, rule: Rule) -> str:
-        """预览规则应用效果"""
-        # 临时修改规则状态为启用
-        original_enabled = rule.enabled
-        rule.enabled = True
+    def _scan_condition(self, real_output: Iterable[bytes], predicate: StreamCondition,
+                        spool: OutputBuffer) -> Tuple[bool, Optional[Iterator[bytes]]]:
+        """
+        在进程内边读取边判断条件，读取的输出写入spool
         
-        # 应用规则并获取结果
-        result = self._apply_rule(command, rule)
+        条件满足时立即返回 (True, 剩余输出的迭代器)，不等待命令结束；
+        读完仍未满足时返回 (False, None)。单行过长无法判断时改为执行条件命令。
+        """
+        histogram = self.metrics.stage_histogram('condition')
+        trace = self._current_trace()
+        scanner = predicate.scanner()
+        start = time.perf_counter_ns()
+        scan_ns = 0
+        iterator = iter(real_output)
+        for chunk in iterator:
+            spool.write(chunk)
+            scan_start = time.perf_counter_ns()
+            matched = scanner.feed(chunk)
+            scan_ns += time.perf_counter_ns() - scan_start
+            if matched:
+                rest: Optional[Iterator[bytes]] = iterator
+                break
+        else:
+            rest = None
+            if scanner.overflow:
+                matched = self._condition_met(spool.chunks(), predicate.condition)
+            else:
+                scan_start = time.perf_counter_ns()
+                matched = scanner.finish()
+                scan_ns += time.perf_counter_ns() - scan_start
         
-        # 恢复原始状态
-        rule.enabled = original_enabled
+        histogram.record(scan_ns)
+        if trace is not None:
+            trace.add_span('condition', 'stage', start, time.perf_counter_ns(), native=True,
+                           matched=matched, early=rest is not None, overflow=scanner.overflow,
+                           bytes_scanned=scanner.bytes_scanned, scan_ms=scan_ns / 1e6)
+        return matched, rest
+    
+    def _condition_met(self, chunks: Iterable[bytes], condition: str) -> bool:
+        """检查输出是否满足条件（条件命令从标准输入读取输出，退出码为0时满足）"""
+        stream = self._process_stream(['/bin/bash', '-c', condition], 'condition',
+                                      input_chunks=chunks, label='条件', merge_stderr=False)
+        for _ in stream:
+            pass
+        return stream.completed and stream.returncode == 0
+    
+    def _filter_stream(self, chunks: Iterable[bytes], filter_cmd: str) -> ProcessStream:
+        """应用过滤器处理输出流（过滤命令从标准输入读取输出）"""
+        return self._process_stream(['/bin/bash', '-c', filter_cmd], 'filter',
+                                    input_chunks=chunks, label='过滤', merge_stderr=False)
+    
+    def preview_rule(self, command: str, rule: Rule) -> str:
+        """
+        预览规则应用效果（无论规则是否启用都直接应用，不修改规则本身），解码后用于界面显示
         
-        return result
+        输出受capture_memory_limit和capture_max_bytes限制，直接从输出缓冲解码。
+        """
+        with self._command_budget(rule):
+            with self._capture(self._rule_stream(command, rule)) as buffer:
+                return buffer.decode()
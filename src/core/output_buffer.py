@@ -0,0 +1,137 @@
+import io
+import mmap
+import tempfile
+from typing import Iterator, Optional, Union
+
+from .process_stream import CHUNK_SIZE
+
+# 输出保存在内存中的默认上限（字节），超出后转存到临时文件
+DEFAULT_MEMORY_LIMIT = 8 * 1024 * 1024
+
+# 超过截断上限时追加在输出末尾的标记
+TRUNCATION_MARKER = "\n[输出已截断: 超过 {limit} 字节]\n"
+
+
+class OutputBuffer:
+    """
+    有上限的输出缓冲
+
+    输出不超过memory_limit时保存在内存（BytesIO）中；超过后已写入的内容和后续输出转存到
+    匿名临时文件（创建后即删除，只能通过描述符访问），读取时用mmap映射为只读缓冲区，
+    不复制回内存，由操作系统按需换入换出。
+    设置max_bytes时超出部分被丢弃，末尾追加截断标记，is_full()返回True，
+    引擎据此停止读取并结束仍在运行的子进程。
+
+    写入完成后通过getbuffer()/chunks()/decode()读取；使用完毕后调用close()释放映射和临时文件。
+    """
+
+    def __init__(self, memory_limit: int = DEFAULT_MEMORY_LIMIT, max_bytes: Optional[int] = None):
+        """
+        Args:
+            memory_limit: 内存中保存的最大字节数
+            max_bytes: 保留的最大字节数（不含截断标记），为None时不截断
+        """
+        self.memory_limit = memory_limit
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.truncated = False
+        self._memory: Optional[io.BytesIO] = io.BytesIO()
+        self._file = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._view: Optional[memoryview] = None
+
+    @property
+    def spilled(self) -> bool:
+        """输出是否已转存到临时文件"""
+        return self._file is not None
+
+    def is_full(self) -> bool:
+        """是否已达到截断上限，之后的写入都被丢弃"""
+        return self.truncated
+
+    def write(self, data: Union[bytes, memoryview]) -> int:
+        """写入输出块，返回实际保存的字节数"""
+        if self.truncated or self._view is not None:
+            return 0
+        length = len(data)
+        if self.max_bytes is not None and self.size + length > self.max_bytes:
+            data = memoryview(data)[:self.max_bytes - self.size]
+            length = len(data)
+            self._write(data)
+            self._write(TRUNCATION_MARKER.format(limit=self.max_bytes).encode('utf-8'))
+            self.truncated = True
+            return length
+        self._write(data)
+        return length
+
+    def _write(self, data: Union[bytes, memoryview]):
+        """写入内存或临时文件，超过内存上限时转存"""
+        if self._file is None and self._memory.tell() + len(data) > self.memory_limit:
+            self._file = tempfile.TemporaryFile(prefix='fakelinux-output-')
+            self._file.write(self._memory.getbuffer())
+            self._memory = None
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._memory.write(data)
+        self.size += len(data)
+
+    def getbuffer(self) -> memoryview:
+        """
+        输出内容的只读视图，不复制
+
+        首次调用后缓冲不再接受写入。转存到临时文件时视图由mmap提供。
+        """
+        if self._view is None:
+            if self._file is None:
+                self._view = self._memory.getbuffer().toreadonly()
+            elif self.size == 0:
+                self._view = memoryview(b'')
+            else:
+                self._file.flush()
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._mmap)
+        return self._view
+
+    def chunks(self, chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+        """按块读取输出，每块是getbuffer()的切片，可直接写入下游子进程的标准输入"""
+        view = self.getbuffer()
+        for offset in range(0, len(view), chunk_size):
+            yield view[offset:offset + chunk_size]
+
+    def tobytes(self) -> bytes:
+        """输出内容的bytes（仍在内存中时不复制，已转存时读入内存）"""
+        if self._file is None and self._view is None:
+            return self._memory.getvalue()
+        return self.getbuffer().tobytes()
+
+    def decode(self, errors: str = 'replace') -> str:
+        """按UTF-8解码，直接从缓冲区解码，不先复制为bytes"""
+        return str(self.getbuffer(), 'utf-8', errors)
+
+    def close(self):
+        """释放映射和临时文件"""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # 调用方仍持有切片，映射在切片释放后由垃圾回收关闭
+                pass
+            self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._memory = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __enter__(self) -> 'OutputBuffer':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
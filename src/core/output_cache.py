@@ -0,0 +1,260 @@
+import os
+import shlex
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 只读取文件内容、不修改任何文件的程序，只有这些程序的输出可以缓存
+READ_ONLY_PROGRAMS = frozenset({
+    'cat', 'tac', 'nl', 'head', 'tail', 'grep', 'egrep', 'fgrep', 'wc', 'cut', 'strings',
+    'md5sum', 'sha1sum', 'sha256sum', 'sha512sum',
+})
+
+# 会让输出依赖于文件参数之外内容的选项（跟随文件、递归读取目录、从其他文件读取模式）
+_GREP_UNSAFE = (set('rRdf'), {'--recursive', '--dereference-recursive', '--directories',
+                              '--file', '--exclude-from', '--include', '--exclude'})
+_UNSAFE_OPTIONS = {
+    'tail': (set('fF'), {'--follow', '--retry'}),
+    'grep': _GREP_UNSAFE, 'egrep': _GREP_UNSAFE, 'fgrep': _GREP_UNSAFE,
+}
+
+# 出现任一字符时命令需要shell解释（管道、重定向、变量、通配符等），不缓存
+_SHELL_CHARS = set('|&;<>()$`\\*?[]{}~!#\n')
+
+# 文件签名: (修改时间纳秒, 大小, inode)，文件不存在时为None
+Signature = Optional[Tuple[int, int, int]]
+
+
+def command_dependencies(command: str, cwd: str) -> Optional[List[str]]:
+    """
+    解析只读命令依赖的文件路径
+
+    所有非选项参数都按文件路径处理（grep的模式、head -n的数字也算在内，多出的依赖只会让缓存
+    更早失效）。命令不是只读程序、需要shell解释或没有文件参数（读取标准输入）时返回None。
+    """
+    if not command or any(char in _SHELL_CHARS for char in command):
+        return None
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return None
+    if not args or '=' in args[0] or os.path.basename(args[0]) not in READ_ONLY_PROGRAMS:
+        return None
+
+    unsafe_flags, unsafe_long = _UNSAFE_OPTIONS.get(os.path.basename(args[0]), (set(), set()))
+    paths = []
+    options_done = False
+    for arg in args[1:]:
+        if not options_done and arg == '--':
+            options_done = True
+            continue
+        if not options_done and arg.startswith('-') and arg != '-':
+            if arg.startswith('--'):
+                if arg.split('=', 1)[0] in unsafe_long:
+                    return None
+            elif unsafe_flags.intersection(arg[1:]):
+                return None
+            continue
+        if arg == '-':
+            return None
+        paths.append(os.path.normpath(os.path.join(cwd, arg)))
+    return paths or None
+
+
+def file_signature(path: str) -> Signature:
+    """获取文件签名"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+
+class _Entry:
+    """缓存的命令输出"""
+
+    __slots__ = ('output', 'expires_at', 'dependencies', 'size')
+
+    def __init__(self, output: bytes, expires_at: float,
+                 dependencies: Tuple[Tuple[str, Signature], ...], size: int):
+        self.output = output
+        self.expires_at = expires_at
+        self.dependencies = dependencies
+        self.size = size
+
+
+class CacheTicket:
+    """未命中时获取的写入凭据，记录缓存键和执行前的依赖签名"""
+
+    __slots__ = ('key', 'dependencies')
+
+    def __init__(self, key: Tuple[str, str], dependencies: Tuple[Tuple[str, Signature], ...]):
+        self.key = key
+        self.dependencies = dependencies
+
+
+class OutputCache:
+    """
+    只读命令真实输出的缓存
+
+    以 (命令, 工作目录) 为键，每个结果带有过期时间和依赖文件的签名，
+    过期或任一依赖文件的修改时间、大小、inode变化时失效。依赖签名在执行命令之前获取，
+    执行期间文件被修改时下次读取就会失效。
+    按输出大小限制总内存，超出时淘汰最久未使用的结果。可以被多个线程同时使用。
+    """
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        """
+        Args:
+            max_bytes: 缓存输出的总大小上限（字节），单个输出超过其1/8时不缓存
+        """
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Tuple[str, str], _Entry]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.invalidated = 0
+        self.evictions = 0
+        self.uncacheable = 0
+
+    def _get(self, key: Tuple[str, str]) -> Optional[bytes]:
+        """读取仍然有效的结果"""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        if time.monotonic() >= entry.expires_at:
+            stale = 'expired'
+        elif any(file_signature(path) != signature for path, signature in entry.dependencies):
+            stale = 'invalidated'
+        else:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return entry.output
+
+        with self._lock:
+            if self._entries.get(key) is entry:
+                del self._entries[key]
+                self.bytes -= entry.size
+                setattr(self, stale, getattr(self, stale) + 1)
+        return None
+
+    def _put(self, key: Tuple[str, str], entry: _Entry):
+        """写入结果并按内存上限淘汰"""
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old.size
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while self.bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+
+    def lookup(self, command: str) -> Tuple[Optional[bytes], Optional['CacheTicket']]:
+        """
+        查找命令输出
+
+        Returns:
+            (缓存的输出, 写入凭据)：命中时凭据为None；未命中时输出为None，
+            命令不可缓存时凭据也为None
+        """
+        cwd = os.getcwd()
+        key = (command, cwd)
+        output = self._get(key)
+        if output is not None:
+            with self._lock:
+                self.hits += 1
+            return output, None
+
+        paths = command_dependencies(command, cwd)
+        with self._lock:
+            self.misses += 1
+            if paths is None:
+                self.uncacheable += 1
+        if paths is None:
+            return None, None
+        # 依赖签名在执行命令之前获取
+        return None, CacheTicket(key, tuple((path, file_signature(path)) for path in paths))
+
+    def store(self, ticket: 'CacheTicket', output: bytes, ttl: float):
+        """写入执行结果"""
+        size = len(output) + len(ticket.key[0])
+        if ttl > 0 and size <= self.max_bytes // 8:
+            self._put(ticket.key, _Entry(output, time.monotonic() + ttl, ticket.dependencies, size))
+
+    def record(self, stream: Iterable[bytes], ticket: 'CacheTicket', ttl: float) -> 'CachingStream':
+        """包装输出流，流正常读完时写入缓存"""
+        return CachingStream(self, stream, ticket, ttl)
+
+    def clear(self):
+        """清空缓存的结果，保留统计"""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """命中率"""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存统计"""
+        with self._lock:
+            entries = len(self._entries)
+        return {
+            'entries': entries,
+            'bytes': self.bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'invalidated': self.invalidated,
+            'evictions': self.evictions,
+            'uncacheable': self.uncacheable,
+            'hit_rate': self.hit_rate,
+        }
+
+
+class CachingStream:
+    """
+    边读取边缓存的输出流
+
+    累计大小不超过缓存上限的1/8时保留输出，超过后丢弃已保留的部分，不再占用内存。
+    原始流正常读完（有completed属性时为True）才写入缓存，超时、出错或提前结束的结果不缓存。
+    """
+
+    def __init__(self, cache: OutputCache, stream: Iterable[bytes], ticket: CacheTicket,
+                 ttl: float):
+        self.cache = cache
+        self.stream = stream
+        self.ticket = ticket
+        self.ttl = ttl
+
+    def stop(self):
+        """结束原始流的子进程"""
+        stop = getattr(self.stream, 'stop', None)
+        if stop is not None:
+            stop()
+
+    def __iter__(self) -> Iterator[bytes]:
+        limit = self.cache.max_bytes // 8
+        chunks: Optional[List[bytes]] = []
+        size = 0
+        for chunk in self.stream:
+            if chunks is not None:
+                size += len(chunk)
+                if size <= limit:
+                    chunks.append(chunk)
+                else:
+                    chunks = None
+            yield chunk
+        if chunks is not None and getattr(self.stream, 'completed', True):
+            self.cache.store(self.ticket, b''.join(chunks), self.ttl)
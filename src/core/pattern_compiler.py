@@ -0,0 +1,618 @@
+import re
+import shlex
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_constants
+    import sre_parse
+
+_C = sre_constants
+
+# POSIX要求实现支持的最大重复次数（RE_DUP_MAX的下限）
+ERE_DUP_MAX = 255
+
+# ERE中需要转义的字符
+_ERE_SPECIAL = set('.[]()*+?{}|^$\\')
+
+# Python分类对应的POSIX字符类
+_CATEGORY_NAMES = {
+    _C.CATEGORY_DIGIT: 'digit', _C.CATEGORY_NOT_DIGIT: 'not_digit',
+    _C.CATEGORY_SPACE: 'space', _C.CATEGORY_NOT_SPACE: 'not_space',
+    _C.CATEGORY_WORD: 'word', _C.CATEGORY_NOT_WORD: 'not_word',
+}
+_CATEGORY_PYTHON = {
+    'digit': r'\d', 'not_digit': r'\D', 'space': r'\s', 'not_space': r'\S',
+    'word': r'\w', 'not_word': r'\W',
+}
+_CATEGORY_ERE = {'digit': '[:digit:]', 'space': '[:space:]', 'word': '[:alnum:]_'}  # 方括号内的成员
+
+_ANCHORS = {
+    _C.AT_BEGINNING: 'start', _C.AT_BEGINNING_STRING: 'start_string',
+    _C.AT_END: 'end', _C.AT_END_STRING: 'end_string',
+    _C.AT_BOUNDARY: 'boundary', _C.AT_NON_BOUNDARY: 'non_boundary',
+}
+_ANCHOR_PYTHON = {
+    'start': '^', 'start_string': r'\A', 'end': '$', 'end_string': r'\Z',
+    'boundary': r'\b', 'non_boundary': r'\B',
+}
+# \b \B 是GNU扩展，GNU grep和glibc上的bash =~ 都支持
+_ANCHOR_ERE = {
+    'start': '^', 'start_string': '^', 'end': '$', 'end_string': '$',
+    'boundary': r'\b', 'non_boundary': r'\B',
+}
+
+# 输出片段的结合优先级：原子、顺序连接、多选分支
+_ATOM, _SEQ, _ALT = 2, 1, 0
+
+_FLAG_LETTERS = (
+    (re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.ASCII, 'a'),
+)
+
+
+class PatternCompileError(ValueError):
+    """模式无法解析，或目标方言无法表达其中的结构"""
+    pass
+
+
+class Node:
+    """模式语法树节点"""
+
+    __slots__ = ()
+
+
+class Literal(Node):
+    """连续的字面字符"""
+
+    __slots__ = ('text',)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class Any(Node):
+    """任意字符 ."""
+
+    __slots__ = ()
+
+
+class CharSet(Node):
+    """字符集合，items为 ('char', c) / ('range', (lo, hi)) / ('category', 名称)"""
+
+    __slots__ = ('items', 'negated')
+
+    def __init__(self, items: Tuple[Tuple[str, object], ...], negated: bool):
+        self.items = items
+        self.negated = negated
+
+
+class Repeat(Node):
+    """重复，max_count为None表示无上限"""
+
+    __slots__ = ('child', 'min_count', 'max_count', 'greedy')
+
+    def __init__(self, child: Node, min_count: int, max_count: Optional[int], greedy: bool):
+        self.child = child
+        self.min_count = min_count
+        self.max_count = max_count
+        self.greedy = greedy
+
+
+class Group(Node):
+    """分组，index为None表示非捕获分组；add_flags/del_flags为局部标志"""
+
+    __slots__ = ('child', 'index', 'name', 'add_flags', 'del_flags')
+
+    def __init__(self, child: Node, index: Optional[int], name: Optional[str] = None,
+                 add_flags: int = 0, del_flags: int = 0):
+        self.child = child
+        self.index = index
+        self.name = name
+        self.add_flags = add_flags
+        self.del_flags = del_flags
+
+
+class Sequence(Node):
+    """顺序连接"""
+
+    __slots__ = ('items',)
+
+    def __init__(self, items: List[Node]):
+        self.items = items
+
+
+class Alternation(Node):
+    """多选分支"""
+
+    __slots__ = ('branches',)
+
+    def __init__(self, branches: List[Node]):
+        self.branches = branches
+
+
+class Anchor(Node):
+    """零宽锚点，kind见 _ANCHORS"""
+
+    __slots__ = ('kind',)
+
+    def __init__(self, kind: str):
+        self.kind = kind
+
+
+class Lookaround(Node):
+    """先行/后行断言"""
+
+    __slots__ = ('child', 'ahead', 'negated')
+
+    def __init__(self, child: Node, ahead: bool, negated: bool):
+        self.child = child
+        self.ahead = ahead
+        self.negated = negated
+
+
+class Backref(Node):
+    """反向引用"""
+
+    __slots__ = ('index',)
+
+    def __init__(self, index: int):
+        self.index = index
+
+
+def _convert(parsed, names: Dict[int, str]) -> Node:
+    """把sre_parse的解析结果转换为语法树"""
+    items: List[Node] = []
+    for op, av in parsed:
+        if op is _C.LITERAL:
+            char = chr(av)
+            if items and isinstance(items[-1], Literal):
+                items[-1] = Literal(items[-1].text + char)
+            else:
+                items.append(Literal(char))
+        elif op is _C.NOT_LITERAL:
+            items.append(CharSet((('char', chr(av)),), True))
+        elif op is _C.ANY:
+            items.append(Any())
+        elif op is _C.IN:
+            negated = False
+            members = []
+            for item_op, item_av in av:
+                if item_op is _C.NEGATE:
+                    negated = True
+                elif item_op is _C.LITERAL:
+                    members.append(('char', chr(item_av)))
+                elif item_op is _C.RANGE:
+                    members.append(('range', (chr(item_av[0]), chr(item_av[1]))))
+                elif item_op is _C.CATEGORY and item_av in _CATEGORY_NAMES:
+                    members.append(('category', _CATEGORY_NAMES[item_av]))
+                else:
+                    raise PatternCompileError(f"不支持的字符集合成员: {item_op}")
+            items.append(CharSet(tuple(members), negated))
+        elif op in (_C.MAX_REPEAT, _C.MIN_REPEAT):
+            low, high, sub = av
+            items.append(Repeat(_convert(sub, names), low,
+                                None if high == _C.MAXREPEAT else high, op is _C.MAX_REPEAT))
+        elif op is _C.SUBPATTERN:
+            index, add_flags, del_flags, sub = av
+            items.append(Group(_convert(sub, names), index, names.get(index),
+                               add_flags, del_flags))
+        elif op is _C.BRANCH:
+            items.append(Alternation([_convert(branch, names) for branch in av[1]]))
+        elif op is _C.AT:
+            items.append(Anchor(_ANCHORS[av]))
+        elif op in (_C.ASSERT, _C.ASSERT_NOT):
+            direction, sub = av
+            items.append(Lookaround(_convert(sub, names), direction > 0, op is _C.ASSERT_NOT))
+        elif op is _C.GROUPREF:
+            items.append(Backref(av))
+        else:
+            raise PatternCompileError(f"不支持的正则结构: {op}")
+    if len(items) == 1:
+        return items[0]
+    return Sequence(items)
+
+
+def _is_any_star(node: Node) -> bool:
+    """节点是否为 .* （可匹配任意长度的任意字符）"""
+    return (isinstance(node, Repeat) and isinstance(node.child, Any)
+            and node.min_count == 0 and node.max_count is None)
+
+
+def _sequence_items(node: Node) -> List[Node]:
+    """节点作为顺序连接时的成员"""
+    return list(node.items) if isinstance(node, Sequence) else [node]
+
+
+# ---------------------------------------------------------------- Python
+
+def _python_set(node: CharSet) -> str:
+    """输出Python字符集合"""
+    parts = []
+    for kind, value in node.items:
+        if kind == 'char':
+            parts.append(_python_set_char(value))
+        elif kind == 'range':
+            parts.append(f"{_python_set_char(value[0])}-{_python_set_char(value[1])}")
+        else:
+            parts.append(_CATEGORY_PYTHON[value])
+    return '[' + ('^' if node.negated else '') + ''.join(parts) + ']'
+
+
+def _python_set_char(char: str) -> str:
+    """转义字符集合中的字符"""
+    if char in '\\]^-[':
+        return '\\' + char
+    return re.escape(char) if not char.isprintable() else char
+
+
+def _flag_letters(flags: int) -> str:
+    """标志位对应的内联标志字母"""
+    return ''.join(letter for flag, letter in _FLAG_LETTERS if flags & flag)
+
+
+def _emit_python(node: Node) -> Tuple[str, int]:
+    """输出Python正则，返回 (文本, 结合优先级)"""
+    if isinstance(node, Literal):
+        return re.escape(node.text), _ATOM if len(node.text) == 1 else _SEQ
+    if isinstance(node, Any):
+        return '.', _ATOM
+    if isinstance(node, CharSet):
+        return _python_set(node), _ATOM
+    if isinstance(node, Anchor):
+        return _ANCHOR_PYTHON[node.kind], _ATOM
+    if isinstance(node, Backref):
+        return f'(?:\\{node.index})', _ATOM
+    if isinstance(node, Group):
+        inner, _ = _emit_python(node.child)
+        if node.add_flags or node.del_flags:
+            flags = _flag_letters(node.add_flags)
+            if node.del_flags:
+                flags += '-' + _flag_letters(node.del_flags)
+            if node.index is None:
+                return f'(?{flags}:{inner})', _ATOM
+            inner = f'(?{flags}:{inner})'
+        if node.index is None:
+            return f'(?:{inner})', _ATOM
+        if node.name:
+            return f'(?P<{node.name}>{inner})', _ATOM
+        return f'({inner})', _ATOM
+    if isinstance(node, Lookaround):
+        inner, _ = _emit_python(node.child)
+        prefix = ('?=' if not node.negated else '?!') if node.ahead else \
+                 ('?<=' if not node.negated else '?<!')
+        return f'({prefix}{inner})', _ATOM
+    if isinstance(node, Repeat):
+        inner, level = _emit_python(node.child)
+        if level != _ATOM:
+            inner = f'(?:{inner})'
+        return inner + _quantifier(node) + ('' if node.greedy else '?'), _SEQ
+    if isinstance(node, Alternation):
+        return '|'.join(_emit_python(branch)[0] for branch in node.branches), _ALT
+    if isinstance(node, Sequence):
+        parts = []
+        for item in node.items:
+            text, level = _emit_python(item)
+            parts.append(f'(?:{text})' if level == _ALT else text)
+        return ''.join(parts), _SEQ
+    raise PatternCompileError(f"未知节点: {type(node).__name__}")
+
+
+def _quantifier(node: Repeat) -> str:
+    """重复次数对应的量词"""
+    low, high = node.min_count, node.max_count
+    if high is None:
+        return {0: '*', 1: '+'}.get(low, f'{{{low},}}')
+    if (low, high) == (0, 1):
+        return '?'
+    if low == high:
+        return f'{{{low}}}'
+    return f'{{{low},{high}}}'
+
+
+# ---------------------------------------------------------------- ERE
+
+def _fold_chars(char: str) -> List[str]:
+    """字符的大小写变体（只取单字符的变体）"""
+    variants = [char]
+    for other in (char.lower(), char.upper()):
+        if len(other) == 1 and other not in variants:
+            variants.append(other)
+    return variants
+
+
+def _fold_range(low: str, high: str) -> List[Tuple[str, str]]:
+    """区间与其大小写对应区间（只处理ASCII字母部分）"""
+    ranges = [(low, high)]
+    for start, end, delta in (('a', 'z', -32), ('A', 'Z', 32)):
+        lo, hi = max(low, start), min(high, end)
+        if lo <= hi:
+            ranges.append((chr(ord(lo) + delta), chr(ord(hi) + delta)))
+    return ranges
+
+
+def _ere_bracket(chars: List[str], ranges: List[Tuple[str, str]], classes: List[str],
+                 negated: bool) -> str:
+    """
+    输出POSIX方括号表达式
+
+    方括号内反斜杠没有转义作用，特殊字符只能靠位置表达：
+    ] 放在最前，^ 放在中间，[ 和 - 放在最后。
+    """
+    for low, high in ranges:
+        if low in ']^-[' or high in ']^-[':
+            raise PatternCompileError(f"ERE无法表达以特殊字符为端点的区间: {low}-{high}")
+    unique = sorted(set(chars))
+    body = (']' if ']' in unique else '') + \
+        ''.join(c for c in unique if c not in '][-^') + \
+        ''.join(f'{low}-{high}' for low, high in ranges) + \
+        ''.join(classes) + \
+        ('^' if '^' in unique else '') + \
+        ('[' if '[' in unique else '') + ('-' if '-' in unique else '')
+    if not body:
+        raise PatternCompileError("ERE无法表达空字符集合")
+    if body == '^' and not negated:
+        return r'\^'
+    return '[' + ('^' if negated else '') + body + ']'
+
+
+def _ere_set(node: CharSet, fold: bool) -> str:
+    """输出ERE字符集合"""
+    chars: List[str] = []
+    ranges: List[Tuple[str, str]] = []
+    classes: List[str] = []
+    negated = node.negated
+    for kind, value in node.items:
+        if kind == 'char':
+            chars.extend(_fold_chars(value) if fold else [value])
+        elif kind == 'range':
+            ranges.extend(_fold_range(*value) if fold else [value])
+        elif value.startswith('not_'):
+            # 方括号内不能表达取反的字符类，只有它是唯一成员时才能整体取反
+            if len(node.items) != 1:
+                raise PatternCompileError(f"ERE无法在字符集合中表达取反的分类 {_CATEGORY_PYTHON[value]}")
+            classes.append(_CATEGORY_ERE[value[4:]])
+            negated = not negated
+        else:
+            classes.append(_CATEGORY_ERE[value])
+    for char in chars:
+        if char in '\n\0':
+            raise PatternCompileError("ERE模式中不能包含换行或NUL字符")
+    return _ere_bracket(chars, ranges, classes, negated)
+
+
+def _ere_literal(text: str, fold: bool) -> Tuple[str, int]:
+    """输出ERE字面文本，返回 (文本, 结合优先级)"""
+    parts = []
+    for char in text:
+        if char in '\n\0':
+            raise PatternCompileError("ERE模式中不能包含换行或NUL字符")
+        variants = _fold_chars(char) if fold else [char]
+        if len(variants) > 1:
+            parts.append(_ere_bracket(variants, [], [], False))
+        elif char in _ERE_SPECIAL:
+            parts.append('\\' + char)
+        else:
+            parts.append(char)
+    return ''.join(parts), _ATOM if len(text) == 1 else _SEQ
+
+
+def _emit_ere(node: Node, fold: bool) -> Tuple[str, int]:
+    """输出POSIX ERE，fold为True时把大小写展开为字符集合；返回 (文本, 结合优先级)"""
+    if isinstance(node, Literal):
+        return _ere_literal(node.text, fold)
+    if isinstance(node, Any):
+        return '.', _ATOM
+    if isinstance(node, CharSet):
+        return _ere_set(node, fold), _ATOM
+    if isinstance(node, Anchor):
+        return _ANCHOR_ERE[node.kind], _ATOM
+    if isinstance(node, Backref):
+        raise PatternCompileError("ERE不支持反向引用")
+    if isinstance(node, Lookaround):
+        raise PatternCompileError("ERE不支持先行/后行断言")
+    if isinstance(node, Group):
+        if node.add_flags or node.del_flags:
+            raise PatternCompileError("ERE不支持局部标志分组")
+        inner, level = _emit_ere(node.child, fold)
+        return (inner, level) if level == _ATOM or not inner else (f'({inner})', _ATOM)
+    if isinstance(node, Repeat):
+        # 只判断是否匹配时，非贪婪和贪婪量词的结果相同
+        if node.min_count > ERE_DUP_MAX or (node.max_count or 0) > ERE_DUP_MAX:
+            raise PatternCompileError(f"ERE的重复次数不能超过{ERE_DUP_MAX}")
+        inner, level = _emit_ere(node.child, fold)
+        if not inner:
+            return '', _ATOM
+        if level != _ATOM:
+            inner = f'({inner})'
+        return inner + _quantifier(node), _SEQ
+    if isinstance(node, Alternation):
+        # POSIX ERE不允许空分支，(a|) 改写为 (a)?
+        branches = [_emit_ere(branch, fold)[0] for branch in node.branches]
+        present = [branch for branch in branches if branch]
+        if not present:
+            return '', _ATOM
+        if len(present) < len(branches):
+            return f'({"|".join(present)})?', _SEQ
+        return '|'.join(present), _ALT
+    if isinstance(node, Sequence):
+        parts = []
+        for item in node.items:
+            text, level = _emit_ere(item, fold)
+            parts.append(f'({text})' if level == _ALT else text)
+        return ''.join(parts), _SEQ
+    raise PatternCompileError(f"未知节点: {type(node).__name__}")
+
+
+# ---------------------------------------------------------------- 前置过滤
+
+def _literal_prefixes(node: Node) -> Optional[List[str]]:
+    """所有匹配都以其中之一开头的字面前缀，无法确定时返回None"""
+    if isinstance(node, Literal):
+        return [node.text]
+    if isinstance(node, Group):
+        return _literal_prefixes(node.child)
+    if isinstance(node, Repeat):
+        return _literal_prefixes(node.child) if node.min_count >= 1 else None
+    if isinstance(node, Alternation):
+        prefixes = []
+        for branch in node.branches:
+            branch_prefixes = _literal_prefixes(branch)
+            if branch_prefixes is None:
+                return None
+            prefixes.extend(branch_prefixes)
+        return prefixes
+    if isinstance(node, Sequence):
+        for item in node.items:
+            if isinstance(item, (Anchor, Lookaround)):
+                continue
+            return _literal_prefixes(item)
+    return None
+
+
+def _required_literals(node: Node) -> Optional[List[str]]:
+    """所有匹配都至少包含其中之一的字面文本，无法确定时返回None"""
+    if isinstance(node, Literal):
+        return [node.text]
+    if isinstance(node, Group):
+        return _required_literals(node.child)
+    if isinstance(node, Repeat):
+        return _required_literals(node.child) if node.min_count >= 1 else None
+    if isinstance(node, Lookaround):
+        return _required_literals(node.child) if node.ahead and not node.negated else None
+    if isinstance(node, Alternation):
+        literals = []
+        for branch in node.branches:
+            branch_literals = _required_literals(branch)
+            if branch_literals is None:
+                return None
+            literals.extend(branch_literals)
+        return literals
+    if isinstance(node, Sequence):
+        best = None
+        for item in node.items:
+            candidate = _required_literals(item)
+            if candidate and (best is None or _literal_score(candidate) > _literal_score(best)):
+                best = candidate
+        return best
+    return None
+
+
+def _literal_score(literals: List[str]) -> Tuple[int, int]:
+    """字面文本集合的过滤效果：最短文本越长、成员越少越好"""
+    return min(len(literal) for literal in literals), -len(literals)
+
+
+def _normalize_literals(literals: Optional[List[str]]) -> Optional[Tuple[str, ...]]:
+    """转为小写去重；包含空串时没有过滤作用，返回None"""
+    if not literals:
+        return None
+    folded = sorted({literal.lower() for literal in literals})
+    if '' in folded:
+        return None
+    # 包含了更短成员的文本是多余的
+    return tuple(literal for literal in folded
+                 if not any(other != literal and other in literal for other in folded))
+
+
+class CompiledPattern:
+    """
+    解析后的规则模式
+
+    模式按 re.IGNORECASE 解释（与RuleMatcher一致），可输出为Python、grep -E 和 bash =~ 三种形式。
+    ERE目标按GNU grep和glibc的实现处理，\\b \\B 作为GNU扩展保留。
+    只判断是否匹配，因此非贪婪量词按贪婪输出。
+    Python在忽略大小写时还会做Unicode折叠（如开尔文符号与k），ERE展开大小写时只处理
+    单字符的大小写变体。
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        try:
+            parsed = sre_parse.parse(pattern, re.IGNORECASE)
+        except re.error as e:
+            raise PatternCompileError(f"正则表达式语法错误: {str(e)}")
+        self.flags = parsed.state.flags & ~re.UNICODE
+        names = {index: name for name, index in parsed.state.groupdict.items()}
+        self.root = _convert(parsed, names)
+        self.ignore_case = bool(self.flags & re.IGNORECASE)
+        # 前置过滤用的字面文本统一转为小写，调用方应以小写命令比较
+        self.literal_prefixes = _normalize_literals(_literal_prefixes(self.root))
+        self.required_literals = _normalize_literals(_required_literals(self.root))
+
+    def to_python(self) -> str:
+        """输出Python正则，需以 re.IGNORECASE 编译"""
+        text, _ = _emit_python(self.root)
+        flags = _flag_letters(self.flags & ~re.IGNORECASE)
+        return (f'(?{flags})' if flags else '') + text
+
+    def _conjuncts(self) -> List[Node]:
+        """
+        把可以拆分的顶层先行断言拆为多个必须同时匹配的子模式
+
+        可视化编辑器生成的"与"模式形如 ^(?=.*A)(?=.*B).*$。以 ^ 开头时，断言和剩余部分都在
+        行首判断，等价于分别匹配 ^(.*A) 和 ^(.*B)（剩余的 .*$ 总能匹配单行命令）；不以 ^ 开头时，只有断言都以 .* 开头且
+        剩余部分为空或 .*、.*$ 时才能拆分。
+        """
+        items = _sequence_items(self.root)
+        anchored = bool(items) and isinstance(items[0], Anchor) and \
+            items[0].kind in ('start', 'start_string')
+        if anchored:
+            items = items[1:]
+        lookaheads = []
+        while items and isinstance(items[0], Lookaround) and items[0].ahead \
+                and not items[0].negated:
+            lookaheads.append(items.pop(0).child)
+        if not lookaheads or self.flags & re.MULTILINE:
+            return [self.root]
+
+        # 剩余部分为空或 .*、.*$ 时在单行命令上总能匹配
+        rest_trivial = (not items or (_is_any_star(items[0]) and
+                        all(isinstance(item, Anchor) and item.kind in ('end', 'end_string')
+                            for item in items[1:])))
+        if anchored:
+            start = Anchor('start')
+            conjuncts = [Sequence([start] + _sequence_items(body)) for body in lookaheads]
+            if not rest_trivial:
+                conjuncts.append(Sequence([start] + items))
+            return conjuncts
+
+        if rest_trivial and all(_sequence_items(body) and _is_any_star(_sequence_items(body)[0])
+                                for body in lookaheads):
+            return list(lookaheads)
+        return [self.root]
+
+    def to_ere(self, fold_case: bool = False) -> List[str]:
+        """
+        输出POSIX ERE列表，命令需与其中每一个都匹配
+
+        Args:
+            fold_case: 把忽略大小写展开到模式中（用于没有 -i 选项的 bash =~）
+        """
+        return [_emit_ere(node, fold_case and self.ignore_case)[0] for node in self._conjuncts()]
+
+    def grep_condition(self, variable: str = 'CMD') -> str:
+        """输出判断 $variable 是否匹配的shell条件，使用 grep -E"""
+        option = '-Eiq' if self.ignore_case else '-Eq'
+        return ' && '.join(f'printf \'%s\\n\' "${variable}" | grep {option} -e {shlex.quote(ere)}'
+                           for ere in self.to_ere())
+
+    def bash_condition(self, variable: str = 'CMD', regex_variable: str = 'RULE_RE') -> str:
+        """
+        输出判断 $variable 是否匹配的bash条件，使用 [[ =~ ]]
+
+        正则先赋值给变量再展开，避免 [[ ]] 中引号改变含义；忽略大小写已展开到模式中。
+        """
+        eres = self.to_ere(fold_case=True)
+        assignments = ' '.join(f'{regex_variable}{index}={shlex.quote(ere)}'
+                               for index, ere in enumerate(eres))
+        tests = ' && '.join(f'${variable} =~ ${regex_variable}{index}'
+                            for index in range(len(eres)))
+        return f'{assignments}; [[ {tests} ]]'
+
+
+@lru_cache(maxsize=1024)
+def compile_pattern(pattern: str) -> CompiledPattern:
+    """解析模式（带缓存），语法错误时抛出PatternCompileError"""
+    return CompiledPattern(pattern)
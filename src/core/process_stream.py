@@ -0,0 +1,256 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import IO, Any, Callable, Iterable, Iterator, List, Optional, Sequence, Union
+
+# 每次从子进程或暂存文件读取的块大小
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_file(file: IO[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """从头按块读取文件"""
+    file.seek(0)
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def limit_args(args: Union[str, List[str]], shell: bool = False,
+               cpu_limit: Optional[int] = None, memory_limit: Optional[int] = None) -> List[str]:
+    """
+    在资源限制下执行命令的命令行
+
+    由/bin/sh设置RLIMIT_CPU（ulimit -t，秒）和RLIMIT_AS（ulimit -v，MB换算为KB）后exec原命令，
+    不需要preexec_fn，通过posix_spawn启动时同样有效；限制由后代进程继承。
+    """
+    argv = ['/bin/sh', '-c', args] if shell else list(args)
+    limits = []
+    if cpu_limit:
+        limits.append(f'ulimit -t {int(cpu_limit)}')
+    if memory_limit:
+        limits.append(f'ulimit -v {int(memory_limit) * 1024}')
+    if not limits:
+        return argv
+    return ['/bin/sh', '-c', ' && '.join(limits) + ' && exec "$@"', 'sh'] + argv
+
+
+class ChainedStream:
+    """依次读取多个输出流，stop时结束source（产生剩余输出的子进程）"""
+
+    def __init__(self, parts: Sequence[Iterable[bytes]], source: Optional[Any] = None):
+        self.parts = parts
+        self.source = source
+
+    def stop(self):
+        """结束产生输出的子进程"""
+        stop = getattr(self.source, 'stop', None)
+        if stop is not None:
+            stop()
+
+    def __iter__(self) -> Iterator[bytes]:
+        for part in self.parts:
+            yield from part
+
+
+class ProcessStream:
+    """
+    子进程的输出流
+
+    迭代时启动子进程，按块读取标准输出（merge_stderr为True时合并标准错误）。
+    子进程在新的会话（进程组）中运行，超时或结束时向整个进程组发送SIGKILL，
+    shell派生的后代进程一并结束，不会留下继续占用输出管道的孙进程。
+    input_chunks不为None时由后台线程写入子进程的标准输入，子进程提前退出（如 grep -q、head）时
+    关闭上游；上游也是ProcessStream时结束上游子进程，和shell管道中的SIGPIPE效果相同。
+    各环节之间只有管道缓冲和一个块，消费方读取慢时子进程阻塞在写管道上，内存占用与输出大小无关。
+
+    只能迭代一次。迭代提前结束（消费方关闭迭代器）时结束子进程。
+    启动失败或超时时在输出末尾追加 "<label>执行错误: ..." / "<label>执行超时"；
+    启动时已过截止时间则不启动子进程，直接视为超时。
+    """
+
+    def __init__(self, args: Union[str, List[str]], shell: bool = False,
+                 deadline: Optional[float] = None, input_chunks: Optional[Iterable[bytes]] = None,
+                 label: str = '命令', merge_stderr: bool = True,
+                 on_finish: Optional[Callable[['ProcessStream'], Any]] = None,
+                 popen: Optional[Callable[..., Any]] = None):
+        """
+        Args:
+            args: 命令行，shell为True时为字符串
+            shell: 是否通过shell执行
+            deadline: 截止时间（time.monotonic()时间），到期后结束子进程所在的进程组
+            input_chunks: 写入标准输入的数据块，为None时标准输入为/dev/null
+            label: 错误信息中的阶段名称
+            merge_stderr: 为False时丢弃标准错误
+            on_finish: 子进程结束后调用，参数为本对象；可能在消费本流的其他线程中调用
+            popen: 启动子进程的函数，参数与subprocess.Popen一致（如SpawnServer.popen），
+                   默认为subprocess.Popen
+        """
+        self.args = args
+        self.shell = shell
+        self.deadline = deadline
+        self.input_chunks = input_chunks
+        self.label = label
+        self.merge_stderr = merge_stderr
+        self.on_finish = on_finish
+        self.popen = popen or subprocess.Popen
+        self.pid: Optional[int] = None
+        self.returncode: Optional[int] = None
+        self.completed = False  # 子进程正常退出且输出已全部读取
+        self.timed_out = False
+        self.stopped = False
+        self.error: Optional[str] = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.start_ns = 0
+        self.spawned_ns = 0
+        self.end_ns = 0
+        self._process: Optional[Any] = None
+        self._reaped = False
+        self._lock = threading.Lock()
+
+    def stop(self):
+        """结束子进程（及其进程组），可以在其他线程中调用"""
+        with self._lock:
+            self.stopped = True
+            process = self._process
+            reaped = self._reaped
+        if process is not None and not reaped:
+            self._kill(process)
+
+    @staticmethod
+    def _kill(process: Any):
+        """
+        向子进程所在的进程组发送SIGKILL（子进程是组长，进程组ID即pid）
+
+        进程服务启动的子进程由服务进程回收，组信号也交给服务进程在回收前发送，避免误杀复用的pid。
+        """
+        send_signal_group = getattr(process, 'send_signal_group', None)
+        if send_signal_group is not None:
+            send_signal_group(signal.SIGKILL)
+        elif process.poll() is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                # 进程组已不存在
+                pass
+        if process.poll() is None:
+            process.kill()
+
+    def _expire(self):
+        """超时回调"""
+        self.timed_out = True
+        self.stop()
+
+    def _feed(self, stdin: IO[bytes]):
+        """把输入数据块写入子进程的标准输入"""
+        iterator = iter(self.input_chunks)
+        try:
+            for chunk in iterator:
+                view = memoryview(chunk)
+                while view:
+                    view = view[stdin.write(view):]
+                self.bytes_in += len(chunk)
+        except (OSError, ValueError):
+            # 子进程不再读取输入
+            pass
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def _abort(self):
+        """未启动子进程时结束本阶段"""
+        self.end_ns = self.spawned_ns = time.perf_counter_ns()
+        close = getattr(self.input_chunks, 'close', None)
+        if close is not None:
+            close()
+        self._finish()
+
+    def __iter__(self) -> Iterator[bytes]:
+        self.start_ns = time.perf_counter_ns()
+        remaining = None
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                # 前面的阶段已用完时间预算
+                self.timed_out = True
+                self._abort()
+                yield f"{self.label}执行超时".encode('utf-8')
+                return
+        try:
+            process = self.popen(
+                self.args, shell=self.shell, bufsize=0,
+                stdin=subprocess.PIPE if self.input_chunks is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT if self.merge_stderr else subprocess.DEVNULL,
+                start_new_session=True)
+        except Exception as e:
+            self.error = str(e)
+            self._abort()
+            yield f"{self.label}执行错误: {self.error}".encode('utf-8')
+            return
+
+        self.spawned_ns = time.perf_counter_ns()
+        self.pid = process.pid
+        with self._lock:
+            self._process = process
+            stopped = self.stopped
+        if stopped:
+            self._kill(process)
+
+        feeder = None
+        if self.input_chunks is not None:
+            feeder = threading.Thread(target=self._feed, args=(process.stdin,), daemon=True)
+            feeder.start()
+        timer = None
+        if remaining is not None:
+            timer = threading.Timer(remaining, self._expire)
+            timer.daemon = True
+            timer.start()
+
+        try:
+            while True:
+                chunk = process.stdout.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.bytes_out += len(chunk)
+                yield chunk
+            process.wait()
+            self.completed = not self.timed_out and not self.stopped
+        finally:
+            if timer is not None:
+                timer.cancel()
+            if not self.completed:
+                self._kill(process)
+            self.returncode = process.wait()
+            with self._lock:
+                self._reaped = True
+            process.stdout.close()
+            if feeder is not None:
+                if feeder.is_alive():
+                    # 子进程没有读完输入，结束上游使写入线程退出
+                    stop = getattr(self.input_chunks, 'stop', None)
+                    if stop is not None:
+                        stop()
+                feeder.join()
+            self.end_ns = time.perf_counter_ns()
+            self._finish()
+
+        if self.timed_out:
+            yield f"{self.label}执行超时".encode('utf-8')
+
+    def _finish(self):
+        """调用结束回调"""
+        if self.on_finish is not None:
+            try:
+                self.on_finish(self)
+            except Exception as e:
+                print(f"记录子进程结果失败: {str(e)}")
@@ -0,0 +1,490 @@
+import json
+import os
+import re
+import select
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_constants
+    import sre_parse
+
+
+_C = sre_constants
+_REPEATS = {_C.MAX_REPEAT, _C.MIN_REPEAT}
+if hasattr(_C, 'POSSESSIVE_REPEAT'):
+    _REPEATS.add(_C.POSSESSIVE_REPEAT)
+
+# 重复次数超过该值即视为“无界”
+_UNBOUNDED_THRESHOLD = 16
+
+# 字符集合在ASCII范围内近似计算，OTHER表示任意非ASCII字符
+_OTHER = 128
+_ALL = frozenset(range(129))
+_NEWLINE = ord('\n')
+
+
+class RegexIssue:
+    """正则表达式复杂度问题"""
+
+    HIGH = 'high'      # 指数级回溯风险
+    MEDIUM = 'medium'  # 多项式级回溯风险
+    LOW = 'low'        # 提示信息，不影响匹配路径
+
+    def __init__(self, severity: str, message: str):
+        self.severity = severity
+        self.message = message
+
+    def __str__(self) -> str:
+        labels = {self.HIGH: "高风险", self.MEDIUM: "中风险", self.LOW: "提示"}
+        return f"[{labels.get(self.severity, self.severity)}] {self.message}"
+
+    def __repr__(self) -> str:
+        return f"RegexIssue({self.severity!r}, {self.message!r})"
+
+
+def _category_set(category) -> FrozenSet[int]:
+    """字符类别在ASCII范围内对应的字符集合"""
+    name = str(category)
+    if 'DIGIT' in name:
+        chars = {c for c in range(128) if chr(c).isdigit()}
+    elif 'SPACE' in name:
+        chars = {c for c in range(128) if chr(c).isspace()}
+    elif 'WORD' in name:
+        chars = {c for c in range(128) if chr(c).isalnum() or c == ord('_')} | {_OTHER}
+    else:
+        return _ALL
+    if 'NOT_' in name:
+        return frozenset(_ALL - chars) | {_OTHER}
+    return frozenset(chars)
+
+
+def _fold(code: int) -> FrozenSet[int]:
+    """单个字符在忽略大小写时对应的集合"""
+    if code >= 128:
+        return frozenset({_OTHER})
+    ch = chr(code)
+    return frozenset({ord(ch.lower()), ord(ch.upper())} & set(range(128)) | {code})
+
+
+def _charset(items: list) -> FrozenSet[int]:
+    """子模式中可能出现的所有字符（近似）"""
+    chars = set()
+    for op, av in items:
+        if op == _C.LITERAL:
+            chars |= _fold(av)
+        elif op == _C.NOT_LITERAL:
+            chars |= _ALL - _fold(av)
+        elif op == _C.ANY:
+            chars |= _ALL - {_NEWLINE}
+        elif op == _C.IN:
+            chars |= _in_set(av)
+        elif op in _REPEATS:
+            chars |= _charset(av[2])
+        elif op == _C.SUBPATTERN:
+            chars |= _charset(av[-1])
+        elif op == _C.BRANCH:
+            for alt in av[1]:
+                chars |= _charset(alt)
+        elif op == _C.GROUPREF:
+            chars |= _ALL
+    return frozenset(chars)
+
+
+def _in_set(av: list) -> FrozenSet[int]:
+    """字符类 [...] 对应的集合"""
+    chars = set()
+    negate = False
+    for op, value in av:
+        if op == _C.NEGATE:
+            negate = True
+        elif op == _C.LITERAL:
+            chars |= _fold(value)
+        elif op == _C.RANGE:
+            lo, hi = value
+            for code in range(lo, min(hi, 127) + 1):
+                chars |= _fold(code)
+            if hi >= 128:
+                chars.add(_OTHER)
+        elif op == _C.CATEGORY:
+            chars |= _category_set(value)
+    if negate:
+        return frozenset(_ALL - chars) | {_OTHER}
+    return frozenset(chars)
+
+
+def _first_set(items: list) -> FrozenSet[int]:
+    """子模式可能的首字符集合（近似）"""
+    chars = set()
+    for op, av in items:
+        if op in (_C.AT, _C.ASSERT, _C.ASSERT_NOT):
+            continue
+        if op in _REPEATS:
+            chars |= _first_set(av[2])
+            if av[0] > 0:
+                return frozenset(chars)
+            continue
+        if op == _C.SUBPATTERN:
+            chars |= _first_set(av[-1])
+            if not _nullable(av[-1]):
+                return frozenset(chars)
+            continue
+        if op == _C.BRANCH:
+            for alt in av[1]:
+                chars |= _first_set(alt)
+            return frozenset(chars)
+        chars |= _charset([(op, av)])
+        return frozenset(chars)
+    return frozenset(chars)
+
+
+def _nullable(items: list) -> bool:
+    """子模式能否匹配空串"""
+    for op, av in items:
+        if op in (_C.AT, _C.ASSERT, _C.ASSERT_NOT):
+            continue
+        if op in _REPEATS:
+            if av[0] > 0 and not _nullable(av[2]):
+                return False
+        elif op == _C.SUBPATTERN:
+            if not _nullable(av[-1]):
+                return False
+        elif op == _C.BRANCH:
+            if not any(_nullable(alt) for alt in av[1]):
+                return False
+        elif op == _C.GROUPREF:
+            continue
+        else:
+            return False
+    return True
+
+
+def _unwrap(items: list) -> list:
+    """去掉只包含一个子模式的分组外壳"""
+    while len(items) == 1 and items[0][0] == _C.SUBPATTERN:
+        items = list(items[0][1][-1])
+    return items
+
+
+def _is_unbounded(av) -> bool:
+    """重复次数是否无界（或足够大）"""
+    return av[1] == _C.MAXREPEAT or av[1] > _UNBOUNDED_THRESHOLD
+
+
+class _ComplexityChecker:
+    """遍历正则语法树，查找会导致灾难性回溯的结构"""
+
+    def __init__(self, anchored: bool):
+        self.anchored = anchored
+        self.issues: List[RegexIssue] = []
+        self._seen = set()
+
+    def add(self, severity: str, message: str):
+        if message not in self._seen:
+            self._seen.add(message)
+            self.issues.append(RegexIssue(severity, message))
+
+    def walk(self, items: list, inside_repeat: bool = False):
+        self._check_adjacent(items)
+        for op, av in items:
+            if op in _REPEATS:
+                body = _unwrap(list(av[2]))
+                if _is_unbounded(av):
+                    self._check_nested(body, RegexIssue.HIGH)
+                    self._check_branches(body)
+                elif av[1] >= 3:
+                    # 有界重复嵌套无界重复，回溯次数随重复次数呈多项式增长
+                    self._check_nested(body, RegexIssue.MEDIUM)
+                self.walk(body, inside_repeat or _is_unbounded(av))
+            elif op == _C.SUBPATTERN:
+                self.walk(list(av[-1]), inside_repeat)
+            elif op == _C.BRANCH:
+                for alt in av[1]:
+                    self.walk(list(alt), inside_repeat)
+            elif op in (_C.ASSERT, _C.ASSERT_NOT):
+                body = list(av[1])
+                if not self.anchored and any(o in _REPEATS and _is_unbounded(a) for o, a in body):
+                    self.add(RegexIssue.MEDIUM,
+                             "未锚定的模式中使用了包含 .* 等无界重复的断言，"
+                             "每个起始位置都会重新扫描剩余内容（建议以^开头）")
+                self.walk(body, inside_repeat)
+            elif op == _C.GROUPREF:
+                self.add(RegexIssue.LOW, "使用了反向引用，无法转换为线性时间匹配")
+
+    def _check_nested(self, body: list, severity: str):
+        """重复内部又包含可以匹配相同内容的无界重复，如 (a+)+、(\\w+\\s?)*"""
+        for index, (op, av) in enumerate(body):
+            inner = None
+            if op in _REPEATS and _is_unbounded(av):
+                inner = av
+            elif op == _C.SUBPATTERN:
+                sub = list(av[-1])
+                if len(sub) == 1 and sub[0][0] in _REPEATS and _is_unbounded(sub[0][1]):
+                    inner = sub[0][1]
+            if inner is None:
+                continue
+
+            # 其余元素都可以为空，或与内层重复的字符重叠时，同一段输入有多种划分方式
+            inner_chars = _charset(list(inner[2]))
+            others = body[:index] + body[index + 1:]
+            ambiguous = all(
+                _nullable([item]) or (_charset([item]) & inner_chars) for item in others
+            )
+            if ambiguous:
+                if severity == RegexIssue.HIGH:
+                    self.add(severity, "嵌套的无界重复（如 (a+)+），可能导致指数级回溯")
+                else:
+                    self.add(severity, "有界重复中嵌套了无界重复（如 (.*a){10}），可能导致多项式级回溯")
+
+    def _check_branches(self, body: list):
+        """无界重复内部的选择分支首字符重叠或可以为空，如 (\\w|\\d)+、(a|aa)+"""
+        body_chars = _charset(body)
+        for op, av in body:
+            branches = None
+            if op == _C.BRANCH:
+                branches = av[1]
+            elif op == _C.SUBPATTERN:
+                sub = list(av[-1])
+                if len(sub) == 1 and sub[0][0] == _C.BRANCH:
+                    branches = sub[0][1][1]
+            if not branches:
+                continue
+            # 某个分支可以为空时，重复体能以不同长度匹配同一段输入
+            if len(body) > 1 and any(_nullable(list(alt)) for alt in branches):
+                if any(_charset(list(alt)) & body_chars for alt in branches if not _nullable(list(alt))):
+                    self.add(RegexIssue.HIGH, "重复体中的可选分支使同一段输入有多种划分方式（如 (a|aa)+），可能导致指数级回溯")
+                    return
+            firsts = [_first_set(list(alt)) for alt in branches]
+            for i in range(len(firsts)):
+                for j in range(i + 1, len(firsts)):
+                    if firsts[i] & firsts[j]:
+                        self.add(RegexIssue.HIGH, "重复的选择分支可以匹配相同的开头（如 (a|ab)*），可能导致指数级回溯")
+                        return
+
+    def _check_adjacent(self, items: list):
+        """相邻的无界重复字符集合重叠，如 \\s*\\s*、\\d+\\d+、.*.*"""
+        previous = None
+        for op, av in items:
+            if op in _REPEATS and _is_unbounded(av):
+                chars = _charset(list(av[2]))
+                if previous is not None and previous & chars:
+                    self.add(RegexIssue.MEDIUM, "相邻的无界重复可以匹配相同的字符（如 \\s*\\s*），可能导致多项式级回溯")
+                previous = chars
+            elif not _nullable([(op, av)]):
+                previous = None
+
+
+def check_regex_complexity(pattern: str) -> List[RegexIssue]:
+    """
+    静态检查正则表达式的回溯风险
+
+    Args:
+        pattern: 正则表达式
+
+    Returns:
+        List[RegexIssue]: 发现的问题，无效模式返回空列表（由模式校验负责报告）
+    """
+    try:
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    except re.error:
+        return []
+    items = list(parsed.data)
+    anchored = bool(items) and items[0][0] == _C.AT and items[0][1] in (
+        _C.AT_BEGINNING, _C.AT_BEGINNING_STRING
+    )
+    checker = _ComplexityChecker(anchored)
+    checker.walk(items)
+    return checker.issues
+
+
+def is_risky_pattern(pattern: str) -> bool:
+    """模式是否存在中高回溯风险，需要在受限环境中匹配"""
+    return any(issue.severity != RegexIssue.LOW for issue in check_regex_complexity(pattern))
+
+
+# 工作进程源码：启动完成后输出 R，然后逐行读取 [模式, 命令]，返回是否匹配
+_WORKER_SOURCE = r"""
+import json, re, sys
+cache = {}
+sys.stdout.write('R\n')
+sys.stdout.flush()
+for line in sys.stdin:
+    pattern, command = json.loads(line)
+    regex = cache.get(pattern)
+    if regex is None:
+        regex = cache[pattern] = re.compile(pattern, re.IGNORECASE)
+    sys.stdout.write('1\n' if regex.search(command) else '0\n')
+    sys.stdout.flush()
+"""
+
+# 等待工作进程启动完成的最长时间（秒），不计入匹配的截止时间
+WORKER_START_TIMEOUT = 5.0
+
+
+class RegexGuard:
+    """
+    带截止时间的正则匹配器
+
+    有回溯风险的模式放到独立的工作进程中匹配，超过截止时间时直接杀掉工作进程，
+    该次匹配没有结果（返回None）并记录违规；同一规则违规次数达到上限后被隔离，
+    不再启动匹配、直接返回None，修改模式后解除隔离。
+    没有结果不等于不匹配：调用方应按匹配处理（失败即拦截），否则构造超时的命令就能绕过规则。
+    每次匹配独占一个工作进程，并发的匹配各自使用空闲的或新启动的进程，互不等待；
+    截止时间从工作进程就绪、请求写入时开始计算，进程启动耗时不计入。
+    """
+
+    def __init__(self, timeout: float = 0.05, max_offenses: int = 3, max_idle_workers: int = 4):
+        """
+        Args:
+            timeout: 单条规则单次匹配的最长时间（秒）
+            max_offenses: 超时多少次后隔离该规则
+            max_idle_workers: 保留的空闲工作进程数量，超出的在用完后关闭
+        """
+        self.timeout = timeout
+        self.max_offenses = max_offenses
+        self.max_idle_workers = max_idle_workers
+        # 只保护空闲进程列表和违规记录，不在匹配期间持有
+        self._lock = threading.Lock()
+        self._idle: List[Any] = []
+        # 启动工作进程的函数，GUI进程中替换为SpawnServer.popen
+        self.popen: Callable[..., Any] = subprocess.Popen
+        self._offenses: Dict[int, Dict[str, object]] = {}
+
+    def _start_worker(self) -> Optional[Any]:
+        """启动工作进程并等待其就绪，失败时返回None"""
+        try:
+            worker = self.popen(
+                [sys.executable, '-c', _WORKER_SOURCE],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                bufsize=0
+            )
+        except Exception as e:
+            print(f"启动正则匹配进程失败: {str(e)}")
+            return None
+        try:
+            readable, _, _ = select.select([worker.stdout], [], [], WORKER_START_TIMEOUT)
+            if readable and os.read(worker.stdout.fileno(), 2) == b'R\n':
+                return worker
+        except OSError as e:
+            print(f"启动正则匹配进程失败: {str(e)}")
+        else:
+            print("启动正则匹配进程失败: 进程未就绪")
+        self._kill_worker(worker)
+        return None
+
+    def _acquire_worker(self) -> Optional[Any]:
+        """取出一个空闲的工作进程，没有时启动新的"""
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.poll() is None:
+                    return worker
+        return self._start_worker()
+
+    def _release_worker(self, worker: Any):
+        """归还完成匹配的工作进程，空闲进程已足够时关闭它"""
+        with self._lock:
+            if len(self._idle) < self.max_idle_workers:
+                self._idle.append(worker)
+                return
+        self._close_worker(worker)
+
+    @staticmethod
+    def _kill_worker(worker: Any):
+        """终止卡住的工作进程"""
+        try:
+            worker.kill()
+        except OSError:
+            pass
+        worker.wait()
+
+    def _close_worker(self, worker: Any):
+        """关闭工作进程"""
+        try:
+            worker.stdin.close()
+        except OSError:
+            pass
+        self._kill_worker(worker)
+
+    def is_quarantined(self, rule_id: int, pattern: Optional[str] = None) -> bool:
+        """规则是否因多次超时被隔离；指定pattern时只在超时的是同一模式时成立"""
+        offense = self._offenses.get(rule_id)
+        if not offense or offense['count'] < self.max_offenses:
+            return False
+        return pattern is None or offense['pattern'] == pattern
+
+    def search(self, rule_id: int, pattern: str, command: str) -> Optional[bool]:
+        """
+        在截止时间内匹配
+
+        Returns:
+            是否匹配；超时（记录违规）、工作进程异常或规则已被隔离时返回None
+        """
+        if self.is_quarantined(rule_id, pattern):
+            return None
+
+        worker = self._acquire_worker()
+        if worker is None:
+            return None
+        start = time.perf_counter()
+        try:
+            worker.stdin.write((json.dumps([pattern, command]) + '\n').encode('utf-8'))
+            readable, _, _ = select.select([worker.stdout], [], [], self.timeout)
+            if readable:
+                response = os.read(worker.stdout.fileno(), 2)
+                if response:
+                    self._release_worker(worker)
+                    return response[:1] == b'1'
+        except (BrokenPipeError, OSError):
+            pass
+
+        # 超时或工作进程异常：杀掉进程，下次匹配时启动新的
+        elapsed = time.perf_counter() - start
+        self._kill_worker(worker)
+        self._record_offense(rule_id, pattern, command, elapsed)
+        return None
+
+    def _record_offense(self, rule_id: int, pattern: str, command: str, elapsed: float):
+        """记录一次超时"""
+        with self._lock:
+            offense = self._offenses.setdefault(rule_id, {'count': 0})
+            # 模式修改后重新计数
+            if offense.get('pattern') != pattern:
+                offense['count'] = 0
+            offense['count'] += 1
+            offense['pattern'] = pattern
+            offense['last_command'] = command[:200]
+            offense['last_elapsed_ms'] = elapsed * 1000
+            count = offense['count']
+        print(f"规则 {rule_id} 匹配超时（{elapsed * 1000:.1f}ms）: {pattern}")
+        if count == self.max_offenses:
+            print(f"规则 {rule_id} 超时次数过多，已被隔离")
+
+    def get_offenders(self) -> Dict[int, Dict[str, object]]:
+        """获取发生过超时的规则及其统计"""
+        with self._lock:
+            return {
+                rule_id: dict(offense, quarantined=offense['count'] >= self.max_offenses)
+                for rule_id, offense in self._offenses.items()
+            }
+
+    def reset(self, rule_id: Optional[int] = None):
+        """清除违规记录，解除隔离"""
+        with self._lock:
+            if rule_id is None:
+                self._offenses.clear()
+            else:
+                self._offenses.pop(rule_id, None)
+
+    def close(self):
+        """关闭空闲的工作进程，正在匹配的进程在归还时按需关闭"""
+        with self._lock:
+            workers, self._idle = self._idle, []
+        for worker in workers:
+            self._close_worker(worker)
@@ -0,0 +1,664 @@
+import random
+import re
+import string
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover
+    import sre_constants
+    import sre_parse
+
+from .rule_manager import Rule
+from .rule_schema import MATCH_ARGV
+
+
+_C = sre_constants
+_REPEATS = {_C.MAX_REPEAT, _C.MIN_REPEAT}
+if hasattr(_C, 'POSSESSIVE_REPEAT'):
+    _REPEATS.add(_C.POSSESSIVE_REPEAT)
+_START_ANCHORS = {_C.AT_BEGINNING, _C.AT_BEGINNING_STRING}
+
+# 占有量词和原子分组匹配后不回溯，不能按普通的 .* 和字面量序列推理
+_NO_BACKTRACK = {op for op in (getattr(_C, 'POSSESSIVE_REPEAT', None), getattr(_C, 'ATOMIC_GROUP', None))
+                 if op is not None}
+
+# 影响匹配范围的标志；三者都只会扩大匹配的字符串集合
+_COVER_FLAGS = re.DOTALL | re.MULTILINE | re.IGNORECASE
+
+# 分支展开的上限，超过后把选择结构视为不可翻译
+_MAX_BRANCHES = 64
+
+# 采样时使用的字符集合
+_PRINTABLE = string.ascii_letters + string.digits + string.punctuation + ' '
+_WORD = string.ascii_letters + string.digits + '_'
+_SAMPLE_AFFIXES = ['', ' ', 'x', 'sudo ', 'ls ', ' -al', ' /tmp', '; id', ' | grep a']
+
+
+class _Branch:
+    """
+    正则表达式的一个分支（不含选择结构的顺序序列）
+
+    被遮蔽的一方只需要“必要条件”：匹配的字符串一定包含的字面量片段；
+    遮蔽的一方需要“充分条件”：仅由字面量和 .* 组成时才可翻译。
+    """
+
+    def __init__(self, items: list, flags: int):
+        self.items = items
+        self.flags = flags & _COVER_FLAGS
+        self.dotall = bool(flags & re.DOTALL)
+        multiline = bool(flags & re.MULTILINE)
+
+        self.anchored = bool(items) and items[0][0] == _C.AT and items[0][1] in _START_ANCHORS
+        # 多行模式下^可以在任意行首匹配，作为被遮蔽方时不能视为锚定
+        self.strictly_anchored = self.anchored and not multiline
+
+        self.runs, self.prefix = self._required_runs()
+        self.literals, self.literal_anchored, self.universal = self._translate()
+        self.canonical = [_canonical(item) for item in (items[1:] if self.anchored else items)]
+
+    def _required_runs(self) -> Tuple[List[str], Optional[str]]:
+        """提取匹配字符串中按顺序一定出现的连续字面量片段"""
+        runs = []
+        prefix = None
+        current = []
+        at_start = self.strictly_anchored
+
+        def close():
+            nonlocal current, prefix, at_start
+            if current:
+                run = ''.join(current)
+                runs.append(run)
+                if at_start:
+                    prefix = run
+            current = []
+            at_start = False
+
+        items = self.items[1:] if self.anchored else self.items
+        for op, av in items:
+            if op == _C.LITERAL:
+                current.append(chr(av).lower())
+                continue
+            if op in _REPEATS:
+                min_count, _, body = av
+                body_literal = _literal_text(body)
+                if min_count >= 1 and body_literal is not None:
+                    current.append(body_literal * min_count)
+            close()
+        close()
+        return runs, prefix
+
+    def _translate(self) -> Tuple[Optional[List[str]], bool, bool]:
+        """
+        尝试将分支翻译为“按顺序包含若干字面量”的形式
+
+        Returns:
+            (字面量列表, 是否锚定行首, 是否匹配任意字符串)，不可翻译时字面量列表为None
+        """
+        items = self.items[1:] if self.anchored else self.items
+        literals = []
+        current = []
+        anchored = self.anchored
+        nullable = True
+        leading = True
+        for op, av in items:
+            if op == _C.LITERAL:
+                current.append(chr(av).lower())
+                nullable = False
+                leading = False
+            elif op in (_C.MAX_REPEAT, _C.MIN_REPEAT) and av[0] == 0 and av[1] == _C.MAXREPEAT \
+                    and _is_any(av[2]):
+                # .* 只在字面量之间起分隔作用
+                if current:
+                    literals.append(''.join(current))
+                    current = []
+                if leading:
+                    anchored = False
+            else:
+                return None, False, _is_nullable(items)
+        if current:
+            literals.append(''.join(current))
+        return literals, anchored, nullable
+
+    def covers(self, other: '_Branch') -> Optional[bool]:
+        """
+        判断本分支能否匹配other分支能匹配的所有字符串
+
+        Returns:
+            True表示已证明覆盖，False表示无法证明，None表示本分支不可翻译
+        """
+        if self.universal:
+            return True
+        # 字面量统一按小写比较，other忽略大小写而本分支不忽略时无法证明
+        if other.flags & ~self.flags & re.IGNORECASE:
+            return False
+        if self._covers_structurally(other):
+            return True
+        if self.literals is None:
+            return None
+        if not self.literals:
+            return True
+
+        if self.literal_anchored:
+            if not other.strictly_anchored or other.prefix is None:
+                return False
+            return _find_in_order(other.prefix, self.literals, 0, self.dotall) == 0
+
+        # 不含DOTALL时 .* 不能跨越换行，只能在同一个字面量片段内查找，且字面量之间不能有换行
+        if len(self.literals) == 1 or not self.dotall:
+            return any(_find_in_order(run, self.literals, dotall=self.dotall) is not None
+                       for run in other.runs)
+        return _find_across(other.runs, self.literals)
+
+
+    def _covers_structurally(self, other: '_Branch') -> bool:
+        """
+        本分支的语法元素序列是否原样出现在other中
+
+        锚定时要求是other的前缀，否则要求是other中连续的一段，
+        这样other匹配的字符串中对应的那一段一定也能被本分支匹配。
+        other的标志（. 匹配换行、^ $ 匹配行首行尾、忽略大小写）本分支都要有；
+        含占有量词或原子分组时不做判断。
+        """
+        if other.flags & ~self.flags:
+            return False
+        if any(op in _NO_BACKTRACK for op, _ in self.items):
+            return False
+        core = self.canonical
+        anchored = self.anchored
+        # 首尾的 .* 对搜索语义没有影响
+        while core and core[0] == _ANY_STAR:
+            core = core[1:]
+            anchored = False
+        while core and core[-1] == _ANY_STAR:
+            core = core[:-1]
+        if not core or any(item[0] == str(_C.GROUPREF) for item in core):
+            return False
+
+        target = other.canonical
+        if anchored:
+            return other.strictly_anchored and target[:len(core)] == core
+        return any(target[i:i + len(core)] == core for i in range(len(target) - len(core) + 1))
+
+
+def _canonical(item) -> Tuple[str, str]:
+    """语法元素的可比较表示，字面量统一为小写"""
+    op, av = item
+    if op == _C.LITERAL:
+        return ('LITERAL', chr(av).lower())
+    return (str(op), str(av))
+
+
+_ANY_STAR = (str(_C.MAX_REPEAT), str((0, _C.MAXREPEAT, [(_C.ANY, None)])))
+
+
+def _literal_text(items: list) -> Optional[str]:
+    """如果子模式只由字面量组成，返回对应的小写文本"""
+    chars = []
+    for op, av in items:
+        if op != _C.LITERAL:
+            return None
+        chars.append(chr(av).lower())
+    return ''.join(chars) if chars else None
+
+
+def _is_any(items: list) -> bool:
+    """子模式是否为单个 ."""
+    return len(items) == 1 and items[0][0] == _C.ANY
+
+
+def _is_nullable(items: list) -> bool:
+    """序列能否在不依赖行尾等断言的情况下匹配空串"""
+    for op, av in items:
+        if op in _REPEATS:
+            if av[0] > 0 and not _is_nullable(av[2]):
+                return False
+        elif op == _C.SUBPATTERN:
+            if not _is_nullable(av[-1]):
+                return False
+        elif op == _C.BRANCH:
+            if not any(_is_nullable(list(alt)) for alt in av[1]):
+                return False
+        elif op == _C.AT and av in _START_ANCHORS:
+            continue
+        else:
+            return False
+    return True
+
+
+def _find_in_order(text: str, literals: List[str], start: Optional[int] = None,
+                   dotall: bool = True) -> Optional[int]:
+    """
+    在text中按顺序查找所有字面量，返回第一个字面量的位置
+
+    dotall为False时字面量之间由不能跨越换行的 .* 连接，相邻字面量之间的间隔不能含换行；
+    对第一个字面量的每个出现位置，其后的字面量取最早的出现位置（间隔最短）。
+    """
+    first = text.find(literals[0]) if start is None else \
+        (start if text.startswith(literals[0], start) else -1)
+    while first >= 0:
+        pos = first + len(literals[0])
+        for literal in literals[1:]:
+            index = text.find(literal, pos)
+            if index < 0:
+                return None
+            if not dotall and '\n' in text[pos:index]:
+                break
+            pos = index + len(literal)
+        else:
+            return first
+        if start is not None:
+            return None
+        first = text.find(literals[0], first + 1)
+    return None
+
+
+def _find_across(runs: List[str], literals: List[str]) -> bool:
+    """在多个按顺序出现的片段中依次查找字面量"""
+    index = 0
+    for run in runs:
+        pos = 0
+        while index < len(literals):
+            found = run.find(literals[index], pos)
+            if found < 0:
+                break
+            pos = found + len(literals[index])
+            index += 1
+    return index == len(literals)
+
+
+def _expand(items: list) -> Optional[List[list]]:
+    """把选择结构和不含选择的分组展开为若干顺序分支"""
+    branches = [[]]
+    for op, av in items:
+        if op == _C.BRANCH:
+            alternatives = []
+            for alt in av[1]:
+                expanded = _expand(list(alt))
+                if expanded is None:
+                    return None
+                alternatives.extend(expanded)
+        elif op == _C.SUBPATTERN and av[1] == 0 and av[2] == 0:
+            alternatives = _expand(list(av[-1]))
+            if alternatives is None:
+                return None
+        else:
+            branches = [branch + [(op, av)] for branch in branches]
+            continue
+
+        branches = [branch + alt for branch in branches for alt in alternatives]
+        if len(branches) > _MAX_BRANCHES:
+            return None
+    return branches
+
+
+@lru_cache(maxsize=1024)
+def _parse_branches(pattern: str) -> Optional[List[_Branch]]:
+    """解析模式为分支列表，无法解析或分支过多时返回None（结果只读）"""
+    try:
+        parsed = sre_parse.parse(pattern, re.IGNORECASE)
+    except re.error:
+        return None
+    flags = parsed.state.flags
+    expanded = _expand(list(parsed.data))
+    if expanded is None:
+        return None
+    return [_Branch(items, flags) for items in expanded]
+
+
+class _SampleGenerator:
+    """根据正则表达式的语法树随机生成可能匹配的字符串"""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def generate(self, pattern: str) -> Optional[str]:
+        try:
+            parsed = sre_parse.parse(pattern, re.IGNORECASE)
+        except re.error:
+            return None
+        groups: Dict[int, str] = {}
+        return self._emit(list(parsed.data), groups)
+
+    def _emit(self, items: list, groups: Dict[int, str]) -> str:
+        out = []
+        for op, av in items:
+            if op == _C.LITERAL:
+                out.append(chr(av))
+            elif op == _C.NOT_LITERAL:
+                out.append(self._pick_printable(lambda ch: ord(ch) != av))
+            elif op == _C.ANY:
+                out.append(self.rng.choice(_PRINTABLE))
+            elif op == _C.IN:
+                out.append(self._emit_in(av))
+            elif op == _C.BRANCH:
+                out.append(self._emit(list(self.rng.choice(av[1])), groups))
+            elif op == _C.SUBPATTERN:
+                text = self._emit(list(av[-1]), groups)
+                if av[0]:
+                    groups[av[0]] = text
+                out.append(text)
+            elif op in _REPEATS:
+                min_count, max_count, body = av
+                upper = min_count + 3 if max_count == _C.MAXREPEAT else min(max_count, min_count + 3)
+                for _ in range(self.rng.randint(min_count, upper)):
+                    out.append(self._emit(list(body), groups))
+            elif op == _C.GROUPREF:
+                out.append(groups.get(av, ''))
+            elif hasattr(_C, 'ATOMIC_GROUP') and op == _C.ATOMIC_GROUP:
+                out.append(self._emit(list(av), groups))
+            elif op == _C.ASSERT and av[0] == 1:
+                # 正向先行断言：把断言内容直接放在当前位置，便于满足“且”关系的模式
+                out.append(self._emit(list(av[1]), groups))
+            # 其余断言（^ $ \b 等）不产生字符，生成后统一验证
+        return ''.join(out)
+
+    def _emit_in(self, av: list) -> str:
+        negate = bool(av) and av[0][0] == _C.NEGATE
+        choices = []
+        tests = []
+        for op, value in av:
+            if op == _C.LITERAL:
+                choices.append(chr(value))
+                tests.append(lambda ch, v=value: ord(ch) == v)
+            elif op == _C.RANGE:
+                lo, hi = value
+                choices.append(chr(self.rng.randint(lo, min(hi, lo + 200))))
+                tests.append(lambda ch, lo=lo, hi=hi: lo <= ord(ch) <= hi)
+            elif op == _C.CATEGORY:
+                chars, test = _category_chars(value)
+                if chars:
+                    choices.append(self.rng.choice(chars))
+                tests.append(test)
+        if negate:
+            return self._pick_printable(lambda ch: not any(test(ch) for test in tests))
+        return self.rng.choice(choices) if choices else self.rng.choice(_PRINTABLE)
+
+    def _pick_printable(self, accept) -> str:
+        for _ in range(32):
+            ch = self.rng.choice(_PRINTABLE)
+            if accept(ch):
+                return ch
+        return '\x01'
+
+
+def _category_chars(category) -> Tuple[str, callable]:
+    """字符类别对应的候选字符及判定函数"""
+    name = str(category)
+    if 'NOT_DIGIT' in name:
+        return string.ascii_letters, lambda ch: not ch.isdigit()
+    if 'DIGIT' in name:
+        return string.digits, lambda ch: ch.isdigit()
+    if 'NOT_SPACE' in name:
+        return _WORD + '/.-', lambda ch: not ch.isspace()
+    if 'SPACE' in name:
+        return ' \t', lambda ch: ch.isspace()
+    if 'NOT_WORD' in name:
+        return ' /.-', lambda ch: not (ch.isalnum() or ch == '_')
+    if 'WORD' in name:
+        return _WORD, lambda ch: ch.isalnum() or ch == '_'
+    return '', lambda ch: False
+
+
+class RuleAnalysis:
+    """单条规则的可达性分析结果"""
+
+    REACHABLE = 'reachable'      # 存在只由该规则处理的命令
+    DEAD = 'dead'                # 已证明被前面的规则完全遮蔽，永远不会触发
+    LIKELY_DEAD = 'likely_dead'  # 采样未找到反例，很可能被遮蔽
+    UNKNOWN = 'unknown'          # 无法证明也无法构造匹配样本
+    DISABLED = 'disabled'
+    INVALID = 'invalid'
+
+    def __init__(self, rule_id: int, status: str, shadowed_by: Optional[List[int]] = None,
+                 witness: Optional[str] = None, redundant: bool = False):
+        self.rule_id = rule_id
+        self.status = status
+        self.shadowed_by = shadowed_by or []  # 遮蔽该规则的前序规则ID
+        self.witness = witness                # 可达时，只会由该规则处理的示例命令
+        self.redundant = redundant            # 遮蔽规则的动作与该规则完全相同，删除不损失意图
+
+    @property
+    def is_dead(self) -> bool:
+        """是否已证明永远不会触发"""
+        return self.status == self.DEAD
+
+    def describe(self) -> str:
+        """分析结果的文字描述"""
+        shadowers = "、".join(str(rule_id) for rule_id in self.shadowed_by)
+        if self.status == self.DEAD:
+            if self.redundant:
+                return f"冗余：被规则 {shadowers} 完全覆盖且动作相同"
+            return f"无法触发：被规则 {shadowers} 完全遮蔽"
+        if self.status == self.LIKELY_DEAD:
+            return f"可能无法触发：采样命令均被规则 {shadowers} 先匹配"
+        if self.status == self.UNKNOWN:
+            return "无法判定：未能构造匹配该规则的命令"
+        if self.status == self.DISABLED:
+            return "已禁用"
+        if self.status == self.INVALID:
+            return "匹配模式无效"
+        if self.witness is not None:
+            return f"可触发，例如: {self.witness}"
+        return "可触发"
+
+    def __repr__(self) -> str:
+        return f"RuleAnalysis({self.rule_id}, {self.status!r}, shadowed_by={self.shadowed_by})"
+
+
+def _same_effect(a: Rule, b: Rule) -> bool:
+    """两条规则命中后的处理是否完全相同"""
+    keys = ('action', 'output', 'script', 'filter', 'condition', 'metadata')
+    return all(getattr(a, key) == getattr(b, key) for key in keys)
+
+
+def analyze_rules(rules: Sequence[Rule], samples: int = 200, seed: int = 0) -> List[RuleAnalysis]:
+    """
+    分析规则列表中被前序规则遮蔽的规则
+
+    在可翻译的子集（字面量与 .* 组成的模式）上做正则包含判定，
+    其余情况随机生成匹配该规则的命令，寻找不被前序规则匹配的反例。
+
+    Args:
+        rules: 按优先级排列的规则
+        samples: 每条规则的采样次数
+        seed: 随机种子，保证结果可复现
+
+    Returns:
+        List[RuleAnalysis]: 与rules一一对应的分析结果
+    """
+    rng = random.Random(seed)
+    generator = _SampleGenerator(rng)
+    results = []
+    earlier: List[Tuple[Rule, re.Pattern, Optional[List[_Branch]]]] = []
+
+    for rule in rules:
+        if not rule.enabled:
+            results.append(RuleAnalysis(rule.id, RuleAnalysis.DISABLED))
+            continue
+        if rule.match_mode == MATCH_ARGV:
+            # 参数模式无法生成样本，只作为前序规则参与后续规则的采样判断
+            argv_pattern = rule.get_argv_pattern()
+            if argv_pattern is None:
+                results.append(RuleAnalysis(rule.id, RuleAnalysis.INVALID))
+            else:
+                results.append(RuleAnalysis(rule.id, RuleAnalysis.UNKNOWN))
+                earlier.append((rule, argv_pattern, None))
+            continue
+        try:
+            regex = re.compile(rule.pattern, re.IGNORECASE)
+        except re.error:
+            results.append(RuleAnalysis(rule.id, RuleAnalysis.INVALID))
+            continue
+
+        branches = _parse_branches(rule.pattern)
+        result = _prove_shadowed(rule, branches, earlier)
+        if result is None:
+            result = _sample_shadowed(rule, regex, earlier, generator, samples)
+
+        if result.status in (RuleAnalysis.DEAD, RuleAnalysis.LIKELY_DEAD):
+            shadowers = [r for r, _, _ in earlier if r.id in result.shadowed_by]
+            result.redundant = bool(shadowers) and all(_same_effect(rule, r) for r in shadowers)
+        results.append(result)
+        earlier.append((rule, regex, branches))
+
+    return results
+
+
+def _prove_shadowed(rule: Rule, branches: Optional[List[_Branch]],
+                    earlier: List[Tuple[Rule, re.Pattern, Optional[List[_Branch]]]]
+                    ) -> Optional[RuleAnalysis]:
+    """尝试证明每个分支都被某条前序规则覆盖，无法证明时返回None"""
+    if not branches or not earlier:
+        return None
+    shadowers = []
+    for branch in branches:
+        covering = None
+        for earlier_rule, _, earlier_branches in earlier:
+            if earlier_branches and any(b.covers(branch) for b in earlier_branches):
+                covering = earlier_rule
+                break
+        if covering is None:
+            return None
+        if covering.id not in shadowers:
+            shadowers.append(covering.id)
+    return RuleAnalysis(rule.id, RuleAnalysis.DEAD, shadowers)
+
+
+def _sample_shadowed(rule: Rule, regex: re.Pattern,
+                     earlier: List[Tuple[Rule, re.Pattern, Optional[List[_Branch]]]],
+                     generator: _SampleGenerator, samples: int) -> RuleAnalysis:
+    """随机生成匹配该规则的命令，寻找不被前序规则匹配的反例"""
+    shadowers = []
+    matched_samples = 0
+    for _ in range(samples):
+        sample = generator.generate(rule.pattern)
+        if sample is None:
+            break
+        command = generator.rng.choice(_SAMPLE_AFFIXES) + sample + generator.rng.choice(_SAMPLE_AFFIXES)
+        for candidate in (sample, command):
+            if not regex.search(candidate):
+                continue
+            matched_samples += 1
+            first = next((r for r, r_regex, _ in earlier if r_regex.search(candidate)), None)
+            if first is None:
+                return RuleAnalysis(rule.id, RuleAnalysis.REACHABLE, witness=candidate)
+            if first.id not in shadowers:
+                shadowers.append(first.id)
+
+    if matched_samples == 0:
+        # 生成器无法构造匹配样本（如复杂的断言），不做判断
+        return RuleAnalysis(rule.id, RuleAnalysis.UNKNOWN)
+    return RuleAnalysis(rule.id, RuleAnalysis.LIKELY_DEAD, shadowers)
+
+
+def prunable_rule_ids(analyses: Sequence[RuleAnalysis]) -> List[int]:
+    """可以安全删除的规则（已证明永远不会触发）"""
+    return [analysis.rule_id for analysis in analyses if analysis.is_dead]
+
+
+def suggest_order(rules: Sequence[Rule], analyses: Sequence[RuleAnalysis]) -> List[int]:
+    """
+    建议的规则顺序：把无法触发且动作不同的规则移到遮蔽它的第一条规则之前
+
+    冗余规则保持原位（建议直接删除）。
+
+    Returns:
+        List[int]: 调整后的规则ID顺序
+    """
+    order = [rule.id for rule in rules]
+    for analysis in analyses:
+        if analysis.status not in (RuleAnalysis.DEAD, RuleAnalysis.LIKELY_DEAD) or analysis.redundant:
+            continue
+        if not analysis.shadowed_by:
+            continue
+        order.remove(analysis.rule_id)
+        target = min(order.index(rule_id) for rule_id in analysis.shadowed_by if rule_id in order)
+        order.insert(target, analysis.rule_id)
+    return order
+
+
+def generate_matching_commands(pattern: str, count: int, seed: int = 0) -> List[str]:
+    """随机生成最多count条能被模式匹配的命令，模式无法生成样本时返回空列表"""
+    try:
+        regex = re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return []
+    generator = _SampleGenerator(random.Random(seed))
+    commands = []
+    for _ in range(count * 4):
+        sample = generator.generate(pattern)
+        if sample is None:
+            break
+        command = generator.rng.choice(_SAMPLE_AFFIXES) + sample + generator.rng.choice(_SAMPLE_AFFIXES)
+        for candidate in (command, sample):
+            if regex.search(candidate):
+                commands.append(candidate)
+                break
+        if len(commands) >= count:
+            break
+    return commands
+
+
+def _exact_texts(branch: _Branch) -> Optional[Set[str]]:
+    """
+    分支锚定首尾且只含字面量时，返回它能匹配的全部命令文本（小写）
+
+    $ 还可以匹配末尾换行之前的位置，^T$ 能匹配 T 和 T\\n；\\Z 只能匹配 T。
+    多行模式下 ^ $ 可以在任意行首行尾匹配，不做判断。
+    """
+    items = branch.items
+    if not branch.strictly_anchored or len(items) < 2:
+        return None
+    last_op, last_av = items[-1]
+    if last_op != _C.AT or last_av not in (_C.AT_END, _C.AT_END_STRING):
+        return None
+    text = _literal_text(items[1:-1])
+    if text is None:
+        return None
+    if last_av == _C.AT_END:
+        return {text, text + '\n'}
+    return {text}
+
+
+def _branches_disjoint(a: _Branch, b: _Branch) -> bool:
+    """两个分支是否已证明不能匹配同一个字符串"""
+    # 忽略大小写时部分非ASCII字符会与ASCII字母互相匹配（如 ſ 与 s），只比较ASCII文本
+    exact_a, exact_b = _exact_texts(a), _exact_texts(b)
+    if exact_a is not None and exact_b is not None and ''.join(exact_a | exact_b).isascii():
+        return not (exact_a & exact_b)
+    # 都锚定在开头时，开头的字面量互不为前缀则不可能同时匹配
+    if not (a.strictly_anchored and b.strictly_anchored):
+        return False
+    if not a.prefix or not b.prefix or not (a.prefix + b.prefix).isascii():
+        return False
+    return not (a.prefix.startswith(b.prefix) or b.prefix.startswith(a.prefix))
+
+
+def _excludes_exact(branch: _Branch, pattern: str) -> bool:
+    """分支只能匹配固定的几个文本，且另一个模式不匹配其中任何一个时返回True"""
+    texts = _exact_texts(branch)
+    # 局部关闭忽略大小写的模式对不同大小写的结果可能不同，不做判断
+    if texts is None or not ''.join(texts).isascii() or '(?-' in pattern:
+        return False
+    try:
+        regex = re.compile(pattern, re.IGNORECASE)
+    except re.error:
+        return False
+    return not any(regex.search(text) for text in texts)
+
+
+def patterns_disjoint(pattern_a: str, pattern_b: str) -> bool:
+    """
+    两个模式是否已证明不会同时匹配任何命令
+
+    每对分支满足以下任一条件时成立，无法证明时返回False：
+    都锚定开头且开头字面量互不为前缀；一方是完全锚定的字面量且另一方不匹配该文本。
+    """
+    branches_a = _parse_branches(pattern_a)
+    branches_b = _parse_branches(pattern_b)
+    if not branches_a or not branches_b:
+        return False
+    return all(_branches_disjoint(a, b) or _excludes_exact(a, pattern_b) or _excludes_exact(b, pattern_a)
+               for a in branches_a for b in branches_b)
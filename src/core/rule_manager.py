@@ -1,8 +1,24 @@
 import json
 import os
 import re
+import threading
 from pathlib import Path
-from typing import Dict, List, Optional, Union, Any, Set
+from typing import Dict, List, Optional, Union, Any, Set, Pattern, Tuple
+
+from .decision_cache import DecisionCache
+from .file_metadata import MetadataOverride, compile_metadata_override, metadata_function
+from .pattern_compiler import PatternCompileError, compile_pattern
+from .regex_guard import RegexGuard
+from .rule_snapshot import RuleSnapshot
+from .rule_schema import (
+    MATCH_ARGV, MATCH_REGEX, ValidationIssue, check_metadata, iter_rules_file, validate_rules_data,
+    validate_rules_file
+)
+from .shell_parser import ARGV_MATCH_FUNCTION, ArgvPattern, ArgvPatternError, compile_argv_pattern
+
+# 缓存真实命令输出的默认有效时间（秒）
+DEFAULT_CACHE_TTL = 60.0
+
 
 class Rule:
     """规则类，表示一条命令伪装规则"""
@@ -15,12 +31,22 @@ class Rule:
         self.pattern = pattern
         self.action = action
         self.enabled = enabled
+        self.match_mode = kwargs.get('match_mode', MATCH_REGEX)  # regex: 正则匹配命令文本；argv: 按程序名、选项和参数匹配
         
         # 根据不同的动作类型，存储相应的数据
         self.output = kwargs.get('output', '')        # replace动作的输出内容
         self.script = kwargs.get('script', '')        # script动作的脚本内容
         self.filter = kwargs.get('filter', '')        # filter动作的过滤命令
         self.condition = kwargs.get('condition', '')  # filter动作的条件
+        self.metadata = dict(kwargs.get('metadata') or {})  # metadata动作的文件属性设置
+        self.cache_output = kwargs.get('cache_output', False)  # filter动作是否缓存真实命令输出
+        self.cache_ttl = kwargs.get('cache_ttl', DEFAULT_CACHE_TTL)  # 缓存输出的有效时间（秒）
+        self.cpu_limit = kwargs.get('cpu_limit')        # script/filter动作子进程的CPU时间上限（秒）
+        self.memory_limit = kwargs.get('memory_limit')  # script/filter动作子进程的地址空间上限（MB）
+        
+        # 编译后的正则表达式缓存，模式变化时重新编译
+        self._regex_source: Optional[str] = None
+        self._regex: Optional[Pattern] = None
     
     def to_dict(self) -> Dict[str, Any]:
         """将规则转换为字典格式"""
@@ -32,6 +58,8 @@ class Rule:
             'action': self.action,
             'enabled': self.enabled
         }
+        if self.match_mode != MATCH_REGEX:
+            rule_dict['match_mode'] = self.match_mode
         
         # 根据动作类型添加相应的字段
         if self.action == 'replace' and self.output:
@@ -43,6 +71,18 @@ class Rule:
                 rule_dict['filter'] = self.filter
             if self.condition:
                 rule_dict['condition'] = self.condition
+            if self.cache_output:
+                rule_dict['cache_output'] = True
+                rule_dict['cache_ttl'] = self.cache_ttl
+        elif self.action == 'metadata':
+            rule_dict['metadata'] = dict(self.metadata)
+        
+        # 资源限制只对启动子进程的动作有效
+        if self.action in ('script', 'filter'):
+            if self.cpu_limit:
+                rule_dict['cpu_limit'] = self.cpu_limit
+            if self.memory_limit:
+                rule_dict['memory_limit'] = self.memory_limit
         
         return rule_dict
     
@@ -57,6 +97,8 @@ class Rule:
         enabled = rule_dict.get('enabled', True)
         
         kwargs = {}
+        if 'match_mode' in rule_dict:
+            kwargs['match_mode'] = rule_dict['match_mode']
         if 'output' in rule_dict:
             kwargs['output'] = rule_dict['output']
         if 'script' in rule_dict:
@@ -65,18 +107,97 @@ class Rule:
             kwargs['filter'] = rule_dict['filter']
         if 'condition' in rule_dict:
             kwargs['condition'] = rule_dict['condition']
+        if 'metadata' in rule_dict:
+            kwargs['metadata'] = rule_dict['metadata']
+        if 'cache_output' in rule_dict:
+            kwargs['cache_output'] = rule_dict['cache_output']
+        if 'cache_ttl' in rule_dict:
+            kwargs['cache_ttl'] = rule_dict['cache_ttl']
+        if 'cpu_limit' in rule_dict:
+            kwargs['cpu_limit'] = rule_dict['cpu_limit']
+        if 'memory_limit' in rule_dict:
+            kwargs['memory_limit'] = rule_dict['memory_limit']
         
         return cls(rule_id, name, description, pattern, action, enabled, **kwargs)
     
+    def get_regex(self) -> Optional[Pattern]:
+        """获取编译后的正则表达式，无效模式或参数匹配规则返回None"""
+        if self.match_mode != MATCH_REGEX:
+            return None
+        if self._regex_source != self.pattern:
+            try:
+                self._regex = re.compile(self.pattern, re.IGNORECASE)
+            except re.error:
+                self._regex = None
+            self._regex_source = self.pattern
+        return self._regex
+    
+    def get_argv_pattern(self) -> Optional[ArgvPattern]:
+        """获取参数匹配规则编译后的模式，无效模式或正则规则返回None"""
+        if self.match_mode != MATCH_ARGV:
+            return None
+        try:
+            return compile_argv_pattern(self.pattern)
+        except ArgvPatternError:
+            return None
+    
+    def get_metadata_override(self) -> Optional[MetadataOverride]:
+        """获取metadata动作编译后的文件属性设置，设置无效时返回None"""
+        try:
+            return compile_metadata_override(self.metadata)
+        except ValueError:
+            return None
+    
+    def get_matcher(self) -> Optional[Union[Pattern, ArgvPattern]]:
+        """获取按匹配方式编译的模式（都提供search方法），无效模式返回None"""
+        if self.match_mode == MATCH_ARGV:
+            return self.get_argv_pattern()
+        return self.get_regex()
+    
     def matches(self, command: str) -> bool:
         """检查命令是否匹配规则的模式"""
         if not self.enabled:
             return False
-        try:
-            pattern = re.compile(self.pattern, re.IGNORECASE)
-            return bool(pattern.search(command))
-        except re.error:
+        matcher = self.get_matcher()
+        if matcher is None:
             return False
+        return bool(matcher.search(command))
+    
+    def state(self) -> Tuple:
+        """规则内容的可比较表示，用于判断规则是否变化"""
+        return tuple(sorted(
+            (key, value) for key, value in vars(self).items() if not key.startswith('_')
+        ))
+    
+    def output_bytes(self) -> bytes:
+        """replace动作输出内容的UTF-8编码"""
+        return self.output.encode('utf-8')
+    
+    def freeze(self) -> 'FrozenRule':
+        """创建当前规则的只读副本"""
+        self.get_regex()
+        frozen = FrozenRule.__new__(FrozenRule)
+        frozen.__dict__.update(self.__dict__)
+        frozen.__dict__['_output_bytes'] = self.output_bytes()
+        return frozen
+
+
+class FrozenRule(Rule):
+    """只读规则，发布到规则快照中，任何修改都会抛出异常"""
+    
+    def __setattr__(self, name, value):
+        raise AttributeError(f"规则快照中的规则不可修改: {name}")
+    
+    def __delattr__(self, name):
+        raise AttributeError(f"规则快照中的规则不可修改: {name}")
+    
+    def get_regex(self) -> Optional[Pattern]:
+        """获取编译后的正则表达式（冻结时已编译）"""
+        return self._regex
+    
+    def output_bytes(self) -> bytes:
+        """replace动作输出内容的UTF-8编码（冻结时已编码）"""
+        return self._output_bytes
 
 
 class AppConfig:
@@ -108,6 +229,139 @@ class AppConfig:
         return config
 
 
+# 导出脚本的基础模板
+BASH_SCRIPT_TEMPLATE = """#!/bin/bash
+LOG_DIRECTORY="{LOG_DIRECTORY}"
+LOG_FILENAME="{LOG_FILENAME}"
+LOG_FILE="$LOG_DIRECTORY/$LOG_FILENAME"
+
+mkdir -p "$(dirname "$LOG_FILE")"
+touch "$LOG_FILE"
+chmod 666 "$LOG_FILE" 2>/dev/null
+
+# 非交互式命令处理
+if [ -n "$SSH_ORIGINAL_COMMAND" ]; then
+  CMD="$SSH_ORIGINAL_COMMAND"
+  echo "$(date "+%Y-%m-%d %H:%M:%S") [CMD] $USER: $CMD" >> "$LOG_FILE"
+
+{RULE_BLOCKS}
+
+  # 默认正常执行
+  OUTPUT=$(eval "$CMD" 2>&1)
+  echo "$OUTPUT"
+  exit 0
+fi
+
+# 交互式会话处理
+echo "$(date "+%Y-%m-%d %H:%M:%S") [SSH] Interactive session started by $USER (PID=$$)" >> "$LOG_FILE"
+
+if command -v script &>/dev/null; then
+  script -q --timing="$LOG_FILE.time" -a "$LOG_FILE" -c "/bin/bash"
+else
+  export HISTFILE="/tmp/.hist.$$"
+  export HISTTIMEFORMAT="%F %T "
+  export PROMPT_COMMAND='history -a; history 1 >> '"$LOG_FILE"
+  trap 'history -a; history 1 >> "$LOG_FILE"' DEBUG
+  exec /bin/bash --noprofile --norc
+fi
+"""
+
+# 导出脚本中执行真实命令的方式
+BASH_REAL_EXEC = 'eval "$CMD"'
+
+
+def export_condition(rule: Rule, var: str = 'CMD') -> str:
+    """
+    规则模式在导出脚本中的判断条件
+    
+    正则模式经pattern_compiler转换为忽略大小写的grep -E条件；参数模式调用ARGV_MATCH_FUNCTION
+    定义的awk匹配函数。无法转换时抛出PatternCompileError。
+    """
+    if rule.match_mode == MATCH_ARGV:
+        try:
+            return compile_argv_pattern(rule.pattern).bash_condition()
+        except ArgvPatternError as e:
+            raise PatternCompileError(f"参数模式无效: {str(e)}")
+    return compile_pattern(rule.pattern).grep_condition(var)
+
+
+def build_rule_blocks(rules: List[Rule], real_exec: str = BASH_REAL_EXEC,
+                      marker: bool = False) -> List[str]:
+    """
+    生成导出脚本中的规则判断块
+    
+    条件由export_condition生成，无法转换时抛出PatternCompileError。
+    有启用的参数匹配规则或文件属性伪装规则时，第一个块定义它们使用的函数。
+    
+    Args:
+        rules: 按匹配顺序排列的规则，跳过未启用的规则
+        real_exec: 执行真实命令的shell片段，差异测试时替换为桩
+        marker: 是否在规则命中时先输出 \\036规则ID\\036 标记
+    """
+    rule_blocks = []
+    if any(rule.enabled and rule.match_mode == MATCH_ARGV for rule in rules):
+        rule_blocks.append("  # 参数匹配规则使用的匹配函数\n" + "".join(
+            f"  {line}\n" if line else "\n" for line in ARGV_MATCH_FUNCTION.splitlines()))
+    if any(rule.enabled and rule.action == 'metadata' for rule in rules):
+        rule_blocks.append("  # 文件属性伪装规则使用的ls/stat输出改写函数\n" + "".join(
+            f"  {line}\n" if line else "\n" for line in metadata_function(real_exec).splitlines()))
+    
+    for rule in rules:
+        if not rule.enabled:
+            continue
+            
+        try:
+            condition = export_condition(rule)
+        except PatternCompileError as e:
+            raise PatternCompileError(f"规则 {rule.name}(#{rule.id}) 的模式无法导出: {str(e)}")
+        
+        block = f"  # {rule.name}: {rule.description}\n"
+        block += f"  if {condition}; then\n"
+        if marker:
+            block += f"    printf '\\036%s\\036' {rule.id}\n"
+        
+        if rule.action == 'replace':
+            # 输出替换
+            output_lines = rule.output.split('\n')
+            for line in output_lines:
+                block += f"    echo \"{line}\"\n"
+        
+        elif rule.action == 'script':
+            # 执行脚本
+            script_lines = rule.script.split('\n')
+            for line in script_lines:
+                block += f"    {line}\n"
+        
+        elif rule.action == 'filter':
+            # 过滤输出
+            block += f"    OUTPUT=$({real_exec} 2>&1)\n"
+            if rule.condition:
+                block += f"    if echo \"$OUTPUT\" | {rule.condition}; then\n"
+                block += f"      echo \"$OUTPUT\" | {rule.filter}\n"
+                block += f"    else\n"
+                block += f"      echo \"$OUTPUT\"\n"
+                block += f"    fi\n"
+            else:
+                block += f"    echo \"$OUTPUT\" | {rule.filter}\n"
+        
+        elif rule.action == 'empty':
+            # 返回空
+            pass
+        
+        elif rule.action == 'metadata':
+            # 伪装文件属性：改写真实命令的输出，设置无效时输出真实命令的结果
+            override = rule.get_metadata_override()
+            if override is not None:
+                block += f"    {override.bash_call()}\n"
+            else:
+                block += f"    {real_exec} 2>&1\n"
+        
+        block += "    exit 0\n"
+        block += "  fi\n"
+        rule_blocks.append(block)
+    return rule_blocks
+
+
 class RuleManager:
     """规则管理器，负责加载、保存和应用规则"""
     
@@ -115,31 +369,165 @@ class RuleManager:
         self.rules: List[Rule] = []
         self.next_id = 1
         self.config = AppConfig()
+        self.last_errors: List[ValidationIssue] = []  # 最近一次加载/导入的校验错误
+        
+        # 写操作之间互斥，读取方只读取快照引用，无需加锁
+        self._write_lock = threading.RLock()
+        
+        # 有回溯风险的模式在独立进程中带截止时间匹配
+        self.regex_guard = RegexGuard()
+        self._snapshot = RuleSnapshot.build(0, self.rules, guard=self.regex_guard)
+        
+        # 重复命令的匹配结果缓存，键中包含快照版本，规则变化后自动失效
+        self.decision_cache = DecisionCache()
+    
+    @property
+    def snapshot(self) -> RuleSnapshot:
+        """当前发布的只读规则快照"""
+        return self._snapshot
+    
+    @property
+    def version(self) -> int:
+        """当前规则集合的版本号，每次修改后递增"""
+        return self._snapshot.version
+    
+    def _publish(self):
+        """根据当前规则列表构建并发布新快照（需在写锁内调用）"""
+        self._snapshot = RuleSnapshot.build(
+            self._snapshot.version + 1, self.rules, self._snapshot, self.regex_guard
+        )
+        self.decision_cache.clear()
     
     def load_rules(self, file_path: Union[str, Path]) -> bool:
         """从文件加载规则和配置"""
+        self.last_errors = []
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
+            
+            # 校验文件结构并预编译所有正则表达式
+            issues = validate_rules_data(data)
+            if issues:
+                self.last_errors = issues
+                for issue in issues:
+                    print(f"规则校验失败: {issue}")
+                return False
                 
-            self.rules = []
+            rules = []
             for rule_dict in data.get('rules', []):
                 rule = Rule.from_dict(rule_dict)
-                self.rules.append(rule)
+                rules.append(rule)
                 
                 # 更新next_id为最大ID+1
                 if rule.id >= self.next_id:
                     self.next_id = rule.id + 1
             
+            with self._write_lock:
+                self.rules = rules
+                self._publish()
+            
             # 加载配置
             if 'config' in data:
                 self.config = AppConfig.from_dict(data['config'])
             
             return True
         except (json.JSONDecodeError, FileNotFoundError) as e:
+            self.last_errors = [ValidationIssue("$", str(e))]
             print(f"加载规则失败: {str(e)}")
             return False
     
+    def import_rules(self, file_path: Union[str, Path]) -> bool:
+        """
+        批量导入规则文件中的规则，追加到当前规则之后
+        
+        先流式校验整个文件，有任何错误时不导入任何规则，错误记录在last_errors中。
+        导入的规则会分配新的ID。
+        """
+        self.last_errors = validate_rules_file(file_path)
+        if self.last_errors:
+            for issue in self.last_errors:
+                print(f"规则校验失败: {issue}")
+            return False
+        
+        with self._write_lock:
+            rules = self.rules.copy()
+            for _, _, rule_dict in iter_rules_file(file_path):
+                rule = Rule.from_dict(rule_dict)
+                rule.id = self.next_id
+                self.next_id += 1
+                rules.append(rule)
+            
+            # 全部解析完成后一次性替换，只发布一次快照
+            self.rules = rules
+            self._publish()
+        return True
+    
+    def reload_rules(self, file_paths: List[Union[str, Path]]) -> Optional[Dict[str, int]]:
+        """
+        重新加载规则文件，与当前规则比较后只替换发生变化的部分
+        
+        多个文件的规则按文件顺序依次排列。未变化的规则对象和已编译的模式会被复用，
+        新快照整体发布，正在进行的匹配继续使用旧快照。
+        
+        Args:
+            file_paths: 规则文件路径列表
+            
+        Returns:
+            Optional[Dict[str, int]]: 变更统计（added/removed/changed/unchanged/recompiled），
+                                      加载或校验失败时返回None
+        """
+        self.last_errors = []
+        rule_dicts = []
+        config = None
+        for file_path in file_paths:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                self.last_errors = [ValidationIssue("$", f"{file_path}: {str(e)}")]
+                print(f"重新加载规则失败: {str(e)}")
+                return None
+            
+            issues = validate_rules_data(data)
+            if issues:
+                self.last_errors = issues
+                for issue in issues:
+                    print(f"规则校验失败: {file_path}: {issue}")
+                return None
+            
+            rule_dicts.extend(data.get('rules', []))
+            if config is None and 'config' in data:
+                config = AppConfig.from_dict(data['config'])
+        
+        with self._write_lock:
+            # 按ID比较新旧规则，内容相同的沿用原对象
+            current = {rule.id: rule for rule in self.rules}
+            stats = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+            rules = []
+            for rule_dict in rule_dicts:
+                rule = Rule.from_dict(rule_dict)
+                existing = current.pop(rule.id, None)
+                if existing is None:
+                    stats['added'] += 1
+                elif existing.to_dict() == rule.to_dict():
+                    stats['unchanged'] += 1
+                    rule = existing
+                else:
+                    stats['changed'] += 1
+                rules.append(rule)
+                if rule.id >= self.next_id:
+                    self.next_id = rule.id + 1
+            stats['removed'] = len(current)
+            
+            # 引用赋值是原子操作，读取方要么看到旧快照要么看到新快照
+            self.rules = rules
+            self._publish()
+            stats['recompiled'] = self._snapshot.matcher.recompiled
+            if config is not None:
+                self.config = config
+        
+        return stats
+    
     def save_rules(self, file_path: Union[str, Path]) -> bool:
         """保存规则和配置到文件"""
         try:
@@ -161,29 +549,57 @@ class RuleManager:
     
     def add_rule(self, rule: Rule) -> int:
         """添加新规则"""
-        if rule.id == 0:
-            rule.id = self.next_id
-            self.next_id += 1
-        
-        self.rules.append(rule)
+        with self._write_lock:
+            if rule.id == 0:
+                rule.id = self.next_id
+                self.next_id += 1
+            
+            self.rules = self.rules + [rule]
+            self._publish()
         return rule.id
     
     def update_rule(self, rule: Rule) -> bool:
         """更新现有规则"""
-        for i, existing_rule in enumerate(self.rules):
-            if existing_rule.id == rule.id:
-                self.rules[i] = rule
-                return True
+        with self._write_lock:
+            for i, existing_rule in enumerate(self.rules):
+                if existing_rule.id == rule.id:
+                    rules = self.rules.copy()
+                    rules[i] = rule
+                    self.rules = rules
+                    self._publish()
+                    return True
         return False
     
     def delete_rule(self, rule_id: int) -> bool:
         """删除规则"""
-        for i, rule in enumerate(self.rules):
-            if rule.id == rule_id:
-                del self.rules[i]
-                return True
+        with self._write_lock:
+            for i, rule in enumerate(self.rules):
+                if rule.id == rule_id:
+                    self.rules = self.rules[:i] + self.rules[i + 1:]
+                    self._publish()
+                    return True
         return False
     
+    def set_rule_enabled(self, rule_id: int, enabled: bool) -> bool:
+        """启用或禁用规则"""
+        with self._write_lock:
+            rule = self.get_rule(rule_id)
+            if rule is None:
+                return False
+            rule.enabled = enabled
+            self._publish()
+        return True
+    
+    def reorder_rules(self, rule_ids: List[int]) -> bool:
+        """按给定的ID顺序重新排列规则，ID必须与现有规则一一对应"""
+        with self._write_lock:
+            by_id = {rule.id: rule for rule in self.rules}
+            if sorted(rule_ids) != sorted(by_id):
+                return False
+            self.rules = [by_id[rule_id] for rule_id in rule_ids]
+            self._publish()
+        return True
+    
     def get_rule(self, rule_id: int) -> Optional[Rule]:
         """获取特定规则"""
         for rule in self.rules:
@@ -192,101 +608,41 @@ class RuleManager:
         return None
     
     def find_matching_rule(self, command: str) -> Optional[Rule]:
-        """查找匹配命令的规则"""
-        for rule in self.rules:
-            if rule.matches(command):
-                return rule
-        return None
+        """查找匹配命令的规则（返回快照中的只读规则），结果经过缓存"""
+        return self.decision_cache.lookup(self._snapshot, command)[0]
     
     def get_all_rules(self) -> List[Rule]:
         """获取所有规则"""
         return self.rules.copy()
     
+    def check_export(self) -> List[str]:
+        """检查启用的规则能否导出为bash脚本，返回问题说明"""
+        problems = []
+        for rule in self.snapshot.rules:
+            if not rule.enabled:
+                continue
+            try:
+                export_condition(rule)
+            except PatternCompileError as e:
+                problems.append(f"规则 {rule.name}(#{rule.id}): {str(e)}")
+            if rule.action == 'metadata':
+                message = check_metadata(rule.metadata)
+                if message:
+                    problems.append(f"规则 {rule.name}(#{rule.id}): {message}（导出后执行真实命令）")
+        return problems
+    
+    def build_bash_script(self) -> str:
+        """生成当前快照对应的bash脚本内容"""
+        script_content = BASH_SCRIPT_TEMPLATE.replace(
+            "{RULE_BLOCKS}", "\n".join(build_rule_blocks(self.snapshot.rules)))
+        script_content = script_content.replace("{LOG_DIRECTORY}", self.config.log_directory)
+        script_content = script_content.replace("{LOG_FILENAME}", self.config.log_filename)
+        return script_content
+    
     def export_to_bash_script(self, file_path: Union[str, Path]) -> bool:
         """将规则导出为bash脚本"""
         try:
-            # 基础脚本模板
-            script_template = """#!/bin/bash
-LOG_DIRECTORY="{LOG_DIRECTORY}"
-LOG_FILENAME="{LOG_FILENAME}"
-LOG_FILE="$LOG_DIRECTORY/$LOG_FILENAME"
-
-mkdir -p "$(dirname "$LOG_FILE")"
-touch "$LOG_FILE"
-chmod 666 "$LOG_FILE" 2>/dev/null
-
-# 非交互式命令处理
-if [ -n "$SSH_ORIGINAL_COMMAND" ]; then
-  CMD="$SSH_ORIGINAL_COMMAND"
-  echo "$(date "+%Y-%m-%d %H:%M:%S") [CMD] $USER: $CMD" >> "$LOG_FILE"
-
-{RULE_BLOCKS}
-
-  # 默认正常执行
-  OUTPUT=$(eval "$CMD" 2>&1)
-  echo "$OUTPUT"
-  exit 0
-fi
-
-# 交互式会话处理
-echo "$(date "+%Y-%m-%d %H:%M:%S") [SSH] Interactive session started by $USER (PID=$$)" >> "$LOG_FILE"
-
-if command -v script &>/dev/null; then
-  script -q --timing="$LOG_FILE.time" -a "$LOG_FILE" -c "/bin/bash"
-else
-  export HISTFILE="/tmp/.hist.$$"
-  export HISTTIMEFORMAT="%F %T "
-  export PROMPT_COMMAND='history -a; history 1 >> '"$LOG_FILE"
-  trap 'history -a; history 1 >> "$LOG_FILE"' DEBUG
-  exec /bin/bash --noprofile --norc
-fi
-"""
-            
-            # 构建规则块
-            rule_blocks = []
-            for rule in self.rules:
-                if not rule.enabled:
-                    continue
-                    
-                block = f"  # {rule.name}: {rule.description}\n"
-                block += f"  if echo \"$CMD\" | grep -Eq '{rule.pattern}'; then\n"
-                
-                if rule.action == 'replace':
-                    # 输出替换
-                    output_lines = rule.output.split('\n')
-                    for line in output_lines:
-                        block += f"    echo \"{line}\"\n"
-                
-                elif rule.action == 'script':
-                    # 执行脚本
-                    script_lines = rule.script.split('\n')
-                    for line in script_lines:
-                        block += f"    {line}\n"
-                
-                elif rule.action == 'filter':
-                    # 过滤输出
-                    block += f"    OUTPUT=$(eval \"$CMD\" 2>&1)\n"
-                    if rule.condition:
-                        block += f"    if echo \"$OUTPUT\" | {rule.condition}; then\n"
-                        block += f"      echo \"$OUTPUT\" | {rule.filter}\n"
-                        block += f"    else\n"
-                        block += f"      echo \"$OUTPUT\"\n"
-                        block += f"    fi\n"
-                    else:
-                        block += f"    echo \"$OUTPUT\" | {rule.filter}\n"
-                
-                elif rule.action == 'empty':
-                    # 返回空
-                    pass
-                
-                block += "    exit 0\n"
-                block += "  fi\n"
-                rule_blocks.append(block)
-            
-            # 替换模板中的参数
-            script_content = script_template.replace("{RULE_BLOCKS}", "\n".join(rule_blocks))
-            script_content = script_content.replace("{LOG_DIRECTORY}", self.config.log_directory)
-            script_content = script_content.replace("{LOG_FILENAME}", self.config.log_filename)
+            script_content = self.build_bash_script()
             
             # 写入文件
             with open(file_path, 'w', encoding='utf-8') as f:
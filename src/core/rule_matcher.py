@@ -0,0 +1,208 @@
+import re
+import time
+from typing import TYPE_CHECKING, Dict, List, Optional, Pattern, Tuple, Union
+
+from .literal_index import LiteralIndex
+from .pattern_compiler import PatternCompileError, compile_pattern
+from .regex_guard import RegexGuard, is_risky_pattern
+from .rule_schema import MATCH_ARGV
+from .shell_parser import ArgvPattern, ArgvPatternError, compile_argv_pattern, parse_command
+
+if TYPE_CHECKING:
+    from .rule_manager import Rule
+
+# 启用字面文本前置过滤所需的最少规则数，规则很少时逐条匹配更快
+PREFILTER_MIN_RULES = 8
+
+# 编译结果: (正则, 是否有回溯风险, 必需字面文本)
+_Compiled = Tuple[Optional[Pattern], bool, Optional[Tuple[str, ...]]]
+
+
+def _iter_bits(mask: int):
+    """从低到高生成位掩码中置位的位置"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class RuleMatcher:
+    """
+    编译后的规则匹配器
+
+    构建完成后不再修改，替换规则时整体换成新的匹配器，
+    正在使用旧匹配器的调用不受影响。
+
+    编译时从每个模式中提取必需字面文本（匹配必然包含其中之一），建立Aho-Corasick自动机。
+    匹配时先扫描一遍命令得到候选规则，只对候选规则运行正则。
+    非ASCII命令不使用前置过滤，因为忽略大小写时Unicode折叠（如 ſ 与 s）无法用小写比较表达。
+
+    参数匹配规则按程序名建立散列索引（程序名 -> 规则位置掩码）：命令解析后（结果有缓存）
+    只有程序名出现在命令中的参数规则成为候选，不逐条扫描。
+    """
+
+    def __init__(self, rules: List['Rule'], previous: Optional['RuleMatcher'] = None,
+                 guard: Optional[RegexGuard] = None, prefilter: Optional[bool] = None):
+        """
+        Args:
+            rules: 按优先级排列的启用规则列表
+            previous: 上一个匹配器，未变化的模式直接复用其编译结果
+            guard: 有回溯风险的模式通过它在截止时间内匹配，为None时直接匹配
+            prefilter: 是否使用字面文本前置过滤，为None时规则数不少于PREFILTER_MIN_RULES才使用
+        """
+        reusable = previous._compiled if previous else {}
+        self._compiled: Dict[str, _Compiled] = {}
+        self.recompiled = 0  # 本次构建中实际编译的模式数量
+        self.guard = guard
+
+        entries: List[Tuple['Rule', Union[Pattern, ArgvPattern], bool]] = []
+        literal_sets: List[Optional[Tuple[str, ...]]] = []
+        self.program_index: Dict[str, int] = {}  # 程序名 -> 参数匹配规则的位置掩码
+        self._argv_mask = 0
+        for rule in rules:
+            if rule.match_mode == MATCH_ARGV:
+                try:
+                    argv_pattern = compile_argv_pattern(rule.pattern)
+                except ArgvPatternError:
+                    continue
+                bit = 1 << len(entries)
+                self.program_index[argv_pattern.program] = (
+                    self.program_index.get(argv_pattern.program, 0) | bit)
+                self._argv_mask |= bit
+                entries.append((rule, argv_pattern, False))
+                literal_sets.append(None)
+                continue
+            regex, risky, literals = self._compile(rule.pattern, reusable)
+            if regex is not None:
+                entries.append((rule, regex, risky and guard is not None))
+                literal_sets.append(literals)
+        self._entries = tuple(entries)
+        self.rule_ids = tuple(rule.id for rule, _, _ in self._entries)
+
+        if prefilter is None:
+            prefilter = len(self._entries) >= PREFILTER_MIN_RULES
+        self.literal_index: Optional[LiteralIndex] = None
+        if prefilter and any(literal_sets):
+            self.literal_index = LiteralIndex(literal_sets)
+
+    @staticmethod
+    def _required_literals(pattern: str) -> Optional[Tuple[str, ...]]:
+        """
+        模式的必需字面文本
+
+        包含非ASCII字符的字面文本可能通过Unicode折叠匹配ASCII命令，不能用于过滤。
+        """
+        try:
+            literals = compile_pattern(pattern).required_literals
+        except PatternCompileError:
+            return None
+        if literals is None or not all(literal.isascii() for literal in literals):
+            return None
+        return literals
+
+    def _compile(self, pattern: str, reusable: Dict[str, _Compiled]) -> _Compiled:
+        """编译模式、检查回溯风险并提取必需字面文本，优先复用已有结果"""
+        if pattern in self._compiled:
+            return self._compiled[pattern]
+        if pattern in reusable:
+            compiled = reusable[pattern]
+        else:
+            try:
+                compiled = (re.compile(pattern, re.IGNORECASE), is_risky_pattern(pattern),
+                            self._required_literals(pattern))
+            except re.error:
+                compiled = (None, False, None)
+            self.recompiled += 1
+        self._compiled[pattern] = compiled
+        return compiled
+
+    @property
+    def guarded_rule_ids(self) -> List[int]:
+        """需要受限匹配的规则ID"""
+        return [rule.id for rule, _, guarded in self._entries if guarded]
+
+    def find(self, command: str) -> Optional['Rule']:
+        """按顺序查找第一条匹配命令的规则"""
+        return self.find_with_position(command)[0]
+
+    def _candidate_positions(self, command: str):
+        """按顺序生成需要测试的规则位置"""
+        if not self._argv_mask:
+            if self.literal_index is None or not command.isascii():
+                return range(len(self._entries))
+            return _iter_bits(self.literal_index.candidates(command.lower()))
+
+        # 正则规则的候选（参数规则没有字面文本，在字面索引中总是候选，这里去掉）
+        if self.literal_index is None or not command.isascii():
+            mask = (1 << len(self._entries)) - 1
+        else:
+            mask = self.literal_index.candidates(command.lower())
+        mask &= ~self._argv_mask
+        for program in parse_command(command).programs:
+            mask |= self.program_index.get(program, 0)
+        return _iter_bits(mask)
+
+    def find_with_position(self, command: str, evaluated: Optional[Dict[int, int]] = None
+                           ) -> Tuple[Optional['Rule'], int]:
+        """
+        查找第一条匹配的规则及其位置，未匹配时位置为规则数量
+
+        Args:
+            command: 命令
+            evaluated: 规则ID -> 测试次数，不为None时为每个实际测试的规则加一
+        """
+        rule, position, _ = self.find_with_certainty(command, evaluated)
+        return rule, position
+
+    def find_with_certainty(self, command: str, evaluated: Optional[Dict[int, int]] = None
+                            ) -> Tuple[Optional['Rule'], int, bool]:
+        """
+        与find_with_position相同，同时返回结果是否确定
+
+        受限匹配没有结果（超时、工作进程异常或规则已被隔离）时，该规则按匹配处理，
+        结果不确定：重试可能得到不同的结果，不应缓存。
+
+        Returns:
+            (匹配的规则, 位置, 是否确定)
+        """
+        entries = self._entries
+        for position in self._candidate_positions(command):
+            rule, regex, guarded = entries[position]
+            if evaluated is not None:
+                evaluated[rule.id] = evaluated.get(rule.id, 0) + 1
+            if guarded:
+                matched = self.guard.search(rule.id, rule.pattern, command)
+                if matched is None:
+                    return rule, position, False
+                if matched:
+                    return rule, position, True
+            elif regex.search(command):
+                return rule, position, True
+        return None, len(self._entries), True
+
+    def find_with_timings(self, command: str, evaluated: Optional[Dict[int, int]] = None
+                          ) -> Tuple[Optional['Rule'], int, bool,
+                                     List[Tuple['Rule', int, int, bool]]]:
+        """
+        与find_with_certainty相同，同时记录每个被测试规则的耗时，用于追踪
+
+        Returns:
+            (匹配的规则, 位置, 是否确定, [(规则, 开始纳秒, 结束纳秒, 是否受限匹配)])
+        """
+        timings = []
+        entries = self._entries
+        for position in self._candidate_positions(command):
+            rule, regex, guarded = entries[position]
+            if evaluated is not None:
+                evaluated[rule.id] = evaluated.get(rule.id, 0) + 1
+            start = time.perf_counter_ns()
+            if guarded:
+                matched = self.guard.search(rule.id, rule.pattern, command)
+            else:
+                matched = regex.search(command) is not None
+            timings.append((rule, start, time.perf_counter_ns(), guarded))
+            if matched is None:
+                return rule, position, False, timings
+            if matched:
+                return rule, position, True, timings
+        return None, len(self._entries), True, timings
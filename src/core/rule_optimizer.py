@@ -0,0 +1,164 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+from .benchmark import load_log_commands
+from .metrics import EngineMetrics
+from .rule_analyzer import patterns_disjoint
+from .rule_manager import Rule, RuleManager
+from .rule_schema import MATCH_ARGV
+from .rule_snapshot import RuleSnapshot
+
+
+class HitStats:
+    """规则命中统计，hits为各规则首个匹配的命令数，total为命令总数"""
+
+    def __init__(self, hits: Dict[int, int], total: int):
+        self.hits = hits
+        self.total = total
+
+    @property
+    def unmatched(self) -> int:
+        """没有规则匹配的命令数"""
+        return max(self.total - sum(self.hits.values()), 0)
+
+    @classmethod
+    def from_metrics(cls, metrics: EngineMetrics) -> 'HitStats':
+        """从MockEngine的运行指标读取命中统计"""
+        data = metrics.to_dict()
+        hits = {int(rule_id): counters['matched'] for rule_id, counters in data['rules'].items()}
+        return cls(hits, data['commands'])
+
+    @classmethod
+    def from_commands(cls, snapshot: RuleSnapshot, commands: Iterable[str]) -> 'HitStats':
+        """用当前规则快照匹配一组命令得到命中统计"""
+        hits: Dict[int, int] = {}
+        total = 0
+        for command in commands:
+            total += 1
+            rule = snapshot.matcher.find(command)
+            if rule is not None:
+                hits[rule.id] = hits.get(rule.id, 0) + 1
+        return cls(hits, total)
+
+    @classmethod
+    def from_log(cls, snapshot: RuleSnapshot, log_path: Union[str, Path],
+                 limit: Optional[int] = None) -> 'HitStats':
+        """回放ssh_commands.log中记录的命令得到命中统计"""
+        return cls.from_commands(snapshot, load_log_commands(log_path, limit))
+
+
+class ReorderPlan:
+    """规则重排方案"""
+
+    def __init__(self, original: List[int], order: List[int], stats: HitStats,
+                 before: float, after: float):
+        self.original = original  # 当前规则ID顺序
+        self.order = order  # 建议的规则ID顺序
+        self.stats = stats
+        self.before = before  # 当前顺序下每条命令顺序扫描到首个匹配规则的平均规则数
+        self.after = after  # 建议顺序下每条命令顺序扫描到首个匹配规则的平均规则数
+
+    @property
+    def changed(self) -> bool:
+        """顺序是否有变化"""
+        return self.order != self.original
+
+    @property
+    def reduction(self) -> float:
+        """平均扫描规则数减少的比例"""
+        return 1 - self.after / self.before if self.before else 0.0
+
+    @property
+    def moved(self) -> List[int]:
+        """位置发生变化的规则ID"""
+        return [rule_id for old, rule_id in zip(self.original, self.order) if old != rule_id]
+
+    def describe(self) -> str:
+        """方案说明"""
+        if not self.stats.total:
+            return "没有命中统计数据"
+        if not self.changed:
+            return (f"当前顺序无需调整（平均每条命令顺序扫描 {self.before:.2f} 条规则，"
+                    "可交换的规则之间命中频率已是最优或无法证明互斥）")
+        return (f"调整 {len(self.moved)} 条规则的位置后，平均每条命令顺序扫描的规则数从 "
+                f"{self.before:.2f} 降至 {self.after:.2f}（减少 {self.reduction:.1%}），"
+                "首个匹配结果不变")
+
+
+def _active(rule: Rule) -> bool:
+    """规则是否参与匹配（启用且模式有效）"""
+    return rule.enabled and rule.get_matcher() is not None
+
+
+def _disjoint(a: Rule, b: Rule) -> bool:
+    """两条规则是否已证明互斥，参数匹配规则与任何规则都无法证明（同一命令的不同命令段可以分别匹配）"""
+    if a.match_mode == MATCH_ARGV or b.match_mode == MATCH_ARGV:
+        return False
+    return patterns_disjoint(a.pattern, b.pattern)
+
+
+def expected_evaluations(rules: Sequence[Rule], stats: HitStats) -> float:
+    """
+    按给定顺序计算每条命令顺序扫描到首个匹配规则的平均规则数（未匹配时为全部规则）
+
+    这是不经过任何索引时的匹配代价模型；实际匹配中字面索引、参数索引和决策缓存
+    会跳过其中的规则，测试的正则数更少，但首个匹配位置越靠前，需要测试的候选也越少。
+    """
+    if not stats.total:
+        return 0.0
+    active = [rule for rule in rules if _active(rule)]
+    cost = sum(stats.hits.get(rule.id, 0) * (position + 1) for position, rule in enumerate(active))
+    cost += stats.unmatched * len(active)
+    return cost / stats.total
+
+
+def plan_reorder(rules: Sequence[Rule], stats: HitStats) -> ReorderPlan:
+    """
+    按命中频率生成新的规则顺序
+
+    两条参与匹配的规则只有在模式已证明互斥时才允许交换先后，
+    因此任何命令的首个匹配规则都不会改变。在满足先后约束的规则中，
+    每次选出命中最多的一条（相同时保持原顺序）。
+    禁用或模式无效的规则保持原来的位置。
+    """
+    original = [rule.id for rule in rules]
+    active = [rule for rule in rules if _active(rule)]
+
+    # 不能证明互斥的规则对保持原有先后关系
+    successors: List[List[int]] = [[] for _ in active]
+    pending = [0] * len(active)
+    for i in range(len(active)):
+        for j in range(i + 1, len(active)):
+            if not _disjoint(active[i], active[j]):
+                successors[i].append(j)
+                pending[j] += 1
+
+    ready = [i for i in range(len(active)) if pending[i] == 0]
+    ordered = []
+    while ready:
+        best = max(ready, key=lambda i: (stats.hits.get(active[i].id, 0), -i))
+        ready.remove(best)
+        ordered.append(active[best])
+        for j in successors[best]:
+            pending[j] -= 1
+            if pending[j] == 0:
+                ready.append(j)
+
+    # 把新的顺序填回参与匹配的规则原来占据的位置
+    slots = iter(ordered)
+    new_rules = [next(slots) if _active(rule) else rule for rule in rules]
+    return ReorderPlan(original, [rule.id for rule in new_rules], stats,
+                       expected_evaluations(rules, stats), expected_evaluations(new_rules, stats))
+
+
+def apply_plan(rule_manager: RuleManager, plan: ReorderPlan) -> bool:
+    """
+    把方案应用到规则管理器，导出脚本随之使用新顺序
+
+    规则在生成方案后发生过变化时不应用，返回False。
+    """
+    if [rule.id for rule in rule_manager.snapshot.rules] != plan.original:
+        return False
+    if not plan.changed:
+        return True
+    return rule_manager.reorder_rules(plan.order)
@@ -0,0 +1,229 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from .rule_manager import RuleManager
+
+
+# inotify事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_INOTIFY_EVENT = struct.Struct('iIII')
+
+
+class _Inotify:
+    """通过ctypes调用libc的inotify接口，监视规则文件所在目录"""
+
+    WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, libc, directories: List[str]):
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        try:
+            for directory in directories:
+                wd = libc.inotify_add_watch(self.fd, os.fsencode(directory), self.WATCH_MASK)
+                if wd < 0:
+                    raise OSError(ctypes.get_errno(), f"inotify_add_watch 失败: {directory}")
+        except OSError:
+            os.close(self.fd)
+            raise
+
+    @classmethod
+    def create(cls, directories: List[str]) -> Optional['_Inotify']:
+        """创建inotify监视器，不支持时返回None"""
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            return cls(libc, directories)
+        except (OSError, AttributeError):
+            return None
+
+    def wait(self, timeout: float, names: set) -> bool:
+        """等待目录事件，返回是否有与监视文件相关的事件"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return False
+
+        relevant = False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        offset = 0
+        while offset + _INOTIFY_EVENT.size <= len(data):
+            _, _, _, name_len = _INOTIFY_EVENT.unpack_from(data, offset)
+            offset += _INOTIFY_EVENT.size
+            name = data[offset:offset + name_len].rstrip(b'\0')
+            offset += name_len
+            if os.fsdecode(name) in names:
+                relevant = True
+        return relevant
+
+    def close(self):
+        """关闭inotify文件描述符"""
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+class RuleReloader:
+    """
+    规则热加载器
+
+    监视规则文件，检测到变化后调用RuleManager.reload_rules，只重新编译变化的模式，
+    新的匹配器整体替换旧的，正在执行的MockEngine调用继续使用旧的匹配器。
+    优先使用inotify，不可用时退化为定时轮询文件状态。
+    """
+
+    def __init__(self, rule_manager: RuleManager, file_paths: List[Union[str, Path]],
+                 interval: float = 1.0, use_inotify: bool = True,
+                 on_reload: Optional[Callable[[Dict[str, int]], None]] = None):
+        """
+        Args:
+            rule_manager: 要更新的规则管理器
+            file_paths: 监视的规则文件列表，规则按文件顺序合并
+            interval: 轮询间隔（秒），使用inotify时为最长等待时间
+            use_inotify: 是否尝试使用inotify
+            on_reload: 重新加载成功后的回调，参数为变更统计
+        """
+        self.rule_manager = rule_manager
+        self.file_paths = [os.path.abspath(str(path)) for path in file_paths]
+        self.interval = interval
+        self.use_inotify = use_inotify
+        self.on_reload = on_reload
+
+        self._signatures = self._read_signatures()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        # 热加载指标
+        self._metrics = {
+            'reloads': 0,
+            'failures': 0,
+            'last_latency_ms': 0.0,
+            'max_latency_ms': 0.0,
+            'total_latency_ms': 0.0,
+            'last_recompiled': 0,
+            'total_recompiled': 0,
+            'last_added': 0,
+            'last_removed': 0,
+            'last_changed': 0,
+        }
+        self.watch_mode = 'stopped'
+
+    def _read_signatures(self) -> Dict[str, Optional[Tuple[int, int, int]]]:
+        """读取所有文件的状态签名（inode、大小、修改时间）"""
+        signatures = {}
+        for path in self.file_paths:
+            try:
+                st = os.stat(path)
+                signatures[path] = (st.st_ino, st.st_size, st.st_mtime_ns)
+            except OSError:
+                signatures[path] = None
+        return signatures
+
+    def check(self) -> bool:
+        """检查文件是否变化，变化时重新加载，返回是否执行了重新加载"""
+        signatures = self._read_signatures()
+        if signatures == self._signatures:
+            return False
+        # 文件被删除（如编辑器先删后写）时等待其重新出现
+        if any(signature is None for signature in signatures.values()):
+            return False
+        self._signatures = signatures
+        self.reload()
+        return True
+
+    def reload(self) -> Optional[Dict[str, int]]:
+        """立即重新加载规则文件并记录指标"""
+        with self._lock:
+            start = time.perf_counter()
+            stats = self.rule_manager.reload_rules(self.file_paths)
+            latency_ms = (time.perf_counter() - start) * 1000
+
+            if stats is None:
+                self._metrics['failures'] += 1
+                return None
+
+            self._metrics['reloads'] += 1
+            self._metrics['last_latency_ms'] = latency_ms
+            self._metrics['max_latency_ms'] = max(self._metrics['max_latency_ms'], latency_ms)
+            self._metrics['total_latency_ms'] += latency_ms
+            self._metrics['last_recompiled'] = stats['recompiled']
+            self._metrics['total_recompiled'] += stats['recompiled']
+            self._metrics['last_added'] = stats['added']
+            self._metrics['last_removed'] = stats['removed']
+            self._metrics['last_changed'] = stats['changed']
+
+        if self.on_reload:
+            self.on_reload(stats)
+        return stats
+
+    def get_metrics(self) -> Dict[str, Union[int, float, str]]:
+        """获取热加载指标"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        metrics['watch_mode'] = self.watch_mode
+        return metrics
+
+    def start(self):
+        """启动后台监视线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="RuleReloader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台监视线程"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """监视线程主循环"""
+        inotify = None
+        if self.use_inotify:
+            directories = sorted({os.path.dirname(path) for path in self.file_paths})
+            inotify = _Inotify.create(directories)
+        names = {os.path.basename(path) for path in self.file_paths}
+        self.watch_mode = 'inotify' if inotify else 'poll'
+
+        try:
+            while not self._stop_event.is_set():
+                if inotify:
+                    if not inotify.wait(self.interval, names):
+                        continue
+                    # 合并短时间内的连续写入事件
+                    time.sleep(0.05)
+                elif self._stop_event.wait(self.interval):
+                    break
+                try:
+                    self.check()
+                except Exception as e:
+                    self._metrics['failures'] += 1
+                    print(f"热加载规则失败: {str(e)}")
+        finally:
+            if inotify:
+                inotify.close()
+            self.watch_mode = 'stopped'
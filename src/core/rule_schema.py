@@ -0,0 +1,380 @@
+import json
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import jsonschema
+
+from .file_metadata import compile_metadata_override
+from .shell_parser import ArgvPatternError, compile_argv_pattern
+
+
+# 支持的动作类型
+RULE_ACTIONS = ('replace', 'script', 'filter', 'empty', 'metadata')
+
+# 匹配方式：regex按正则匹配命令文本，argv按解析出的程序名、选项和参数匹配
+MATCH_REGEX = 'regex'
+MATCH_ARGV = 'argv'
+MATCH_MODES = (MATCH_REGEX, MATCH_ARGV)
+
+# 单条规则的模式定义
+RULE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "id": {"type": "integer", "minimum": 0},
+        "name": {"type": "string"},
+        "description": {"type": "string"},
+        "pattern": {"type": "string", "minLength": 1},
+        "match_mode": {"enum": list(MATCH_MODES)},
+        "action": {"enum": list(RULE_ACTIONS)},
+        "enabled": {"type": "boolean"},
+        "output": {"type": "string"},
+        "script": {"type": "string"},
+        "filter": {"type": "string"},
+        "condition": {"type": "string"},
+        "metadata": {
+            "type": "object",
+            "properties": {
+                "paths": {"type": "array", "items": {"type": "string", "minLength": 1}},
+                "clear_mode": {"type": "string", "pattern": "^[0-7]{0,4}$"},
+                "set_mode": {"type": "string", "pattern": "^[0-7]{0,4}$"},
+                "owner": {"type": "string"},
+                "group": {"type": "string"},
+                "mtime": {"type": "string"}
+            },
+            "additionalProperties": False
+        },
+        "cache_output": {"type": "boolean"},
+        "cache_ttl": {"type": "number", "exclusiveMinimum": 0},
+        "cpu_limit": {"type": "integer", "minimum": 1},
+        "memory_limit": {"type": "integer", "minimum": 1}
+    },
+    "required": ["pattern", "action"],
+    "allOf": [
+        {
+            "if": {"properties": {"action": {"const": "script"}}},
+            "then": {"required": ["script"]}
+        },
+        {
+            "if": {"properties": {"action": {"const": "filter"}}},
+            "then": {"required": ["filter"]}
+        },
+        {
+            "if": {"properties": {"action": {"const": "metadata"}}},
+            "then": {"required": ["metadata"]}
+        }
+    ]
+}
+
+# 应用配置的模式定义
+CONFIG_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "log_directory": {"type": "string"},
+        "log_filename": {"type": "string", "minLength": 1}
+    }
+}
+
+# 规则文件的模式定义
+RULES_FILE_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "rules": {"type": "array", "items": RULE_SCHEMA},
+        "config": CONFIG_SCHEMA
+    },
+    "required": ["rules"]
+}
+
+
+class ValidationIssue:
+    """校验问题，记录出错位置和原因"""
+
+    def __init__(self, location: str, message: str, line: Optional[int] = None):
+        self.location = location
+        self.message = message
+        self.line = line
+
+    def __str__(self) -> str:
+        if self.line is not None:
+            return f"第{self.line}行 {self.location}: {self.message}"
+        return f"{self.location}: {self.message}"
+
+    def __repr__(self) -> str:
+        return f"ValidationIssue({str(self)!r})"
+
+
+@lru_cache(maxsize=None)
+def get_file_validator() -> jsonschema.protocols.Validator:
+    """获取规则文件校验器（只编译一次）"""
+    validator_cls = jsonschema.validators.validator_for(RULES_FILE_SCHEMA)
+    validator_cls.check_schema(RULES_FILE_SCHEMA)
+    return validator_cls(RULES_FILE_SCHEMA)
+
+
+@lru_cache(maxsize=None)
+def get_rule_validator() -> jsonschema.protocols.Validator:
+    """获取单条规则校验器（只编译一次）"""
+    validator_cls = jsonschema.validators.validator_for(RULE_SCHEMA)
+    validator_cls.check_schema(RULE_SCHEMA)
+    return validator_cls(RULE_SCHEMA)
+
+
+def _format_location(prefix: str, path) -> str:
+    """将jsonschema的错误路径格式化为 rules[0].pattern 形式"""
+    location = prefix
+    for part in path:
+        if isinstance(part, int):
+            location += f"[{part}]"
+        else:
+            location += f".{part}" if location else str(part)
+    return location or "$"
+
+
+def check_pattern(pattern: str, match_mode: str = MATCH_REGEX) -> Optional[str]:
+    """预编译正则表达式或参数模式，返回错误信息（无错误时返回None）"""
+    if match_mode == MATCH_ARGV:
+        try:
+            compile_argv_pattern(pattern)
+            return None
+        except ArgvPatternError as e:
+            return f"参数模式无效: {str(e)}"
+    try:
+        re.compile(pattern, re.IGNORECASE)
+        return None
+    except re.error as e:
+        return f"正则表达式无效: {str(e)}"
+
+
+def check_metadata(metadata: Any) -> Optional[str]:
+    """检查文件属性伪装设置，返回错误信息（无错误时返回None）"""
+    try:
+        compile_metadata_override(metadata)
+        return None
+    except ValueError as e:
+        return f"文件属性设置无效: {str(e)}"
+
+
+def validate_rule(rule_dict: Any, location: str = "rule",
+                  line: Optional[int] = None) -> List[ValidationIssue]:
+    """校验单条规则，包括模式定义和正则表达式预编译"""
+    issues = []
+    for error in get_rule_validator().iter_errors(rule_dict):
+        issues.append(ValidationIssue(
+            _format_location(location, error.absolute_path), error.message, line
+        ))
+
+    if isinstance(rule_dict, dict) and isinstance(rule_dict.get('pattern'), str):
+        message = check_pattern(rule_dict['pattern'], rule_dict.get('match_mode', MATCH_REGEX))
+        if message:
+            issues.append(ValidationIssue(f"{location}.pattern", message, line))
+
+    if isinstance(rule_dict, dict) and rule_dict.get('action') == 'metadata' \
+            and isinstance(rule_dict.get('metadata'), dict):
+        message = check_metadata(rule_dict['metadata'])
+        if message:
+            issues.append(ValidationIssue(f"{location}.metadata", message, line))
+
+    return issues
+
+
+def validate_rules_data(data: Any) -> List[ValidationIssue]:
+    """校验已解析的规则文件内容"""
+    issues = []
+    for error in get_file_validator().iter_errors(data):
+        # 单条规则的错误交给validate_rule统一报告
+        if len(error.absolute_path) >= 2 and error.absolute_path[0] == 'rules':
+            continue
+        issues.append(ValidationIssue(_format_location("", error.absolute_path), error.message))
+
+    rules = data.get('rules') if isinstance(data, dict) else None
+    if isinstance(rules, list):
+        seen_ids = set()
+        for i, rule_dict in enumerate(rules):
+            location = f"rules[{i}]"
+            issues.extend(validate_rule(rule_dict, location))
+            issues.extend(_check_duplicate_id(rule_dict, location, seen_ids))
+
+    return issues
+
+
+def _check_duplicate_id(rule_dict: Any, location: str, seen_ids: set,
+                        line: Optional[int] = None) -> List[ValidationIssue]:
+    """检查规则ID是否重复"""
+    if not isinstance(rule_dict, dict):
+        return []
+    rule_id = rule_dict.get('id', 0)
+    if not isinstance(rule_id, int) or rule_id == 0:
+        return []
+    if rule_id in seen_ids:
+        return [ValidationIssue(f"{location}.id", f"规则ID重复: {rule_id}", line)]
+    seen_ids.add(rule_id)
+    return []
+
+
+class RulesFileSyntaxError(ValueError):
+    """规则文件JSON语法错误，带有绝对行号"""
+
+    def __init__(self, message: str, line: int):
+        super().__init__(f"第{line}行: {message}")
+        self.message = message
+        self.line = line
+
+
+class _JsonStreamReader:
+    """增量读取JSON文本，按需解码单个值，已消费的内容会被丢弃"""
+
+    _WHITESPACE = ' \t\r\n'
+    # 直到缓冲区末尾都是数字、字面量或转义的组成字符
+    _TOKEN_TAIL = re.compile(r'[\w.+\-\\]*\Z')
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.line = 1  # buffer起始位置所在的行号
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """读取更多数据，同时丢弃已消费的部分"""
+        if self.eof:
+            return False
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.line += self.buffer.count('\n', 0, self.pos)
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def current_line(self) -> int:
+        """当前读取位置的行号"""
+        return self.line + self.buffer.count('\n', 0, self.pos)
+
+    def peek(self) -> str:
+        """跳过空白并返回下一个字符（文件结束时返回空串）"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self._WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        """读取一个期望的结构字符"""
+        ch = self.peek()
+        if not ch or ch not in chars:
+            found = repr(ch) if ch else "文件结束"
+            raise json.JSONDecodeError(f"期望 {chars!r}，实际为 {found}", self.buffer, self.pos)
+        self.pos += 1
+        return ch
+
+    def _may_be_truncated(self, error: json.JSONDecodeError) -> bool:
+        """
+        解码错误是否可能由数据不足引起
+
+        错误位于缓冲区末尾、字符串未结束，或从错误位置到末尾是未读完的数字、字面量或转义
+        （如 1.、tru、\\u12）时，读取更多数据后可能成功；否则是真正的语法错误。
+        """
+        if error.pos >= len(self.buffer) or error.msg.startswith('Unterminated string'):
+            return True
+        return self._TOKEN_TAIL.match(self.buffer, error.pos) is not None
+
+    def decode_value(self) -> Any:
+        """解码一个完整的JSON值，只在错误可能由数据不足引起时继续读取"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                if self._may_be_truncated(e) and self._fill():
+                    continue
+                raise
+            # 数字可能被分块截断，需确认其后还有数据
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_rules_file(file_path: Union[str, Path], chunk_size: int = 65536
+                    ) -> Iterator[Tuple[int, int, Any]]:
+    """
+    流式遍历规则文件中的规则，不会把整个文档读入内存
+
+    Args:
+        file_path: 规则文件路径
+        chunk_size: 每次读取的字符数
+
+    Yields:
+        Tuple[int, int, Any]: (规则序号, 所在行号, 规则字典)
+
+    Raises:
+        RulesFileSyntaxError: 文件不是合法的JSON
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        reader = _JsonStreamReader(f, chunk_size)
+        try:
+            yield from _iter_rules(reader)
+        except json.JSONDecodeError as e:
+            # 错误位置相对于当前缓冲区，换算为文件中的绝对行号
+            raise RulesFileSyntaxError(e.msg, reader.line + e.lineno - 1) from e
+
+
+def _iter_rules(reader: _JsonStreamReader) -> Iterator[Tuple[int, int, Any]]:
+    """逐个解析顶层对象的字段，只对rules数组做流式展开"""
+    reader.expect('{')
+    if reader.peek() == '}':
+        return
+
+    while True:
+        key = reader.decode_value()
+        reader.expect(':')
+
+        if key == 'rules' and reader.peek() == '[':
+            reader.expect('[')
+            index = 0
+            if reader.peek() == ']':
+                reader.expect(']')
+            else:
+                while True:
+                    reader.peek()
+                    line = reader.current_line()
+                    yield index, line, reader.decode_value()
+                    index += 1
+                    if reader.expect(',]') == ']':
+                        break
+        else:
+            # 其他字段（如config）体积很小，直接解码
+            reader.decode_value()
+
+        if reader.expect(',}') == '}':
+            break
+
+
+def validate_rules_file(file_path: Union[str, Path]) -> List[ValidationIssue]:
+    """
+    流式校验规则文件，报告所有错误及其位置
+
+    Args:
+        file_path: 规则文件路径
+
+    Returns:
+        List[ValidationIssue]: 所有校验问题，为空表示文件有效
+    """
+    issues = []
+    seen_ids = set()
+    try:
+        for index, line, rule_dict in iter_rules_file(file_path):
+            location = f"rules[{index}]"
+            issues.extend(validate_rule(rule_dict, location, line))
+            issues.extend(_check_duplicate_id(rule_dict, location, seen_ids, line))
+    except RulesFileSyntaxError as e:
+        issues.append(ValidationIssue("$", f"JSON格式错误: {e.message}", e.line))
+    except (OSError, UnicodeDecodeError) as e:
+        issues.append(ValidationIssue("$", f"无法读取文件: {str(e)}"))
+    return issues
@@ -0,0 +1,54 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from .regex_guard import RegexGuard
+from .rule_matcher import RuleMatcher
+
+if TYPE_CHECKING:
+    from .rule_manager import FrozenRule, Rule
+
+
+class RuleSnapshot:
+    """
+    规则快照，包含某一版本的只读规则和对应的匹配器
+
+    快照发布后不再修改。读取方只需读取一次RuleManager.snapshot引用，
+    即可在整个处理过程中无锁地使用一致的规则集合。
+    """
+
+    __slots__ = ('version', 'rules', 'matcher', '_by_id')
+
+    def __init__(self, version: int, rules: Tuple['FrozenRule', ...], matcher: RuleMatcher):
+        self.version = version
+        self.rules = rules
+        self.matcher = matcher
+        self._by_id: Dict[int, 'FrozenRule'] = {rule.id: rule for rule in rules}
+
+    @classmethod
+    def build(cls, version: int, rules: List['Rule'],
+              previous: Optional['RuleSnapshot'] = None,
+              guard: Optional[RegexGuard] = None) -> 'RuleSnapshot':
+        """
+        根据可编辑的规则列表构建新快照
+
+        内容未变化的规则直接复用上一个快照中的只读副本，
+        未变化的模式复用已编译的正则表达式。
+        """
+        frozen_rules = []
+        for rule in rules:
+            old = previous._by_id.get(rule.id) if previous else None
+            if old is not None and old.state() == rule.state():
+                frozen_rules.append(old)
+            else:
+                frozen_rules.append(rule.freeze())
+
+        enabled = [rule for rule in frozen_rules if rule.enabled]
+        matcher = RuleMatcher(enabled, previous.matcher if previous else None, guard)
+        return cls(version, tuple(frozen_rules), matcher)
+
+    def get_rule(self, rule_id: int) -> Optional['FrozenRule']:
+        """按ID获取快照中的规则"""
+        return self._by_id.get(rule_id)
+
+    def find_matching_rule(self, command: str) -> Optional['FrozenRule']:
+        """查找匹配命令的规则"""
+        return self.matcher.find(command)
@@ -0,0 +1,506 @@
+import re
+import shlex
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterator, List, Optional, Pattern, Tuple
+
+# 运算符字符：管道、&&、||、;、&、括号和重定向由这些字符组成，换行也分隔命令
+OPERATOR_CHARS = '();<>|&\n'
+
+# 单词之间的空白（换行是运算符，不在其中）
+WHITESPACE = ' \t\r'
+
+# 命令前的包装程序及其带参数值的选项，解析时跳过它们找到真正的程序
+WRAPPERS: Dict[str, Tuple[str, ...]] = {
+    'sudo': ('-u', '-g', '-C', '-D', '-p', '-r', '-t', '-U'),
+    'env': ('-u', '-C', '-S'),
+    'nice': ('-n',),
+    'exec': ('-a',),
+    'time': ('-f', '-o'),
+    'command': (),
+    'nohup': (),
+    'busybox': (),
+    # shell保留字，后面紧跟的是命令
+    '!': (), '{': (), 'if': (), 'then': (), 'else': (), 'elif': (),
+    'do': (), 'while': (), 'until': (),
+}
+
+# 命令前的环境变量赋值（VAR=value）
+_ASSIGNMENT_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*=')
+
+# 分隔参数模式中多个值的字符（导出脚本中通过环境变量传给awk）
+_FIELD_SEPARATOR = '\034'
+
+# 解析结果缓存的条目数
+PARSE_CACHE_SIZE = 4096
+
+
+class _CommandLexer(shlex.shlex):
+    """
+    POSIX模式的shlex词法分析器
+
+    shlex对运算符和内容恰好由运算符字符组成的单词（如 find -exec 的 \\; 或 '|'）返回相同的文本，
+    这里在读取每个词之前查看第一个非空白字符：未转义、未加引号的运算符字符开始的才是运算符。
+    同时得到每个词在命令中的起始位置，用于按运算符切分原始命令文本。
+    """
+
+    def __init__(self, command: str):
+        super().__init__(command, posix=True, punctuation_chars=OPERATOR_CHARS)
+        self.whitespace = WHITESPACE
+        self.whitespace_split = True
+        self.commenters = ''
+
+    def _peek(self) -> Tuple[int, bool]:
+        """
+        下一个词的起始位置和是否为运算符
+
+        回退的字符（至多一个，不会是空白）是上一次读取的最后一个字符，位于当前读取位置之前。
+        """
+        position = self.instream.tell()
+        if self._pushback_chars:
+            return position - 1, self._pushback_chars[-1] in self.punctuation_chars
+        char = self.instream.read(1)
+        skipped = 0
+        while char and char in self.whitespace:
+            char = self.instream.read(1)
+            skipped += 1
+        self.instream.seek(position)
+        return position + skipped, bool(char) and char in self.punctuation_chars
+
+    def tokens(self) -> Iterator[Tuple[str, bool, int]]:
+        """
+        生成 (词, 是否为运算符, 在命令中的起始位置)
+
+        Raises:
+            ValueError: 引号未闭合或命令以转义符结尾
+        """
+        while True:
+            start, operator = self._peek()
+            token = self.get_token()
+            if token is None:
+                return
+            yield token, operator, start
+
+
+def _is_redirect(operator: str) -> bool:
+    """是否为重定向运算符（>、>>、<、2>&1 中的 >& 等），其后的词是重定向目标而不是参数"""
+    return set(operator) <= set('<>&') and ('<' in operator or '>' in operator)
+
+
+def _is_assignment(word: str) -> bool:
+    return _ASSIGNMENT_RE.match(word) is not None
+
+
+def normalize_path(word: str) -> str:
+    """规范化路径参数：合并重复的 /，去掉 /./、开头的 ./ 和末尾的 /"""
+    word = re.sub('//+', '/', word)
+    while '/./' in word:
+        word = word.replace('/./', '/')
+    if word.startswith('./') and len(word) > 2:
+        word = word[2:]
+    if len(word) > 1 and word.endswith('/'):
+        word = word[:-1]
+    return word
+
+
+class CommandSegment:
+    """
+    管道或命令列表中的一段简单命令
+
+    program是去掉路径后的程序名（跳过了前置的变量赋值和sudo、env等包装程序）；
+    短选项（-la）按字符展开保存在short_flags中，长选项（--color=auto）保存整个词和 = 之前的部分；
+    args为其余参数和输入重定向（<）的文件，已按normalize_path规范化；-- 之后的词都是参数。
+    """
+
+    __slots__ = ('argv', 'program', 'short_flags', 'long_flags', 'args')
+
+    def __init__(self, argv: Tuple[str, ...], program: str, short_flags: str,
+                 long_flags: FrozenSet[str], args: Tuple[str, ...]):
+        self.argv = argv
+        self.program = program
+        self.short_flags = short_flags
+        self.long_flags = long_flags
+        self.args = args
+
+    @classmethod
+    def build(cls, words: List[str], inputs: List[str]) -> Optional['CommandSegment']:
+        """从一段命令的词构建，没有程序名（只有赋值或重定向）时返回None"""
+        i = 0
+        while i < len(words) and _is_assignment(words[i]):
+            i += 1
+        while i < len(words) and words[i] in WRAPPERS:
+            options = WRAPPERS[words[i]]
+            i += 1
+            while i < len(words) and (words[i].startswith('-') or _is_assignment(words[i])):
+                if words[i] in options:
+                    i += 1
+                i += 1
+        if i >= len(words):
+            return None
+
+        program = words[i].rsplit('/', 1)[-1]
+        short_flags = []
+        long_flags = set()
+        args = []
+        options_done = False
+        for word in words[i + 1:]:
+            if not options_done and word.startswith('-') and len(word) > 1:
+                if word == '--':
+                    options_done = True
+                elif word.startswith('--'):
+                    long_flags.add(word)
+                    long_flags.add(word.split('=', 1)[0])
+                else:
+                    short_flags.append(word[1:])
+            else:
+                args.append(normalize_path(word))
+        args.extend(normalize_path(word) for word in inputs)
+        return cls(tuple(words[i:]), program, ''.join(short_flags), frozenset(long_flags),
+                   tuple(args))
+
+    def __repr__(self) -> str:
+        return f"CommandSegment({list(self.argv)!r})"
+
+
+class ParsedCommand:
+    """
+    解析后的命令：按 |、&&、||、;、&、括号和换行分隔的各段命令
+
+    命令是只由 | 连接的管道（不含其他分隔运算符）时，pipeline为各阶段的原始文本（未去除空白），
+    与segments一一对应；否则为None。
+    """
+
+    __slots__ = ('command', 'segments', 'programs', 'valid', 'pipeline')
+
+    def __init__(self, command: str, segments: Tuple[CommandSegment, ...], valid: bool = True,
+                 pipeline: Optional[Tuple[str, ...]] = None):
+        self.command = command
+        self.segments = segments
+        self.programs = frozenset(segment.program for segment in segments)
+        self.valid = valid  # 为False时命令有未闭合的引号，没有任何命令段
+        self.pipeline = pipeline
+
+    def __repr__(self) -> str:
+        return f"ParsedCommand({self.command!r}, {list(self.segments)!r})"
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_command(command: str) -> ParsedCommand:
+    """
+    用shlex解析命令，结果按命令文本缓存
+
+    引号和转义按POSIX shell处理，因此 cat  /etc/login.defs、cat "/etc/login.defs"
+    和 /bin/cat /etc/login.defs 得到相同的结构。不展开变量、通配符和命令替换；
+    $(...) 中的命令因括号是运算符而成为单独的命令段。
+    """
+    segments = []
+    words: List[str] = []
+    inputs: List[str] = []
+    redirect = None
+    word_end = -1  # 上一个词按原文长度推算的结束位置，其他词之后为-1
+    pipe_offsets = []  # 管道运算符的位置
+    is_pipeline = True
+
+    def close_segment():
+        segment = CommandSegment.build(words, inputs)
+        if segment is not None:
+            segments.append(segment)
+        return segment is not None
+
+    try:
+        for token, operator, start in _CommandLexer(command).tokens():
+            if operator:
+                if _is_redirect(token):
+                    # 2>/dev/null 中紧贴重定向运算符、未加引号的数字是文件描述符，不是参数
+                    # （词带引号或转义时原文比词长，结束位置不会恰好是运算符的起点）
+                    if word_end == start and words[-1].isascii() and words[-1].isdigit():
+                        words.pop()
+                    redirect = token
+                    word_end = -1
+                    continue
+                if token == '|':
+                    pipe_offsets.append(start)
+                else:
+                    is_pipeline = False
+                is_pipeline = close_segment() and is_pipeline
+                words, inputs, redirect = [], [], None
+            elif redirect is not None:
+                # 输入重定向的文件视为路径参数，其他重定向目标忽略
+                if redirect == '<':
+                    inputs.append(token)
+                redirect = None
+            else:
+                words.append(token)
+                word_end = start + len(token)
+                continue
+            word_end = -1
+    except ValueError:
+        return ParsedCommand(command, (), valid=False)
+    is_pipeline = close_segment() and is_pipeline
+
+    pipeline = None
+    if is_pipeline and pipe_offsets:
+        bounds = [-1] + pipe_offsets + [len(command)]
+        pipeline = tuple(command[bounds[i] + 1:bounds[i + 1]] for i in range(len(bounds) - 1))
+    return ParsedCommand(command, tuple(segments), pipeline=pipeline)
+
+
+def split_simple_command(command: str) -> Optional[List[str]]:
+    """
+    把一条简单命令切分为词，引号和转义按POSIX shell处理
+
+    命令中有管道、命令分隔符、重定向或括号，或者引号未闭合时返回None。
+    """
+    words = []
+    try:
+        for token, operator, _ in _CommandLexer(command).tokens():
+            if operator:
+                return None
+            words.append(token)
+    except ValueError:
+        return None
+    return words
+
+
+class ArgvPatternError(ValueError):
+    """参数模式无效"""
+
+
+def glob_to_regex(glob: str) -> str:
+    """
+    把路径通配符转换为Python re和POSIX awk都能按相同方式解释的正则
+
+    * 匹配任意字符（包括 /），? 匹配一个字节；其余字符按字面匹配。
+    """
+    parts = []
+    for char in glob:
+        if char == '*':
+            parts.append('.*')
+        elif char == '?':
+            parts.append('.')
+        elif (char.isascii() and char.isalnum()) or char == '/' or not char.isascii():
+            parts.append(char)
+        elif char in '^\\[':
+            parts.append('\\' + char)
+        else:
+            parts.append(f'[{char}]')
+    return ''.join(parts)
+
+
+class ArgvPattern:
+    """
+    按程序名、选项和路径参数匹配的模式
+
+    模式本身写成一条命令，如 "cat /etc/login.defs"、"ls -l /root /root/*"、"grep --color PASS_MAX_DAYS"：
+    程序名必须相同；模式中的选项都必须出现（短选项按字符比较，-la 与 -al、-l -a 等价）；
+    给出参数时命令中至少一个参数与其中之一匹配（参数支持 * 和 ? 通配符）。
+    命令中任意一段满足即匹配。
+    """
+
+    __slots__ = ('source', 'program', 'short_flags', 'long_flags', 'globs', 'args_regex', '_regex')
+
+    def __init__(self, source: str):
+        """
+        Raises:
+            ArgvPatternError: 模式不是一条简单命令
+        """
+        if _FIELD_SEPARATOR in source:
+            raise ArgvPatternError("模式中不能包含控制字符 \\034")
+        parsed = parse_command(source)
+        if not parsed.valid:
+            raise ArgvPatternError("引号未闭合")
+        if len(parsed.segments) != 1:
+            raise ArgvPatternError("模式必须是一条不含管道、分号或 && 的命令")
+        segment = parsed.segments[0]
+        if not segment.program:
+            raise ArgvPatternError("缺少程序名")
+        if '' in segment.args:
+            raise ArgvPatternError("参数不能为空")
+
+        self.source = source
+        self.program = segment.program
+        self.short_flags = ''.join(dict.fromkeys(segment.short_flags))
+        self.long_flags = segment.long_flags
+        self.globs = segment.args
+        self.args_regex = '|'.join(glob_to_regex(glob) for glob in self.globs)
+        self._regex: Optional[Pattern[bytes]] = None
+        if self.globs:
+            self._regex = re.compile(f'(?s:{self.args_regex})'.encode('utf-8', 'surrogateescape'))
+
+    def matches_segment(self, segment: CommandSegment) -> bool:
+        """检查一段命令是否满足模式"""
+        if segment.program != self.program:
+            return False
+        if not all(flag in segment.short_flags for flag in self.short_flags):
+            return False
+        if not self.long_flags <= segment.long_flags:
+            return False
+        if self._regex is None:
+            return True
+        return any(self._regex.fullmatch(arg.encode('utf-8', 'surrogateescape'))
+                   for arg in segment.args)
+
+    def search(self, command: str) -> Optional[CommandSegment]:
+        """返回命令中第一段满足模式的命令，不匹配时返回None（与正则的search用法相同，供匹配器统一调用）"""
+        parsed = parse_command(command)
+        if self.program not in parsed.programs:
+            return None
+        for segment in parsed.segments:
+            if self.matches_segment(segment):
+                return segment
+        return None
+
+    def bash_condition(self) -> str:
+        """导出脚本中的判断条件，调用ARGV_MATCH_FUNCTION定义的函数"""
+        return ' '.join([ARGV_MATCH_FUNCTION_NAME] + [shlex.quote(value) for value in (
+            self.program,
+            _FIELD_SEPARATOR.join(self.short_flags),
+            _FIELD_SEPARATOR.join(sorted(self.long_flags)),
+            self.args_regex,
+        )])
+
+    def __repr__(self) -> str:
+        return f"ArgvPattern({self.source!r})"
+
+
+@lru_cache(maxsize=None)
+def compile_argv_pattern(source: str) -> ArgvPattern:
+    """编译参数模式（按模式文本缓存）"""
+    return ArgvPattern(source)
+
+
+# 导出脚本中的awk词法分析函数：按shlex的POSIX模式（状态 ' '、'a'、'c'、引号和转义）逐字节切分命令，
+# 词保存在T[1..NT]中，O[i]表示第i个词是否为运算符，F[i]表示第i个词是否为紧贴运算符、未加引号的数字
+# （2>/dev/null 中的文件描述符）；引号未闭合或以转义符结尾时返回0。
+# awk程序放在单引号中，需要单引号时用 sprintf("%c", 39)。
+AWK_TOKENIZE_FUNCTION = r'''
+function tokenize(s,    n, i, c, state, esc, tok, b) {
+  Q = sprintf("%c", 39); WS = " \t\r"; OPS = "();<>|&\n"
+  NT = 0; n = length(s); i = 1; state = " "; tok = ""
+  while (1) {
+    c = (i <= n) ? substr(s, i, 1) : ""
+    i++
+    if (state == " ") {
+      if (c == "") return 1
+      if (index(WS, c)) continue
+      b = i - 1
+      if (c == "\\") { esc = "a"; state = c }
+      else if (index(OPS, c)) { tok = c; state = "c" }
+      else if (c == "\"" || c == Q) state = c
+      else { tok = c; state = "a" }
+    } else if (state == "\"" || state == Q) {
+      if (c == "") return 0
+      if (c == state) state = "a"
+      else if (c == "\\" && state == "\"") { esc = state; state = c }
+      else tok = tok c
+    } else if (state == "\\") {
+      if (c == "") return 0
+      if (esc == "\"" && c != "\\" && c != esc) tok = tok "\\"
+      tok = tok c; state = esc
+    } else if (c == "" || index(WS, c)) {
+      T[++NT] = tok; O[NT] = (state == "c"); F[NT] = 0; tok = ""
+      if (c == "") return 1
+      state = " "
+    } else if (state == "c") {
+      if (index(OPS, c)) tok = tok c
+      else { i--; T[++NT] = tok; O[NT] = 1; F[NT] = 0; tok = ""; state = " " }
+    } else if (c == "\"" || c == Q) state = c
+    else if (c == "\\") { esc = "a"; state = c }
+    else if (!index(OPS, c)) tok = tok c
+    else { i--; T[++NT] = tok; O[NT] = 0; F[NT] = (substr(s, b, i - b) ~ /^[0-9]+$/); tok = ""; state = " " }
+  }
+}
+'''
+
+# 导出脚本中的参数匹配：与上面的解析和匹配逐步对应的awk程序
+_ARGV_MATCH_AWK = r'''
+BEGIN {
+  n = split("@WRAPPERS@", tmp, " "); for (i = 1; i <= n; i++) WRAP[tmp[i]] = 1
+  n = split("@WRAPPER_OPTIONS@", tmp, " "); for (i = 1; i <= n; i += 2) WOPT[tmp[i], tmp[i + 1]] = 1
+}
+{ s = (NR > 1) ? s "\n" $0 : $0 }
+END { exit !(tokenize(s) && match_segments()) }
+
+function match_segments(    i, t, nw, redirect, last) {
+  nw = 0; NI = 0; redirect = ""; last = 0
+  for (i = 1; i <= NT; i++) {
+    t = T[i]
+    if (O[i]) {
+      if (t ~ /^[<>&]+$/ && t ~ /[<>]/) {
+        if (last == i - 1 && F[last]) nw--
+        redirect = t; continue
+      }
+      if (segment_matches(nw)) return 1
+      nw = 0; NI = 0; redirect = ""
+    } else if (redirect != "") {
+      if (redirect == "<") IN[++NI] = t
+      redirect = ""
+    } else { W[++nw] = t; last = i }
+  }
+  return segment_matches(nw)
+}
+
+function normalize(w) {
+  gsub(/\/\/+/, "/", w)
+  while (index(w, "/./")) gsub(/\/\.\//, "/", w)
+  if (substr(w, 1, 2) == "./" && length(w) > 2) w = substr(w, 3)
+  if (length(w) > 1 && substr(w, length(w)) == "/") w = substr(w, 1, length(w) - 1)
+  return w
+}
+
+function is_assignment(w) { return w ~ /^[A-Za-z_][A-Za-z0-9_]*=/ }
+
+function segment_matches(nw,    i, j, k, n, w, p, prog, shorts, done, r) {
+  i = 1
+  while (i <= nw && is_assignment(W[i])) i++
+  while (i <= nw && (W[i] in WRAP)) {
+    w = W[i]; i++
+    while (i <= nw && (substr(W[i], 1, 1) == "-" || is_assignment(W[i]))) {
+      if ((w, W[i]) in WOPT) i++
+      i++
+    }
+  }
+  if (i > nw) return 0
+  prog = W[i]; sub(/.*\//, "", prog)
+  if (prog != ENVIRON["FL_PROG"]) return 0
+
+  shorts = ""; split("", L); n = 0; done = 0
+  for (j = i + 1; j <= nw; j++) {
+    w = W[j]
+    if (!done && substr(w, 1, 1) == "-" && length(w) > 1) {
+      if (w == "--") done = 1
+      else if (substr(w, 1, 2) == "--") {
+        L[w] = 1; p = index(w, "=")
+        if (p) L[substr(w, 1, p - 1)] = 1
+      } else shorts = shorts substr(w, 2)
+    } else A[++n] = normalize(w)
+  }
+  for (j = 1; j <= NI; j++) A[++n] = normalize(IN[j])
+
+  k = split(ENVIRON["FL_SHORT"], R, "\034")
+  for (j = 1; j <= k; j++) if (!index(shorts, R[j])) return 0
+  k = split(ENVIRON["FL_LONG"], R, "\034")
+  for (j = 1; j <= k; j++) if (!(R[j] in L)) return 0
+  if (ENVIRON["FL_ARGS"] == "") return 1
+  r = "^(" ENVIRON["FL_ARGS"] ")$"
+  for (j = 1; j <= n; j++) if (A[j] ~ r) return 1
+  return 0
+}
+'''
+
+ARGV_MATCH_AWK = ((_ARGV_MATCH_AWK + AWK_TOKENIZE_FUNCTION)
+                  .replace('@WRAPPERS@', ' '.join(WRAPPERS))
+                  .replace('@WRAPPER_OPTIONS@', ' '.join(
+                      f'{wrapper} {option}' for wrapper, options in WRAPPERS.items()
+                      for option in options)))
+
+# 导出脚本中参数匹配函数的名称
+ARGV_MATCH_FUNCTION_NAME = 'fakelinux_argv_match'
+
+# 导出脚本中的参数匹配函数，参数依次为程序名、短选项字符、长选项、参数正则（多个值以\034分隔）；
+# $CMD末尾追加换行，awk按行读取后再用换行拼接，得到与原命令完全相同的文本
+ARGV_MATCH_FUNCTION = (
+    f"{ARGV_MATCH_FUNCTION_NAME}() {{\n"
+    f"  printf '%s\\n' \"$CMD\" | FL_PROG=\"$1\" FL_SHORT=\"$2\" FL_LONG=\"$3\" FL_ARGS=\"$4\" "
+    f"LC_ALL=C awk '{ARGV_MATCH_AWK}'\n"
+    f"}}\n"
+)
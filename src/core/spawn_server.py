@@ -0,0 +1,366 @@
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+# 单条消息的最大长度（含环境变量），SOCK_SEQPACKET按消息收发
+MAX_MESSAGE = 1024 * 1024
+
+
+def _reply(sock: socket.socket, message: Dict[str, Any]):
+    """服务进程发送一条消息"""
+    sock.send(json.dumps(message).encode('utf-8'))
+
+
+def _serve(sock: socket.socket):
+    """
+    服务进程主循环
+
+    接收启动请求（标准输入、输出、错误的描述符随消息传入），用posix_spawn启动子进程；
+    SIGCHLD通过wakeup_fd唤醒select，回收子进程并回报退出码。
+    连接关闭（GUI进程退出）时结束所有仍在运行的子进程。
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    wakeup_read, wakeup_write = os.pipe()
+    os.set_blocking(wakeup_write, False)
+    signal.set_wakeup_fd(wakeup_write)
+    signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+    children = set()
+    env: Dict[str, str] = {}
+
+    def reap():
+        while children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            children.discard(pid)
+            _reply(sock, {'event': 'exit', 'pid': pid,
+                          'returncode': os.waitstatus_to_exitcode(status)})
+
+    while True:
+        readable, _, _ = select.select([sock, wakeup_read], [], [])
+        if wakeup_read in readable:
+            os.read(wakeup_read, 4096)
+            reap()
+        if sock not in readable:
+            continue
+
+        data, fds, _, _ = socket.recv_fds(sock, MAX_MESSAGE, 3)
+        if not data:
+            break
+        request = json.loads(data)
+        if request['op'] in ('signal', 'killpg'):
+            # 只向尚未回收的子进程（或以它为组长的进程组）发信号，pid不会被复用
+            if request['pid'] in children:
+                try:
+                    if request['op'] == 'killpg':
+                        os.killpg(request['pid'], request['signal'])
+                    else:
+                        os.kill(request['pid'], request['signal'])
+                except OSError:
+                    pass
+            continue
+
+        if 'env' in request:
+            env = request['env']
+        try:
+            for fd in fds:
+                os.set_inheritable(fd, False)
+            if os.getcwd() != request['cwd']:
+                os.chdir(request['cwd'])
+            file_actions = [(os.POSIX_SPAWN_DUP2, fd, target) for target, fd in enumerate(fds)]
+            pid = os.posix_spawnp(request['args'][0], request['args'], env,
+                                  file_actions=file_actions,
+                                  setsid=request.get('setsid', False))
+            children.add(pid)
+            _reply(sock, {'id': request['id'], 'pid': pid})
+        except (OSError, ValueError, TypeError) as e:
+            _reply(sock, {'id': request['id'], 'error': str(e),
+                          'errno': getattr(e, 'errno', None) or 0})
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    for pid in children:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+class SpawnedProcess:
+    """由SpawnServer启动的子进程，提供subprocess.Popen中常用的接口"""
+
+    def __init__(self, server: 'SpawnServer', args: Union[str, List[str]]):
+        self.server = server
+        self.args = args
+        self.pid: Optional[int] = None
+        self.returncode: Optional[int] = None
+        self.stdin = None
+        self.stdout = None
+        self.stderr = None
+        self._error: Optional[OSError] = None
+        self._started = threading.Event()
+        self._exited = threading.Event()
+
+    def _set_exit(self, returncode: int):
+        self.returncode = returncode
+        self._exited.set()
+
+    def poll(self) -> Optional[int]:
+        """子进程结束时返回退出码，否则返回None"""
+        return self.returncode
+
+    def wait(self, timeout: Optional[float] = None) -> int:
+        """等待子进程结束，超时抛出subprocess.TimeoutExpired"""
+        if not self._exited.wait(timeout):
+            raise subprocess.TimeoutExpired(self.args, timeout)
+        return self.returncode
+
+    def send_signal(self, signum: int):
+        """发送信号，子进程已结束时忽略"""
+        if self.returncode is None:
+            self.server._send({'op': 'signal', 'pid': self.pid, 'signal': int(signum)})
+
+    def send_signal_group(self, signum: int):
+        """
+        向以子进程为组长的进程组发送信号（子进程需以start_new_session启动）
+
+        由服务进程在回收子进程之前发送，避免进程组ID被复用后误杀无关进程；子进程已结束时忽略。
+        """
+        if self.returncode is None:
+            self.server._send({'op': 'killpg', 'pid': self.pid, 'signal': int(signum)})
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+
+class SpawnServer:
+    """
+    在独立的小进程中启动子进程
+
+    GUI进程加载Qt后内存占用大且有多个线程，直接fork代价高，也容易在子进程中继承锁状态。
+    start()应在导入Qt之前调用：此时fork出的服务进程很小，之后所有启动请求都通过socket
+    交给它用posix_spawn执行，GUI进程自己不再fork。
+    管道在GUI进程中创建，子进程一端的描述符通过SCM_RIGHTS传给服务进程。
+    """
+
+    def __init__(self):
+        self._sock: Optional[socket.socket] = None
+        self._pid: Optional[int] = None
+        self._send_lock = threading.Lock()
+        self._next_id = 0
+        self._sent_env: Optional[Dict[str, str]] = None
+        self._pending: Dict[int, SpawnedProcess] = {}
+        self._running: Dict[int, SpawnedProcess] = {}
+        self._state_lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+        self.alive = False
+
+    def start(self) -> bool:
+        """fork服务进程，成功返回True；平台不支持时返回False，调用方继续使用subprocess"""
+        if not hasattr(os, 'posix_spawnp') or not hasattr(socket, 'send_fds'):
+            return False
+        try:
+            parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+            pid = os.fork()
+        except OSError as e:
+            print(f"启动进程服务失败: {str(e)}")
+            return False
+
+        if pid == 0:
+            # 服务进程
+            code = 0
+            try:
+                parent_sock.close()
+                devnull = os.open(os.devnull, os.O_RDWR)
+                os.dup2(devnull, 0)
+                _serve(child_sock)
+            except BaseException:
+                code = 1
+            finally:
+                os._exit(code)
+
+        child_sock.close()
+        self._sock = parent_sock
+        self._pid = pid
+        self.alive = True
+        self._reader = threading.Thread(target=self._read_loop, name='spawn-server', daemon=True)
+        self._reader.start()
+        return True
+
+    def _send(self, message: Dict[str, Any], fds: Sequence[int] = ()):
+        """发送一条请求"""
+        data = json.dumps(message).encode('utf-8')
+        with self._send_lock:
+            if fds:
+                socket.send_fds(self._sock, [data], list(fds))
+            else:
+                self._sock.send(data)
+
+    def _read_loop(self):
+        """接收服务进程的回复和退出通知"""
+        while True:
+            try:
+                data = self._sock.recv(MAX_MESSAGE)
+            except OSError:
+                data = b''
+            if not data:
+                break
+            message = json.loads(data)
+            with self._state_lock:
+                if message.get('event') == 'exit':
+                    process = self._running.pop(message['pid'], None)
+                    if process is not None:
+                        process._set_exit(message['returncode'])
+                    continue
+                process = self._pending.pop(message['id'], None)
+                if process is None:
+                    continue
+                if 'error' in message:
+                    process._error = OSError(message['errno'], message['error'])
+                else:
+                    process.pid = message['pid']
+                    self._running[process.pid] = process
+            process._started.set()
+
+        # 服务进程退出：等待中的请求失败，运行中的子进程无法再获知状态
+        self.alive = False
+        with self._state_lock:
+            for process in self._pending.values():
+                process._error = OSError("进程服务已退出")
+                process._started.set()
+            for process in self._running.values():
+                process._set_exit(-signal.SIGKILL)
+            self._pending.clear()
+            self._running.clear()
+
+    def popen(self, args: Union[str, List[str]], shell: bool = False, bufsize: int = -1,
+              stdin: Optional[int] = None, stdout: Optional[int] = None,
+              stderr: Optional[int] = None,
+              start_new_session: bool = False) -> Union[SpawnedProcess, subprocess.Popen]:
+        """
+        启动子进程，参数与subprocess.Popen的同名参数一致
+
+        stdin/stdout/stderr支持None（继承）、subprocess.PIPE、subprocess.DEVNULL，
+        stderr还支持subprocess.STDOUT。服务进程不可用时直接使用subprocess.Popen。
+        启动失败时抛出OSError。
+        """
+        if not self.alive:
+            return subprocess.Popen(args, shell=shell, bufsize=bufsize, stdin=stdin,
+                                    stdout=stdout, stderr=stderr,
+                                    start_new_session=start_new_session)
+
+        argv = ['/bin/sh', '-c', args] if shell else list(args)
+        process = SpawnedProcess(self, args)
+        child_fds: List[int] = []
+        to_close: List[int] = []
+        parent_ends = {}
+        try:
+            for target, spec in enumerate((stdin, stdout, stderr)):
+                if spec is None:
+                    child_fds.append(target)
+                elif spec == subprocess.STDOUT and target == 2:
+                    child_fds.append(child_fds[1])
+                elif spec == subprocess.DEVNULL:
+                    fd = os.open(os.devnull, os.O_RDWR)
+                    to_close.append(fd)
+                    child_fds.append(fd)
+                elif spec == subprocess.PIPE:
+                    read_fd, write_fd = os.pipe()
+                    child_fd, parent_fd = (read_fd, write_fd) if target == 0 else (write_fd, read_fd)
+                    to_close.append(child_fd)
+                    child_fds.append(child_fd)
+                    parent_ends[target] = parent_fd
+                else:
+                    child_fds.append(spec if isinstance(spec, int) else spec.fileno())
+
+            request = {'op': 'spawn', 'args': argv, 'cwd': os.getcwd(),
+                       'setsid': start_new_session}
+            env = dict(os.environ)
+            with self._state_lock:
+                self._next_id += 1
+                request['id'] = self._next_id
+                self._pending[self._next_id] = process
+            with self._send_lock:
+                # 环境变量没有变化时不重复发送，服务进程沿用上次的；在发送锁内判断保证顺序
+                if env != self._sent_env:
+                    request['env'] = self._sent_env = env
+                socket.send_fds(self._sock, [json.dumps(request).encode('utf-8')], child_fds)
+            process._started.wait()
+        except BaseException:
+            for fd in parent_ends.values():
+                os.close(fd)
+            raise
+        finally:
+            for fd in to_close:
+                os.close(fd)
+
+        if process._error is not None:
+            for fd in parent_ends.values():
+                os.close(fd)
+            raise process._error
+
+        buffering = 0 if bufsize == 0 else -1
+        for target, fd in parent_ends.items():
+            stream = open(fd, 'wb' if target == 0 else 'rb', buffering=buffering)
+            setattr(process, ('stdin', 'stdout', 'stderr')[target], stream)
+        return process
+
+    def close(self):
+        """关闭连接，服务进程结束所有子进程后退出"""
+        if self._sock is None:
+            return
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+        if self._reader is not None:
+            self._reader.join(1)
+        try:
+            os.waitpid(self._pid, 0)
+        except ChildProcessError:
+            pass
+        self._sock = None
+        self.alive = False
+
+
+def measure_spawn_latency(popen, count: int = 200,
+                          args: Sequence[str] = ('/bin/true',)) -> Dict[str, float]:
+    """
+    测量启动延迟
+
+    Returns:
+        每次启动（popen返回）和启动到退出的平均、最大耗时（毫秒）
+    """
+    spawn_times = []
+    total_times = []
+    for _ in range(count):
+        start = time.perf_counter()
+        process = popen(list(args), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                        stderr=subprocess.DEVNULL)
+        spawned = time.perf_counter()
+        process.wait()
+        end = time.perf_counter()
+        spawn_times.append((spawned - start) * 1000)
+        total_times.append((end - start) * 1000)
+    spawn_times.sort()
+    total_times.sort()
+    return {
+        'spawn_avg_ms': sum(spawn_times) / count,
+        'spawn_p99_ms': spawn_times[int(count * 0.99) - 1],
+        'total_avg_ms': sum(total_times) / count,
+        'total_p99_ms': total_times[int(count * 0.99) - 1],
+    }
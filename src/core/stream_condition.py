@@ -0,0 +1,435 @@
+import codecs
+import os
+import re
+import shlex
+from functools import lru_cache
+from typing import List, Optional, Tuple, Union
+
+# 单行超过该长度（字符或字节）时放弃进程内判断，改为执行条件命令
+MAX_LINE_LENGTH = 1024 * 1024
+
+# 不影响退出码的grep选项（只改变输出内容）
+_OUTPUT_FLAGS = set('qscnlhH')
+_OUTPUT_LONG = {'--quiet', '--silent', '--count', '--line-number', '--files-with-matches',
+                '--no-filename', '--with-filename'}
+_MODE_FLAGS = {'E': 'extended', 'F': 'fixed', 'G': 'basic'}
+_MODE_LONG = {'--extended-regexp': 'extended', '--fixed-strings': 'fixed',
+              '--basic-regexp': 'basic'}
+_PROGRAM_MODES = {'grep': 'basic', 'egrep': 'extended', 'fgrep': 'fixed'}
+
+# 引号外出现时需要shell展开或解释的字符
+_SHELL_UNQUOTED = set('|&;<>()$`*?[]{}~#!\n')
+
+# 方括号内支持的POSIX字符类（只支持与区域设置无关的类）
+_POSIX_CLASSES = {'digit': '0-9', 'xdigit': '0-9A-Fa-f', 'space': r' \t\r\f\v',
+                  'blank': r' \t'}
+
+# 转义后含义与GNU grep一致的字符类，\s \W 排除换行，不会跨行匹配
+_ESCAPES = {'w': r'\w', 'W': r'[^\w\n]', 's': r'[^\S\n]', 'S': r'\S', 'b': r'\b', 'B': r'\B',
+            '<': r'\b(?=\w)', '>': r'\b(?<=\w)'}
+
+
+def _utf8_locale() -> bool:
+    """子进程（grep）是否在UTF-8区域设置下运行，按 LC_ALL > LC_CTYPE > LANG 的顺序判断"""
+    for name in ('LC_ALL', 'LC_CTYPE', 'LANG'):
+        value = os.environ.get(name)
+        if value:
+            return 'utf-8' in value.lower() or 'utf8' in value.lower()
+    return False
+
+
+def _is_plain(condition: str) -> bool:
+    """条件是否只是一条简单命令：没有管道、重定向、变量、命令替换和引号外的通配符"""
+    quote = None
+    escaped = False
+    for char in condition:
+        if escaped:
+            escaped = False
+        elif quote == "'":
+            if char == "'":
+                quote = None
+        elif quote == '"':
+            if char in '$`':
+                return False
+            if char == '\\':
+                escaped = True
+            elif char == '"':
+                quote = None
+        elif char == '\\':
+            escaped = True
+        elif char in '\'"':
+            quote = char
+        elif char in _SHELL_UNQUOTED:
+            return False
+    return quote is None and not escaped
+
+
+def _parse_grep(args: List[str]) -> Optional[Tuple[List[str], str, bool, bool, bool, bool]]:
+    """
+    解析grep参数
+
+    Returns:
+        (模式列表, 语法, 忽略大小写, 反向匹配, 整词匹配, 整行匹配)，
+        有不支持的选项或从文件读取时返回None
+    """
+    program = os.path.basename(args[0])
+    if program not in _PROGRAM_MODES:
+        return None
+    mode = _PROGRAM_MODES[program]
+    patterns: List[str] = []
+    operands: List[str] = []
+    ignore_case = invert = word = line = False
+
+    index = 1
+    options_done = False
+    while index < len(args):
+        arg = args[index]
+        index += 1
+        if options_done or arg == '-' or not arg.startswith('-'):
+            operands.append(arg)
+            continue
+        if arg == '--':
+            options_done = True
+            continue
+
+        if arg.startswith('--'):
+            name, separator, value = arg.partition('=')
+            if name in _OUTPUT_LONG:
+                continue
+            if name in _MODE_LONG:
+                mode = _MODE_LONG[name]
+            elif name == '--ignore-case':
+                ignore_case = True
+            elif name == '--no-ignore-case':
+                ignore_case = False
+            elif name == '--invert-match':
+                invert = True
+            elif name == '--word-regexp':
+                word = True
+            elif name == '--line-regexp':
+                line = True
+            elif name == '--regexp':
+                if not separator:
+                    if index >= len(args):
+                        return None
+                    value = args[index]
+                    index += 1
+                patterns.append(value)
+            else:
+                return None
+            continue
+
+        letters = arg[1:]
+        while letters:
+            letter, letters = letters[0], letters[1:]
+            if letter in _OUTPUT_FLAGS:
+                continue
+            if letter in _MODE_FLAGS:
+                mode = _MODE_FLAGS[letter]
+            elif letter in 'iy':
+                ignore_case = True
+            elif letter == 'v':
+                invert = True
+            elif letter == 'w':
+                word = True
+            elif letter == 'x':
+                line = True
+            elif letter == 'e':
+                if not letters:
+                    if index >= len(args):
+                        return None
+                    letters = args[index]
+                    index += 1
+                patterns.append(letters)
+                letters = ''
+            else:
+                return None
+
+    if not patterns:
+        if not operands:
+            return None
+        patterns.append(operands.pop(0))
+    # 只支持从标准输入读取
+    if any(operand != '-' for operand in operands):
+        return None
+    # 模式中的换行分隔多个模式
+    split = [part for pattern in patterns for part in pattern.split('\n')]
+    return split, mode, ignore_case, invert, word, line
+
+
+def _translate_bracket(pattern: str, start: int) -> Optional[Tuple[str, int]]:
+    """转换从start处 '[' 开始的方括号表达式，返回 (Python表示, 结束位置之后的下标)"""
+    index = start + 1
+    negate = index < len(pattern) and pattern[index] == '^'
+    if negate:
+        index += 1
+    members = []
+    first = True
+    while index < len(pattern):
+        char = pattern[index]
+        if char == ']' and not first:
+            body = ''.join(members)
+            # 取反的集合不匹配换行，和grep逐行匹配一致
+            return ('[^' + body + r'\n]' if negate else '[' + body + ']'), index + 1
+        first = False
+        if pattern.startswith('[:', index):
+            end = pattern.find(':]', index + 2)
+            if end < 0 or pattern[index + 2:end] not in _POSIX_CLASSES:
+                return None
+            members.append(_POSIX_CLASSES[pattern[index + 2:end]])
+            index = end + 2
+            continue
+        if pattern.startswith('[=', index) or pattern.startswith('[.', index):
+            return None
+        if char == '-' and members and index + 1 < len(pattern) and pattern[index + 1] != ']':
+            members.append('-')
+        else:
+            members.append('\\' + char if char in '\\[]^-' else char)
+        index += 1
+    return None
+
+
+def _translate(pattern: str, extended: bool) -> Optional[str]:
+    """把BRE/ERE模式转换为等价的Python正则，遇到不支持或含义不确定的结构时返回None"""
+    out: List[str] = []
+    index = 0
+    length = len(pattern)
+    # 上一项的类型：'start'（模式、分组或分支开头）、'atom'、'anchor'、'repeat'。
+    # 重复只能跟在原子之后，叠加重复或重复断言时grep与Python的含义不同
+    prev = 'start'
+    # BRE中位于开头（可以在 ^ 之后）的 * 是普通字符
+    leading = True
+
+    def repeat(text: str) -> bool:
+        nonlocal prev
+        if prev != 'atom':
+            return False
+        out.append(text)
+        prev = 'repeat'
+        return True
+
+    while index < length:
+        char = pattern[index]
+        was_leading = leading
+        leading = False
+
+        if char == '\\':
+            if index + 1 >= length:
+                return None
+            escaped = pattern[index + 1]
+            index += 2
+            if not extended and escaped in '(|':
+                out.append(escaped)
+                prev = 'start'
+                leading = True
+            elif not extended and escaped == ')':
+                out.append(')')
+                prev = 'atom'
+            elif not extended and escaped in '+?':
+                if not repeat(escaped):
+                    return None
+            elif not extended and escaped == '{':
+                end = pattern.find('\\}', index)
+                if end < 0 or not re.fullmatch(r'\d+(,\d*)?', pattern[index:end]):
+                    return None
+                if not repeat('{' + pattern[index:end] + '}'):
+                    return None
+                index = end + 2
+            elif escaped in _ESCAPES:
+                out.append(_ESCAPES[escaped])
+                prev = 'atom' if escaped in 'wWsS' else 'anchor'
+            elif escaped.isdigit() and escaped != '0':
+                out.append('\\' + escaped)
+                prev = 'atom'
+            elif escaped.isalnum() or escaped == '\n':
+                return None
+            else:
+                out.append(re.escape(escaped))
+                prev = 'atom'
+            continue
+
+        if char == '[':
+            bracket = _translate_bracket(pattern, index)
+            if bracket is None:
+                return None
+            text, index = bracket
+            out.append(text)
+            prev = 'atom'
+            continue
+
+        index += 1
+        if char == '*':
+            if not extended and was_leading:
+                out.append(r'\*')
+                prev = 'atom'
+            elif not repeat('*'):
+                return None
+        elif char == '^' and (extended or was_leading):
+            out.append('^')
+            prev = 'anchor'
+            leading = not extended
+        elif char == '$' and (extended or index == length
+                              or pattern.startswith(('\\)', '\\|'), index)):
+            out.append('$')
+            prev = 'anchor'
+        elif extended and char in '(|':
+            out.append(char)
+            prev = 'start'
+        elif extended and char == ')':
+            out.append(')')
+            prev = 'atom'
+        elif extended and char in '+?':
+            if not repeat(char):
+                return None
+        elif extended and char == '{':
+            end = pattern.find('}', index)
+            if end < 0 or not re.fullmatch(r'\d+(,\d*)?', pattern[index:end]):
+                return None
+            if not repeat('{' + pattern[index:end] + '}'):
+                return None
+            index = end + 1
+        elif char == '.':
+            out.append('.')
+            prev = 'atom'
+        else:
+            out.append(re.escape(char))
+            prev = 'atom'
+    return ''.join(out)
+
+
+class ConditionScanner:
+    """
+    条件的单次流式判断
+
+    按块输入命令输出，只在完整的行上搜索，不完整的最后一行留到下一块拼接。
+    匹配后feed立即返回True，调用方不必读完输出；单行超过MAX_LINE_LENGTH时overflow为True，
+    此后不再判断，调用方需要改为执行条件命令。
+    """
+
+    def __init__(self, predicate: 'StreamCondition'):
+        self.predicate = predicate
+        self._decoder = (codecs.getincrementaldecoder('utf-8')('surrogateescape')
+                         if predicate.text else None)
+        self._newline: Union[str, bytes] = '\n' if predicate.text else b'\n'
+        self._carry: List[Union[str, bytes]] = []
+        self._carry_length = 0
+        self.matched = False
+        self.overflow = False
+        self.bytes_scanned = 0
+
+    def _search(self, text: Union[str, bytes]) -> bool:
+        """在若干完整行中搜索"""
+        if self.predicate.regex.search(text):
+            self.matched = True
+        return self.matched
+
+    def feed(self, chunk: bytes) -> bool:
+        """输入一块输出，返回是否已经满足条件"""
+        if self.matched or self.overflow:
+            return self.matched
+        self.bytes_scanned += len(chunk)
+        data = self._decoder.decode(chunk) if self._decoder is not None else chunk
+        end = data.rfind(self._newline)
+        if end < 0:
+            self._carry.append(data)
+            self._carry_length += len(data)
+            if self._carry_length > MAX_LINE_LENGTH:
+                self.overflow = True
+                self._carry = []
+            return False
+
+        self._carry.append(data[:end])
+        lines = data[:0].join(self._carry)
+        self._carry = [data[end + 1:]]
+        self._carry_length = len(self._carry[0])
+        return self._search(lines)
+
+    def finish(self) -> bool:
+        """输出结束，判断最后一行（没有换行结尾时）并返回结果"""
+        if self.matched or self.overflow:
+            return self.matched
+        if self._decoder is not None:
+            self._carry.append(self._decoder.decode(b'', final=True))
+        tail = self._newline[:0].join(self._carry)
+        self._carry = []
+        return bool(tail) and self._search(tail)
+
+
+class StreamCondition:
+    """可以在进程内判断的条件（grep的等价正则）"""
+
+    def __init__(self, condition: str, regex: 're.Pattern', text: bool):
+        """
+        Args:
+            condition: 原始条件命令
+            regex: 在多行文本上搜索的正则，匹配表示条件满足
+            text: 为True时按UTF-8解码后匹配，否则直接匹配字节（C区域设置）
+        """
+        self.condition = condition
+        self.regex = regex
+        self.text = text
+
+    def scanner(self) -> ConditionScanner:
+        """创建一次判断的扫描状态"""
+        return ConditionScanner(self)
+
+    def evaluate(self, output: Union[str, bytes]) -> bool:
+        """判断完整输出"""
+        scanner = self.scanner()
+        scanner.feed(output.encode('utf-8') if isinstance(output, str) else output)
+        return scanner.finish()
+
+
+@lru_cache(maxsize=256)
+def _compile(condition: str, utf8: bool) -> Optional[StreamCondition]:
+    """解析条件（带缓存）"""
+    if not _is_plain(condition):
+        return None
+    try:
+        args = shlex.split(condition)
+    except ValueError:
+        return None
+    if not args:
+        return None
+    parsed = _parse_grep(args)
+    if parsed is None:
+        return None
+    patterns, mode, ignore_case, invert, word, line = parsed
+
+    parts = []
+    for pattern in patterns:
+        if not utf8 and not pattern.isascii():
+            return None
+        if mode == 'fixed':
+            translated = re.escape(pattern)
+        else:
+            translated = _translate(pattern, mode == 'extended')
+            if translated is None:
+                return None
+        if line:
+            translated = f'^(?:{translated})$'
+        elif word:
+            translated = rf'(?<!\w)(?:{translated})(?!\w)'
+        parts.append(f'(?:{translated})')
+    regex = '|'.join(parts)
+    if invert:
+        # 存在不匹配的行：行首之后整行都找不到匹配
+        regex = f'^(?!.*(?:{regex}))'
+
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    try:
+        compiled = re.compile(regex if utf8 else regex.encode('ascii'), flags)
+    except (re.error, RecursionError):
+        return None
+    return StreamCondition(condition, compiled, utf8)
+
+
+def compile_condition(condition: str) -> Optional[StreamCondition]:
+    """
+    把条件命令转换为进程内的流式判断
+
+    支持从标准输入读取的grep/egrep/fgrep（-E -F -G -i -v -w -x -e 及只影响输出的选项），
+    BRE/ERE转换为等价的Python正则；其他命令、shell语法或无法确定等价的模式返回None，
+    调用方继续执行条件命令。
+    """
+    return _compile(condition, _utf8_locale())
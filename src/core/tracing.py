@@ -0,0 +1,242 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+
+
+class Span:
+    """追踪中的一个时间区间，可以嵌套子区间"""
+
+    __slots__ = ('name', 'category', 'start_ns', 'end_ns', 'args', 'children')
+
+    def __init__(self, name: str, category: str, start_ns: int,
+                 end_ns: Optional[int] = None, args: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.category = category
+        self.start_ns = start_ns
+        self.end_ns = end_ns
+        self.args = args or {}
+        self.children: List['Span'] = []
+
+    @property
+    def duration_ns(self) -> int:
+        """区间耗时（纳秒），未结束时为0"""
+        return (self.end_ns - self.start_ns) if self.end_ns is not None else 0
+
+    def walk(self, depth: int = 0):
+        """深度优先遍历，生成 (深度, 区间)"""
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'name': self.name,
+            'category': self.category,
+            'duration_ms': self.duration_ns / 1e6,
+            'args': self.args,
+            'children': [child.to_dict() for child in self.children],
+        }
+
+
+class _SpanScope:
+    """区间上下文，退出时结束区间"""
+
+    __slots__ = ('trace', 'span')
+
+    def __init__(self, trace: 'TraceContext', span: Span):
+        self.trace = trace
+        self.span = span
+
+    def __enter__(self) -> Span:
+        return self.span
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.span.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.span.args.setdefault('error', exc_type.__name__)
+        self.trace._stack.pop()
+        return False
+
+
+class TraceContext:
+    """
+    单条命令的追踪上下文
+
+    以命令为根区间记录区间树，结束时交给追踪输出处理。
+    只在创建它的线程中使用。
+    """
+
+    enabled = True
+
+    def __init__(self, command: str, sink: Optional['TraceSink'] = None):
+        self.command = command
+        self.sink = sink
+        self.thread_id = threading.get_ident()
+        self.root = Span('command', 'command', time.perf_counter_ns(), args={'command': command})
+        self._stack: List[Span] = [self.root]
+
+    @property
+    def current(self) -> Span:
+        """当前所在的区间"""
+        return self._stack[-1]
+
+    def span(self, name: str, category: str, **args) -> _SpanScope:
+        """开始一个子区间，用法: with trace.span('filter', 'stage'): ..."""
+        span = Span(name, category, time.perf_counter_ns(), args=args)
+        self.current.children.append(span)
+        self._stack.append(span)
+        return _SpanScope(self, span)
+
+    def add_span(self, name: str, category: str, start_ns: int, end_ns: int, **args) -> Span:
+        """添加一个已经结束的子区间"""
+        span = Span(name, category, start_ns, end_ns, args)
+        self.current.children.append(span)
+        return span
+
+    def event(self, name: str, **args):
+        """在当前区间中记录瞬时事件"""
+        now = time.perf_counter_ns()
+        self.add_span(name, 'event', now, now, **args)
+
+    def annotate(self, **args):
+        """给当前区间添加参数"""
+        self.current.args.update(args)
+
+    def finish(self):
+        """结束追踪并输出"""
+        if self.root.end_ns is None:
+            self.root.end_ns = time.perf_counter_ns()
+        if self.sink is not None:
+            try:
+                self.sink.emit(self)
+            except Exception as e:
+                print(f"输出追踪失败: {str(e)}")
+
+
+class _NullScope:
+    """不记录的区间上下文"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class NullTrace:
+    """
+    不记录任何内容的追踪上下文
+
+    接口与TraceContext相同，未设置追踪输出时代替它，使处理流程不必区分是否追踪。
+    """
+
+    __slots__ = ()
+
+    enabled = False
+    current = None
+    _scope = _NullScope()
+
+    def span(self, name: str, category: str, **args) -> _NullScope:
+        return self._scope
+
+    def add_span(self, name: str, category: str, start_ns: int, end_ns: int, **args) -> None:
+        return None
+
+    def event(self, name: str, **args):
+        pass
+
+    def annotate(self, **args):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class TraceSink:
+    """追踪输出接口，子类实现emit处理每条命令的追踪结果"""
+
+    def emit(self, trace: TraceContext):
+        """处理一条命令的追踪结果"""
+        raise NotImplementedError
+
+    def close(self):
+        """关闭输出"""
+        pass
+
+
+class CallbackSink(TraceSink):
+    """把追踪结果交给回调函数处理"""
+
+    def __init__(self, callback: Callable[[TraceContext], None]):
+        self.callback = callback
+
+    def emit(self, trace: TraceContext):
+        self.callback(trace)
+
+
+class ChromeTraceSink(TraceSink):
+    """
+    以Chrome trace-event JSON格式写入文件
+
+    生成的文件可以在 chrome://tracing 或 Perfetto 中打开。
+    事件逐条追加写入，close时补全数组结尾。
+    """
+
+    def __init__(self, file_path: Union[str, Path]):
+        self.file_path = Path(file_path)
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._first = True
+        self._file = open(self.file_path, 'w', encoding='utf-8')
+        self._file.write('[\n')
+
+    @staticmethod
+    def _to_event(span: Span, pid: int, tid: int) -> Dict[str, Any]:
+        """把区间转换为trace-event"""
+        event = {
+            'name': span.name,
+            'cat': span.category,
+            'ts': span.start_ns / 1000.0,
+            'pid': pid,
+            'tid': tid,
+            'args': span.args,
+        }
+        if span.category == 'event':
+            event['ph'] = 'i'
+            event['s'] = 't'
+        else:
+            event['ph'] = 'X'
+            event['dur'] = span.duration_ns / 1000.0
+        return event
+
+    def emit(self, trace: TraceContext):
+        lines = [
+            json.dumps(self._to_event(span, self._pid, trace.thread_id),
+                       ensure_ascii=False, default=str)
+            for _, span in trace.root.walk()
+        ]
+        with self._lock:
+            if self._file is None:
+                return
+            for line in lines:
+                if not self._first:
+                    self._file.write(',\n')
+                self._file.write(line)
+                self._first = False
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.write('\n]\n')
+                self._file.close()
+                self._file = None
@@ -2,7 +2,7 @@ import os
 import sys
 from pathlib import Path
 
-from PySide6.QtCore import Qt, QSize
+from PySide6.QtCore import Qt, QSize, Signal
 from PySide6.QtGui import QIcon, QAction
 from PySide6.QtWidgets import (
     QMainWindow, QTabWidget, QVBoxLayout, QHBoxLayout, QWidget, 
@@ -12,14 +12,23 @@ from PySide6.QtWidgets import (
 
 from ..core.rule_manager import RuleManager
 from ..core.mock_engine import MockEngine
+from ..core.rule_optimizer import HitStats, apply_plan, plan_reorder
+from ..core.rule_reloader import RuleReloader
+from ..core.spawn_server import SpawnServer
 from .rule_editor import RuleEditorWidget
 from .rule_list import RuleListWidget
 
+# 界面中预览的命令输出上限（字节），超出部分截断，避免大输出占满内存或卡住文本框
+PREVIEW_MAX_BYTES = 4 * 1024 * 1024
+
 
 class MainWindow(QMainWindow):
     """应用程序主窗口"""
     
-    def __init__(self):
+    # 规则文件被热加载，参数为变更统计；由监视线程发出，排队到GUI线程处理
+    rules_reloaded = Signal(dict)
+    
+    def __init__(self, spawn_server: SpawnServer = None):
         super().__init__()
         
         # 设置窗口属性
@@ -28,14 +37,25 @@ class MainWindow(QMainWindow):
         
         # 初始化规则管理器
         self.rule_manager = RuleManager()
-        self.mock_engine = MockEngine(self.rule_manager)
+        # 有进程服务时所有子进程都由它启动，GUI进程自己不fork
+        popen = spawn_server.popen if spawn_server is not None else None
+        self.mock_engine = MockEngine(self.rule_manager, popen=popen,
+                                      capture_max_bytes=PREVIEW_MAX_BYTES)
+        if popen is not None:
+            self.rule_manager.regex_guard.popen = popen
+        self.rule_reloader = None
         
         # 加载默认规则
-        self._load_default_rules()
+        rules_path = self._load_default_rules()
         
         # 设置UI组件
         self._setup_ui()
         
+        # 监视已加载的规则文件，外部修改后自动重新加载
+        self.rules_reloaded.connect(self._handle_rules_reloaded, Qt.QueuedConnection)
+        if rules_path is not None:
+            self._watch_rules(rules_path)
+        
         # 加载样式表
         self._load_stylesheet()
     
@@ -69,6 +89,7 @@ class MainWindow(QMainWindow):
         self.rule_list_widget.rule_selected.connect(self._handle_rule_selected)
         self.rule_list_widget.rule_added.connect(self._handle_rule_added)
         self.rule_editor_widget.rule_saved.connect(self._handle_rule_saved)
+        self.tab_widget.currentChanged.connect(self._handle_tab_changed)
         
         # 创建菜单栏
         self._create_menu_bar()
@@ -98,6 +119,11 @@ class MainWindow(QMainWindow):
         open_action.triggered.connect(self._open_config)
         file_menu.addAction(open_action)
         
+        # 导入规则
+        import_action = QAction("导入规则", self)
+        import_action.triggered.connect(self._import_rules)
+        file_menu.addAction(import_action)
+        
         # 保存配置
         save_action = QAction("保存配置", self)
         save_action.setShortcut("Ctrl+S")
@@ -139,6 +165,13 @@ class MainWindow(QMainWindow):
         duplicate_action.triggered.connect(self._duplicate_rule)
         edit_menu.addAction(duplicate_action)
         
+        edit_menu.addSeparator()
+        
+        # 按命中频率优化规则顺序
+        optimize_action = QAction("按命中频率优化顺序", self)
+        optimize_action.triggered.connect(self._optimize_rule_order)
+        edit_menu.addAction(optimize_action)
+        
         # 帮助菜单
         help_menu = self.menuBar().addMenu("帮助")
         
@@ -249,9 +282,40 @@ class MainWindow(QMainWindow):
             rules_path = base_dir / "config" / "default_rules.json"
             
             # 加载规则
-            self.rule_manager.load_rules(rules_path)
+            if self.rule_manager.load_rules(rules_path):
+                return rules_path
         except Exception as e:
             QMessageBox.warning(self, "加载失败", f"加载默认规则失败: {str(e)}")
+        return None
+    
+    def _watch_rules(self, file_path):
+        """改为监视指定的规则文件"""
+        if self.rule_reloader is not None:
+            self.rule_reloader.stop()
+        # 回调在监视线程中执行，只发出信号，不直接操作界面
+        self.rule_reloader = RuleReloader(self.rule_manager, [file_path],
+                                          on_reload=self.rules_reloaded.emit)
+        self.rule_reloader.start()
+    
+    def _handle_rules_reloaded(self, stats):
+        """处理规则文件热加载事件（在GUI线程中执行）"""
+        # 更新规则列表
+        self.rule_list_widget.refresh()
+        
+        # 正在编辑的规则已被删除时清空编辑器，未保存的修改不会写回不存在的规则
+        current_rule_id = self.rule_editor_widget.current_rule_id
+        if current_rule_id and self.rule_manager.get_rule(current_rule_id) is None:
+            self.rule_editor_widget.clear()
+        
+        # 显示状态消息
+        self.status_bar.showMessage(
+            f"规则文件已重新加载: 新增 {stats['added']}，删除 {stats['removed']}，"
+            f"修改 {stats['changed']}", 3000)
+    
+    def _handle_tab_changed(self, index):
+        """切换到规则列表时刷新，显示匹配期间新隔离的规则"""
+        if self.tab_widget.widget(index) is self.rule_list_widget:
+            self.rule_list_widget.refresh()
     
     def _handle_rule_selected(self, rule_id):
         """处理选择规则事件"""
@@ -301,10 +365,42 @@ class MainWindow(QMainWindow):
                 # 清空编辑器
                 self.rule_editor_widget.clear()
                 
+                # 改为监视新打开的文件
+                self._watch_rules(file_path)
+                
                 # 显示状态消息
                 self.status_bar.showMessage(f"已加载配置: {file_path}", 3000)
             else:
-                QMessageBox.warning(self, "加载失败", "无法加载配置文件")
+                self._show_validation_errors("加载失败", "无法加载配置文件")
+    
+    def _import_rules(self):
+        """从规则文件批量导入规则"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "导入规则", "", "JSON文件 (*.json)"
+        )
+        
+        if file_path:
+            rule_count = len(self.rule_manager.rules)
+            if self.rule_manager.import_rules(file_path):
+                # 刷新规则列表
+                self.rule_list_widget.refresh()
+                
+                # 显示状态消息
+                imported = len(self.rule_manager.rules) - rule_count
+                self.status_bar.showMessage(f"已导入 {imported} 条规则: {file_path}", 3000)
+            else:
+                self._show_validation_errors("导入失败", "规则文件校验失败，未导入任何规则")
+    
+    def _show_validation_errors(self, title, message):
+        """显示最近一次加载/导入的校验错误"""
+        errors = self.rule_manager.last_errors
+        if errors:
+            # 错误过多时只显示前若干条
+            details = "\n".join(str(issue) for issue in errors[:20])
+            if len(errors) > 20:
+                details += f"\n... 共 {len(errors)} 个错误"
+            message = f"{message}\n\n{details}"
+        QMessageBox.warning(self, title, message)
     
     def _save_config(self):
         """保存配置文件"""
@@ -337,7 +433,9 @@ class MainWindow(QMainWindow):
                     "您可以将此脚本复制到目标系统使用。"
                 )
             else:
-                QMessageBox.warning(self, "导出失败", "无法导出脚本")
+                problems = self.rule_manager.check_export()
+                detail = "\n".join(problems) if problems else "无法导出脚本"
+                QMessageBox.warning(self, "导出失败", detail)
     
     def _delete_rule(self):
         """删除规则"""
@@ -375,8 +473,8 @@ class MainWindow(QMainWindow):
         # 获取规则
         rule = self.rule_manager.get_rule(rule_id)
         if rule:
-            # 切换启用状态
-            rule.enabled = not rule.enabled
+            # 切换启用状态（通过规则管理器发布新快照）
+            self.rule_manager.set_rule_enabled(rule_id, not rule.enabled)
             
             # 刷新规则列表
             self.rule_list_widget.refresh()
@@ -399,19 +497,9 @@ class MainWindow(QMainWindow):
         # 获取规则
         rule = self.rule_manager.get_rule(rule_id)
         if rule:
-            # 创建新规则
-            new_rule = type(rule)(
-                0,  # 新ID会在添加时自动分配
-                f"{rule.name} (复制)",
-                rule.description,
-                rule.pattern,
-                rule.action,
-                rule.enabled,
-                output=rule.output,
-                script=rule.script,
-                filter=rule.filter,
-                condition=rule.condition
-            )
+            # 创建新规则，经过字典复制全部字段（缓存、资源限制等），新ID会在添加时自动分配
+            new_rule = type(rule).from_dict({**rule.to_dict(), 'id': 0,
+                                             'name': f"{rule.name} (复制)"})
             
             # 添加新规则
             new_id = self.rule_manager.add_rule(new_rule)
@@ -428,6 +516,40 @@ class MainWindow(QMainWindow):
             # 显示状态消息
             self.status_bar.showMessage("规则已复制", 3000)
     
+    def _optimize_rule_order(self):
+        """根据命令日志中的命中频率调整规则顺序"""
+        file_path, _ = QFileDialog.getOpenFileName(
+            self, "选择命令日志", self.rule_manager.config.get_log_path(), "日志文件 (*.log);;所有文件 (*)"
+        )
+        if not file_path:
+            return
+        
+        try:
+            stats = HitStats.from_log(self.rule_manager.snapshot, file_path)
+        except Exception as e:
+            QMessageBox.warning(self, "读取失败", f"读取命令日志失败: {str(e)}")
+            return
+        
+        plan = plan_reorder(self.rule_manager.snapshot.rules, stats)
+        if not plan.changed:
+            QMessageBox.information(self, "优化规则顺序", plan.describe())
+            return
+        
+        reply = QMessageBox.question(
+            self, "优化规则顺序",
+            f"根据 {stats.total} 条命令的统计：\n{plan.describe()}\n\n是否应用新的顺序？",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        
+        if apply_plan(self.rule_manager, plan):
+            self.rule_list_widget.refresh()
+            self.status_bar.showMessage("规则顺序已优化", 3000)
+        else:
+            QMessageBox.warning(self, "优化失败", "规则在统计期间发生了变化，请重新执行")
+    
     def _show_about(self):
         """显示关于对话框"""
         QMessageBox.about(
@@ -462,3 +584,8 @@ class MainWindow(QMainWindow):
                 event.ignore()
         else:
             event.accept()
+        
+        # 退出时停止监视线程
+        if event.isAccepted() and self.rule_reloader is not None:
+            self.rule_reloader.stop()
+            self.rule_reloader = None
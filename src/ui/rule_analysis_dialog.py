@@ -0,0 +1,145 @@
+from PySide6.QtCore import Qt
+from PySide6.QtGui import QColor
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton,
+    QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox
+)
+
+from ..core.rule_manager import RuleManager
+from ..core.rule_analyzer import (
+    RuleAnalysis, analyze_rules, prunable_rule_ids, suggest_order
+)
+
+
+# 各分析结果在列表中显示的文字和颜色
+ANALYSIS_DISPLAY = {
+    RuleAnalysis.DEAD: ("无法触发", QColor("#f8d7da")),
+    RuleAnalysis.LIKELY_DEAD: ("可能无法触发", QColor("#fff3cd")),
+    RuleAnalysis.UNKNOWN: ("无法判定", None),
+    RuleAnalysis.INVALID: ("模式无效", QColor("#f8d7da")),
+}
+
+
+def analysis_label(analysis: RuleAnalysis) -> str:
+    """分析结果的简短标签"""
+    if analysis.is_dead and analysis.redundant:
+        return "冗余"
+    text, _ = ANALYSIS_DISPLAY.get(analysis.status, ("", None))
+    return text
+
+
+class RuleAnalysisDialog(QDialog):
+    """规则遮蔽分析对话框，列出无法触发的规则并提供删除和调整顺序操作"""
+
+    def __init__(self, rule_manager: RuleManager, parent=None):
+        super().__init__(parent)
+
+        self.rule_manager = rule_manager
+        self.analyses = []
+
+        self.setWindowTitle("规则分析")
+        self.setMinimumSize(700, 400)
+
+        self._setup_ui()
+        self.run_analysis()
+
+    def _setup_ui(self):
+        """设置UI组件"""
+        layout = QVBoxLayout(self)
+
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        # 分析结果表格
+        self.table = QTableWidget()
+        self.table.setColumnCount(3)
+        self.table.setHorizontalHeaderLabels(["ID", "名称", "分析结果"])
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        # 按钮区域
+        button_layout = QHBoxLayout()
+
+        self.prune_button = QPushButton("删除无法触发的规则")
+        self.prune_button.clicked.connect(self._prune_rules)
+        button_layout.addWidget(self.prune_button)
+
+        self.reorder_button = QPushButton("按建议调整顺序")
+        self.reorder_button.clicked.connect(self._reorder_rules)
+        button_layout.addWidget(self.reorder_button)
+
+        close_button = QPushButton("关闭")
+        close_button.clicked.connect(self.accept)
+        button_layout.addWidget(close_button)
+
+        button_layout.setAlignment(Qt.AlignRight)
+        layout.addLayout(button_layout)
+
+    def run_analysis(self):
+        """分析当前规则快照并刷新表格"""
+        snapshot = self.rule_manager.snapshot
+        self.analyses = analyze_rules(snapshot.rules)
+
+        self.table.setRowCount(0)
+        for i, (rule, analysis) in enumerate(zip(snapshot.rules, self.analyses)):
+            self.table.insertRow(i)
+            self.table.setItem(i, 0, QTableWidgetItem(str(rule.id)))
+            self.table.setItem(i, 1, QTableWidgetItem(rule.name))
+            self.table.setItem(i, 2, QTableWidgetItem(analysis.describe()))
+
+            _, color = ANALYSIS_DISPLAY.get(analysis.status, ("", None))
+            if color is not None:
+                for column in range(3):
+                    self.table.item(i, column).setBackground(color)
+
+        dead = prunable_rule_ids(self.analyses)
+        likely = [a for a in self.analyses if a.status == RuleAnalysis.LIKELY_DEAD]
+        self.summary_label.setText(
+            f"共 {len(self.analyses)} 条规则，{len(dead)} 条已证明无法触发，"
+            f"{len(likely)} 条可能无法触发"
+        )
+
+        self.prune_button.setEnabled(bool(dead))
+        order = suggest_order(snapshot.rules, self.analyses)
+        self.reorder_button.setEnabled(order != [rule.id for rule in snapshot.rules])
+
+    def _prune_rules(self):
+        """删除已证明无法触发的规则"""
+        rule_ids = prunable_rule_ids(self.analyses)
+        if not rule_ids:
+            return
+
+        reply = QMessageBox.question(
+            self, "确认删除",
+            f"将删除 {len(rule_ids)} 条永远不会触发的规则（ID: "
+            f"{', '.join(str(rule_id) for rule_id in rule_ids)}），"
+            "删除后命令处理结果不变。确定继续吗？",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+        for rule_id in rule_ids:
+            self.rule_manager.delete_rule(rule_id)
+        self.run_analysis()
+
+    def _reorder_rules(self):
+        """把被遮蔽的规则移动到遮蔽它的规则之前"""
+        reply = QMessageBox.question(
+            self, "确认调整",
+            "调整顺序后，被遮蔽的规则将优先于遮蔽它的规则匹配，"
+            "同时匹配两条规则的命令处理结果会改变。确定继续吗？",
+            QMessageBox.Yes | QMessageBox.No,
+            QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+
+        order = suggest_order(self.rule_manager.snapshot.rules, self.analyses)
+        self.rule_manager.reorder_rules(order)
+        self.run_analysis()
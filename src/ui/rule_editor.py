@@ -1,7 +1,7 @@
 from PySide6.QtCore import Signal, Qt
 from PySide6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QFormLayout,
-    QLineEdit, QTextEdit, QComboBox, QCheckBox,
+    QLineEdit, QTextEdit, QComboBox, QCheckBox, QDoubleSpinBox, QSpinBox,
     QPushButton, QTabWidget, QLabel, QGroupBox,
     QMessageBox, QListWidget, QListWidgetItem, QMenu, QToolButton,
     QGridLayout, QSplitter
@@ -10,7 +10,9 @@ from PySide6.QtGui import QAction
 
 from .visual_rule_editor import VisualRuleEditorDialog
 
-from ..core.rule_manager import Rule, RuleManager
+from ..core.rule_manager import DEFAULT_CACHE_TTL, Rule, RuleManager
+from ..core.rule_schema import MATCH_MODES, MATCH_REGEX, check_metadata, check_pattern
+from ..core.regex_guard import RegexIssue, check_regex_complexity
 from ..core.mock_engine import MockEngine
 
 
@@ -49,6 +51,16 @@ class RuleEditorWidget(QWidget):
         self.desc_edit.setPlaceholderText("输入规则描述...")
         form_layout.addRow("规则描述:", self.desc_edit)
         
+        # 匹配方式
+        self.match_mode_combo = QComboBox()
+        self.match_mode_combo.addItems(["正则表达式", "命令参数"])
+        self.match_mode_combo.setToolTip(
+            "正则表达式: 匹配原始命令文本\n"
+            "命令参数: 模式写成一条命令（如 cat /etc/login.defs），按程序名、选项和路径参数匹配，\n"
+            "不受空格、引号和程序路径写法的影响，参数支持 * 和 ? 通配符")
+        self.match_mode_combo.currentIndexChanged.connect(self._handle_match_mode_changed)
+        form_layout.addRow("匹配方式:", self.match_mode_combo)
+        
         # 匹配模式 布局
         pattern_layout = QHBoxLayout()
         
@@ -58,12 +70,12 @@ class RuleEditorWidget(QWidget):
         pattern_layout.addWidget(self.pattern_edit)
         
         # 可视化编辑按钮
-        visual_edit_button = QPushButton("可视化编辑")
-        visual_edit_button.clicked.connect(self._open_visual_editor)
-        pattern_layout.addWidget(visual_edit_button)
+        self.visual_edit_button = QPushButton("可视化编辑")
+        self.visual_edit_button.clicked.connect(self._open_visual_editor)
+        pattern_layout.addWidget(self.visual_edit_button)
         
         # 匹配模式帮助按钮
-        pattern_help_button = QToolButton()
+        self.pattern_help_button = pattern_help_button = QToolButton()
         pattern_help_button.setText("帮助")
         pattern_help_button.setPopupMode(QToolButton.InstantPopup)
         pattern_menu = QMenu()
@@ -112,7 +124,7 @@ class RuleEditorWidget(QWidget):
         
         # 动作类型
         self.action_combo = QComboBox()
-        self.action_combo.addItems(["替换输出", "自定义脚本", "过滤输出", "返回空"])
+        self.action_combo.addItems(["替换输出", "自定义脚本", "过滤输出", "返回空", "伪装文件属性"])
         self.action_combo.currentIndexChanged.connect(self._handle_action_changed)
         form_layout.addRow("动作类型:", self.action_combo)
         
@@ -121,6 +133,13 @@ class RuleEditorWidget(QWidget):
         self.enabled_check.setChecked(True)
         form_layout.addRow("", self.enabled_check)
         
+        # 隔离提示（规则多次匹配超时后显示）
+        self.quarantine_label = QLabel()
+        self.quarantine_label.setStyleSheet("color: red;")
+        self.quarantine_label.setWordWrap(True)
+        self.quarantine_label.hide()
+        form_layout.addRow("", self.quarantine_label)
+        
         main_layout.addLayout(form_layout)
         
         # 创建选项卡
@@ -169,6 +188,7 @@ class RuleEditorWidget(QWidget):
         self.script_container = QWidget()
         self.filter_container = QWidget()
         self.empty_container = QWidget()
+        self.metadata_container = QWidget()
         
         # 替换输出设置
         self.replace_layout = QVBoxLayout(self.replace_container)
@@ -226,6 +246,23 @@ class RuleEditorWidget(QWidget):
         self.filter_layout.addWidget(condition_help)
         self.filter_layout.addWidget(self.condition_edit)
         
+        # 只读命令（cat、grep等）的真实输出可以缓存，依赖文件变化或超时后重新执行
+        cache_layout = QHBoxLayout()
+        self.cache_output_check = QCheckBox("缓存原始命令输出")
+        self.cache_output_check.setToolTip("仅对cat、grep等只读命令生效，读取的文件变化时自动失效")
+        self.cache_ttl_spin = QDoubleSpinBox()
+        self.cache_ttl_spin.setRange(0.1, 86400)
+        self.cache_ttl_spin.setDecimals(1)
+        self.cache_ttl_spin.setSuffix(" 秒")
+        self.cache_ttl_spin.setValue(DEFAULT_CACHE_TTL)
+        self.cache_ttl_spin.setEnabled(False)
+        self.cache_output_check.toggled.connect(self.cache_ttl_spin.setEnabled)
+        cache_layout.addWidget(self.cache_output_check)
+        cache_layout.addWidget(QLabel("有效时间:"))
+        cache_layout.addWidget(self.cache_ttl_spin)
+        cache_layout.addStretch()
+        self.filter_layout.addLayout(cache_layout)
+        
         # 空输出设置
         self.empty_layout = QVBoxLayout(self.empty_container)
         empty_label = QLabel("此操作将直接返回空输出，无需额外参数。")
@@ -234,6 +271,53 @@ class RuleEditorWidget(QWidget):
         self.empty_layout.addWidget(empty_label)
         self.empty_layout.addWidget(empty_help)
         
+        # 文件属性伪装设置
+        self.metadata_layout = QVBoxLayout(self.metadata_container)
+        metadata_help = QLabel("（在进程内执行ls -l和stat并修改匹配文件的属性，不支持的调用执行真实命令并改写输出中的权限）")
+        metadata_help.setStyleSheet("color: #666;")
+        self.metadata_layout.addWidget(metadata_help)
+        
+        metadata_form = QFormLayout()
+        self.metadata_paths_edit = QLineEdit()
+        self.metadata_paths_edit.setPlaceholderText("多个路径用空格分隔，* 匹配任意字符，如: /bin/* /usr/bin/*，留空则应用于所有文件")
+        self.metadata_clear_mode_edit = QLineEdit()
+        self.metadata_clear_mode_edit.setPlaceholderText("八进制，如 6000 清除SUID和SGID")
+        self.metadata_set_mode_edit = QLineEdit()
+        self.metadata_set_mode_edit.setPlaceholderText("八进制，如 0755")
+        self.metadata_owner_edit = QLineEdit()
+        self.metadata_owner_edit.setPlaceholderText("用户名或uid，留空不修改")
+        self.metadata_group_edit = QLineEdit()
+        self.metadata_group_edit.setPlaceholderText("组名或gid，留空不修改")
+        self.metadata_mtime_edit = QLineEdit()
+        self.metadata_mtime_edit.setPlaceholderText("YYYY-MM-DD HH:MM:SS，留空不修改")
+        metadata_form.addRow("路径:", self.metadata_paths_edit)
+        metadata_form.addRow("清除权限位:", self.metadata_clear_mode_edit)
+        metadata_form.addRow("设置权限位:", self.metadata_set_mode_edit)
+        metadata_form.addRow("属主:", self.metadata_owner_edit)
+        metadata_form.addRow("属组:", self.metadata_group_edit)
+        metadata_form.addRow("修改时间:", self.metadata_mtime_edit)
+        self.metadata_layout.addLayout(metadata_form)
+        
+        # 资源限制（脚本和过滤动作启动的子进程），0表示不限制
+        self.limits_container = QWidget()
+        limits_layout = QHBoxLayout(self.limits_container)
+        limits_layout.setContentsMargins(0, 0, 0, 0)
+        self.cpu_limit_spin = QSpinBox()
+        self.cpu_limit_spin.setRange(0, 3600)
+        self.cpu_limit_spin.setSuffix(" 秒")
+        self.cpu_limit_spin.setSpecialValueText("不限制")
+        self.cpu_limit_spin.setToolTip("子进程可使用的CPU时间（RLIMIT_CPU）")
+        self.memory_limit_spin = QSpinBox()
+        self.memory_limit_spin.setRange(0, 65536)
+        self.memory_limit_spin.setSuffix(" MB")
+        self.memory_limit_spin.setSpecialValueText("不限制")
+        self.memory_limit_spin.setToolTip("子进程可使用的地址空间（RLIMIT_AS）")
+        limits_layout.addWidget(QLabel("CPU时间上限:"))
+        limits_layout.addWidget(self.cpu_limit_spin)
+        limits_layout.addWidget(QLabel("内存上限:"))
+        limits_layout.addWidget(self.memory_limit_spin)
+        limits_layout.addStretch()
+        
         # 创建一个初始布局
         self.action_layout = QVBoxLayout(self.action_group)
         
@@ -242,12 +326,16 @@ class RuleEditorWidget(QWidget):
         self.action_layout.addWidget(self.script_container)
         self.action_layout.addWidget(self.filter_container)
         self.action_layout.addWidget(self.empty_container)
+        self.action_layout.addWidget(self.metadata_container)
+        self.action_layout.addWidget(self.limits_container)
         
         # 隐藏除替换输出外的其他容器
         self.replace_container.setVisible(True)
         self.script_container.setVisible(False)
         self.filter_container.setVisible(False)
         self.empty_container.setVisible(False)
+        self.metadata_container.setVisible(False)
+        self.limits_container.setVisible(False)
     
     def _setup_test_tab(self):
         """设置测试选项卡"""
@@ -281,6 +369,8 @@ class RuleEditorWidget(QWidget):
         self.name_edit.setText(rule.name)
         self.desc_edit.setText(rule.description)
         self.pattern_edit.setText(rule.pattern)
+        self.match_mode_combo.setCurrentIndex(
+            MATCH_MODES.index(rule.match_mode) if rule.match_mode in MATCH_MODES else 0)
         self.enabled_check.setChecked(rule.enabled)
         
         # 动作类型
@@ -288,7 +378,8 @@ class RuleEditorWidget(QWidget):
             'replace': 0,
             'script': 1,
             'filter': 2,
-            'empty': 3
+            'empty': 3,
+            'metadata': 4
         }
         action_index = action_index_map.get(rule.action, 0)
         self.action_combo.setCurrentIndex(action_index)
@@ -301,15 +392,38 @@ class RuleEditorWidget(QWidget):
         elif rule.action == 'filter':
             self.filter_edit.setText(rule.filter)
             self.condition_edit.setText(rule.condition)
+            self.cache_output_check.setChecked(rule.cache_output)
+            self.cache_ttl_spin.setValue(rule.cache_ttl)
+        elif rule.action == 'metadata':
+            self._set_metadata(rule.metadata)
+        self.cpu_limit_spin.setValue(rule.cpu_limit or 0)
+        self.memory_limit_spin.setValue(rule.memory_limit or 0)
+        
+        self._update_quarantine_label()
+    
+    def _update_quarantine_label(self):
+        """显示当前规则是否因多次匹配超时被隔离"""
+        rule = self.rule_manager.get_rule(self.current_rule_id) if self.current_rule_id else None
+        guard = self.rule_manager.regex_guard
+        if rule is None or not guard.is_quarantined(rule.id, rule.pattern):
+            self.quarantine_label.hide()
+            return
+        offense = guard.get_offenders().get(rule.id, {})
+        self.quarantine_label.setText(
+            f"该规则匹配超时 {offense.get('count', 0)} 次，已被隔离，不再运行正则，测试到该规则时直接按匹配处理；"
+            f"修改匹配模式并保存后解除隔离。最近超时的命令: {offense.get('last_command', '')}")
+        self.quarantine_label.show()
     
     def clear(self):
         """清空编辑器"""
         self.current_rule_id = None
+        self.quarantine_label.hide()
         
         # 清空基本信息
         self.name_edit.clear()
         self.desc_edit.clear()
         self.pattern_edit.clear()
+        self.match_mode_combo.setCurrentIndex(0)
         self.enabled_check.setChecked(True)
         
         # 重置动作类型
@@ -320,6 +434,11 @@ class RuleEditorWidget(QWidget):
         self.script_edit.clear()
         self.filter_edit.clear()
         self.condition_edit.clear()
+        self.cache_output_check.setChecked(False)
+        self.cache_ttl_spin.setValue(DEFAULT_CACHE_TTL)
+        self._set_metadata({})
+        self.cpu_limit_spin.setValue(0)
+        self.memory_limit_spin.setValue(0)
         
         # 清空测试
         self.test_command_edit.clear()
@@ -331,10 +450,23 @@ class RuleEditorWidget(QWidget):
             0: 'replace',
             1: 'script',
             2: 'filter',
-            3: 'empty'
+            3: 'empty',
+            4: 'metadata'
         }
         return action_map.get(self.action_combo.currentIndex(), 'replace')
     
+    def _get_current_match_mode(self):
+        """获取当前选择的匹配方式"""
+        return MATCH_MODES[self.match_mode_combo.currentIndex()]
+    
+    def _handle_match_mode_changed(self, index):
+        """处理匹配方式变化：可视化编辑和正则预设只用于正则表达式"""
+        regex_mode = MATCH_MODES[index] == MATCH_REGEX
+        self.visual_edit_button.setEnabled(regex_mode)
+        self.pattern_help_button.setEnabled(regex_mode)
+        self.pattern_edit.setPlaceholderText(
+            "输入正则表达式模式..." if regex_mode else "输入命令，如: cat /etc/login.defs 或 ls -l /root/*")
+    
     def _insert_pattern(self, pattern):
         """将模式插入到匹配模式输入框"""
         current_text = self.pattern_edit.text()
@@ -381,6 +513,40 @@ class RuleEditorWidget(QWidget):
         if pattern:
             self.pattern_edit.setText(pattern)
     
+    def _get_limits(self):
+        """编辑器中的资源限制，0（不限制）保存为None"""
+        return {
+            'cpu_limit': self.cpu_limit_spin.value() or None,
+            'memory_limit': self.memory_limit_spin.value() or None,
+        }
+    
+    def _get_metadata(self):
+        """编辑器中的文件属性设置，空字段不保存"""
+        metadata = {}
+        paths = self.metadata_paths_edit.text().split()
+        if paths:
+            metadata['paths'] = paths
+        fields = (
+            ('clear_mode', self.metadata_clear_mode_edit),
+            ('set_mode', self.metadata_set_mode_edit),
+            ('owner', self.metadata_owner_edit),
+            ('group', self.metadata_group_edit),
+            ('mtime', self.metadata_mtime_edit),
+        )
+        for key, edit in fields:
+            if edit.text().strip():
+                metadata[key] = edit.text().strip()
+        return metadata
+    
+    def _set_metadata(self, metadata):
+        """将文件属性设置加载到编辑器"""
+        self.metadata_paths_edit.setText(' '.join(metadata.get('paths', [])))
+        self.metadata_clear_mode_edit.setText(metadata.get('clear_mode', ''))
+        self.metadata_set_mode_edit.setText(metadata.get('set_mode', ''))
+        self.metadata_owner_edit.setText(metadata.get('owner', ''))
+        self.metadata_group_edit.setText(metadata.get('group', ''))
+        self.metadata_mtime_edit.setText(metadata.get('mtime', ''))
+    
     def _handle_action_changed(self, index):
         """处理动作类型变更事件"""
         # 隐藏所有容器
@@ -388,6 +554,7 @@ class RuleEditorWidget(QWidget):
         self.script_container.setVisible(False)
         self.filter_container.setVisible(False)
         self.empty_container.setVisible(False)
+        self.metadata_container.setVisible(False)
         
         # 显示选定的容器
         if index == 0:  # 替换输出
@@ -398,6 +565,9 @@ class RuleEditorWidget(QWidget):
             self.filter_container.setVisible(True)
         elif index == 3:  # 返回空
             self.empty_container.setVisible(True)
+        elif index == 4:  # 伪装文件属性
+            self.metadata_container.setVisible(True)
+        self.limits_container.setVisible(index in (1, 2))
     
     def _handle_save_button_clicked(self):
         """处理保存按钮点击事件"""
@@ -410,9 +580,31 @@ class RuleEditorWidget(QWidget):
             QMessageBox.warning(self, "验证失败", "匹配模式不能为空")
             return
         
+        match_mode = self._get_current_match_mode()
+        pattern_error = check_pattern(self.pattern_edit.text(), match_mode)
+        if pattern_error:
+            QMessageBox.warning(self, "验证失败", pattern_error)
+            return
+        
+        # 检查回溯风险，有风险的模式会在受限环境中匹配
+        risks = []
+        if match_mode == MATCH_REGEX:
+            risks = [issue for issue in check_regex_complexity(self.pattern_edit.text())
+                     if issue.severity != RegexIssue.LOW]
+        if risks:
+            reply = QMessageBox.question(
+                self, "匹配模式存在性能风险",
+                "\n".join(str(issue) for issue in risks) +
+                "\n\n该规则匹配时将受到超时限制，超时多次后会被自动隔离。是否仍然保存？",
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.No
+            )
+            if reply != QMessageBox.Yes:
+                return
+        
         # 获取动作类型相关参数
         action_type = self._get_current_action_type()
-        kwargs = {}
+        kwargs = {'match_mode': match_mode}
         
         if action_type == 'replace':
             if not self.output_edit.toPlainText():
@@ -432,6 +624,18 @@ class RuleEditorWidget(QWidget):
                 return
             kwargs['filter'] = self.filter_edit.text()
             kwargs['condition'] = self.condition_edit.text()
+            kwargs['cache_output'] = self.cache_output_check.isChecked()
+            kwargs['cache_ttl'] = self.cache_ttl_spin.value()
+        
+        elif action_type == 'metadata':
+            metadata_error = check_metadata(self._get_metadata())
+            if metadata_error:
+                QMessageBox.warning(self, "验证失败", metadata_error)
+                return
+            kwargs['metadata'] = self._get_metadata()
+        
+        if action_type in ('script', 'filter'):
+            kwargs.update(self._get_limits())
         
         # 创建规则对象
         rule = Rule(
@@ -453,6 +657,8 @@ class RuleEditorWidget(QWidget):
             success = rule_id > 0
         
         if success:
+            self._update_quarantine_label()
+            
             # 发送规则保存信号
             self.rule_saved.emit()
             
@@ -480,11 +686,16 @@ class RuleEditorWidget(QWidget):
         elif action_type == 'filter' and not self.filter_edit.text().strip():
             QMessageBox.warning(self, "测试失败", "请先输入过滤命令")
             return
+        elif action_type == 'metadata':
+            metadata_error = check_metadata(self._get_metadata())
+            if metadata_error:
+                QMessageBox.warning(self, "测试失败", metadata_error)
+                return
         
         try:
             # 创建临时规则用于测试
             action_type = self._get_current_action_type()
-            kwargs = {}
+            kwargs = {'match_mode': self._get_current_match_mode()}
             
             if action_type == 'replace':
                 kwargs['output'] = self.output_edit.toPlainText()
@@ -493,6 +704,10 @@ class RuleEditorWidget(QWidget):
             elif action_type == 'filter':
                 kwargs['filter'] = self.filter_edit.text()
                 kwargs['condition'] = self.condition_edit.text()
+            elif action_type == 'metadata':
+                kwargs['metadata'] = self._get_metadata()
+            if action_type in ('script', 'filter'):
+                kwargs.update(self._get_limits())
             
             temp_rule = Rule(
                 0,
@@ -5,6 +5,7 @@ from PySide6.QtWidgets import (
 )
 
 from ..core.rule_manager import RuleManager
+from .rule_analysis_dialog import ANALYSIS_DISPLAY, RuleAnalysisDialog, analysis_label
 
 
 class RuleListWidget(QWidget):
@@ -19,6 +20,10 @@ class RuleListWidget(QWidget):
         
         self.rule_manager = rule_manager
         
+        # 最近一次规则分析的结果及对应的规则版本
+        self.analysis = {}
+        self.analysis_version = None
+        
         # 设置UI
         self._setup_ui()
         
@@ -32,8 +37,8 @@ class RuleListWidget(QWidget):
         
         # 创建表格
         self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["ID", "名称", "描述", "类型", "状态"])
+        self.table.setColumnCount(6)
+        self.table.setHorizontalHeaderLabels(["ID", "名称", "描述", "类型", "状态", "分析"])
         self.table.setSelectionBehavior(QTableWidget.SelectRows)
         self.table.setSelectionMode(QTableWidget.SingleSelection)
         self.table.setEditTriggers(QTableWidget.NoEditTriggers)
@@ -44,6 +49,7 @@ class RuleListWidget(QWidget):
         self.table.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
         self.table.horizontalHeader().setSectionResizeMode(3, QHeaderView.ResizeToContents)
         self.table.horizontalHeader().setSectionResizeMode(4, QHeaderView.ResizeToContents)
+        self.table.horizontalHeader().setSectionResizeMode(5, QHeaderView.ResizeToContents)
         
         # 连接信号
         self.table.itemDoubleClicked.connect(self._handle_item_double_clicked)
@@ -73,6 +79,11 @@ class RuleListWidget(QWidget):
         self.toggle_button.clicked.connect(self._handle_toggle_button_clicked)
         button_layout.addWidget(self.toggle_button)
         
+        # 规则分析按钮
+        self.analyze_button = QPushButton("分析规则")
+        self.analyze_button.clicked.connect(self._handle_analyze_button_clicked)
+        button_layout.addWidget(self.analyze_button)
+        
         # 设置布局右对齐
         button_layout.setAlignment(Qt.AlignRight)
         
@@ -85,6 +96,8 @@ class RuleListWidget(QWidget):
         
         # 获取所有规则
         rules = self.rule_manager.get_all_rules()
+        guard = self.rule_manager.regex_guard
+        offenders = guard.get_offenders()
         
         # 添加规则到表格
         for i, rule in enumerate(rules):
@@ -107,7 +120,8 @@ class RuleListWidget(QWidget):
                 'replace': '替换输出',
                 'script': '自定义脚本',
                 'filter': '过滤输出',
-                'empty': '返回空'
+                'empty': '返回空',
+                'metadata': '伪装文件属性'
             }
             action_text = action_map.get(rule.action, rule.action)
             action_item = QTableWidgetItem(action_text)
@@ -117,7 +131,29 @@ class RuleListWidget(QWidget):
             status_text = "启用" if rule.enabled else "禁用"
             status_item = QTableWidgetItem(status_text)
             status_item.setForeground(Qt.green if rule.enabled else Qt.red)
+            # 多次匹配超时被隔离的规则不再运行正则，测试到该规则时直接按匹配处理
+            offense = offenders.get(rule.id)
+            if rule.enabled and guard.is_quarantined(rule.id, rule.pattern):
+                status_item.setText("已隔离")
+                status_item.setForeground(Qt.darkYellow)
+                status_item.setToolTip(
+                    f"匹配超时 {offense['count']} 次，已停止参与匹配，修改匹配模式后解除\n"
+                    f"最近超时: {offense['last_command']}（{offense['last_elapsed_ms']:.1f}ms）")
+            elif offense and offense['pattern'] == rule.pattern:
+                status_item.setToolTip(f"匹配超时 {offense['count']} 次，"
+                                       f"达到 {guard.max_offenses} 次后将被隔离")
             self.table.setItem(i, 4, status_item)
+            
+            # 设置分析结果（规则变化后旧结果不再显示）
+            analysis_item = QTableWidgetItem("")
+            analysis = self.analysis.get(rule.id)
+            if analysis and self.analysis_version == self.rule_manager.version:
+                analysis_item.setText(analysis_label(analysis))
+                analysis_item.setToolTip(analysis.describe())
+                _, color = ANALYSIS_DISPLAY.get(analysis.status, ("", None))
+                if color is not None:
+                    analysis_item.setBackground(color)
+            self.table.setItem(i, 5, analysis_item)
     
     def get_selected_rule_id(self):
         """获取当前选中的规则ID"""
@@ -167,8 +203,18 @@ class RuleListWidget(QWidget):
             # 获取规则
             rule = self.rule_manager.get_rule(rule_id)
             if rule:
-                # 切换启用状态
-                rule.enabled = not rule.enabled
+                # 切换启用状态（通过规则管理器发布新快照）
+                self.rule_manager.set_rule_enabled(rule_id, not rule.enabled)
                 
                 # 刷新表格
                 self.refresh()
+    
+    def _handle_analyze_button_clicked(self):
+        """处理规则分析按钮点击事件"""
+        dialog = RuleAnalysisDialog(self.rule_manager, self)
+        dialog.exec()
+        
+        # 保存分析结果用于在列表中标记
+        self.analysis = {analysis.rule_id: analysis for analysis in dialog.analyses}
+        self.analysis_version = self.rule_manager.version
+        self.refresh()
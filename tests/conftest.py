@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 测试直接导入 src 包，与 main.py 的运行方式相同
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,12 @@
+from src.core.benchmark import synthetic_commands
+from src.core.rule_manager import Rule
+
+
+def test_argv_rules_contribute_samples():
+    rules = [Rule(1, 'a', '', 'cat /etc/zzz', 'empty', match_mode='argv')]
+    assert set(synthetic_commands(rules, 20, match_ratio=1.0, seed=1)) == {'cat /etc/zzz'}
+
+
+def test_disabled_rules_skipped():
+    rules = [Rule(1, 'a', '', '^zzz-only$', 'empty', enabled=False)]
+    assert 'zzz-only' not in synthetic_commands(rules, 50, match_ratio=1.0, seed=1)
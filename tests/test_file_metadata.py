@@ -0,0 +1,122 @@
+import os
+import shlex
+import shutil
+import subprocess
+
+import pytest
+
+from src.core.file_metadata import (
+    MetadataOverride, ModeRewriter, human_size, metadata_function, parse_metadata_command,
+    render_metadata_command,
+)
+
+_GNU = shutil.which('ls') is not None and b'GNU' in subprocess.run(
+    ['ls', '--version'], capture_output=True).stdout
+_BASH = shutil.which('bash') is not None and shutil.which('awk') is not None
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    (tmp_path / 'suid').write_bytes(b'x' * 1536)
+    os.chmod(tmp_path / 'suid', 0o4755)
+    (tmp_path / 'plain').write_bytes(b'')
+    (tmp_path / 'dir').mkdir()
+    os.symlink('dir', tmp_path / 'link')
+    os.symlink('missing', tmp_path / 'dangling')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _real(command, cwd):
+    return subprocess.run(command, shell=True, cwd=cwd, stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT, env={**os.environ, 'LC_ALL': 'C'}).stdout
+
+
+@pytest.mark.parametrize('size, text', [
+    (0, '0'), (1023, '1023'), (1024, '1.0K'), (1025, '1.1K'), (1536, '1.5K'), (10239, '10K'),
+    (10241, '11K'), (1048575, '1.0M'), (1048577, '1.1M'), (5000000000, '4.7G'),
+])
+def test_human_size(size, text):
+    assert human_size(size) == text
+
+
+def test_supported_options():
+    assert parse_metadata_command('ls -lhF /bin/su').options == 'lhF'
+    assert parse_metadata_command('ls -l --color=auto --classify /bin/su').options == 'lF'
+    assert parse_metadata_command('ls -l --classify=never /bin/su').options == 'l'
+    # 输出带颜色时不在进程内处理
+    assert parse_metadata_command('ls -l --color /bin/su') is None
+    assert parse_metadata_command('ls -l --color=always /bin/su') is None
+    assert parse_metadata_command('ls -lR /bin') is None
+    assert parse_metadata_command('stat -c %a /bin/su') is None
+
+
+@pytest.mark.skipif(not _GNU, reason="需要GNU coreutils")
+@pytest.mark.parametrize('command', [
+    'ls -l', 'ls -lh', 'ls -lhF', 'ls -la --color=auto', 'ls -lF suid link dangling dir',
+    'ls -ldF dir link', 'ls -lhi --classify=auto .', 'stat suid plain',
+])
+def test_matches_real_output_without_override(tree, command):
+    assert render_metadata_command(command, MetadataOverride()) == _real(command, tree)
+
+
+def test_override_clears_suid(tree):
+    override = MetadataOverride([str(tree / 'suid')], clear_mode='6000')
+    output = render_metadata_command('ls -lhF suid plain', override).decode()
+    assert '-rwxr-xr-x' in output and 'suid*' in output
+    assert '-rw-r--r--' in output
+    stat_output = render_metadata_command('stat suid', override).decode()
+    assert 'Access: (0755/-rwxr-xr-x)' in stat_output
+
+
+def test_classify_follows_overridden_mode(tree):
+    override = MetadataOverride([str(tree / 'suid')], clear_mode='0111')
+    output = render_metadata_command('ls -lF suid', override)
+    assert output.rstrip().endswith(b' suid')
+
+
+def test_rewriter_stat_format(tree):
+    override = MetadataOverride([str(tree / 'suid')], clear_mode='6000')
+    rewriter = ModeRewriter('stat -c "%a %n" suid plain', override)
+    assert rewriter.rewrite(b'4755 suid') == b'755 suid'
+    # 文件名不匹配的行不改写
+    assert rewriter.rewrite(b'4755 plain') == b'4755 plain'
+    assert ModeRewriter('stat -c %a suid', override).rewrite(b'4755') == b'755'
+    assert ModeRewriter('stat -c%a%n suid', override).rewrite(b'4755suid') == b'755suid'
+    assert ModeRewriter('stat --format=%f suid', override).rewrite(b'89ed') == b'81ed'
+    assert ModeRewriter("stat --printf='%A\\n' suid", override).rewrite(
+        b'-rwsr-xr-x') == b'-rwxr-xr-x'
+    terse = ModeRewriter('stat -t suid', override).rewrite(b'suid 1536 8 89ed 0 0 fe00 1 1')
+    assert terse == b'suid 1536 8 81ed 0 0 fe00 1 1'
+    # stat -f 的 %a 是可用块数
+    assert ModeRewriter('stat -f -c %a /', override).rewrite(b'4755') == b'4755'
+
+
+def test_rewriter_symbolic_modes():
+    rewriter = ModeRewriter('ls -lR /bin', MetadataOverride(clear_mode='6000'))
+    assert rewriter.rewrite(b'-rwsr-sr-x 1 root root 1 Jan  1  2024 su') == \
+        b'-rwxr-xr-x 1 root root 1 Jan  1  2024 su'
+    assert rewriter.rewrite(b'72 -rwsr-xr-x. 1 root root') == b'72 -rwxr-xr-x. 1 root root'
+    assert rewriter.rewrite(b'Access: (4755/-rwsr-xr-x)  Uid') == b'Access: (0755/-rwxr-xr-x)  Uid'
+    # 文件名中的相似文本不改写
+    assert rewriter.rewrite(b'x-rwsr-xr-x') == b'x-rwsr-xr-x'
+    chunks = [b'-rwsr-x', b'r-x 1 su\n-rw', b'-r--r-- 1 a']
+    assert b''.join(rewriter.stream(chunks)) == b'-rwxr-xr-x 1 su\n-rw-r--r-- 1 a\n'
+
+
+@pytest.mark.skipif(not (_GNU and _BASH), reason="需要bash、awk和GNU coreutils")
+@pytest.mark.parametrize('command', [
+    'ls -lhF suid dir link', 'ls -l --color=auto suid', 'ls -lR .', 'ls -l --color=always suid',
+    'stat -c %a suid', 'stat -c "%a %n" suid plain missing', 'stat -t suid', 'stat suid',
+])
+def test_exported_function_agrees(tree, command):
+    override = MetadataOverride([str(tree / 'suid')], clear_mode='6000')
+    script = metadata_function('eval "$CMD"') + 'CMD="$1"; shift; fakelinux_file_metadata "$@"\n'
+    args = shlex.split(override.bash_call())[1:]
+    exported = subprocess.run(['bash', '-c', script, 'x', command] + args, cwd=tree,
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT).stdout
+    expected = render_metadata_command(command, override)
+    if expected is None:
+        expected = b''.join(ModeRewriter(command, override).stream([_real(command, tree)]))
+    assert exported == expected
+    assert b'rws' not in exported and b'4755' not in exported
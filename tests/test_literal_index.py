@@ -0,0 +1,49 @@
+import random
+import re
+
+from src.core.literal_index import LiteralIndex
+from src.core.pattern_compiler import compile_pattern
+
+
+def _brute_force(literal_sets, command):
+    mask = 0
+    for position, literals in enumerate(literal_sets):
+        if not literals or any(literal in command for literal in literals):
+            mask |= 1 << position
+    return mask
+
+
+def test_overlapping_literals():
+    literal_sets = [('he', 'she'), ('his', 'hers'), None, ('s',), ('ushers',)]
+    index = LiteralIndex(literal_sets)
+    for command in ['ushers', 'his', 'x', '', 'shers', 'she is here']:
+        assert index.candidates(command) == _brute_force(literal_sets, command)
+    # 没有字面文本的规则总是候选
+    assert index.candidates('') == 1 << 2
+
+
+def test_random_against_brute_force():
+    rng = random.Random(0)
+    alphabet = 'abc /-'
+    literal_sets = [
+        tuple(''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+              for _ in range(rng.randint(1, 3))) if rng.random() > 0.1 else None
+        for _ in range(60)
+    ]
+    index = LiteralIndex(literal_sets)
+    for _ in range(500):
+        command = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert index.candidates(command) == _brute_force(literal_sets, command)
+
+
+def test_required_literals_never_filter_a_match():
+    patterns = [r'^cat\s+/etc/(passwd|shadow)', r'ls\s+-l', r'(?i)SUDO', r'^id$', r'.*',
+                r'grep\s+PASS_MAX_DAYS', r'(foo|bar)baz', r'x?yz']
+    commands = ['cat /etc/passwd', 'CAT /etc/Shadow', 'ls -l', 'sudo ls', 'id', 'barbaz',
+                'grep PASS_MAX_DAYS /etc/login.defs', 'yz', 'nothing']
+    index = LiteralIndex([compile_pattern(p).required_literals for p in patterns])
+    for command in commands:
+        candidates = index.candidates(command.lower())
+        for position, pattern in enumerate(patterns):
+            if re.search(pattern, command, re.IGNORECASE):
+                assert candidates >> position & 1, (pattern, command)
@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+from src.core.log_index import KIND_COMMAND, KIND_SESSION, LogIndex, command_head, iter_log_records
+
+LOG = (
+    b"2024-01-01 12:00:00 [SSH] Interactive session started by root (PID=1)\n"
+    b"2024-01-01 12:00:01 [CMD] root: cat /etc/passwd\n"
+    b"2024-01-01 12:00:02 [CMD] root:   /usr/bin/cat /etc/shadow\n"
+    b"2024-01-01 12:00:03 [CMD] admin: \tls -l\n"
+    b"2024-01-01 12:00:04 [CMD] admin: \n"
+    b"  ls /tmp\n"
+    b"2024-01-01 12:00:05 [CMD] root: echo a:b: c\n"
+    b"2024-01-01 12:00:06 [CMD] root: \n"
+)
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = tmp_path / 'ssh_commands.log'
+    path.write_bytes(LOG)
+    return path
+
+
+@pytest.mark.parametrize('command, head', [
+    (b'cat /etc/passwd', b'cat'), (b'  /usr/bin/cat x', b'cat'), (b'\tls', b'ls'),
+    (b'\n  ls /tmp', b''), (b'', b''), (b'   ', b''), (b'ls\x0bx', b'ls'),
+])
+def test_command_head(command, head):
+    assert command_head(command) == head
+
+
+def test_index_agrees_with_query(log_path):
+    records = list(iter_log_records(log_path))
+    with LogIndex(log_path) as index:
+        stats = index.ingest(block_size=64)
+        assert stats['records'] == len(records) == 7
+        assert index.count() == len(records)
+        counts = dict(index.count_by('head'))
+        assert counts == {'cat': 2, 'ls': 1, 'echo': 1, '': 2}
+        # 索引中的程序名与查询时的过滤方式一致
+        for head, count in counts.items():
+            found = index.query(head=head)
+            assert len(found) == count
+            assert all(command_head(r.command.encode()) == head.encode() for r in found)
+        assert [r.command for r in index.query(user='admin', head='ls')] == ['\tls -l']
+        assert [r.command for r in index.query(user='admin', head='')] == ['\n  ls /tmp']
+        assert len(index.query(kind=KIND_SESSION)) == 1
+        assert dict(index.count_by('user')) == {'root': 4, 'admin': 2}
+
+
+def test_incremental_ingest(log_path):
+    with LogIndex(log_path) as index:
+        index.ingest()
+        with open(log_path, 'ab') as f:
+            f.write(b"2024-01-01 12:01:00 [CMD] root: cat /etc/hosts\n2024-01-01 12:01:01 [CMD] ro")
+        stats = index.ingest()
+        assert stats['records'] == 1
+        assert len(index.query(head='cat', kind=KIND_COMMAND)) == 3
+
+
+def test_rebuilds_old_format(log_path):
+    with LogIndex(log_path) as index:
+        index.ingest()
+    # 模拟旧版本建立的索引
+    connection = sqlite3.connect(f"{log_path}.index.sqlite")
+    with connection:
+        connection.execute("DELETE FROM meta WHERE key = 'format'")
+        connection.execute("UPDATE block_keys SET count = 100")
+    connection.close()
+    with LogIndex(log_path) as index:
+        assert index.ingest()['records'] == 7
+        assert index.count() == 7
+        assert dict(index.count_by('head'))['cat'] == 2
@@ -0,0 +1,45 @@
+from src.core.metrics import EngineMetrics
+from src.core.mock_engine import MockEngine
+from src.core.rule_manager import Rule, RuleManager
+from src.core.rule_matcher import RuleMatcher
+
+
+def test_evaluated_counts_tested_regexes():
+    rules = [Rule(index, f'r{index}', '', rf'^cmd{index}\b', 'empty') for index in range(10)]
+    matcher = RuleMatcher(rules, prefilter=True)
+    evaluated = {}
+    rule, position = matcher.find_with_position('cmd7 x', evaluated)
+    assert position == 7
+    # 字面索引只留下第8条规则，顺序扫描会测试的前7条都不计
+    assert evaluated == {7: 1}
+    matcher.find_with_position('other', evaluated)
+    assert evaluated == {7: 1}
+
+
+def test_engine_exports_evaluated_and_before_match():
+    manager = RuleManager()
+    manager.add_rule(Rule(0, 'a', '', r'^aaa$', 'empty'))
+    manager.add_rule(Rule(0, 'b', '', r'^bbb$', 'empty'))
+    engine = MockEngine(manager)
+    for _ in range(3):
+        engine.process_command('bbb')
+    first, second = (rule.id for rule in manager.rules)
+    rules = engine.metrics.to_dict()['rules']
+    assert rules[str(second)]['matched'] == 3
+    assert rules[str(first)]['before_match'] == 3
+    # 后两次命中决策缓存，不测试任何正则
+    assert rules[str(first)]['evaluated'] == 1
+    assert rules[str(second)]['evaluated'] == 1
+    assert 'fakelinux_rule_evaluated_total{rule_id="%d"} 1' % second in (
+        engine.metrics.to_prometheus())
+
+
+def test_old_versions_folded():
+    metrics = EngineMetrics()
+    for version in range(100):
+        metrics.record_match(version, (1, 2, 3), 1, 10)
+    assert list(metrics._orders) == [99]
+    rules = metrics.to_dict()['rules']
+    assert rules['1']['before_match'] == rules['2']['before_match'] == 100
+    assert '3' not in rules
+    assert rules['2']['matched'] == 100
@@ -0,0 +1,54 @@
+import pytest
+
+from src.core.mock_engine import MockEngine
+from src.core.rule_manager import Rule, RuleManager
+from src.core.tracing import CallbackSink
+
+
+@pytest.fixture
+def manager():
+    manager = RuleManager()
+    manager.add_rule(Rule(0, 'whoami', '', r'^whoami$', 'replace'))
+    return manager
+
+
+@pytest.mark.parametrize('command, simulated', [
+    ('whoami', True), ('echo hi', False), ('echo a | whoami', True),
+])
+def test_tracing_does_not_change_result(manager, command, simulated):
+    traces = []
+    plain = MockEngine(manager).process_command_bytes(command)
+    traced = MockEngine(manager, trace_sink=CallbackSink(traces.append)).process_command_bytes(
+        command)
+    assert plain == traced
+    assert plain[1] is simulated
+    assert len(traces) == 1
+    root = traces[0].root
+    assert root.args['simulated'] is simulated
+    assert [span.name for span in root.children][0] == 'match'
+
+
+def test_trace_records_tested_rules(manager):
+    traces = []
+    engine = MockEngine(manager, trace_sink=CallbackSink(traces.append))
+    engine.process_command('whoami')
+    match = traces[0].root.children[0]
+    assert match.args['cached'] is False
+    regex = [span for span in match.children if span.name == 'regex']
+    assert len(regex) == match.args['tested'] and regex[-1].args['matched'] is True
+    engine.process_command('whoami')
+    assert traces[1].root.children[0].args['cached'] is True
+
+
+@pytest.mark.parametrize('catch_all', [False, True])
+def test_pipeline_stage_explains_whole_match(catch_all):
+    manager = RuleManager()
+    manager.add_rule(Rule(0, 'shadow', '', r'cat\s+/etc/shadow', 'empty'))
+    if catch_all:
+        manager.add_rule(Rule(0, 'all', '', r'.*', 'filter', filter='cat'))
+    engine = MockEngine(manager)
+    output, simulated = engine.process_command('cat /etc/shadow | wc -l')
+    assert simulated is True
+    assert output.strip() == '0'
+    output, _ = engine.process_command('cat /etc/shadow | awk \'{print "x"}\' | wc -l')
+    assert output.strip() == '0'
@@ -0,0 +1,61 @@
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from src.core.pattern_compiler import PatternCompileError, compile_pattern
+
+PATTERNS = [
+    r'^cat\s+/etc/(passwd|shadow)$', r'ls\s+-\w+\s+/\S+', r'^(?=.*sudo)(?=.*passwd).*$',
+    r'\bid\b', r'^systemctl\s+(start|stop)\s+\w+', r'[A-Z]{2,}', r'^uname -[a-z]?$',
+    r'find\s+/\S+\s+-name\s+\S+', r'a.c', r'\d+\.\d+', r'^$',
+]
+COMMANDS = [
+    'cat /etc/passwd', 'CAT  /etc/SHADOW', 'cat /etc/passwdx', 'ls -la /tmp', 'sudo passwd root',
+    'passwd; sudo', 'id', 'idx', 'systemctl start sshd', 'uname -a', 'uname -', 'ab', 'abc',
+    'find /var -name x', 'echo 1.2', '', 'a\tc',
+]
+
+
+def _grep(condition, command):
+    return subprocess.run(['bash', '-c', condition, 'x'], env={'CMD': command, 'LC_ALL': 'C'},
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode == 0
+
+
+def test_python_round_trip():
+    for pattern in PATTERNS:
+        compiled = re.compile(compile_pattern(pattern).to_python(), re.IGNORECASE)
+        expected = re.compile(pattern, re.IGNORECASE)
+        for command in COMMANDS:
+            assert bool(compiled.search(command)) == bool(expected.search(command)), pattern
+
+
+@pytest.mark.skipif(shutil.which('bash') is None or shutil.which('grep') is None,
+                    reason="需要bash和grep")
+@pytest.mark.parametrize('pattern', PATTERNS)
+def test_shell_conditions_agree_with_python(pattern):
+    compiled = compile_pattern(pattern)
+    expected = re.compile(pattern, re.IGNORECASE)
+    grep_condition = compiled.grep_condition()
+    bash_condition = compiled.bash_condition()
+    for command in COMMANDS:
+        matched = bool(expected.search(command))
+        assert _grep(grep_condition, command) == matched, (pattern, command, grep_condition)
+        assert _grep(bash_condition, command) == matched, (pattern, command, bash_condition)
+
+
+def test_lookahead_conjuncts():
+    eres = compile_pattern(r'^(?=.*sudo)(?=.*passwd).*$').to_ere()
+    assert len(eres) == 2
+
+
+def test_required_literals():
+    assert compile_pattern(r'^cat\s+/etc/(passwd|shadow)').required_literals is not None
+    assert compile_pattern(r'.*').required_literals is None
+    assert compile_pattern(r'(?i)SUDO').required_literals == ('sudo',)
+
+
+def test_syntax_error():
+    with pytest.raises(PatternCompileError):
+        compile_pattern('(')
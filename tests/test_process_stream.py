@@ -0,0 +1,41 @@
+import subprocess
+import time
+
+import pytest
+
+from src.core.process_stream import ProcessStream
+from src.core.spawn_server import SpawnServer
+
+
+@pytest.fixture(params=['subprocess', 'spawn_server'])
+def popen(request):
+    if request.param == 'subprocess':
+        yield subprocess.Popen
+        return
+    server = SpawnServer()
+    if not server.start():
+        pytest.skip("平台不支持posix_spawn或fd传递")
+    yield server.popen
+    server.close()
+
+
+def test_output_streamed(popen):
+    stream = ProcessStream('printf "a\\nb\\n"', shell=True, popen=popen)
+    assert b''.join(stream) == b'a\nb\n'
+    assert stream.completed and stream.returncode == 0
+
+
+def test_timeout_kills_process_group(popen):
+    # 后台的孙进程继承了输出管道，只结束shell时读取不会结束
+    stream = ProcessStream('sleep 30 & sleep 30', shell=True, popen=popen,
+                           deadline=time.monotonic() + 0.3)
+    start = time.monotonic()
+    output = b''.join(stream)
+    assert time.monotonic() - start < 5
+    assert stream.timed_out and not stream.completed
+    assert output.endswith("命令执行超时".encode('utf-8'))
+
+
+def test_input_piped(popen):
+    stream = ProcessStream(['cat'], input_chunks=[b'x' * 10, b'y'], popen=popen)
+    assert b''.join(stream) == b'x' * 10 + b'y'
@@ -0,0 +1,82 @@
+import threading
+import time
+
+from src.core.decision_cache import DecisionCache
+from src.core.regex_guard import RegexGuard
+from src.core.rule_manager import Rule
+from src.core.rule_snapshot import RuleSnapshot
+
+SLOW_PATTERN = r'(a+)+$'
+SLOW_COMMAND = 'a' * 40 + 'b'
+
+
+def test_worker_start_not_counted():
+    guard = RegexGuard(timeout=0.05)
+    try:
+        # 首次匹配需要启动解释器，截止时间从进程就绪后开始计算
+        assert guard.search(1, r'^ls\b', 'ls -l') is True
+        assert guard.search(1, r'^ls\b', 'cat x') is False
+        assert guard.get_offenders() == {}
+    finally:
+        guard.close()
+
+
+def test_quarantine_and_pattern_change():
+    guard = RegexGuard(timeout=0.05, max_offenses=2)
+    try:
+        for _ in range(2):
+            assert guard.search(1, SLOW_PATTERN, SLOW_COMMAND) is None
+        assert guard.is_quarantined(1, SLOW_PATTERN)
+        assert guard.get_offenders()[1]['quarantined'] is True
+        # 已隔离的模式不再启动匹配，没有结果
+        assert guard.search(1, SLOW_PATTERN, 'aaa') is None
+        # 修改模式后解除隔离，重新计数
+        assert not guard.is_quarantined(1, r'^a+$')
+        assert guard.search(1, r'^a+$', 'aaa') is True
+        assert guard.search(1, r'(b+)+$', 'b' * 40 + 'c') is None
+        assert guard.get_offenders()[1]['count'] == 1
+    finally:
+        guard.close()
+
+
+def test_matches_do_not_wait_for_each_other():
+    guard = RegexGuard(timeout=3.0)
+    finished = {}
+
+    def slow():
+        guard.search(1, SLOW_PATTERN, SLOW_COMMAND)
+        finished['slow'] = time.monotonic()
+
+    try:
+        thread = threading.Thread(target=slow)
+        thread.start()
+        time.sleep(0.5)
+        assert guard.search(2, r'^ls\b', 'ls') is True
+        finished['fast'] = time.monotonic()
+        thread.join()
+        assert finished['fast'] < finished['slow']
+    finally:
+        guard.close()
+
+
+def test_timeout_fails_closed_and_is_not_cached():
+    guard = RegexGuard(timeout=0.05, max_offenses=2)
+    rules = [Rule(1, 'slow', '', SLOW_PATTERN, 'empty'), Rule(2, 'all', '', r'.*', 'replace')]
+    snapshot = RuleSnapshot.build(1, rules, guard=guard)
+    cache = DecisionCache()
+    try:
+        # 超时的规则按匹配处理，不会落到后面的规则
+        rule, position = cache.lookup(snapshot, SLOW_COMMAND)
+        assert (rule.id, position) == (1, 0)
+        assert cache.get(SLOW_COMMAND, snapshot.version) is None
+        # 隔离后同样按匹配处理
+        cache.lookup(snapshot, SLOW_COMMAND)
+        assert guard.is_quarantined(1, SLOW_PATTERN)
+        assert cache.lookup(snapshot, 'aaa')[0].id == 1
+        assert cache.get('aaa', snapshot.version) is None
+        # 确定的结果照常缓存
+        guard.reset()
+        assert cache.lookup(snapshot, 'bbb')[0].id == 2
+        assert cache.get('bbb', snapshot.version) is not None
+    finally:
+        guard.close()
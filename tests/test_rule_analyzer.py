@@ -0,0 +1,58 @@
+from src.core.rule_analyzer import RuleAnalysis, analyze_rules, prunable_rule_ids
+from src.core.rule_manager import Rule
+
+
+def _analyze(*patterns):
+    rules = [Rule(i + 1, f"r{i + 1}", "", pattern, 'empty') for i, pattern in enumerate(patterns)]
+    return analyze_rules(rules)
+
+
+def test_literal_shadowed_by_wildcard():
+    result = _analyze('x.*y', 'xy')[1]
+    assert result.status == RuleAnalysis.DEAD
+    assert result.shadowed_by == [1]
+
+
+def test_inline_dotall_not_covered_by_plain_dot():
+    # a.b 不匹配 "a\nb"，(?s)a.b 匹配
+    results = _analyze('a.b', '(?s)a.b')
+    assert not results[1].is_dead
+    assert prunable_rule_ids(results) == []
+
+
+def test_dotall_covers_plain_dot():
+    assert _analyze('(?s)a.b', 'a.b')[1].is_dead
+
+
+def test_multiline_not_covered_by_plain_anchor():
+    assert not _analyze('^a$', '(?m)^a$')[1].is_dead
+
+
+def test_possessive_repeat_is_not_translated():
+    # x.*+y 的 .*+ 吞掉 y 后不回溯，永远不会匹配 "xy"
+    results = _analyze('x.*+y', 'xy')
+    assert not results[1].is_dead
+    assert prunable_rule_ids(results) == []
+
+
+def test_atomic_group_is_not_translated():
+    assert not _analyze('(?>x.*)y', 'xy')[1].is_dead
+
+
+def test_disabled_and_invalid_rules():
+    rules = [Rule(1, "a", "", "abc", 'empty', enabled=False), Rule(2, "b", "", "(", 'empty')]
+    statuses = [result.status for result in analyze_rules(rules)]
+    assert statuses == [RuleAnalysis.DISABLED, RuleAnalysis.INVALID]
+
+
+def test_plain_dot_star_does_not_cross_newline():
+    # a.*b 不匹配 "a\nb"，其后的规则仍然可以触发
+    for pattern in ('a\nb', r'a\nb', r'xa\nb', r'^a\nb'):
+        results = _analyze('a.*b', pattern)
+        assert not results[1].is_dead, pattern
+        assert prunable_rule_ids(results) == []
+    assert not _analyze('^a.*b', r'^a\nb')[1].is_dead
+    # 换行不在字面量之间时仍然可以证明覆盖
+    assert _analyze('a.*b', r'q\nab')[1].is_dead
+    assert _analyze('a.*b', r'a\nab')[1].is_dead
+    assert _analyze('(?s)a.*b', r'a\nb')[1].is_dead
@@ -0,0 +1,18 @@
+from src.core.rule_manager import Rule
+
+
+def test_dict_round_trip_keeps_cache_and_limits():
+    # 复制规则经过字典往返，不能丢失缓存和资源限制设置
+    rule = Rule.from_dict({'id': 5, 'name': 'a', 'pattern': 'x', 'action': 'filter',
+                           'filter': 'cat', 'cache_output': True, 'cache_ttl': 30,
+                           'cpu_limit': 2, 'memory_limit': 100})
+    copy = Rule.from_dict({**rule.to_dict(), 'id': 0, 'name': 'a (复制)'})
+    assert copy.to_dict() == {**rule.to_dict(), 'id': 0, 'name': 'a (复制)'}
+    assert copy.cache_output and copy.cache_ttl == 30
+    assert copy.cpu_limit == 2 and copy.memory_limit == 100
+
+
+def test_dict_round_trip_keeps_metadata():
+    rule = Rule.from_dict({'id': 1, 'name': 'm', 'pattern': '^ls', 'action': 'metadata',
+                           'metadata': {'mode': '0755'}})
+    assert Rule.from_dict(rule.to_dict()).metadata == {'mode': '0755'}
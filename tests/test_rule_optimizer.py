@@ -0,0 +1,45 @@
+import re
+
+from src.core.rule_analyzer import patterns_disjoint
+from src.core.rule_manager import Rule
+from src.core.rule_optimizer import HitStats, plan_reorder
+
+
+def _rules(*patterns):
+    return [Rule(i + 1, f"r{i + 1}", "", pattern, 'empty') for i, pattern in enumerate(patterns)]
+
+
+def test_distinct_literals_disjoint():
+    assert patterns_disjoint('^abc$', '^abd$')
+    assert patterns_disjoint('^ls ', '^cat ')
+
+
+def test_dollar_matches_before_final_newline():
+    # $ 可以匹配末尾换行之前，两个模式都匹配 "abc\n"
+    assert re.search('^abc$', 'abc\n') and re.search('^abc\n$', 'abc\n')
+    assert not patterns_disjoint('^abc$', '^abc\n$')
+    assert not patterns_disjoint('^abc$', 'abc\n')
+    assert patterns_disjoint('^abc\\Z', '^abc\n$')
+
+
+def test_multiline_anchor_not_disjoint():
+    # 多行模式下 "ac\nab" 同时匹配两个模式
+    assert not patterns_disjoint('(?m)^ab', '^ac')
+    assert not patterns_disjoint('(?m:^)ab', '^ac')
+
+
+def test_case_insensitive_literals_overlap():
+    assert not patterns_disjoint('^abc$', '^ABC$')
+
+
+def test_reorder_keeps_overlapping_rules():
+    rules = _rules('^abc$', '^abc\n$')
+    plan = plan_reorder(rules, HitStats({1: 1, 2: 100}, 101))
+    assert plan.order == [1, 2]
+
+
+def test_reorder_moves_frequent_disjoint_rule():
+    rules = _rules('^abc$', '^abd$')
+    plan = plan_reorder(rules, HitStats({1: 1, 2: 100}, 101))
+    assert plan.order == [2, 1]
+    assert plan.after < plan.before
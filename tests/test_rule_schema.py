@@ -0,0 +1,95 @@
+import io
+import json
+
+import pytest
+
+from src.core.rule_schema import (
+    RulesFileSyntaxError, _JsonStreamReader, iter_rules_file, validate_rules_file,
+)
+
+
+def _rule(rule_id, **extra):
+    return {'id': rule_id, 'name': f'rule {rule_id}', 'description': '', 'pattern': f'^cmd{rule_id}$',
+            'action': 'empty', 'enabled': True, **extra}
+
+
+@pytest.fixture
+def rules_file(tmp_path):
+    data = {'config': {'log_directory': '/tmp'},
+            'rules': [_rule(i, description='数字 12345 ' * (i % 3)) for i in range(1, 40)]}
+    path = tmp_path / 'rules.json'
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+    return path, data
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 64, 65536])
+def test_stream_matches_json_load(rules_file, chunk_size):
+    path, data = rules_file
+    rules = list(iter_rules_file(path, chunk_size=chunk_size))
+    assert [rule for _, _, rule in rules] == data['rules']
+    assert [index for index, _, _ in rules] == list(range(len(data['rules'])))
+    # 行号指向规则对象的开头
+    lines = path.read_text(encoding='utf-8').split('\n')
+    for _, line, rule in rules:
+        assert lines[line - 1].strip() == '{'
+        assert lines[line].strip() == f'"id": {rule["id"]},'
+
+
+def test_empty_and_other_fields(tmp_path):
+    path = tmp_path / 'rules.json'
+    path.write_text('{"rules": [], "config": {"rules": [1]}}')
+    assert list(iter_rules_file(path, chunk_size=3)) == []
+    path.write_text('{}')
+    assert list(iter_rules_file(path)) == []
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 65536])
+def test_syntax_error_line(tmp_path, chunk_size):
+    path = tmp_path / 'rules.json'
+    path.write_text('{\n  "rules": [\n    {"id": 1},\n    {"id": 2,}\n  ]\n}\n')
+    with pytest.raises(RulesFileSyntaxError) as info:
+        list(iter_rules_file(path, chunk_size=chunk_size))
+    assert info.value.line == 4
+
+
+def test_validate_reports_locations(tmp_path):
+    path = tmp_path / 'rules.json'
+    rules = [_rule(1), _rule(1), _rule(2, pattern='(')]
+    path.write_text(json.dumps({'rules': rules}, indent=2), encoding='utf-8')
+    issues = validate_rules_file(path)
+    assert {issue.location.split('.')[0] for issue in issues} == {'rules[1]', 'rules[2]'}
+    assert all(issue.line for issue in issues)
+
+
+
+class _CountingFile(io.StringIO):
+    """记录读取了多少字符"""
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.consumed += len(chunk)
+        return chunk
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 64])
+def test_syntax_error_does_not_read_to_end(chunk_size):
+    rules = ',\n'.join(json.dumps(_rule(i)) for i in range(2, 2000))
+    f = _CountingFile('{"rules": [\n{"id": 1 x},\n' + rules + ']}')
+    reader = _JsonStreamReader(f, chunk_size)
+    reader.expect('{')
+    reader.decode_value()
+    reader.expect(':')
+    reader.expect('[')
+    with pytest.raises(json.JSONDecodeError):
+        reader.decode_value()
+    assert f.consumed < 200
+
+
+@pytest.mark.parametrize('text', ['[1.5e-3, true, null]', '"a\\u00e9b"', '12345'])
+def test_truncated_tokens_are_refilled(text):
+    reader = _JsonStreamReader(io.StringIO(text + ' '), 1)
+    assert reader.decode_value() == json.loads(text)
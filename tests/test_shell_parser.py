@@ -0,0 +1,86 @@
+import shutil
+import subprocess
+
+import pytest
+
+from src.core.shell_parser import (
+    ARGV_MATCH_FUNCTION, compile_argv_pattern, normalize_path, parse_command,
+)
+
+
+def _args(command):
+    return [segment.args for segment in parse_command(command).segments]
+
+
+def test_quoting_and_paths_normalized():
+    expected = [('/etc/login.defs',)]
+    assert _args('cat  /etc/login.defs') == expected
+    assert _args('cat "/etc/login.defs"') == expected
+    assert _args('/bin/cat //etc/./login.defs/') == expected
+    assert parse_command('/bin/cat x').segments[0].program == 'cat'
+
+
+def test_flags_split():
+    segment = parse_command('ls -la --color=auto -- -x').segments[0]
+    assert set(segment.short_flags) == {'l', 'a'}
+    assert segment.long_flags == {'--color=auto', '--color'}
+    assert segment.args == ('-x',)
+
+
+def test_wrappers_and_assignments_skipped():
+    segment = parse_command('LANG=C sudo -u root env X=1 cat /etc/shadow').segments[0]
+    assert segment.program == 'cat'
+    assert segment.args == ('/etc/shadow',)
+
+
+def test_fd_prefixed_redirect_dropped():
+    assert _args('cat 2>/dev/null /etc/x') == [('/etc/x',)]
+    assert _args('ls 2>&1 /bin') == [('/bin',)]
+    assert _args('cat 0</etc/y') == [('/etc/y',)]
+    assert _args('echo 12>f') == [()]
+
+
+def test_separated_or_quoted_digit_is_argument():
+    assert _args('cat 2 >f /etc/x') == [('2', '/etc/x')]
+    assert _args("cat '2'>f x") == [('2', 'x')]
+    assert _args('cat \\2>f x') == [('2', 'x')]
+
+
+def test_pipeline_and_lists():
+    parsed = parse_command('cat x 2>/dev/null | grep -v a')
+    assert parsed.pipeline == ('cat x 2>/dev/null ', ' grep -v a')
+    assert [s.program for s in parsed.segments] == ['cat', 'grep']
+    assert parse_command('a && b').pipeline is None
+    assert parse_command('cat "x').valid is False
+
+
+def test_operator_text_in_argument():
+    # find -exec 的 \; 是参数，不是命令分隔符
+    segments = parse_command(r'find / -exec ls {} \;').segments
+    assert len(segments) == 1
+    assert segments[0].args[-1] == ';'
+
+
+def test_normalize_path():
+    assert normalize_path('./x/') == 'x'
+    assert normalize_path('/') == '/'
+
+
+@pytest.mark.skipif(shutil.which('bash') is None or shutil.which('awk') is None,
+                    reason="需要bash和awk")
+@pytest.mark.parametrize('pattern, command', [
+    ('cat /etc/x', 'cat 2>/dev/null /etc/x'),
+    ('cat /etc/x', 'cat 2 >f /etc/x'),
+    ('cat 2', 'cat 2>/dev/null /etc/x'),
+    ('cat 2', 'cat 2 >f /etc/x'),
+    ('cat 2', "cat '2'>f x"),
+    ('ls -l /bin', 'ls -l 2>&1 /bin'),
+    ('grep PASS', 'cat x 2>/dev/null | grep -v PASS'),
+])
+def test_exported_matcher_agrees(pattern, command):
+    argv_pattern = compile_argv_pattern(pattern)
+    expected = any(argv_pattern.matches_segment(segment)
+                   for segment in parse_command(command).segments)
+    script = f'{ARGV_MATCH_FUNCTION}{argv_pattern.bash_condition()}'
+    result = subprocess.run(['bash', '-c', script], env={'CMD': command, 'PATH': '/usr/bin:/bin'})
+    assert (result.returncode == 0) == expected
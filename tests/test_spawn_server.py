@@ -0,0 +1,86 @@
+import os
+import signal
+import subprocess
+import time
+
+import pytest
+
+from src.core.spawn_server import SpawnedProcess, SpawnServer
+
+
+@pytest.fixture
+def server():
+    server = SpawnServer()
+    if not server.start():
+        pytest.skip("平台不支持posix_spawn或fd传递")
+    yield server
+    server.close()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+def test_pipes_passed_to_child(server):
+    process = server.popen(['cat'], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    assert isinstance(process, SpawnedProcess)
+    process.stdin.write(b'hello\n')
+    process.stdin.close()
+    assert process.stdout.read() == b'hello\n'
+    assert process.wait(5) == 0
+    process.stdout.close()
+
+
+def test_stderr_merged_into_stdout(server):
+    process = server.popen('echo out; echo err >&2; exit 3', shell=True,
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    assert sorted(process.stdout.read().split()) == [b'err', b'out']
+    assert process.wait(5) == 3
+    process.stdout.close()
+
+
+def test_spawn_error_raised(server):
+    with pytest.raises(OSError):
+        server.popen(['/nonexistent/fakelinux-command'], stdout=subprocess.DEVNULL)
+
+
+def test_environment_changes_forwarded(server):
+    os.environ['FAKELINUX_TEST_VAR'] = 'first'
+    try:
+        process = server.popen('echo $FAKELINUX_TEST_VAR', shell=True, stdout=subprocess.PIPE)
+        assert process.stdout.read() == b'first\n'
+        process.wait(5)
+        process.stdout.close()
+        os.environ['FAKELINUX_TEST_VAR'] = 'second'
+        process = server.popen('echo $FAKELINUX_TEST_VAR', shell=True, stdout=subprocess.PIPE)
+        assert process.stdout.read() == b'second\n'
+        process.wait(5)
+        process.stdout.close()
+    finally:
+        del os.environ['FAKELINUX_TEST_VAR']
+
+
+def test_signal_group_kills_grandchildren(server):
+    process = server.popen('sleep 30 & echo $!; wait', shell=True, stdout=subprocess.PIPE,
+                           start_new_session=True)
+    grandchild = int(process.stdout.readline())
+    process.send_signal_group(signal.SIGKILL)
+    assert process.wait(5) == -signal.SIGKILL
+    process.stdout.close()
+    for _ in range(50):
+        if not _alive(grandchild):
+            break
+        time.sleep(0.05)
+    assert not _alive(grandchild)
+
+
+def test_signal_after_exit_ignored(server):
+    process = server.popen(['true'])
+    assert process.wait(5) == 0
+    # 已回收的pid可能被复用，不能再发信号
+    process.send_signal_group(signal.SIGKILL)
+    process.kill()
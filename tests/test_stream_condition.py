@@ -0,0 +1,66 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from src.core.stream_condition import MAX_LINE_LENGTH, compile_condition
+
+OUTPUT = (b'root:x:0:0:root:/root:/bin/bash\n'
+          b'daemon:x:1:1:daemon:/usr/sbin:/usr/sbin/nologin\n'
+          b'PASS_MAX_DAYS\t99999\n'
+          b'# comment line\n'
+          b'word-boundary rooted\n'
+          b'last line without newline')
+
+CONDITIONS = [
+    'grep root', 'grep -q ROOT', 'grep -i root', 'grep -v root', 'grep -w root', 'grep -x "# comment line"',
+    'grep -E "PASS_(MAX|MIN)_DAYS"', "grep -F 'a.b'", 'grep -e daemon -e nomatch', "egrep '^[0-9]+$'",
+    'fgrep x:0', "grep 'bash$'", 'grep "^#"', 'grep -c nologin', r"grep -E '\bline\b'",
+    "grep 'newline$'", 'grep -E "[[:digit:]]{5}"', 'grep -v -e x -e line',
+]
+
+
+def _grep(condition, output):
+    return subprocess.run(['bash', '-c', condition], input=output, stdout=subprocess.DEVNULL,
+                          env={**os.environ, 'LC_ALL': 'C'}).returncode == 0
+
+
+@pytest.fixture(autouse=True)
+def c_locale(monkeypatch):
+    for name in ('LC_ALL', 'LC_CTYPE', 'LANG'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('LC_ALL', 'C')
+
+
+@pytest.mark.skipif(shutil.which('grep') is None, reason="需要grep")
+@pytest.mark.parametrize('condition', CONDITIONS)
+def test_agrees_with_grep(condition):
+    predicate = compile_condition(condition)
+    assert predicate is not None, condition
+    expected = _grep(condition, OUTPUT)
+    assert predicate.evaluate(OUTPUT) == expected
+    # 按任意大小分块输入结果相同
+    for size in (1, 3, 17):
+        scanner = predicate.scanner()
+        matched = False
+        for start in range(0, len(OUTPUT), size):
+            if scanner.feed(OUTPUT[start:start + size]):
+                matched = True
+                break
+        assert (matched or scanner.finish()) == expected, (condition, size)
+
+
+@pytest.mark.parametrize('condition', [
+    'grep root | head', 'grep $USER', 'grep -r root /etc', 'grep -P "\\d"', 'awk /root/',
+    'grep root file.txt', 'grep "bash$"', '',
+])
+def test_unsupported_conditions(condition):
+    assert compile_condition(condition) is None
+
+
+def test_long_line_overflows():
+    scanner = compile_condition('grep needle').scanner()
+    assert scanner.feed(b'x' * (MAX_LINE_LENGTH + 1)) is False
+    assert scanner.overflow
+    assert scanner.feed(b'needle\n') is False